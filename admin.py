@@ -0,0 +1,112 @@
+"""AdminService: operational RPCs served next to the NoteService."""
+import logging
+import os
+import time
+
+import grpc
+
+import tracing
+from sharding import ReshardInProgressError
+from storage import StorageError
+
+# These imports will fail in PyCharm but work in Docker
+import notes_pb2
+import notes_pb2_grpc
+
+DEFAULT_BACKUP_DIR = "data/backups"
+
+logger = logging.getLogger("notes.admin")
+
+
+def backup_path(backup_dir, name):
+    """Where a backup called `name` goes; raises ValueError for names that aren't plain file names."""
+    if not name:
+        name = time.strftime("notes-%Y%m%dT%H%M%SZ.db", time.gmtime())
+    if os.path.basename(name) != name or name in (".", ".."):
+        raise ValueError(f"Backup name must be a plain file name, got {name!r}")
+    return os.path.join(backup_dir, name)
+
+
+def _size(path):
+    # A sharded store's backup is a directory of shard files
+    if not os.path.isdir(path):
+        return os.path.getsize(path)
+    return sum(os.path.getsize(os.path.join(path, name)) for name in os.listdir(path))
+
+
+class AdminService(notes_pb2_grpc.AdminServiceServicer):
+
+    def __init__(self, store, backup_dir=DEFAULT_BACKUP_DIR):
+        self.store = store
+        self.backup_dir = backup_dir
+
+    def Backup(self, request, context):
+        try:
+            path = backup_path(self.backup_dir, request.name)
+        except ValueError as e:
+            context.set_code(grpc.StatusCode.INVALID_ARGUMENT)
+            context.set_details(str(e))
+            return notes_pb2.BackupResponse()
+        started = time.perf_counter()
+        try:
+            os.makedirs(self.backup_dir, exist_ok=True)
+            pages = self.store.backup(path)
+        except NotImplementedError:
+            context.set_code(grpc.StatusCode.UNIMPLEMENTED)
+            context.set_details("This store has no database file to back up")
+            return notes_pb2.BackupResponse()
+        except ReshardInProgressError as e:
+            context.set_code(grpc.StatusCode.FAILED_PRECONDITION)
+            context.set_details(str(e))
+            return notes_pb2.BackupResponse()
+        except FileExistsError as e:
+            context.set_code(grpc.StatusCode.ALREADY_EXISTS)
+            context.set_details(str(e))
+            return notes_pb2.BackupResponse()
+        except (StorageError, OSError) as e:
+            context.set_code(grpc.StatusCode.INTERNAL)
+            context.set_details(f"Backup failed: {e}")
+            return notes_pb2.BackupResponse()
+        seconds = time.perf_counter() - started
+        logger.info("Backup written", extra={"path": path, "pages": pages})
+        return notes_pb2.BackupResponse(path=path, pages=pages, size_bytes=_size(path), seconds=seconds)
+
+    def Reshard(self, request, context):
+        reshard = getattr(self.store, "reshard", None)
+        if reshard is None:
+            context.set_code(grpc.StatusCode.UNIMPLEMENTED)
+            context.set_details("Only a sharded store (--store sharded) can be resharded")
+            return notes_pb2.ReshardResponse()
+        started = time.perf_counter()
+        try:
+            moved = reshard(request.shards)
+        except ValueError as e:
+            context.set_code(grpc.StatusCode.INVALID_ARGUMENT)
+            context.set_details(str(e))
+            return notes_pb2.ReshardResponse()
+        except ReshardInProgressError as e:
+            context.set_code(grpc.StatusCode.FAILED_PRECONDITION)
+            context.set_details(str(e))
+            return notes_pb2.ReshardResponse()
+        except StorageError as e:
+            context.set_code(grpc.StatusCode.INTERNAL)
+            context.set_details(f"Reshard failed: {e}")
+            return notes_pb2.ReshardResponse()
+        seconds = time.perf_counter() - started
+        logger.info("Resharded", extra={"shards": request.shards, "moved": moved})
+        return notes_pb2.ReshardResponse(shards=request.shards, moved_notes=moved, seconds=seconds)
+
+    def Profile(self, request, context):
+        if not 0 < request.seconds <= tracing.MAX_PROFILE_SECONDS:
+            context.set_code(grpc.StatusCode.INVALID_ARGUMENT)
+            context.set_details(f"seconds must be more than 0 and at most {tracing.MAX_PROFILE_SECONDS:g}")
+            return notes_pb2.ProfileResponse()
+        interval = request.interval_ms / 1000 if request.interval_ms > 0 else tracing.PROFILE_INTERVAL
+        try:
+            counts, samples = tracing.sample_stacks(request.seconds, interval, request.include_idle)
+        except tracing.ProfilerBusyError as e:
+            context.set_code(grpc.StatusCode.FAILED_PRECONDITION)
+            context.set_details(str(e))
+            return notes_pb2.ProfileResponse()
+        logger.info("Profile taken", extra={"seconds": request.seconds, "samples": samples})
+        return notes_pb2.ProfileResponse(collapsed_stacks=tracing.collapse(counts), samples=samples)
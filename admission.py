@@ -0,0 +1,271 @@
+"""Admission control: decides whether an RPC runs at all.
+
+Checked in this order when an RPC is about to run (cheapest first):
+
+1. Deadline: if the client's deadline already passed while the call sat
+   in the queue, nobody is waiting for the answer, so skip the work
+   (DEADLINE_EXCEEDED).
+2. Queue depth: with more than `max_queue` calls waiting for a worker,
+   new work is shed (RESOURCE_EXHAUSTED) so the backlog drains instead of
+   every call getting slow. The sync server also passes max_workers +
+   max_queue to grpc.server(maximum_concurrent_rpcs=...), which turns
+   calls away before they are queued at all.
+3. Per-client rate: a token bucket per client, keyed on the
+   `x-client-id` metadata header (or the peer address without one).
+4. Per-method concurrency (opt-in, `--method-limit`): expensive methods
+   (listings, search, bulk calls) can be held to a few workers at a time,
+   so they can't starve the cheap GetNote / CreateNote calls. The right
+   numbers depend on max_workers / db_workers, so there are no defaults.
+   On grpc.aio, response streams (StreamNotes, WatchNotes) are never
+   counted: they wait on the event loop, not on a worker.
+
+Rejections carry RESOURCE_EXHAUSTED, which note_client does not retry.
+"""
+import collections
+import threading
+import time
+
+import grpc
+
+CLIENT_ID_HEADER = "x-client-id"
+DEFAULT_MAX_QUEUE = 100
+MIN_TIME_REMAINING = 0.001  # seconds; less than this counts as expired
+MAX_TRACKED_CLIENTS = 10_000  # rate limit buckets kept (least recently seen dropped first)
+
+
+def parse_method_limits(values):
+    """Turns ["ListNotes=8", ...] into {"ListNotes": 8, ...}; raises ValueError.
+
+    A limit of 0 removes one given earlier.
+    """
+    limits = {}
+    for value in values or []:
+        method, sep, limit = value.partition("=")
+        if not sep or not method or not limit.isdigit():
+            raise ValueError(f"Expected METHOD=N, got {value!r}")
+        if int(limit):
+            limits[method] = int(limit)
+        else:
+            limits.pop(method, None)
+    return limits
+
+
+class TokenBucket:
+    """`rate` tokens per second, holding at most `burst`."""
+
+    def __init__(self, rate, burst):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = burst
+        self.updated = time.monotonic()
+
+    def take(self, now):
+        if now > self.updated:
+            self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+        if self.tokens >= 1:
+            self.tokens -= 1
+            return True
+        return False
+
+
+def client_key(metadata, peer):
+    for key, value in metadata or ():
+        if key == CLIENT_ID_HEADER:
+            return value
+    # "ipv4:10.0.0.7:51234" -> "ipv4:10.0.0.7"; the port changes per connection
+    return peer.rsplit(":", 1)[0] if peer else ""
+
+
+class AdmissionController:
+    """The admission decisions, shared by the sync and grpc.aio interceptors. Thread-safe."""
+
+    def __init__(self, method_limits=None, rate=0.0, burst=None, max_queue=DEFAULT_MAX_QUEUE,
+                 min_time_remaining=MIN_TIME_REMAINING, max_clients=MAX_TRACKED_CLIENTS, service_metrics=None):
+        self.method_limits = method_limits or {}  # at most this many calls of a method run at once
+        self.rate = rate  # per client per second; 0 = no rate limit
+        self.burst = burst or max(1.0, rate)
+        self.max_queue = max_queue  # 0 = don't shed on queue depth
+        self.min_time_remaining = min_time_remaining
+        self.max_clients = max_clients
+        self.queue_depth = None  # callable, see watch_executor()
+        self.service_metrics = service_metrics
+        self.rejected = collections.Counter()
+        self._lock = threading.Lock()
+        self._running = collections.Counter()
+        self._buckets = collections.OrderedDict()
+
+    def watch_executor(self, executor):
+        # Same private queue as metrics.ServiceMetrics.watch_executor()
+        self.queue_depth = executor._work_queue.qsize
+
+    def _reject(self, method, reason, code, details):
+        with self._lock:
+            self.rejected[reason] += 1
+        if self.service_metrics is not None:
+            self.service_metrics.rejected.inc(method, reason)
+        return code, details
+
+    def _allow_client(self, key):
+        now = time.monotonic()
+        with self._lock:
+            bucket = self._buckets.get(key)
+            if bucket is None:
+                bucket = self._buckets[key] = TokenBucket(self.rate, self.burst)
+                if len(self._buckets) > self.max_clients:
+                    self._buckets.popitem(last=False)
+            else:
+                self._buckets.move_to_end(key)
+            return bucket.take(now)
+
+    def admit(self, method, metadata, context, counted=True):
+        """Returns None and takes a slot for the method, or the (code, details) to reject with.
+
+        Call release(method) when an admitted call finishes. With counted=False
+        the method's concurrency limit doesn't apply, and there's nothing to release.
+        """
+        remaining = context.time_remaining()
+        if remaining is not None and remaining < self.min_time_remaining:
+            return self._reject(method, "deadline", grpc.StatusCode.DEADLINE_EXCEEDED,
+                                "Deadline expired before the call started")
+        if self.max_queue and self.queue_depth is not None and self.queue_depth() > self.max_queue:
+            return self._reject(method, "queue", grpc.StatusCode.RESOURCE_EXHAUSTED,
+                                "Server overloaded, try again later")
+        if self.rate and not self._allow_client(client_key(metadata, context.peer())):
+            return self._reject(method, "rate", grpc.StatusCode.RESOURCE_EXHAUSTED,
+                                f"Rate limit of {self.rate:g} calls/s exceeded")
+        if not counted:
+            return None
+        limit = self.method_limits.get(method)
+        with self._lock:
+            if limit is not None and self._running[method] >= limit:
+                rejected = True
+            else:
+                self._running[method] += 1
+                rejected = False
+        if rejected:
+            return self._reject(method, "concurrency", grpc.StatusCode.RESOURCE_EXHAUSTED,
+                                f"Too many concurrent {method} calls, try again later")
+        return None
+
+    def release(self, method):
+        with self._lock:
+            self._running[method] -= 1
+
+    def stats(self):
+        with self._lock:
+            return {"running": {method: n for method, n in self._running.items() if n},
+                    "rejected": dict(self.rejected)}
+
+
+def _method_name(handler_call_details):
+    return handler_call_details.method.rsplit("/", 1)[-1]
+
+
+class AdmissionInterceptor(grpc.ServerInterceptor):
+    """Runs AdmissionController.admit() before every call on the thread pool server."""
+
+    def __init__(self, controller):
+        self.controller = controller
+
+    def intercept_service(self, continuation, handler_call_details):
+        handler = continuation(handler_call_details)
+        if handler is None:
+            return None
+        method = _method_name(handler_call_details)
+        metadata = handler_call_details.invocation_metadata
+        controller = self.controller
+
+        def run(behavior, request, context):
+            rejection = controller.admit(method, metadata, context)
+            if rejection is not None:
+                context.abort(*rejection)
+            try:
+                return behavior(request, context)
+            finally:
+                controller.release(method)
+
+        def run_stream(behavior, request, context):
+            rejection = controller.admit(method, metadata, context)
+            if rejection is not None:
+                context.abort(*rejection)
+            try:
+                yield from behavior(request, context)
+            finally:
+                controller.release(method)
+
+        if handler.unary_unary:
+            return grpc.unary_unary_rpc_method_handler(
+                lambda request, context: run(handler.unary_unary, request, context),
+                handler.request_deserializer, handler.response_serializer)
+        if handler.unary_stream:
+            return grpc.unary_stream_rpc_method_handler(
+                lambda request, context: run_stream(handler.unary_stream, request, context),
+                handler.request_deserializer, handler.response_serializer)
+        if handler.stream_unary:
+            return grpc.stream_unary_rpc_method_handler(
+                lambda request_iterator, context: run(handler.stream_unary, request_iterator, context),
+                handler.request_deserializer, handler.response_serializer)
+        return grpc.stream_stream_rpc_method_handler(
+            lambda request_iterator, context: run_stream(handler.stream_stream, request_iterator, context),
+            handler.request_deserializer, handler.response_serializer)
+
+
+class AioAdmissionInterceptor(grpc.aio.ServerInterceptor):
+    """grpc.aio version of AdmissionInterceptor.
+
+    Here it runs on the event loop, before any executor work is queued, so
+    rejected calls cost no database worker at all.
+    """
+
+    def __init__(self, controller):
+        self.controller = controller
+
+    async def intercept_service(self, continuation, handler_call_details):
+        handler = await continuation(handler_call_details)
+        if handler is None:
+            return None
+        method = _method_name(handler_call_details)
+        metadata = handler_call_details.invocation_metadata
+        controller = self.controller
+
+        # Real async functions / generators, as in AioMetricsInterceptor
+        async def run(behavior, request, context):
+            rejection = controller.admit(method, metadata, context)
+            if rejection is not None:
+                await context.abort(*rejection)
+            try:
+                return await behavior(request, context)
+            finally:
+                controller.release(method)
+
+        async def run_stream(behavior, request, context):
+            # Streams mostly wait on the loop; their executor work is bounded by the queue check
+            rejection = controller.admit(method, metadata, context, counted=False)
+            if rejection is not None:
+                await context.abort(*rejection)
+            async for response in behavior(request, context):
+                yield response
+
+        if handler.unary_unary:
+            async def unary_unary(request, context):
+                return await run(handler.unary_unary, request, context)
+            return grpc.unary_unary_rpc_method_handler(
+                unary_unary, handler.request_deserializer, handler.response_serializer)
+        if handler.unary_stream:
+            async def unary_stream(request, context):
+                async for response in run_stream(handler.unary_stream, request, context):
+                    yield response
+            return grpc.unary_stream_rpc_method_handler(
+                unary_stream, handler.request_deserializer, handler.response_serializer)
+        if handler.stream_unary:
+            async def stream_unary(request_iterator, context):
+                return await run(handler.stream_unary, request_iterator, context)
+            return grpc.stream_unary_rpc_method_handler(
+                stream_unary, handler.request_deserializer, handler.response_serializer)
+
+        async def stream_stream(request_iterator, context):
+            async for response in run_stream(handler.stream_stream, request_iterator, context):
+                yield response
+        return grpc.stream_stream_rpc_method_handler(
+            stream_stream, handler.request_deserializer, handler.response_serializer)
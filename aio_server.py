@@ -0,0 +1,301 @@
+import asyncio
+import contextvars
+import functools
+import signal
+from concurrent import futures
+
+import grpc
+
+import admin
+import admission
+import changefeed
+import ids
+import metrics
+import server
+import storage
+import tracing
+
+import notes_pb2
+import notes_pb2_grpc
+
+DEFAULT_DB_WORKERS = 8
+
+
+class _CallContext:
+    """Stand-in context for running the sync servicer off the event loop.
+
+    It only records the status the sync code sets, which is copied onto the
+    real aio context once we are back on the loop.
+    """
+
+    def __init__(self):
+        self.code = None
+        self.details = None
+
+    def set_code(self, code):
+        self.code = code
+
+    def set_details(self, details):
+        self.details = details
+
+    def apply(self, context):
+        if self.code is not None:
+            context.set_code(self.code)
+        if self.details is not None:
+            context.set_details(self.details)
+
+
+async def _run(executor, method, request, context):
+    """Runs a sync servicer method on `executor`; returns (response, _CallContext)."""
+    call_context = _CallContext()
+    loop = asyncio.get_running_loop()
+    # Copy the context so the storage code sees the call's trace (see tracing.py)
+    response = await loop.run_in_executor(executor, contextvars.copy_context().run, method, request, call_context)
+    call_context.apply(context)
+    return response, call_context
+
+
+class AsyncNoteService(notes_pb2_grpc.NoteServiceServicer):
+    """grpc.aio servicer that reuses NoteService for the actual work.
+
+    Every blocking sqlite call runs on a dedicated, sized executor, so the
+    event loop can keep thousands of idle or streaming clients alive while
+    only `db_workers` threads touch the database.
+    """
+
+    def __init__(self, service, executor):
+        self.service = service
+        self.executor = executor
+
+    async def _run(self, method, request, context):
+        return await _run(self.executor, method, request, context)
+
+    async def _unary(self, method, request, context):
+        response, _ = await self._run(method, request, context)
+        return response
+
+    async def CreateNote(self, request, context):
+        return await self._unary(self.service.CreateNote, request, context)
+
+    async def GetNote(self, request, context):
+        # Cache hits are answered on the loop without an executor round-trip
+        if self.service.cache is not None and not request.read_mask.paths:
+            cached = self.service.cache.get(request.id)
+            if cached is not None:
+                return notes_pb2.GetNoteResponse.FromString(cached)
+        return await self._unary(self.service.GetNote, request, context)
+
+    async def ReadNoteContent(self, request, context):
+        # Load on the executor, then slice on the loop
+        note, _ = await self._run(self.service.load_for_read, request, context)
+        if note is None:
+            return
+        chunk_size = min(request.chunk_size or server.DEFAULT_CHUNK_SIZE, server.MAX_CHUNK_SIZE)
+        for chunk in server.content_chunks(note, chunk_size):
+            yield chunk
+
+    async def DeleteNote(self, request, context):
+        return await self._unary(self.service.DeleteNote, request, context)
+
+    async def UpdateNote(self, request, context):
+        return await self._unary(self.service.UpdateNote, request, context)
+
+    async def ListNotes(self, request, context):
+        return await self._unary(self.service.ListNotes, request, context)
+
+    async def BatchCreateNotes(self, request, context):
+        return await self._unary(self.service.BatchCreateNotes, request, context)
+
+    async def BatchGetNotes(self, request, context):
+        return await self._unary(self.service.BatchGetNotes, request, context)
+
+    async def BatchDeleteNotes(self, request, context):
+        return await self._unary(self.service.BatchDeleteNotes, request, context)
+
+    async def SearchNotes(self, request, context):
+        return await self._unary(self.service.SearchNotes, request, context)
+
+    async def CountNotes(self, request, context):
+        return await self._unary(self.service.CountNotes, request, context)
+
+    async def ListTags(self, request, context):
+        return await self._unary(self.service.ListTags, request, context)
+
+    async def StreamNotes(self, request, context):
+        # Read page by page on the executor instead of holding a cursor (and a
+        # worker thread) open for the whole stream
+        page_size = (min(request.page_size, server.MAX_PAGE_SIZE)
+                     if request.page_size > 0 else server.STREAM_CHUNK_SIZE)
+        page_token = request.page_token
+        while True:
+            page_request = notes_pb2.ListNotesRequest()
+            page_request.CopyFrom(request)  # same mask, order and ranges
+            page_request.page_size = page_size
+            page_request.page_token = page_token
+            page, call_context = await self._run(self.service.ListNotes, page_request, context)
+            if call_context.code is not None:
+                return
+            for note in page.notes:
+                yield note
+            page_token = page.next_page_token
+            if not page_token:
+                return
+
+    async def WatchNotes(self, request, context):
+        feed = self.service.feed
+        after_seq = request.after_seq if request.HasField("after_seq") else None
+        if feed is None or (after_seq is not None and after_seq < 0):
+            # Let the sync servicer set the status
+            for _ in self.service.WatchNotes(request, context):
+                pass
+            return
+        loop = asyncio.get_running_loop()
+        wake = asyncio.Event()
+        # A watcher only costs a buffer and this task; the DB is read by the
+        # feed's single poller (plus a few history pages when resuming)
+        subscription = feed.subscribe(waker=lambda: loop.call_soon_threadsafe(wake.set))
+        try:
+            cursor = subscription.start_seq
+            if after_seq is not None:
+                await loop.run_in_executor(self.executor, feed.check_resume, after_seq)
+                cursor = after_seq
+                while cursor < subscription.start_seq:
+                    events = await loop.run_in_executor(self.executor, feed.history, cursor,
+                                                        subscription.start_seq)
+                    if not events:
+                        break
+                    for event in events:
+                        yield server.event_to_proto(event)
+                    cursor = events[-1][0]
+            while True:
+                wake.clear()
+                # Checked before waiting: a subscription to a stopped feed starts
+                # out closed, and nothing would ever set `wake`
+                events = subscription.get(timeout=0)
+                if not events:
+                    if subscription.closed:
+                        return
+                    await wake.wait()
+                    continue
+                for event in events:
+                    if event[0] > cursor:
+                        yield server.event_to_proto(event)
+                        cursor = event[0]
+        except changefeed.ResumeError as e:
+            context.set_code(grpc.StatusCode.OUT_OF_RANGE)
+            context.set_details(f"Can't resume: {e}")
+        except changefeed.SubscriberOverflow as e:
+            context.set_code(grpc.StatusCode.RESOURCE_EXHAUSTED)
+            context.set_details(f"Watcher fell behind ({e}); resume from the last seq received")
+        except storage.StorageError as e:
+            context.set_code(grpc.StatusCode.INTERNAL)
+            context.set_details(f"Database error: {e}")
+        finally:
+            subscription.close()
+
+    async def ImportNotes(self, request_iterator, context):
+        imported = 0
+
+        async def flush(rows):
+            # The sync servicer sets the status as-is; it only needs to know what earlier chunks committed
+            import_chunk = functools.partial(self.service.import_notes, offset=imported)
+            response, call_context = await self._run(import_chunk, iter(rows), context)
+            return response.imported_count, call_context.code is None
+
+        rows = []
+        async for note in request_iterator:
+            rows.append(note)
+            if len(rows) >= server.IMPORT_CHUNK_SIZE:
+                count, ok = await flush(rows)
+                imported += count
+                if not ok:
+                    return notes_pb2.ImportNotesResponse(imported_count=imported)
+                rows = []
+        if rows:
+            count, _ = await flush(rows)
+            imported += count
+        return notes_pb2.ImportNotesResponse(imported_count=imported)
+
+
+class AsyncAdminService(notes_pb2_grpc.AdminServiceServicer):
+    """Runs admin.AdminService on the executor, like AsyncNoteService."""
+
+    def __init__(self, service, executor):
+        self.service = service
+        self.executor = executor
+
+    async def _unary(self, method, request, context):
+        response, _ = await _run(self.executor, method, request, context)
+        return response
+
+    async def Backup(self, request, context):
+        return await self._unary(self.service.Backup, request, context)
+
+    async def Reshard(self, request, context):
+        return await self._unary(self.service.Reshard, request, context)
+
+    async def Profile(self, request, context):
+        return await self._unary(self.service.Profile, request, context)
+
+
+async def serve(store=None, db_workers=DEFAULT_DB_WORKERS, cache=None, metrics_port=0,
+                address=server.SERVER_ADDRESS, options=None, compression=None, id_format=ids.DEFAULT_FORMAT,
+                backup_dir=admin.DEFAULT_BACKUP_DIR, admission_control=None, tracer=None, liveness=None,
+                admin_service=False):
+    store = store or storage.open_store("sqlite")
+
+    executor = server.CountingExecutor(max_workers=db_workers, thread_name_prefix="db")
+    interceptors = []
+    if tracer is not None:
+        # Outermost, so the request span covers the other interceptors too
+        interceptors.append(tracing.AioTracingInterceptor(tracer))
+    service_metrics = server.start_metrics(metrics_port)
+    if service_metrics is not None:
+        interceptors.append(metrics.AioMetricsInterceptor(service_metrics))
+        service_metrics.watch_executor(executor, name="notes_db_executor_queue_depth")
+        store = metrics.TimedStore(store, service_metrics.db_latency)
+        if cache is not None:
+            service_metrics.watch_cache(cache)
+    if admission_control is not None:
+        # Queue depth here is the DB executor's: the loop itself never queues calls
+        interceptors.append(admission.AioAdmissionInterceptor(admission_control))
+        admission_control.watch_executor(executor)
+        admission_control.service_metrics = service_metrics
+    feed = changefeed.ChangeFeed(store).start()
+    grpc_server = grpc.aio.server(interceptors=interceptors, options=server.SERVER_OPTIONS + list(options or []),
+                                  compression=compression)
+    notes_pb2_grpc.add_NoteServiceServicer_to_server(
+        AsyncNoteService(server.NoteService(store, cache=cache, feed=feed, id_format=id_format), executor),
+        grpc_server)
+    if admin_service:
+        # No auth, so only with --admin (see server.create_server)
+        notes_pb2_grpc.add_AdminServiceServicer_to_server(
+            AsyncAdminService(admin.AdminService(store, backup_dir=backup_dir), executor), grpc_server)
+
+    port = grpc_server.add_insecure_port(address)
+    await grpc_server.start()
+    loop = asyncio.get_running_loop()
+    if liveness is not None:
+        liveness.watch_executor(executor)
+        liveness.watch_loop(loop)
+        liveness.serving = True
+    print(f"Async server started on port {port} ({db_workers} DB workers)...")
+
+    stop = asyncio.Event()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(sig, stop.set)
+    try:
+        await stop.wait()
+    finally:
+        if liveness is not None:
+            liveness.serving = False
+        feed.stop()  # ends the watch streams, which would otherwise run out the grace period
+        await grpc_server.stop(grace=5)
+        executor.shutdown(wait=True)
+        store.close()
+        if tracer is not None:
+            tracer.close()
+
+
+if __name__ == '__main__':
+    asyncio.run(serve())
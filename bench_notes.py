@@ -0,0 +1,44 @@
+"""pytest-benchmark microbenchmarks over real gRPC calls.
+
+Not collected by a plain `pytest` run (the file isn't named test_*):
+
+    pytest bench_notes.py --benchmark-json bench.json
+"""
+import grpc
+import pytest
+
+import benchmark as harness  # the pytest-benchmark fixture is also called `benchmark`
+
+# These imports will fail in PyCharm but work in Docker
+import notes_pb2
+import notes_pb2_grpc
+
+pytest.importorskip("pytest_benchmark")
+
+
+@pytest.fixture(scope="module", params=["sqlite", "memory"])
+def stub(request):
+    with harness.BenchServer(request.param) as bench, grpc.insecure_channel(bench.target) as channel:
+        note_stub = notes_pb2_grpc.NoteServiceStub(channel)
+        note_stub.ids = harness.prefill(note_stub, 1000)
+        yield note_stub
+
+
+def test_create_note(benchmark, stub):
+    benchmark(stub.CreateNote, notes_pb2.CreateNoteRequest(title="Bench", content="x" * 200))
+
+
+def test_get_note(benchmark, stub):
+    benchmark(stub.GetNote, notes_pb2.GetNoteRequest(id=stub.ids[len(stub.ids) // 2]))
+
+
+def test_list_notes_page(benchmark, stub):
+    benchmark(stub.ListNotes, notes_pb2.ListNotesRequest(page_size=harness.LIST_PAGE_SIZE))
+
+
+def test_stream_notes(benchmark, stub):
+    benchmark(lambda: sum(1 for _ in stub.StreamNotes(notes_pb2.ListNotesRequest())))
+
+
+def test_batch_get_notes(benchmark, stub):
+    benchmark(stub.BatchGetNotes, notes_pb2.BatchGetNotesRequest(ids=stub.ids[:100]))
@@ -0,0 +1,234 @@
+"""Load generator and latency benchmark for the NoteService.
+
+Starts the server in-process on a free local port, drives it over real
+gRPC channels and prints (or writes) a JSON report, e.g.:
+
+    python benchmark.py --clients 8 --duration 10 --mix create=20,get=60,list=10,delete=10
+    python benchmark.py --store memory --sweep 100,1000,10000 --output bench.json
+"""
+import argparse
+import json
+import os
+import random
+import shutil
+import tempfile
+import threading
+import time
+
+import grpc
+
+import server
+import storage
+from cache import LRUCache
+
+# These imports will fail in PyCharm but work in Docker
+import notes_pb2
+import notes_pb2_grpc
+
+DEFAULT_MIX = "create=20,get=60,list=10,delete=10"
+DEFAULT_SWEEP = "100,1000,10000"
+LIST_PAGE_SIZE = 100
+
+
+def parse_mix(text):
+    mix = {}
+    for part in text.split(","):
+        name, _, weight = part.partition("=")
+        if name not in ("create", "get", "list", "delete"):
+            raise ValueError(f"Unknown operation in mix: {name}")
+        mix[name] = float(weight or 1)
+    return mix
+
+
+def percentile(sorted_values, pct):
+    # Nearest-rank percentile on an already sorted list
+    if not sorted_values:
+        return 0.0
+    rank = max(0, min(len(sorted_values) - 1, int(round(pct / 100 * len(sorted_values))) - 1))
+    return sorted_values[rank]
+
+
+def summarize(latencies, errors, elapsed):
+    latencies = sorted(latencies)
+    return {
+        "count": len(latencies),
+        "errors": errors,
+        "throughput_rps": round(len(latencies) / elapsed, 1) if elapsed else 0.0,
+        "mean_ms": round(sum(latencies) / len(latencies) * 1000, 3) if latencies else 0.0,
+        "p50_ms": round(percentile(latencies, 50) * 1000, 3),
+        "p95_ms": round(percentile(latencies, 95) * 1000, 3),
+        "p99_ms": round(percentile(latencies, 99) * 1000, 3),
+    }
+
+
+class BenchServer:
+    """A NoteService running in this process on 127.0.0.1:<free port>."""
+
+    def __init__(self, store_kind="sqlite", cache=False, workers=10, compression=server.DEFAULT_COMPRESSION,
+                 group_commit=0, shards=None):
+        self.tmp_dir = tempfile.mkdtemp(prefix="notes-bench-")
+        self.store = storage.open_store(store_kind, db_name=os.path.join(self.tmp_dir, "notes.db"),
+                                        group_commit=group_commit, shard_dir=os.path.join(self.tmp_dir, "shards"),
+                                        shards=shards)
+        note_cache = LRUCache() if cache else None
+        self.server, port = server.create_server(self.store, cache=note_cache,
+                                                 address="127.0.0.1:0", max_workers=workers,
+                                                 compression=server.COMPRESSION[compression])
+        self.target = f"127.0.0.1:{port}"
+
+    def __enter__(self):
+        self.server.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.server.stop(grace=None).wait()
+        self.store.close()
+        shutil.rmtree(self.tmp_dir, ignore_errors=True)
+
+
+def prefill(stub, count, content_size=200, batch=server.MAX_BATCH_SIZE):
+    content = "x" * content_size
+    ids = []
+    for start in range(0, count, batch):
+        size = min(batch, count - start)
+        response = stub.BatchCreateNotes(notes_pb2.BatchCreateNotesRequest(notes=[
+            notes_pb2.CreateNoteRequest(title=f"Bench note {start + i}", content=content) for i in range(size)
+        ]))
+        ids.extend(result.id for result in response.results)
+    return ids
+
+
+def run_mix(target, clients, duration, mix, prefill_count, content_size, seed=0,
+            compression=server.DEFAULT_COMPRESSION):
+    """Runs `clients` threads, each with its own channel, for `duration` seconds."""
+    with grpc.insecure_channel(target) as channel:
+        ids = prefill(notes_pb2_grpc.NoteServiceStub(channel), prefill_count, content_size)
+    ids_lock = threading.Lock()
+    operations = list(mix)
+    weights = [mix[op] for op in operations]
+    results = {op: {"latencies": [], "errors": 0} for op in operations}
+    results_lock = threading.Lock()
+    content = "x" * content_size
+    start_barrier = threading.Barrier(clients + 1)
+
+    def client(worker):
+        rng = random.Random(seed + worker)
+        local = {op: {"latencies": [], "errors": 0} for op in operations}
+        with grpc.insecure_channel(target, compression=server.COMPRESSION[compression]) as channel:
+            stub = notes_pb2_grpc.NoteServiceStub(channel)
+            start_barrier.wait()
+            deadline = time.perf_counter() + duration
+            while time.perf_counter() < deadline:
+                op = rng.choices(operations, weights)[0]
+                started = time.perf_counter()
+                try:
+                    if op == "create":
+                        response = stub.CreateNote(notes_pb2.CreateNoteRequest(title="Bench", content=content))
+                        with ids_lock:
+                            ids.append(response.id)
+                    elif op == "get":
+                        with ids_lock:
+                            note_id = rng.choice(ids) if ids else ""
+                        stub.GetNote(notes_pb2.GetNoteRequest(id=note_id))
+                    elif op == "list":
+                        stub.ListNotes(notes_pb2.ListNotesRequest(page_size=LIST_PAGE_SIZE))
+                    elif op == "delete":
+                        with ids_lock:
+                            note_id = ids.pop(rng.randrange(len(ids))) if ids else ""
+                        stub.DeleteNote(notes_pb2.DeleteNoteRequest(id=note_id))
+                except grpc.RpcError as e:
+                    # Another client may have deleted the note we picked
+                    if e.code() != grpc.StatusCode.NOT_FOUND:
+                        local[op]["errors"] += 1
+                        continue
+                local[op]["latencies"].append(time.perf_counter() - started)
+        with results_lock:
+            for op in operations:
+                results[op]["latencies"].extend(local[op]["latencies"])
+                results[op]["errors"] += local[op]["errors"]
+
+    threads = [threading.Thread(target=client, args=(worker,)) for worker in range(clients)]
+    for thread in threads:
+        thread.start()
+    start_barrier.wait()
+    started = time.perf_counter()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - started
+
+    report = {op: summarize(data["latencies"], data["errors"], elapsed) for op, data in results.items()}
+    total = sum(len(data["latencies"]) for data in results.values())
+    report["total"] = {"count": total, "throughput_rps": round(total / elapsed, 1)}
+    return report
+
+
+def time_call(fn, repeat):
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        fn()
+        timings.append(time.perf_counter() - started)
+    return round(percentile(sorted(timings), 50) * 1000, 3)
+
+
+def run_list_sweep(store_kind, sizes, content_size, repeat=5):
+    """Times ListNotes/StreamNotes against tables of increasing size."""
+    sweep = []
+    for size in sizes:
+        with BenchServer(store_kind) as bench, grpc.insecure_channel(bench.target) as channel:
+            stub = notes_pb2_grpc.NoteServiceStub(channel)
+            prefill(stub, size, content_size)
+            sweep.append({
+                "size": size,
+                "list_page_ms": time_call(
+                    lambda: stub.ListNotes(notes_pb2.ListNotesRequest(page_size=LIST_PAGE_SIZE)), repeat),
+                "list_all_ms": time_call(lambda: stub.ListNotes(notes_pb2.ListNotesRequest()), repeat),
+                "stream_all_ms": time_call(lambda: sum(1 for _ in stub.StreamNotes(notes_pb2.ListNotesRequest())),
+                                           repeat),
+            })
+    return sweep
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="NoteService load generator and latency benchmark")
+    parser.add_argument("--store", choices=storage.STORE_KINDS, default="sqlite")
+    parser.add_argument("--cache", action="store_true", help="enable the GetNote cache")
+    parser.add_argument("--server-workers", type=int, default=10)
+    parser.add_argument("--group-commit", type=int, default=0,
+                        help="max writes per group commit on the server (0 = commit every write on its own)")
+    parser.add_argument("--shards", type=int, default=None, help="number of shards for --store sharded")
+    parser.add_argument("--compression", choices=sorted(server.COMPRESSION), default=server.DEFAULT_COMPRESSION,
+                        help="channel compression used by the server and the clients (default: the server's)")
+    parser.add_argument("--clients", type=int, default=4, help="concurrent client threads (one channel each)")
+    parser.add_argument("--duration", type=float, default=5.0, help="seconds to run the mixed workload")
+    parser.add_argument("--mix", default=DEFAULT_MIX, help="operation weights, e.g. " + DEFAULT_MIX)
+    parser.add_argument("--prefill", type=int, default=1000, help="notes created before the mixed workload")
+    parser.add_argument("--content-size", type=int, default=200, help="bytes of content per note")
+    parser.add_argument("--sweep", default=DEFAULT_SWEEP,
+                        help="comma separated table sizes for the ListNotes sweep ('' to skip)")
+    parser.add_argument("--output", help="write the JSON report to this file instead of stdout")
+    args = parser.parse_args(argv)
+
+    report = {
+        "config": {key: value for key, value in vars(args).items() if key != "output"},
+        "started_at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+    }
+    with BenchServer(args.store, cache=args.cache, workers=args.server_workers,
+                     compression=args.compression, group_commit=args.group_commit,
+                     shards=args.shards) as bench:
+        report["mix"] = run_mix(bench.target, args.clients, args.duration, parse_mix(args.mix),
+                                args.prefill, args.content_size, compression=args.compression)
+    sizes = [int(size) for size in args.sweep.split(",") if size.strip()]
+    report["list_sweep"] = run_list_sweep(args.store, sizes, args.content_size)
+
+    text = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w") as out:
+            out.write(text + "\n")
+    else:
+        print(text)
+    return report
+
+
+if __name__ == '__main__':
+    main()
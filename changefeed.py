@@ -0,0 +1,203 @@
+"""Fans the store's change log out to WatchNotes subscribers.
+
+One poller thread reads new change log entries and pushes them into a
+bounded buffer per subscriber, so watchers don't hold a database
+connection (or run a query) each. A subscriber that falls more than
+`buffer_size` events behind is dropped; it can resume from the last seq
+it received, since the change log itself is durable.
+"""
+import collections
+import logging
+import threading
+
+import storage
+
+POLL_INTERVAL = 0.05  # seconds between polls when nobody calls notify()
+BUFFER_SIZE = 1000  # events a subscriber may have waiting before it is dropped
+READ_BATCH = 500  # change log rows read per query
+PRUNE_EVERY = 1200  # polls between change log prunes (about a minute when idle)
+
+logger = logging.getLogger("notes.changefeed")
+
+
+class ResumeError(Exception):
+    """The requested resume point is no longer (or not yet) in the change log."""
+
+
+class SubscriberOverflow(Exception):
+    """The subscriber fell too far behind and was dropped."""
+
+
+class Subscription:
+    """Events pushed by the feed for one watcher.
+
+    `start_seq` is the feed position when it subscribed: every event after
+    it will be pushed here. Older events have to be read with
+    ChangeFeed.history().
+    """
+
+    def __init__(self, feed, start_seq, buffer_size, waker=None):
+        self.feed = feed
+        self.start_seq = start_seq
+        self.buffer_size = buffer_size
+        self.overflowed = False
+        self.closed = False
+        self._events = collections.deque()
+        self._cond = threading.Condition()
+        # Called after every push, e.g. to wake an asyncio task
+        self._waker = waker
+
+    def push(self, events):
+        with self._cond:
+            if self.closed:
+                return
+            if len(self._events) + len(events) > self.buffer_size:
+                self.overflowed = True
+                self.closed = True
+                self._events.clear()
+            else:
+                self._events.extend(events)
+            self._cond.notify_all()
+        if self._waker is not None:
+            self._waker()
+
+    def get(self, timeout=None):
+        """Returns the buffered events, waiting up to `timeout` for one.
+
+        Returns [] on timeout; raises SubscriberOverflow if it was dropped.
+        """
+        with self._cond:
+            if not self._events and not self.closed and timeout != 0:
+                self._cond.wait(timeout)
+            if self.overflowed:
+                raise SubscriberOverflow(f"more than {self.buffer_size} events behind")
+            events = list(self._events)
+            self._events.clear()
+        return events
+
+    def close(self):
+        self.feed.unsubscribe(self)
+        with self._cond:
+            self.closed = True
+            self._cond.notify_all()
+        if self._waker is not None:
+            self._waker()
+
+
+class ChangeFeed:
+
+    def __init__(self, store, poll_interval=POLL_INTERVAL, buffer_size=BUFFER_SIZE,
+                 retention=storage.CHANGE_RETENTION):
+        self.store = store
+        self.poll_interval = poll_interval
+        self.buffer_size = buffer_size
+        self.retention = retention
+        self.last_seq = store.change_bounds()[1]
+        self._subscribers = set()
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._stopped = threading.Event()
+        self._thread = None
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name="change-feed", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        """Stops polling and ends every subscription (watch streams finish normally)."""
+        self._stopped.set()
+        self._wake.set()
+        if self._thread is not None:
+            self._thread.join()
+        with self._lock:
+            subscribers, self._subscribers = list(self._subscribers), set()
+        for subscription in subscribers:
+            subscription.close()
+
+    def notify(self):
+        """Polls right away instead of waiting for the next interval."""
+        self._wake.set()
+
+    def subscribe(self, waker=None):
+        with self._lock:
+            subscription = Subscription(self, self.last_seq, self.buffer_size, waker)
+            if self._stopped.is_set():
+                subscription.closed = True
+            else:
+                self._subscribers.add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription):
+        with self._lock:
+            self._subscribers.discard(subscription)
+
+    @property
+    def subscriber_count(self):
+        return len(self._subscribers)
+
+    def poll(self):
+        """Pushes new change log entries to every subscriber; returns how many there were."""
+        events = self.store.changes(self.last_seq, READ_BATCH)
+        if events:
+            # Under the lock, so a new subscriber either sees these events in
+            # its buffer or gets a start_seq past them
+            with self._lock:
+                self.last_seq = events[-1][0]
+                for subscription in list(self._subscribers):
+                    subscription.push(events)
+                    if subscription.overflowed:
+                        self._subscribers.discard(subscription)
+        return len(events)
+
+    def _run(self):
+        polls = 0
+        while not self._stopped.is_set():
+            self._wake.wait(self.poll_interval)
+            self._wake.clear()
+            try:
+                while self.poll() == READ_BATCH:
+                    pass
+                polls += 1
+                if polls % PRUNE_EVERY == 0:
+                    self.store.prune_changes(self.retention)
+            except storage.StorageError:
+                logger.warning("Change feed poll failed", exc_info=True)
+
+    # --- resuming ---
+
+    def check_resume(self, after_seq):
+        first, last = self.store.change_bounds()
+        if after_seq < first - 1 or after_seq > last:
+            raise ResumeError(f"seq {after_seq} is not in the change log (it holds {first}..{last})")
+
+    def history(self, after_seq, until_seq):
+        """One page of logged events with after_seq < seq <= until_seq."""
+        events = self.store.changes(after_seq, min(READ_BATCH, until_seq - after_seq))
+        return [event for event in events if after_seq < event[0] <= until_seq]
+
+    def watch(self, after_seq=None, is_active=lambda: True, timeout=1.0):
+        """Yields events after `after_seq` (None = from now) until is_active() returns False."""
+        subscription = self.subscribe()
+        try:
+            cursor = subscription.start_seq
+            if after_seq is not None:
+                self.check_resume(after_seq)
+                cursor = after_seq
+                # Catch up from the log, then switch to the pushed events
+                while cursor < subscription.start_seq:
+                    events = self.history(cursor, subscription.start_seq)
+                    if not events:
+                        break
+                    yield from events
+                    cursor = events[-1][0]
+            while is_active():
+                events = subscription.get(timeout)
+                if not events and subscription.closed:
+                    return  # the feed is shutting down
+                for event in events:
+                    if event[0] > cursor:
+                        yield event
+                        cursor = event[0]
+        finally:
+            subscription.close()
@@ -1,11 +1,13 @@
 import grpc
+import note_client
 import notes_pb2
 import notes_pb2_grpc
 
 
 def run():
-    # Connect to the gRPC server (running in Docker)
-    with grpc.insecure_channel('localhost:50051') as channel:
+    # Connect to the gRPC server (running in Docker); requests are gzip-compressed
+    # and reads are retried if the server is briefly unavailable
+    with note_client.create_channel() as channel:
         stub = notes_pb2_grpc.NoteServiceStub(channel)
 
         print("gRPC Note Client Started. Connecting to server...")
@@ -84,15 +86,17 @@ def run():
 
         # --- 3. List All Notes ---
         print("\n--- 3. List All Notes ---")
-        list_request = notes_pb2.ListNotesRequest()
         try:
-            list_response = stub.ListNotes(list_request)
-            if not list_response.notes:
+            # StreamNotes sends notes as they are read, so printing starts right away.
+            # Only titles are printed, so don't ask for the content.
+            count = 0
+            for note in stub.StreamNotes(notes_pb2.ListNotesRequest(read_mask={"paths": ["title"]})):
+                print(f"  - [{note.id}] {note.title}")
+                count += 1
+            if count == 0:
                 print("ℹ️ No notes found in the database.")
             else:
-                print(f"✅ Found {len(list_response.notes)} total note(s):")
-                for note in list_response.notes:
-                    print(f"  - [{note.id}] {note.title}")
+                print(f"✅ Found {count} total note(s).")
         except grpc.RpcError as e:
             print(f"❌ Error listing notes: {e.details()}")
 
@@ -114,13 +118,14 @@ def run():
         # --- 5. Final List (To show deletion) ---
         print("\n--- 5. Final List of All Notes (After Deletion) ---")
         try:
-            final_list_response = stub.ListNotes(notes_pb2.ListNotesRequest())
-            if not final_list_response.notes:
+            count = 0
+            for note in stub.StreamNotes(notes_pb2.ListNotesRequest(read_mask={"paths": ["title"]})):
+                print(f"  - [{note.id}] {note.title}")
+                count += 1
+            if count == 0:
                 print("ℹ️ No notes remaining in the database.")
             else:
-                print(f"✅ Found {len(final_list_response.notes)} remaining note(s):")
-                for note in final_list_response.notes:
-                    print(f"  - [{note.id}] {note.title}")
+                print(f"✅ Found {count} remaining note(s).")
         except grpc.RpcError as e:
             print(f"❌ Error listing final notes: {e.details()}")
 
@@ -1,36 +1,435 @@
 import sqlite3
 import os
+import threading
+import time
+import zlib
+
+import tracing
 
 # Use a path inside the 'data' directory
 DB_NAME = 'data/notes.db'
 
-def init_db():
-    # --- THIS IS THE CHANGE ---
-    # Only create a directory if we are NOT using an in-memory DB
-    if DB_NAME != ":memory:":
-        os.makedirs(os.path.dirname(DB_NAME), exist_ok=True)
-    # --- END OF CHANGE ---
+# --- Connection profiles ---
+# PRAGMAs applied to every connection the server opens. "performance" puts
+# the DB in WAL mode so readers no longer block behind writers, and only
+# fsyncs at checkpoints (synchronous=NORMAL is still crash-safe in WAL).
+PROFILES = {
+    "default": {
+        "busy_timeout": 5000,
+    },
+    "performance": {
+        "journal_mode": "WAL",
+        "synchronous": "NORMAL",
+        "busy_timeout": 5000,
+        "cache_size": -65536,  # negative = KiB, i.e. 64 MB of page cache
+        "mmap_size": 268435456,  # 256 MB
+        "temp_store": "MEMORY",
+    },
+}
+DEFAULT_PROFILE = "performance"
+
+# --- At-rest compression ---
+# Content larger than the threshold is stored zlib-compressed as a BLOB with
+# notes.compressed = 1. note_text() turns it back into text inside SQL, which
+# the full-text index needs (see _compress_large_content).
+COMPRESS_THRESHOLD = 4096  # bytes of UTF-8; 0 turns compression off
+
+
+def encode_content(content, threshold=COMPRESS_THRESHOLD):
+    """Returns (value to store, compressed flag)."""
+    if not threshold or content is None:
+        return content, 0
+    raw = content.encode()
+    if len(raw) < threshold:
+        return content, 0
+    packed = zlib.compress(raw, 6)
+    # Random or already compressed text doesn't shrink; keep it as it is
+    if len(packed) >= len(raw):
+        return content, 0
+    return packed, 1
+
+
+def decode_content(value, compressed):
+    if compressed and value is not None:
+        return zlib.decompress(value).decode()
+    return value
+
+
+def register_functions(conn):
+    conn.create_function("note_text", 2, decode_content, deterministic=True)
+
+
+def configure_connection(conn, profile=DEFAULT_PROFILE):
+    register_functions(conn)
+    for name, value in PROFILES[profile].items():
+        conn.execute(f"PRAGMA {name} = {value}")
+
+
+# --- Migrations ---
+# Each step runs once, in order, inside its own transaction. Never edit a
+# released step; add a new one instead.
+
+def _fts_statements(rowid_column):
+    # Full-text index over title/content. It is an "external content" FTS5
+    # table: it stores only the index and reads the text back from `notes`,
+    # kept in sync by the triggers below.
+    return [
+        f"""CREATE VIRTUAL TABLE IF NOT EXISTS notes_fts USING fts5(
+            title, content, content='notes', content_rowid='{rowid_column}'
+        )""",
+        """CREATE TRIGGER IF NOT EXISTS notes_fts_insert AFTER INSERT ON notes BEGIN
+            INSERT INTO notes_fts(rowid, title, content) VALUES (new.rowid, new.title, new.content);
+        END""",
+        """CREATE TRIGGER IF NOT EXISTS notes_fts_delete AFTER DELETE ON notes BEGIN
+            INSERT INTO notes_fts(notes_fts, rowid, title, content)
+            VALUES ('delete', old.rowid, old.title, old.content);
+        END""",
+        """CREATE TRIGGER IF NOT EXISTS notes_fts_update AFTER UPDATE ON notes BEGIN
+            INSERT INTO notes_fts(notes_fts, rowid, title, content)
+            VALUES ('delete', old.rowid, old.title, old.content);
+            INSERT INTO notes_fts(rowid, title, content) VALUES (new.rowid, new.title, new.content);
+        END""",
+    ]
+
+
+def _table_exists(conn, name):
+    return conn.execute(
+        "SELECT 1 FROM sqlite_master WHERE type IN ('table', 'view') AND name = ?", (name,)
+    ).fetchone() is not None
 
-    conn = sqlite3.connect(DB_NAME)
-    # Create a cursor object
-    cursor = conn.cursor()
 
-    # Define the SQL statement (no backslashes)
-    create_table_query = """
+def _create_notes(conn):
+    conn.execute("""
     CREATE TABLE IF NOT EXISTS notes (
         id TEXT PRIMARY KEY,
         title TEXT NOT NULL,
         content TEXT
-    );
-    """
+    )
+    """)
+
+
+def _add_fts(conn):
+    fts_exists = _table_exists(conn, "notes_fts")
+    for statement in _fts_statements("rowid"):
+        conn.execute(statement)
+    if not fts_exists:
+        # Index notes that were written before the FTS table existed
+        conn.execute("INSERT INTO notes_fts(notes_fts) VALUES ('rebuild')")
+
+
+def _integer_rowid_key(conn):
+    # Give notes an explicit INTEGER PRIMARY KEY: new rows are appended to the
+    # end of the table B-tree, and rowids (which the FTS index points at) no
+    # longer change on VACUUM. The UUID stays unique through its own index.
+    for trigger in ("notes_fts_insert", "notes_fts_delete", "notes_fts_update"):
+        conn.execute(f"DROP TRIGGER IF EXISTS {trigger}")
+    conn.execute("DROP TABLE IF EXISTS notes_fts")
+    conn.execute("""
+    CREATE TABLE notes_new (
+        seq INTEGER PRIMARY KEY,
+        id TEXT NOT NULL UNIQUE,
+        title TEXT NOT NULL,
+        content TEXT
+    )
+    """)
+    conn.execute("INSERT INTO notes_new (seq, id, title, content) "
+                 "SELECT rowid, id, title, content FROM notes ORDER BY rowid")
+    conn.execute("DROP TABLE notes")
+    conn.execute("ALTER TABLE notes_new RENAME TO notes")
+    for statement in _fts_statements("seq"):
+        conn.execute(statement)
+    conn.execute("INSERT INTO notes_fts(notes_fts) VALUES ('rebuild')")
+
+
+def _add_version(conn):
+    # Bumped on every UpdateNote; clients send it back for compare-and-set
+    conn.execute("ALTER TABLE notes ADD COLUMN version INTEGER NOT NULL DEFAULT 1")
+
+
+def _add_change_log(conn):
+    # Every mutation of `notes` appends a row here from a trigger, so the log
+    # entry commits (or rolls back) in the same transaction as the change.
+    # AUTOINCREMENT keeps seq values from being reused after pruning.
+    conn.execute("""
+    CREATE TABLE note_changes (
+        seq INTEGER PRIMARY KEY AUTOINCREMENT,
+        kind TEXT NOT NULL,
+        note_id TEXT NOT NULL,
+        changed_at TEXT NOT NULL DEFAULT CURRENT_TIMESTAMP
+    )
+    """)
+    conn.execute("""CREATE TRIGGER note_changes_insert AFTER INSERT ON notes BEGIN
+        INSERT INTO note_changes (kind, note_id) VALUES ('create', new.id);
+    END""")
+    conn.execute("""CREATE TRIGGER note_changes_update AFTER UPDATE ON notes BEGIN
+        INSERT INTO note_changes (kind, note_id) VALUES ('update', new.id);
+    END""")
+    conn.execute("""CREATE TRIGGER note_changes_delete AFTER DELETE ON notes BEGIN
+        INSERT INTO note_changes (kind, note_id) VALUES ('delete', old.id);
+    END""")
+
+
+def _compress_large_content(conn):
+    # Compressed rows hold a BLOB in `content`, so the FTS index can no longer
+    # read notes.content directly. It now reads a view that decompresses
+    # through note_text(), and its triggers index the decompressed text.
+    conn.execute("ALTER TABLE notes ADD COLUMN compressed INTEGER NOT NULL DEFAULT 0")
+    for trigger in ("notes_fts_insert", "notes_fts_delete", "notes_fts_update"):
+        conn.execute(f"DROP TRIGGER IF EXISTS {trigger}")
+    conn.execute("DROP TABLE IF EXISTS notes_fts")
+    conn.execute("""CREATE VIEW notes_text AS
+        SELECT seq, title, note_text(content, compressed) AS content FROM notes""")
+    conn.execute("""CREATE VIRTUAL TABLE notes_fts USING fts5(
+        title, content, content='notes_text', content_rowid='seq'
+    )""")
+    conn.execute("""CREATE TRIGGER notes_fts_insert AFTER INSERT ON notes BEGIN
+        INSERT INTO notes_fts(rowid, title, content)
+        VALUES (new.seq, new.title, note_text(new.content, new.compressed));
+    END""")
+    conn.execute("""CREATE TRIGGER notes_fts_delete AFTER DELETE ON notes BEGIN
+        INSERT INTO notes_fts(notes_fts, rowid, title, content)
+        VALUES ('delete', old.seq, old.title, note_text(old.content, old.compressed));
+    END""")
+    conn.execute("""CREATE TRIGGER notes_fts_update AFTER UPDATE ON notes BEGIN
+        INSERT INTO notes_fts(notes_fts, rowid, title, content)
+        VALUES ('delete', old.seq, old.title, note_text(old.content, old.compressed));
+        INSERT INTO notes_fts(rowid, title, content)
+        VALUES (new.seq, new.title, note_text(new.content, new.compressed));
+    END""")
+    conn.execute("INSERT INTO notes_fts(notes_fts) VALUES ('rebuild')")
+
+
+def _add_timestamps(conn):
+    # Milliseconds since the epoch, set by the store on every write. Older
+    # notes get the migration time through the column default; an UPDATE
+    # would fire the change log and FTS triggers for every row.
+    now = time.time_ns() // 1_000_000
+    conn.execute(f"ALTER TABLE notes ADD COLUMN created_at INTEGER NOT NULL DEFAULT {now}")
+    conn.execute(f"ALTER TABLE notes ADD COLUMN updated_at INTEGER NOT NULL DEFAULT {now}")
+    # id breaks ties, so these also serve keyset pagination in either order
+    conn.execute("CREATE INDEX notes_created_at ON notes (created_at, id)")
+    conn.execute("CREATE INDEX notes_updated_at ON notes (updated_at, id)")
+
+
+def _add_tags(conn):
+    # owner / notebook are plain columns (one value per note); the composite
+    # indexes serve "owner = ? [AND notebook = ?] ORDER BY id" listings.
+    conn.execute("ALTER TABLE notes ADD COLUMN owner TEXT NOT NULL DEFAULT ''")
+    conn.execute("ALTER TABLE notes ADD COLUMN notebook TEXT NOT NULL DEFAULT ''")
+    conn.execute("CREATE INDEX notes_owner ON notes (owner, id)")
+    conn.execute("CREATE INDEX notes_notebook ON notes (owner, notebook, id)")
+    # Tags are many-to-many: each name is stored once in `tags`, and
+    # note_tags is clustered on (tag_id, note_id), so the notes with a tag
+    # are one contiguous range of it, already in id order
+    conn.execute("""
+    CREATE TABLE tags (
+        tag_id INTEGER PRIMARY KEY,
+        name TEXT NOT NULL UNIQUE
+    )
+    """)
+    conn.execute("""
+    CREATE TABLE note_tags (
+        tag_id INTEGER NOT NULL REFERENCES tags (tag_id),
+        note_id TEXT NOT NULL,
+        PRIMARY KEY (tag_id, note_id)
+    ) WITHOUT ROWID
+    """)
+    # The other direction: a note's own tags
+    conn.execute("CREATE INDEX note_tags_note ON note_tags (note_id)")
+    conn.execute("""CREATE TRIGGER note_tags_delete AFTER DELETE ON notes BEGIN
+        DELETE FROM note_tags WHERE note_id = old.id;
+    END""")
 
-    # Execute the SQL statement
-    cursor.execute(create_table_query)
 
-    # Commit the changes and close the connection
+MIGRATIONS = [
+    (1, "create notes table", _create_notes),
+    (2, "full-text index", _add_fts),
+    (3, "integer rowid key", _integer_rowid_key),
+    (4, "note version column", _add_version),
+    (5, "change log", _add_change_log),
+    (6, "at-rest content compression", _compress_large_content),
+    (7, "created/updated timestamps", _add_timestamps),
+    (8, "tags, owner and notebook", _add_tags),
+]
+
+
+def get_schema_version(conn):
+    if not _table_exists(conn, "schema_version"):
+        return 0
+    return conn.execute("SELECT COALESCE(MAX(version), 0) FROM schema_version").fetchone()[0]
+
+
+def migrate(conn):
+    """Brings the schema up to the latest version; safe to call on every start."""
+    register_functions(conn)
+    conn.execute("""
+    CREATE TABLE IF NOT EXISTS schema_version (
+        version INTEGER PRIMARY KEY,
+        description TEXT NOT NULL,
+        applied_at TEXT NOT NULL DEFAULT CURRENT_TIMESTAMP
+    )
+    """)
     conn.commit()
+    for version, description, step in MIGRATIONS:
+        # IMMEDIATE takes the write lock up front, so two processes starting
+        # at once can't both apply the same step
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            if get_schema_version(conn) < version:
+                step(conn)
+                conn.execute("INSERT INTO schema_version (version, description) VALUES (?, ?)",
+                             (version, description))
+            conn.commit()
+        except BaseException:
+            conn.rollback()
+            raise
+
+
+def init_db(profile=DEFAULT_PROFILE, db_name=None):
+    db_name = db_name or DB_NAME
+    # --- THIS IS THE CHANGE ---
+    # Only create a directory if we are NOT using an in-memory DB
+    if db_name != ":memory:" and os.path.dirname(db_name):
+        os.makedirs(os.path.dirname(db_name), exist_ok=True)
+    # --- END OF CHANGE ---
+
+    conn = sqlite3.connect(db_name)
+    # journal_mode=WAL is stored in the file, so set it before migrating
+    configure_connection(conn, profile)
+    migrate(conn)
+
+    # Close the connection
     conn.close()
-    print(f"Database '{DB_NAME}' initialized successfully.")
+    print(f"Database '{db_name}' initialized successfully.")
+
+
+# --- Online backup ---
+
+BACKUP_STEP_PAGES = 1024  # pages copied per step (4 MB at the default page size)
+BACKUP_PAUSE = 0.001  # seconds between steps, so other connections get a turn
+
+
+def backup(db_name, dest_path, step_pages=BACKUP_STEP_PAGES, pause=BACKUP_PAUSE, progress=None):
+    """Copies db_name to dest_path with SQLite's backup API while it stays in use.
+
+    The copy runs step_pages at a time. In WAL mode it reads from one
+    snapshot, so it is consistent and writers never wait for it. In
+    rollback journal mode writers get in between steps, and SQLite
+    restarts the copy if they change anything. progress(remaining, total)
+    is called after every step. Returns the number of pages copied.
+    """
+    if os.path.exists(dest_path):
+        raise FileExistsError(f"{dest_path} already exists")
+    tmp_path = dest_path + ".tmp"
+    source = sqlite3.connect(db_name)
+    target = sqlite3.connect(tmp_path)
+    copied = []
+
+    def on_step(status, remaining, total):
+        copied[:] = [total]
+        if progress is not None:
+            progress(remaining, total)
+        if pause:
+            time.sleep(pause)
+
+    try:
+        if source.execute("PRAGMA journal_mode").fetchone()[0] == "wal":
+            # Hold a read transaction so every step sees the same snapshot
+            source.execute("BEGIN")
+            source.execute("SELECT COUNT(*) FROM sqlite_master").fetchone()
+        source.backup(target, pages=step_pages, progress=on_step)
+    except BaseException:
+        target.close()
+        os.remove(tmp_path)
+        raise
+    finally:
+        source.close()
+    target.close()
+    # Only a finished copy gets the real name
+    os.replace(tmp_path, dest_path)
+    return copied[0] if copied else 0
+
+
+class ConnectionPool:
+    """Keeps one long-lived connection per worker thread.
+
+    The gRPC server runs a fixed ThreadPoolExecutor, so the number of
+    connections is bounded by the number of worker threads.
+    """
+
+    def __init__(self, db_name=None, health_check_interval=30.0, profile=DEFAULT_PROFILE, connection_factory=None):
+        self.db_name = db_name or DB_NAME
+        self.profile = profile
+        # e.g. a tracing.TracedConnection class; None = plain sqlite3.Connection
+        self.connection_factory = connection_factory or sqlite3.Connection
+        self.health_check_interval = health_check_interval
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._connections = set()
+        self._closed = False
+
+    def _connect(self):
+        # check_same_thread=False so close_all() can run from the main thread
+        conn = sqlite3.connect(self.db_name, check_same_thread=False, factory=self.connection_factory)
+        conn.row_factory = sqlite3.Row
+        configure_connection(conn, self.profile)
+        with self._lock:
+            if self._closed:
+                conn.close()
+                raise sqlite3.ProgrammingError("Connection pool is closed")
+            self._connections.add(conn)
+        return conn
+
+    def _discard(self, conn):
+        with self._lock:
+            self._connections.discard(conn)
+        try:
+            conn.close()
+        except sqlite3.Error:
+            pass
+
+    def _is_healthy(self, conn):
+        try:
+            conn.execute("SELECT 1").fetchone()
+            return True
+        except sqlite3.Error:
+            return False
+
+    def get_connection(self):
+        if self._closed:
+            raise sqlite3.ProgrammingError("Connection pool is closed")
+
+        conn = getattr(self._local, "conn", None)
+        now = time.monotonic()
+        if conn is not None and now - self._local.last_used >= self.health_check_interval:
+            # Idle for a while: make sure the handle still works before reusing it
+            if not self._is_healthy(conn):
+                self._discard(conn)
+                conn = None
+
+        if conn is None:
+            with tracing.span("db.connect"):
+                conn = self._connect()
+            self._local.conn = conn
+
+        self._local.last_used = now
+        return conn
+
+    def size(self):
+        with self._lock:
+            return len(self._connections)
+
+    def close_all(self):
+        with self._lock:
+            self._closed = True
+            connections = list(self._connections)
+            self._connections.clear()
+        for conn in connections:
+            try:
+                conn.close()
+            except sqlite3.Error:
+                pass
+
 
 if __name__ == '__main__':
-    init_db()
\ No newline at end of file
+    init_db()
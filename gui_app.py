@@ -1,7 +1,12 @@
+import bisect
+import queue
+import threading
 import tkinter as tk
+from concurrent.futures import ThreadPoolExecutor
 from tkinter import ttk, messagebox, simpledialog, Toplevel, Text
 
 import grpc
+import note_client
 import notes_pb2
 import notes_pb2_grpc
 
@@ -18,6 +23,128 @@ FONT_PRIMARY = ("Segoe UI", 10)
 FONT_BOLD = ("Segoe UI", 12, "bold")
 FONT_TITLE = ("Segoe UI", 14, "bold")
 
+PAGE_SIZE = 100  # notes fetched per ListNotes call
+LOAD_MORE_AT = 0.9  # fetch the next page once the scrollbar passes this point
+LIST_FIELDS = ["title"]  # the list only shows titles, so don't ship content
+POLL_MS = 30  # how often the Tk loop picks up finished RPCs
+RPC_TIMEOUT = 10.0
+WATCH_RETRY_MS = 5000  # wait before re-watching when the server is at its watcher limit
+
+
+# --- 2. Background RPCs ---
+
+class BackgroundCalls:
+    """Runs blocking stub calls off the Tk thread.
+
+    Tk widgets may only be touched from the main thread, so finished calls
+    are queued and their callbacks run from `drain()`, which NoteApp calls
+    on a timer via `after()`.
+    """
+
+    def __init__(self, workers=2):
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="rpc")
+        self._done = queue.SimpleQueue()
+
+    def submit(self, fn, on_success, on_error=None):
+        def run():
+            try:
+                result = fn()
+            except grpc.RpcError as e:
+                self._done.put((on_error, e))
+            else:
+                self._done.put((on_success, result))
+
+        self._executor.submit(run)
+
+    def stream(self, call, on_item, on_error=None):
+        """Feeds each message of a server-streaming call to `on_item`.
+
+        Runs on its own thread so a long-lived stream doesn't take a pool
+        worker; cancel the call to end it.
+        """
+        def run():
+            try:
+                for item in call:
+                    self._done.put((on_item, item))
+            except grpc.RpcError as e:
+                if e.code() != grpc.StatusCode.CANCELLED:
+                    self._done.put((on_error, e))
+
+        threading.Thread(target=run, name="rpc-stream", daemon=True).start()
+
+    def drain(self):
+        while True:
+            try:
+                callback, value = self._done.get_nowait()
+            except queue.Empty:
+                return
+            if callback is not None:
+                callback(value)
+
+    def shutdown(self):
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+
+class NoteListModel:
+    """The rows shown in the list plus every full note fetched so far.
+
+    Rows are kept in id order, the same order ListNotes pages in, so a new
+    note can be slotted into place without reloading the list. List pages
+    are title-only, so they add rows but not entries in `notes`.
+    """
+
+    def __init__(self):
+        self.notes = {}  # id -> full Note, used by the details window
+        self.row_ids = []
+        self.next_page_token = ""
+        self.exhausted = False
+
+    def reset(self):
+        self.row_ids = []
+        self.next_page_token = ""
+        self.exhausted = False
+
+    def add_page(self, notes, next_page_token):
+        """Appends a page; returns the notes that became new rows."""
+        added = []
+        for note in notes:
+            # Skip notes we already slotted in after creating them
+            if not self.row_ids or note.id > self.row_ids[-1]:
+                self.row_ids.append(note.id)
+                added.append(note)
+        self.next_page_token = next_page_token
+        self.exhausted = not next_page_token
+        return added
+
+    def set_rows(self, notes):
+        """Shows exactly these notes, in this order (e.g. search results by rank)."""
+        for note in notes:
+            self.notes[note.id] = note
+        self.row_ids = [note.id for note in notes]
+        self.next_page_token = ""
+        self.exhausted = True
+
+    def insert(self, note):
+        """Returns the row index for a new note, or None if a later page will bring it."""
+        self.notes[note.id] = note
+        index = bisect.bisect_left(self.row_ids, note.id)
+        if index == len(self.row_ids) and not self.exhausted:
+            return None
+        if index < len(self.row_ids) and self.row_ids[index] == note.id:
+            return None
+        self.row_ids.insert(index, note.id)
+        return index
+
+    def remove(self, note_id):
+        """Forgets the note; returns its row index, or None if it wasn't shown."""
+        self.notes.pop(note_id, None)
+        try:
+            index = self.row_ids.index(note_id)
+        except ValueError:
+            return None
+        del self.row_ids[index]
+        return index
+
 
 class NoteApp(tk.Tk):
     def __init__(self):
@@ -27,20 +154,35 @@ class NoteApp(tk.Tk):
         self.configure(bg=COLOR_SECONDARY_LIGHT)
         self.setup_styles()
 
-        try:
-            self.channel = grpc.insecure_channel('localhost:50051')
-            self.stub = notes_pb2_grpc.NoteServiceStub(self.channel)
-            self.stub.ListNotes(notes_pb2.ListNotesRequest(), timeout=1.0)
-        except grpc.RpcError as e:
-            messagebox.showerror("Connection Error",
-                                 f"Could not connect to gRPC server...\n"
-                                 f"Please ensure Docker is running.\n\nError: {e.details()}")
-            self.destroy()
-            return
+        self.channel = note_client.create_channel()
+        self.stub = notes_pb2_grpc.NoteServiceStub(self.channel)
+        self.calls = BackgroundCalls()
+        self.model = NoteListModel()
+        self.showing_search = False
+        self.loading = False
+        self.placeholder_shown = False
+        self.watch_call = None
+        # Seq of the last change applied, to resume the watch from
+        self.watch_seq = 0
+        # Bumped whenever the list is reset, so late replies for an old list are dropped
+        self.list_generation = 0
 
         self.create_widgets()
+        self.protocol("WM_DELETE_WINDOW", self.on_close)
+        self.after(POLL_MS, self.poll_calls)
         self.list_all_notes()
 
+    def poll_calls(self):
+        # Reschedule first so one failing callback doesn't stop the polling
+        self.after(POLL_MS, self.poll_calls)
+        self.calls.drain()
+
+    def on_close(self):
+        self.stop_watch()
+        self.calls.shutdown()
+        self.channel.close()
+        self.destroy()
+
     def setup_styles(self):
         """Creates all the custom styles for our ttk widgets."""
         style = ttk.Style(self)
@@ -79,7 +221,15 @@ class NoteApp(tk.Tk):
         ttk.Button(sidebar_frame, text="List All Notes", command=self.list_all_notes, style='Sidebar.TButton').pack(
             fill="x", pady=10, padx=10)
 
-        # --- Search Frame REMOVED ---
+        # --- Search Frame ---
+        search_frame = ttk.Frame(sidebar_frame, style='Sidebar.TFrame')
+        search_frame.pack(fill="x", pady=(20, 0), padx=10)
+        ttk.Label(search_frame, text="Search Notes:", style='Sidebar.TLabel').pack()
+        self.search_entry = ttk.Entry(search_frame)
+        self.search_entry.pack(fill="x", pady=5)
+        self.search_entry.bind("<Return>", lambda event: self.search_notes())
+        ttk.Button(search_frame, text="Search", command=self.search_notes, style='Sidebar.TButton').pack(fill="x",
+                                                                                                        pady=5)
 
         # --- Get/Delete by ID ---
         id_frame = ttk.Frame(sidebar_frame, style='Sidebar.TFrame')
@@ -105,9 +255,9 @@ class NoteApp(tk.Tk):
         list_frame.grid_rowconfigure(0, weight=1)
         list_frame.grid_columnconfigure(0, weight=1)
 
-        scrollbar = ttk.Scrollbar(list_frame, orient=tk.VERTICAL)
+        self.scrollbar = ttk.Scrollbar(list_frame, orient=tk.VERTICAL)
         self.notes_listbox = tk.Listbox(list_frame,
-                                        yscrollcommand=scrollbar.set,
+                                        yscrollcommand=self.on_list_scroll,
                                         font=("Courier", 11),
                                         height=25,
                                         background="white",
@@ -116,42 +266,192 @@ class NoteApp(tk.Tk):
                                         highlightthickness=0,
                                         selectbackground=COLOR_PRIMARY_LIGHT,
                                         selectforeground=COLOR_TEXT_LIGHT)
-        scrollbar.config(command=self.notes_listbox.yview)
-        scrollbar.grid(row=0, column=1, sticky="ns")
+        self.scrollbar.config(command=self.notes_listbox.yview)
+        self.scrollbar.grid(row=0, column=1, sticky="ns")
         self.notes_listbox.grid(row=0, column=0, sticky="nsew")
         self.notes_listbox.bind("<<ListboxSelect>>", self.on_note_select)
+        self.notes_listbox.bind("<Double-Button-1>", self.on_note_open)
+
+        self.status_label = ttk.Label(main_frame, text="")
+        self.status_label.grid(row=2, column=0, sticky="w", pady=(5, 0))
+
+    def set_status(self, text):
+        self.status_label.config(text=text)
+
+    @staticmethod
+    def format_row(note):
+        return f"  {note.title:<30} | ID: {note.id}"
+
+    def show_placeholder(self, text):
+        if not self.model.row_ids and not self.placeholder_shown:
+            self.notes_listbox.insert(tk.END, text)
+            self.placeholder_shown = True
+
+    def clear_placeholder(self):
+        if self.placeholder_shown:
+            self.notes_listbox.delete(0, tk.END)
+            self.placeholder_shown = False
 
     # --- gRPC Handler Functions ---
 
     def list_all_notes(self):
+        self.stop_watch()
+        self.list_generation += 1
+        self.showing_search = False
+        self.loading = False
+        self.model.reset()
         self.notes_listbox.delete(0, tk.END)
-        try:
-            response = self.stub.ListNotes(notes_pb2.ListNotesRequest())
-            if not response.notes:
-                self.notes_listbox.insert(tk.END, "  No notes found.")
+        self.placeholder_shown = False
+        self.load_next_page()
+
+    def on_list_scroll(self, first, last):
+        self.scrollbar.set(first, last)
+        if float(last) >= LOAD_MORE_AT:
+            self.load_next_page()
 
-            for note in response.notes:
-                # --- FIX for parenthesis bug ---
-                self.notes_listbox.insert(tk.END, f"  {note.title:<30} | ID: {note.id}")
-        except grpc.RpcError as e:
-            messagebox.showerror("Server Error", f"Could not list notes: {e.details()}")
+    def load_next_page(self):
+        if self.showing_search or self.loading or self.model.exhausted:
+            return
+        self.loading = True
+        self.set_status("Loading...")
+        generation = self.list_generation
+        request = notes_pb2.ListNotesRequest(page_size=PAGE_SIZE, page_token=self.model.next_page_token,
+                                             read_mask={"paths": LIST_FIELDS})
+        first_page = not request.page_token
+        self.calls.submit(lambda: self.stub.ListNotes(request, timeout=RPC_TIMEOUT),
+                          lambda response: self.on_page_loaded(generation, response, first_page),
+                          lambda error: self.on_page_failed(generation, error))
+
+    def on_page_loaded(self, generation, response, first_page=False):
+        if generation != self.list_generation:
+            return
+        self.loading = False
+        if first_page:
+            # Follow changes from here on instead of re-listing (0 is a valid seq on a new server)
+            self.start_watch(generation, response.change_seq)
+        self.clear_placeholder()
+        for note in self.model.add_page(response.notes, response.next_page_token):
+            self.notes_listbox.insert(tk.END, self.format_row(note))
+        self.show_placeholder("  No notes found.")
+        self.set_status(f"{len(self.model.row_ids)} notes" + ("" if self.model.exhausted else " (scroll for more)"))
+        # A short first page may not fill the list, so no scroll event would ask for more
+        first, last = self.notes_listbox.yview()
+        if last >= LOAD_MORE_AT:
+            self.load_next_page()
+
+    def on_page_failed(self, generation, error):
+        if generation != self.list_generation:
+            return
+        self.loading = False
+        self.set_status("")
+        if error.code() == grpc.StatusCode.UNAVAILABLE:
+            messagebox.showerror("Connection Error",
+                                 f"Could not connect to gRPC server...\n"
+                                 f"Please ensure Docker is running.\n\nError: {error.details()}")
+        else:
+            messagebox.showerror("Server Error", f"Could not list notes: {error.details()}")
+
+    # --- Live updates (WatchNotes) ---
+
+    def start_watch(self, generation, after_seq):
+        self.stop_watch()
+        self.watch_seq = after_seq
+        self.watch_call = self.stub.WatchNotes(notes_pb2.WatchNotesRequest(after_seq=after_seq))
+        self.calls.stream(self.watch_call,
+                          lambda event: self.on_note_event(generation, event),
+                          lambda error: self.on_watch_failed(generation, error))
+
+    def stop_watch(self):
+        if self.watch_call is not None:
+            self.watch_call.cancel()
+            self.watch_call = None
+
+    def on_note_event(self, generation, event):
+        if generation != self.list_generation:
+            return
+        self.watch_seq = event.seq
+        if event.type == notes_pb2.NoteEvent.CREATED and event.HasField("note"):
+            self.add_row(event.note)
+        elif event.type == notes_pb2.NoteEvent.UPDATED and event.HasField("note"):
+            self.update_row(event.note)
+        elif event.type == notes_pb2.NoteEvent.DELETED:
+            self.remove_row(event.note_id)
+
+    def on_watch_failed(self, generation, error):
+        # UNIMPLEMENTED: the server has no change feed, so just keep the static list
+        if generation != self.list_generation or error.code() == grpc.StatusCode.UNIMPLEMENTED:
+            return
+        if error.code() == grpc.StatusCode.RESOURCE_EXHAUSTED:
+            # Too many watchers, or this one fell behind; either way resume later
+            self.set_status(f"Live updates paused: {error.details()}")
+            self.after(WATCH_RETRY_MS, lambda: self.retry_watch(generation))
+            return
+        self.set_status(f"Live updates stopped: {error.details()} (List All Notes to refresh)")
 
-    # --- search_by_title function REMOVED ---
+    def retry_watch(self, generation):
+        if generation == self.list_generation:
+            self.start_watch(generation, self.watch_seq)
+
+    def search_notes(self):
+        query = self.search_entry.get().strip()
+        if not query:
+            self.list_all_notes()
+            return
+        self.stop_watch()
+        self.list_generation += 1
+        self.showing_search = True
+        self.model.reset()
+        self.notes_listbox.delete(0, tk.END)
+        self.placeholder_shown = False
+        self.set_status("Searching...")
+        generation = self.list_generation
+        request = notes_pb2.SearchNotesRequest(query=query, page_size=PAGE_SIZE)
+        self.calls.submit(lambda: self.stub.SearchNotes(request, timeout=RPC_TIMEOUT),
+                          lambda response: self.on_search_done(generation, response),
+                          lambda error: self.on_search_failed(generation, error))
+
+    def on_search_done(self, generation, response):
+        if generation != self.list_generation:
+            return
+        self.model.set_rows([result.note for result in response.results])
+        for result in response.results:
+            self.notes_listbox.insert(tk.END, self.format_row(result.note))
+        self.show_placeholder("  No matching notes.")
+        self.set_status(f"{len(response.results)} matches")
+
+    def on_search_failed(self, generation, error):
+        if generation != self.list_generation:
+            return
+        self.set_status("")
+        messagebox.showerror("Search Error", f"Could not search notes: {error.details()}")
 
     def get_note_by_id(self):
         note_id = self.id_entry.get()
         if not note_id:
             messagebox.showwarning("Input Error", "Please enter a Note ID.")
             return
-        try:
-            request = notes_pb2.GetNoteRequest(id=note_id)
-            response = self.stub.GetNote(request)
+        self.open_note(note_id)
+
+    def open_note(self, note_id):
+        if note_id in self.model.notes:
+            self.show_note_details(self.model.notes[note_id])
+            return
+
+        def on_success(response):
             if not response.note.id:
                 messagebox.showerror("Not Found", f"Note with ID '{note_id}' not found.")
                 return
+            self.model.notes[note_id] = response.note
             self.show_note_details(response.note)
-        except grpc.RpcError as e:
-            messagebox.showerror("Server Error", f"Could not get note: {e.details()}")
+
+        def on_error(error):
+            if error.code() == grpc.StatusCode.NOT_FOUND:
+                messagebox.showerror("Not Found", f"Note with ID '{note_id}' not found.")
+            else:
+                messagebox.showerror("Server Error", f"Could not get note: {error.details()}")
+
+        request = notes_pb2.GetNoteRequest(id=note_id)
+        self.calls.submit(lambda: self.stub.GetNote(request, timeout=RPC_TIMEOUT), on_success, on_error)
 
     def delete_note_by_id(self):
         note_id = self.id_entry.get()
@@ -160,17 +460,49 @@ class NoteApp(tk.Tk):
             return
         if not messagebox.askyesno("Confirm Delete", f"Are you sure you want to delete note {note_id}?"):
             return
-        try:
-            request = notes_pb2.DeleteNoteRequest(id=note_id)
-            response = self.stub.DeleteNote(request)
+
+        def on_success(response):
             if response.success:
-                messagebox.showinfo("Success", response.message)
-                self.id_entry.delete(0, tk.END)
-                self.list_all_notes()
+                self.remove_row(note_id)
+                if self.id_entry.get() == note_id:
+                    self.id_entry.delete(0, tk.END)
+                self.set_status(response.message)
             else:
                 messagebox.showerror("Error", response.message)
-        except grpc.RpcError as e:
-            messagebox.showerror("Server Error", f"Could not delete note: {e.details()}")
+
+        def on_error(error):
+            messagebox.showerror("Server Error", f"Could not delete note: {error.details()}")
+
+        request = notes_pb2.DeleteNoteRequest(id=note_id)
+        self.calls.submit(lambda: self.stub.DeleteNote(request, timeout=RPC_TIMEOUT), on_success, on_error)
+
+    def add_row(self, note):
+        if self.showing_search:
+            self.model.notes[note.id] = note
+            return
+        index = self.model.insert(note)
+        if index is not None:
+            self.clear_placeholder()
+            self.notes_listbox.insert(index, self.format_row(note))
+            self.notes_listbox.see(index)
+
+    def update_row(self, note):
+        self.model.notes[note.id] = note
+        if note.id in self.model.row_ids:
+            index = self.model.row_ids.index(note.id)
+            self.notes_listbox.delete(index)
+            self.notes_listbox.insert(index, self.format_row(note))
+
+    def remove_row(self, note_id):
+        index = self.model.remove(note_id)
+        if index is not None:
+            self.notes_listbox.delete(index)
+            if self.showing_search:
+                self.show_placeholder("  No matching notes.")
+            elif self.model.exhausted:
+                self.show_placeholder("  No notes found.")
+            else:
+                self.load_next_page()
 
     def open_create_note_window(self):
         create_window = Toplevel(self)
@@ -189,13 +521,19 @@ class NoteApp(tk.Tk):
                 messagebox.showwarning("Input Error", "Title is required.", parent=create_window)
                 return
             request = notes_pb2.CreateNoteRequest(title=title, content=content)
-            try:
-                response = self.stub.CreateNote(request)
-                messagebox.showinfo("Success", f"Note created with ID: {response.id}", parent=create_window)
+            submit_button.config(state="disabled")
+
+            def on_success(response):
+                self.add_row(notes_pb2.Note(id=response.id, title=title, content=content))
+                self.set_status(f"Note created with ID: {response.id}")
                 create_window.destroy()
-                self.list_all_notes()
-            except grpc.RpcError as e:
-                messagebox.showerror("Server Error", f"Could not create note: {e.details()}", parent=create_window)
+
+            def on_error(error):
+                if create_window.winfo_exists():
+                    submit_button.config(state="normal")
+                messagebox.showerror("Server Error", f"Could not create note: {error.details()}")
+
+            self.calls.submit(lambda: self.stub.CreateNote(request, timeout=RPC_TIMEOUT), on_success, on_error)
 
         # --- FIX for create button ---
         submit_button = ttk.Button(form_frame, text="Create", command=submit_create, style='Success.TButton')
@@ -225,6 +563,11 @@ class NoteApp(tk.Tk):
         except IndexError:
             pass
 
+    def on_note_open(self, event):
+        selected_indices = self.notes_listbox.curselection()
+        if selected_indices and selected_indices[0] < len(self.model.row_ids):
+            self.open_note(self.model.row_ids[selected_indices[0]])
+
     def show_note_details(self, note):
         details_window = Toplevel(self)
         details_window.title(f"Details for: {note.title}")
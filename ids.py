@@ -0,0 +1,69 @@
+"""Note id generators (`python server.py --id-format uuid4|uuid7`).
+
+uuid4 ids are random, so every new note lands on a random page of the
+notes.id index and listings by id come out in no useful order. uuid7 ids
+(RFC 9562) start with the creation time in milliseconds: they still look
+like any other UUID to clients, but new ids sort after old ones, so
+inserts append to the end of the index and id order is creation order.
+"""
+import os
+import threading
+import time
+import uuid
+
+DEFAULT_FORMAT = "uuid7"
+
+
+def uuid4():
+    return str(uuid.uuid4())
+
+
+class UUID7:
+    """Callable that returns uuid7 strings, strictly increasing within the process.
+
+    The 12 bits after the timestamp are a counter (RFC 9562 "method 1"),
+    so ids made in the same millisecond still sort in creation order. If
+    the counter runs out, or the clock steps back, the timestamp is moved
+    ahead of the real clock until it catches up.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._last_ms = 0
+        self._counter = 0
+
+    def __call__(self):
+        now = time.time_ns() // 1_000_000
+        with self._lock:
+            if now > self._last_ms:
+                self._last_ms = now
+                # Start low so there is room to count up in the same millisecond
+                self._counter = int.from_bytes(os.urandom(2), "big") & 0x7FF
+            else:
+                self._counter += 1
+                if self._counter > 0xFFF:
+                    self._last_ms += 1
+                    self._counter = 0
+            timestamp, counter = self._last_ms, self._counter
+        random_bits = int.from_bytes(os.urandom(8), "big") & ((1 << 62) - 1)
+        value = (timestamp << 80) | (0x7 << 76) | (counter << 64) | (0b10 << 62) | random_bits
+        return str(uuid.UUID(int=value))
+
+
+def uuid7_time(note_id):
+    """Milliseconds since the epoch encoded in a uuid7 id."""
+    return uuid.UUID(note_id).int >> 80
+
+
+FORMATS = {
+    "uuid4": lambda: uuid4,
+    "uuid7": UUID7,
+}
+
+
+def generator(id_format=DEFAULT_FORMAT):
+    """Returns a function that makes new note ids in the given format."""
+    try:
+        return FORMATS[id_format]()
+    except KeyError:
+        raise ValueError(f"Unknown id format: {id_format}") from None
@@ -0,0 +1,70 @@
+import json
+import logging
+import logging.handlers
+import queue
+import random
+import sys
+import time
+
+# Attributes every LogRecord has; anything else came in through `extra=`
+_STANDARD_ATTRS = set(vars(logging.LogRecord("", 0, "", 0, "", (), None))) | {"message", "asctime"}
+
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per line; fields passed via `extra=` become keys."""
+
+    def format(self, record):
+        entry = {
+            "ts": time.strftime("%Y-%m-%dT%H:%M:%S", time.gmtime(record.created)) + f".{int(record.msecs):03d}Z",
+            "level": record.levelname,
+            "logger": record.name,
+            "msg": record.getMessage(),
+        }
+        for key, value in vars(record).items():
+            if key not in _STANDARD_ATTRS:
+                entry[key] = value
+        if record.exc_info:
+            entry["exc"] = self.formatException(record.exc_info)
+        return json.dumps(entry, default=str)
+
+
+# Loggers that write a line per request; admin, sharding etc. are never sampled
+SAMPLED_LOGGERS = ("notes.server",)
+
+
+class SamplingFilter(logging.Filter):
+    """Lets through only `rate` of INFO-and-below records; warnings always pass."""
+
+    def __init__(self, rate):
+        super().__init__()
+        self.rate = rate
+
+    def filter(self, record):
+        return record.levelno >= logging.WARNING or random.random() < self.rate
+
+
+def configure_logging(level="INFO", sample_rate=1.0, stream=sys.stdout, sampled_loggers=SAMPLED_LOGGERS):
+    """Routes logging through a queue so RPC threads never block on stdout.
+
+    Only records from `sampled_loggers` are sampled; everything else is kept.
+    Returns the QueueListener; call stop() on shutdown to flush it.
+    """
+    log_queue = queue.SimpleQueue()
+    queue_handler = logging.handlers.QueueHandler(log_queue)
+
+    stream_handler = logging.StreamHandler(stream)
+    stream_handler.setFormatter(JsonFormatter())
+
+    root = logging.getLogger()
+    root.handlers[:] = [queue_handler]
+    root.setLevel(level)
+    # Filter on the logger itself so dropped records never reach the queue
+    for name in sampled_loggers:
+        sampled = logging.getLogger(name)
+        for old in [f for f in sampled.filters if isinstance(f, SamplingFilter)]:
+            sampled.removeFilter(old)
+        sampled.addFilter(SamplingFilter(sample_rate))
+
+    listener = logging.handlers.QueueListener(log_queue, stream_handler)
+    listener.start()
+    return listener
@@ -0,0 +1,404 @@
+"""Prometheus-style metrics for the NoteService.
+
+Everything here is standard library: a small metrics registry, server
+interceptors (sync and grpc.aio) that time every RPC, a NoteStore
+wrapper that times storage calls, and a tiny HTTP server for /metrics.
+"""
+import asyncio
+import inspect
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import grpc
+
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+SIZE_BUCKETS = (64, 256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304)
+
+
+def _format_labels(names, values, extra=""):
+    pairs = [f'{name}="{str(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, name, help_text, labelnames=()):
+        self.name = name
+        self.help_text = help_text
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+        self._values = {}
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} {self.kind}"]
+        with self._lock:
+            items = sorted(self._values.items())
+        for labels, value in items:
+            lines.append(f"{self.name}{_format_labels(self.labelnames, labels)} {value}")
+        return lines
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def inc(self, *labels, amount=1):
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def value(self, *labels):
+        with self._lock:
+            return self._values.get(labels, 0)
+
+
+class Gauge(_Metric):
+    kind = "gauge"
+
+    def __init__(self, name, help_text, labelnames=(), callback=None):
+        super().__init__(name, help_text, labelnames)
+        # callback() -> number, read at scrape time (unlabelled gauges only)
+        self.callback = callback
+
+    def inc(self, *labels, amount=1):
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def dec(self, *labels, amount=1):
+        self.inc(*labels, amount=-amount)
+
+    def set(self, value, *labels):
+        with self._lock:
+            self._values[labels] = value
+
+    def value(self, *labels):
+        if self.callback is not None:
+            return self.callback()
+        with self._lock:
+            return self._values.get(labels, 0)
+
+    def render(self):
+        if self.callback is not None:
+            return [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} {self.kind}",
+                    f"{self.name} {self.callback()}"]
+        return super().render()
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name, help_text, labelnames=(), buckets=LATENCY_BUCKETS):
+        super().__init__(name, help_text, labelnames)
+        self.buckets = tuple(buckets)
+
+    def observe(self, value, *labels):
+        with self._lock:
+            entry = self._values.get(labels)
+            if entry is None:
+                entry = self._values[labels] = [[0] * len(self.buckets), 0.0, 0]
+            for index, bound in enumerate(self.buckets):
+                if value <= bound:
+                    entry[0][index] += 1
+                    break
+            entry[1] += value
+            entry[2] += 1
+
+    def count(self, *labels):
+        with self._lock:
+            entry = self._values.get(labels)
+            return entry[2] if entry else 0
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} {self.kind}"]
+        with self._lock:
+            items = sorted((labels, (list(entry[0]), entry[1], entry[2])) for labels, entry in self._values.items())
+        for labels, (bucket_counts, total, count) in items:
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets, bucket_counts):
+                cumulative += bucket_count
+                le = _format_labels(self.labelnames, labels, 'le="%s"' % bound)
+                lines.append(f"{self.name}_bucket{le} {cumulative}")
+            le = _format_labels(self.labelnames, labels, 'le="+Inf"')
+            lines.append(f"{self.name}_bucket{le} {count}")
+            lines.append(f"{self.name}_sum{_format_labels(self.labelnames, labels)} {total}")
+            lines.append(f"{self.name}_count{_format_labels(self.labelnames, labels)} {count}")
+        return lines
+
+
+class MetricsRegistry:
+
+    def __init__(self):
+        self._metrics = []
+
+    def _register(self, metric):
+        self._metrics.append(metric)
+        return metric
+
+    def counter(self, name, help_text, labelnames=()):
+        return self._register(Counter(name, help_text, labelnames))
+
+    def gauge(self, name, help_text, labelnames=(), callback=None):
+        return self._register(Gauge(name, help_text, labelnames, callback))
+
+    def histogram(self, name, help_text, labelnames=(), buckets=LATENCY_BUCKETS):
+        return self._register(Histogram(name, help_text, labelnames, buckets))
+
+    def render(self):
+        lines = []
+        for metric in self._metrics:
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+class ServiceMetrics:
+    """The metrics the NoteService exports."""
+
+    def __init__(self, registry=None):
+        self.registry = registry or MetricsRegistry()
+        r = self.registry
+        self.started = r.counter("grpc_server_started_total", "RPCs started", ("method",))
+        self.handled = r.counter("grpc_server_handled_total", "RPCs completed", ("method", "code"))
+        self.latency = r.histogram("grpc_server_handling_seconds", "RPC latency", ("method",))
+        self.in_flight = r.gauge("grpc_server_in_flight", "RPCs currently running", ("method",))
+        self.received_bytes = r.histogram("grpc_server_msg_received_bytes", "Request message size",
+                                          ("method",), SIZE_BUCKETS)
+        self.sent_bytes = r.histogram("grpc_server_msg_sent_bytes", "Response message size",
+                                      ("method",), SIZE_BUCKETS)
+        self.db_latency = r.histogram("notes_db_operation_seconds", "Storage call latency", ("operation",))
+        self.rejected = r.counter("notes_admission_rejected_total", "RPCs turned away by admission control",
+                                  ("method", "reason"))
+
+    def watch_executor(self, executor, name="grpc_server_queue_depth"):
+        # ThreadPoolExecutor has no public queue length; _work_queue is a SimpleQueue
+        self.registry.gauge(name, "Calls waiting for a worker thread",
+                            callback=lambda: executor._work_queue.qsize())
+
+    def watch_cache(self, cache):
+        for key in ("hits", "misses", "evictions", "entries", "bytes"):
+            self.registry.gauge(f"notes_cache_{key}", f"GetNote cache {key}",
+                                callback=lambda key=key: cache.stats()[key])
+
+    # --- per-RPC bookkeeping shared by both interceptors ---
+
+    def begin(self, method):
+        self.started.inc(method)
+        self.in_flight.inc(method)
+        return time.perf_counter()
+
+    def finish(self, method, started, code):
+        self.in_flight.dec(method)
+        self.latency.observe(time.perf_counter() - started, method)
+        self.handled.inc(method, code.name if code is not None else "OK")
+
+    def received(self, method, message):
+        self.received_bytes.observe(message.ByteSize(), method)
+        return message
+
+    def sent(self, method, message):
+        self.sent_bytes.observe(message.ByteSize(), method)
+        return message
+
+
+def _method_name(handler_call_details):
+    return handler_call_details.method.rsplit("/", 1)[-1]
+
+
+def _cancelled(context, error):
+    if isinstance(error, (GeneratorExit, asyncio.CancelledError)):
+        return True  # the stream was closed / the task cancelled under us
+    is_active = getattr(context, "is_active", None)  # grpc.aio contexts have cancelled() instead
+    return not is_active() if is_active is not None else context.cancelled()
+
+
+def _final_code(context, error=None):
+    code = context.code()
+    if code is not None:
+        return code  # set by the servicer, or by abort()
+    if _cancelled(context, error):
+        # The client went away (e.g. a watcher closing); not a server error
+        return grpc.StatusCode.CANCELLED
+    return grpc.StatusCode.UNKNOWN if error is not None else None
+
+
+class MetricsInterceptor(grpc.ServerInterceptor):
+    """Records per-method counts, status codes, latency and message sizes."""
+
+    def __init__(self, metrics):
+        self.metrics = metrics
+
+    def intercept_service(self, continuation, handler_call_details):
+        handler = continuation(handler_call_details)
+        if handler is None:
+            return None
+        method = _method_name(handler_call_details)
+        m = self.metrics
+
+        def run(behavior, request, context):
+            started = m.begin(method)
+            error = None
+            try:
+                return m.sent(method, behavior(request, context))
+            except BaseException as e:
+                error = e
+                raise
+            finally:
+                m.finish(method, started, _final_code(context, error))
+
+        def run_stream(behavior, request, context):
+            started = m.begin(method)
+            error = None
+            try:
+                for response in behavior(request, context):
+                    yield m.sent(method, response)
+            except BaseException as e:
+                error = e
+                raise
+            finally:
+                m.finish(method, started, _final_code(context, error))
+
+        def requests(request_iterator):
+            for request in request_iterator:
+                yield m.received(method, request)
+
+        if handler.unary_unary:
+            return grpc.unary_unary_rpc_method_handler(
+                lambda request, context: run(handler.unary_unary, m.received(method, request), context),
+                handler.request_deserializer, handler.response_serializer)
+        if handler.unary_stream:
+            return grpc.unary_stream_rpc_method_handler(
+                lambda request, context: run_stream(handler.unary_stream, m.received(method, request), context),
+                handler.request_deserializer, handler.response_serializer)
+        if handler.stream_unary:
+            return grpc.stream_unary_rpc_method_handler(
+                lambda request_iterator, context: run(handler.stream_unary, requests(request_iterator), context),
+                handler.request_deserializer, handler.response_serializer)
+        return grpc.stream_stream_rpc_method_handler(
+            lambda request_iterator, context: run_stream(handler.stream_stream, requests(request_iterator), context),
+            handler.request_deserializer, handler.response_serializer)
+
+
+class AioMetricsInterceptor(grpc.aio.ServerInterceptor):
+    """grpc.aio version of MetricsInterceptor."""
+
+    def __init__(self, metrics):
+        self.metrics = metrics
+
+    async def intercept_service(self, continuation, handler_call_details):
+        handler = await continuation(handler_call_details)
+        if handler is None:
+            return None
+        method = _method_name(handler_call_details)
+        m = self.metrics
+
+        # grpc.aio inspects the behaviours, so these must be real async
+        # functions / async generators rather than lambdas
+        async def run(behavior, request, context):
+            started = m.begin(method)
+            error = None
+            try:
+                return m.sent(method, await behavior(request, context))
+            except BaseException as e:
+                error = e
+                raise
+            finally:
+                m.finish(method, started, _final_code(context, error))
+
+        async def run_stream(behavior, request, context):
+            started = m.begin(method)
+            error = None
+            try:
+                async for response in behavior(request, context):
+                    yield m.sent(method, response)
+            except BaseException as e:
+                error = e
+                raise
+            finally:
+                m.finish(method, started, _final_code(context, error))
+
+        async def requests(request_iterator):
+            async for request in request_iterator:
+                yield m.received(method, request)
+
+        if handler.unary_unary:
+            async def unary_unary(request, context):
+                return await run(handler.unary_unary, m.received(method, request), context)
+            return grpc.unary_unary_rpc_method_handler(
+                unary_unary, handler.request_deserializer, handler.response_serializer)
+        if handler.unary_stream:
+            async def unary_stream(request, context):
+                async for response in run_stream(handler.unary_stream, m.received(method, request), context):
+                    yield response
+            return grpc.unary_stream_rpc_method_handler(
+                unary_stream, handler.request_deserializer, handler.response_serializer)
+        if handler.stream_unary:
+            async def stream_unary(request_iterator, context):
+                return await run(handler.stream_unary, requests(request_iterator), context)
+            return grpc.stream_unary_rpc_method_handler(
+                stream_unary, handler.request_deserializer, handler.response_serializer)
+
+        async def stream_stream(request_iterator, context):
+            async for response in run_stream(handler.stream_stream, requests(request_iterator), context):
+                yield response
+        return grpc.stream_stream_rpc_method_handler(
+            stream_stream, handler.request_deserializer, handler.response_serializer)
+
+
+class TimedStore:
+    """Wraps a NoteStore and records how long each storage call takes.
+
+    Generators returned by scan() are timed until they are exhausted.
+    """
+
+    def __init__(self, store, histogram):
+        self._store = store
+        self._histogram = histogram
+
+    def _timed_iter(self, name, iterator, started):
+        try:
+            yield from iterator
+        finally:
+            self._histogram.observe(time.perf_counter() - started, name)
+
+    def __getattr__(self, name):
+        attr = getattr(self._store, name)
+        if name.startswith("_") or not callable(attr):
+            return attr
+
+        def timed(*args, **kwargs):
+            started = time.perf_counter()
+            result = attr(*args, **kwargs)
+            if inspect.isgenerator(result):
+                return self._timed_iter(name, result, started)
+            self._histogram.observe(time.perf_counter() - started, name)
+            return result
+
+        return timed
+
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    registry = None
+
+    def do_GET(self):
+        if self.path.split("?")[0] != "/metrics":
+            self.send_error(404)
+            return
+        body = self.registry.render().encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass  # scrapes every few seconds would flood stdout
+
+
+def start_http_server(registry, port, address="0.0.0.0"):
+    """Serves GET /metrics from a daemon thread; returns the HTTP server."""
+    handler = type("MetricsHandler", (_MetricsHandler,), {"registry": registry})
+    http_server = ThreadingHTTPServer((address, port), handler)
+    http_server.daemon_threads = True
+    threading.Thread(target=http_server.serve_forever, name="metrics-http", daemon=True).start()
+    return http_server
@@ -0,0 +1,345 @@
+"""Reusable NoteService client (sync and grpc.aio).
+
+Every client spreads its calls over a small pool of channels (one HTTP/2
+connection each), so a busy client isn't capped by one connection's
+concurrent stream limit. Deadlines and retries come from the channel's
+service config: reads are retried on UNAVAILABLE with backoff, writes
+only get gRPC's transparent retries (requests that never left the client).
+
+    with NoteClient("localhost:50051") as client:
+        note_id = client.create("Title", "Content")
+        for note in client.list(order_by="created_at desc", fields=["title"]):
+            ...
+"""
+import asyncio
+import collections
+import itertools
+import json
+
+import grpc
+
+# These imports will fail in PyCharm but work in Docker
+import notes_pb2
+import notes_pb2_grpc
+
+DEFAULT_TARGET = "localhost:50051"
+DEFAULT_POOL_SIZE = 4
+DEFAULT_PAGE_SIZE = 500
+DEFAULT_WINDOW = 64  # calls in flight per pipeline()
+BATCH_SIZE = 1000  # server.MAX_BATCH_SIZE
+
+SERVICE = "notes.NoteService"
+UNARY_READS = ("GetNote", "ListNotes", "BatchGetNotes", "SearchNotes", "CountNotes", "ListTags")
+STREAMING_READS = ("StreamNotes", "ReadNoteContent")
+WRITES = ("CreateNote", "UpdateNote", "DeleteNote", "BatchCreateNotes", "BatchDeleteNotes")
+CALL_TIMEOUT = "10s"
+
+RETRY_POLICY = {
+    "maxAttempts": 4,
+    "initialBackoff": "0.1s",
+    "maxBackoff": "2s",
+    "backoffMultiplier": 2,
+    "retryableStatusCodes": ["UNAVAILABLE"],
+}
+
+
+def _names(methods):
+    return [{"service": SERVICE, "method": method} for method in methods]
+
+
+# https://github.com/grpc/grpc/blob/master/doc/service_config.md
+# Streams (exports, ImportNotes, WatchNotes) run as long as they need to, so
+# they get no timeout. Streaming reads are only retried until the first note
+# has arrived.
+SERVICE_CONFIG = {
+    "methodConfig": [
+        {"name": _names(UNARY_READS), "timeout": CALL_TIMEOUT, "retryPolicy": RETRY_POLICY},
+        {"name": _names(STREAMING_READS), "retryPolicy": RETRY_POLICY},
+        {"name": _names(WRITES), "timeout": CALL_TIMEOUT},
+    ],
+    # Stop retrying when most calls fail, instead of multiplying the load
+    "retryThrottling": {"maxTokens": 10, "tokenRatio": 0.1},
+}
+
+CHANNEL_OPTIONS = [
+    ("grpc.service_config", json.dumps(SERVICE_CONFIG)),
+    ("grpc.enable_retries", 1),
+    # Notice dead connections during long calls (WatchNotes) instead of hanging
+    ("grpc.keepalive_time_ms", 60_000),
+    ("grpc.keepalive_timeout_ms", 20_000),
+    # Without this, channels with the same target and options share one connection
+    ("grpc.use_local_subchannel_pool", 1),
+]
+
+
+def create_channel(target=DEFAULT_TARGET, compression=grpc.Compression.Gzip, options=None, aio=False):
+    """An insecure channel with the client's service config and keepalive options."""
+    make = grpc.aio.insecure_channel if aio else grpc.insecure_channel
+    return make(target, options=CHANNEL_OPTIONS + list(options or []), compression=compression)
+
+
+class ChannelPool:
+    """`size` channels to one target, handed out round-robin."""
+
+    def __init__(self, target=DEFAULT_TARGET, size=DEFAULT_POOL_SIZE, compression=grpc.Compression.Gzip,
+                 options=None, aio=False):
+        self.channels = [create_channel(target, compression, options, aio) for _ in range(max(1, size))]
+        self.stubs = [notes_pb2_grpc.NoteServiceStub(channel) for channel in self.channels]
+        self._next = itertools.count()
+
+    def stub(self):
+        return self.stubs[next(self._next) % len(self.stubs)]
+
+
+def _create_request(note):
+    # (title, content), optionally followed by (tags, owner, notebook)
+    title, content, tags, owner, notebook = tuple(note) + ((), "", "")[len(note) - 2:]
+    return notes_pb2.CreateNoteRequest(title=title, content=content, tags=tags, owner=owner, notebook=notebook)
+
+
+def _set_time_ranges(request, created, updated):
+    # created / updated are (start, end) Timestamps, either may be None
+    for name, bounds in (("created", created), ("updated", updated)):
+        if bounds is not None:
+            start, end = bounds
+            time_range = getattr(request, name)
+            time_range.SetInParent()
+            if start is not None:
+                time_range.start.CopyFrom(start)
+            if end is not None:
+                time_range.end.CopyFrom(end)
+    return request
+
+
+def _list_request(page_size, order_by, fields, created, updated, tags, owner, notebook):
+    request = notes_pb2.ListNotesRequest(page_size=page_size, order_by=order_by,
+                                         read_mask={"paths": list(fields or [])},
+                                         filter={"tags": list(tags or []), "owner": owner, "notebook": notebook})
+    return _set_time_ranges(request, created, updated)
+
+
+def _count_request(created, updated, tags, owner, notebook):
+    request = notes_pb2.CountNotesRequest(filter={"tags": list(tags or []), "owner": owner, "notebook": notebook})
+    return _set_time_ranges(request, created, updated)
+
+
+def _update_request(note_id, expected_version, changes):
+    if not changes:
+        raise ValueError("Nothing to update")
+    return notes_pb2.UpdateNoteRequest(id=note_id, expected_version=expected_version,
+                                       update_mask={"paths": list(changes)}, **changes)
+
+
+def _changes(title, content, tags, owner, notebook):
+    fields = (("title", title), ("content", content), ("tags", tags), ("owner", owner), ("notebook", notebook))
+    return {name: value for name, value in fields if value is not None}
+
+
+class NoteClient:
+    """Blocking client; safe to share between threads."""
+
+    def __init__(self, target=DEFAULT_TARGET, pool_size=DEFAULT_POOL_SIZE, compression=grpc.Compression.Gzip,
+                 options=None, timeout=None):
+        self.pool = ChannelPool(target, pool_size, compression, options)
+        # Per-call deadline in seconds; None falls back to the service config
+        self.timeout = timeout
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def close(self):
+        for channel in self.pool.channels:
+            channel.close()
+
+    def _call(self, method, request, **kwargs):
+        return getattr(self.pool.stub(), method)(request, timeout=self.timeout, **kwargs)
+
+    def create(self, title, content="", tags=(), owner="", notebook=""):
+        return self._call("CreateNote", _create_request((title, content, tags, owner, notebook))).id
+
+    def get(self, note_id, fields=None):
+        """Returns the Note, or None if it doesn't exist."""
+        request = notes_pb2.GetNoteRequest(id=note_id, read_mask={"paths": list(fields or [])})
+        try:
+            return self._call("GetNote", request).note
+        except grpc.RpcError as e:
+            if e.code() == grpc.StatusCode.NOT_FOUND:
+                return None
+            raise
+
+    def update(self, note_id, title=None, content=None, expected_version=0, tags=None, owner=None, notebook=None):
+        """Returns the updated Note; raises RpcError (ABORTED) on a version mismatch.
+
+        Only the arguments that aren't None are changed; tags replaces all of them.
+        """
+        request = _update_request(note_id, expected_version, _changes(title, content, tags, owner, notebook))
+        return self._call("UpdateNote", request).note
+
+    def delete(self, note_id):
+        """Returns True if the note existed."""
+        return self._call("DeleteNote", notes_pb2.DeleteNoteRequest(id=note_id)).success
+
+    def get_many(self, note_ids, fields=None):
+        """Yields the Notes that exist, BATCH_SIZE ids per call."""
+        note_ids = list(note_ids)
+        for start in range(0, len(note_ids), BATCH_SIZE):
+            request = notes_pb2.BatchGetNotesRequest(ids=note_ids[start:start + BATCH_SIZE],
+                                                     read_mask={"paths": list(fields or [])})
+            yield from self._call("BatchGetNotes", request).notes
+
+    def list(self, page_size=DEFAULT_PAGE_SIZE, order_by="", fields=None, created=None, updated=None, tags=None,
+             owner="", notebook=""):
+        """Yields every note (with all of `tags`, and the owner / notebook if given), a page at a time."""
+        request = _list_request(page_size, order_by, fields, created, updated, tags, owner, notebook)
+        while True:
+            page = self._call("ListNotes", request)
+            yield from page.notes
+            if not page.next_page_token:
+                return
+            request.page_token = page.next_page_token
+
+    def stream(self, order_by="", fields=None, created=None, updated=None, tags=None, owner="", notebook=""):
+        """Yields every note over one StreamNotes call (faster than list() for full dumps)."""
+        request = _list_request(0, order_by, fields, created, updated, tags, owner, notebook)
+        yield from self._call("StreamNotes", request)
+
+    def count(self, created=None, updated=None, tags=None, owner="", notebook=""):
+        """Number of notes list() would return."""
+        return self._call("CountNotes", _count_request(created, updated, tags, owner, notebook)).count
+
+    def tags(self, owner="", limit=0):
+        """Returns [(tag, note count)], most used first."""
+        response = self._call("ListTags", notes_pb2.ListTagsRequest(owner=owner, limit=limit))
+        return [(tag.tag, tag.note_count) for tag in response.tags]
+
+    def search(self, query, page_size=50):
+        """Yields SearchResults, best match first."""
+        request = notes_pb2.SearchNotesRequest(query=query, page_size=page_size)
+        while True:
+            page = self._call("SearchNotes", request)
+            yield from page.results
+            if not page.next_page_token:
+                return
+            request.page_token = page.next_page_token
+
+    def import_notes(self, notes):
+        """Uploads (title, content[, tags, owner, notebook]) tuples over one ImportNotes stream.
+
+        Returns how many were stored.
+        """
+        requests = (_create_request(note) for note in notes)
+        return self.pool.stub().ImportNotes(requests, timeout=self.timeout).imported_count
+
+    def watch(self, after_seq=None):
+        """Yields NoteEvents after `after_seq` (None = from now) until the call is cancelled or fails."""
+        yield from self.pool.stub().WatchNotes(notes_pb2.WatchNotesRequest(after_seq=after_seq))
+
+    def pipeline(self, method, requests, window=DEFAULT_WINDOW):
+        """Calls a unary method once per request, keeping up to `window` calls in flight.
+
+        Yields the responses in request order; the first failure is raised
+        and the calls still in flight are cancelled.
+        """
+        in_flight = collections.deque()
+        try:
+            for request in requests:
+                if len(in_flight) >= window:
+                    yield in_flight.popleft().result()
+                in_flight.append(getattr(self.pool.stub(), method).future(request, timeout=self.timeout))
+            while in_flight:
+                yield in_flight.popleft().result()
+        finally:
+            for call in in_flight:
+                call.cancel()
+
+    def create_many(self, notes, window=DEFAULT_WINDOW):
+        """Creates notes, given as for import_notes(), with pipelined CreateNote calls; yields the new ids."""
+        requests = (_create_request(note) for note in notes)
+        for response in self.pipeline("CreateNote", requests, window):
+            yield response.id
+
+
+class AsyncNoteClient:
+    """grpc.aio client; use it from one event loop."""
+
+    def __init__(self, target=DEFAULT_TARGET, pool_size=DEFAULT_POOL_SIZE, compression=grpc.Compression.Gzip,
+                 options=None, timeout=None):
+        self.pool = ChannelPool(target, pool_size, compression, options, aio=True)
+        self.timeout = timeout
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc_info):
+        await self.close()
+
+    async def close(self):
+        await asyncio.gather(*(channel.close() for channel in self.pool.channels))
+
+    async def _call(self, method, request):
+        return await getattr(self.pool.stub(), method)(request, timeout=self.timeout)
+
+    async def create(self, title, content="", tags=(), owner="", notebook=""):
+        return (await self._call("CreateNote", _create_request((title, content, tags, owner, notebook)))).id
+
+    async def get(self, note_id, fields=None):
+        request = notes_pb2.GetNoteRequest(id=note_id, read_mask={"paths": list(fields or [])})
+        try:
+            return (await self._call("GetNote", request)).note
+        except grpc.aio.AioRpcError as e:
+            if e.code() == grpc.StatusCode.NOT_FOUND:
+                return None
+            raise
+
+    async def update(self, note_id, title=None, content=None, expected_version=0, tags=None, owner=None,
+                     notebook=None):
+        request = _update_request(note_id, expected_version, _changes(title, content, tags, owner, notebook))
+        return (await self._call("UpdateNote", request)).note
+
+    async def delete(self, note_id):
+        return (await self._call("DeleteNote", notes_pb2.DeleteNoteRequest(id=note_id))).success
+
+    async def list(self, page_size=DEFAULT_PAGE_SIZE, order_by="", fields=None, created=None, updated=None,
+                   tags=None, owner="", notebook=""):
+        request = _list_request(page_size, order_by, fields, created, updated, tags, owner, notebook)
+        while True:
+            page = await self._call("ListNotes", request)
+            for note in page.notes:
+                yield note
+            if not page.next_page_token:
+                return
+            request.page_token = page.next_page_token
+
+    async def stream(self, order_by="", fields=None, created=None, updated=None, tags=None, owner="",
+                     notebook=""):
+        request = _list_request(0, order_by, fields, created, updated, tags, owner, notebook)
+        async for note in self.pool.stub().StreamNotes(request, timeout=self.timeout):
+            yield note
+
+    async def count(self, created=None, updated=None, tags=None, owner="", notebook=""):
+        return (await self._call("CountNotes", _count_request(created, updated, tags, owner, notebook))).count
+
+    async def tags(self, owner="", limit=0):
+        response = await self._call("ListTags", notes_pb2.ListTagsRequest(owner=owner, limit=limit))
+        return [(tag.tag, tag.note_count) for tag in response.tags]
+
+    async def watch(self, after_seq=None):
+        async for event in self.pool.stub().WatchNotes(notes_pb2.WatchNotesRequest(after_seq=after_seq)):
+            yield event
+
+    async def pipeline(self, method, requests, window=DEFAULT_WINDOW):
+        """Like NoteClient.pipeline(), but returns the list of responses."""
+        limit = asyncio.Semaphore(window)
+
+        async def call(request):
+            async with limit:
+                return await self._call(method, request)
+
+        return await asyncio.gather(*(call(request) for request in requests))
+
+    async def create_many(self, notes, window=DEFAULT_WINDOW):
+        requests = [_create_request(note) for note in notes]
+        return [response.id for response in await self.pipeline("CreateNote", requests, window)]
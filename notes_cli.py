@@ -0,0 +1,181 @@
+"""Bulk command line client; notes go in and out as NDJSON (one JSON object per line).
+
+    python notes_cli.py import notes.ndjson      # {"title": ..., "content": ...} per line
+    python notes_cli.py export > backup.ndjson
+    python notes_cli.py list --order-by "created_at desc" --limit 20
+    python notes_cli.py list --tag work --tag urgent --owner alice
+    python notes_cli.py get ID [ID ...]
+    python notes_cli.py count --tag work
+
+"-" (the default) means stdin / stdout. Lines written by export can be
+imported again; the notes get new ids.
+"""
+import argparse
+import contextlib
+import itertools
+import json
+import sys
+
+import grpc
+
+import note_client
+import server
+import storage
+
+
+def note_to_dict(note, fields=None):
+    fields = storage.check_fields(fields)
+    data = {}
+    for field in fields:
+        value = getattr(note, field)
+        if field in storage.TIME_FIELDS:
+            value = value.ToJsonString()
+        elif field == "tags":
+            value = list(value)
+        data[field] = value
+    return data
+
+
+def read_ndjson(stream):
+    """Yields (title, content, tags, owner, notebook) from NDJSON lines; raises ValueError naming the bad line."""
+    for number, line in enumerate(stream, 1):
+        if not line.strip():
+            continue
+        try:
+            note = json.loads(line)
+            tags = note.get("tags", [])
+            if isinstance(tags, str):
+                raise TypeError("tags must be a list")
+            yield (str(note["title"]), str(note.get("content", "")), [str(tag) for tag in tags],
+                   str(note.get("owner", "")), str(note.get("notebook", "")))
+        except (ValueError, KeyError, TypeError, AttributeError) as e:
+            raise ValueError(f"line {number}: expected a JSON object with a title ({e})") from None
+
+
+def write_ndjson(notes, stream, fields=None):
+    count = 0
+    for note in notes:
+        stream.write(json.dumps(note_to_dict(note, fields), ensure_ascii=False) + "\n")
+        count += 1
+    stream.flush()
+    return count
+
+
+def _open(path, mode):
+    if path == "-":
+        # Leave stdin / stdout open for the caller
+        return contextlib.nullcontext(sys.stdin if "r" in mode else sys.stdout)
+    return open(path, mode, encoding="utf-8")
+
+
+def cmd_import(client, args):
+    errors = []
+
+    def rows(stream):
+        # gRPC only reports "Exception iterating requests", so keep the real error
+        try:
+            yield from read_ndjson(stream)
+        except ValueError as e:
+            errors.append(e)
+            raise
+
+    with _open(args.file, "r") as stream:
+        try:
+            imported = client.import_notes(rows(stream))
+        except grpc.RpcError:
+            if errors:
+                raise ValueError(f"{errors[0]}; the lines before it may have been imported") from None
+            raise
+    print(f"Imported {imported} notes", file=sys.stderr)
+
+
+def _filter(args):
+    return {"tags": args.tag, "owner": args.owner, "notebook": args.notebook}
+
+
+def cmd_export(client, args):
+    with _open(args.file, "w") as stream:
+        exported = write_ndjson(client.stream(order_by=args.order_by, **_filter(args)), stream)
+    print(f"Exported {exported} notes", file=sys.stderr)
+
+
+def cmd_list(client, args):
+    notes = client.list(page_size=min(args.limit or note_client.DEFAULT_PAGE_SIZE, server.MAX_PAGE_SIZE),
+                        order_by=args.order_by, fields=args.fields, **_filter(args))
+    write_ndjson(itertools.islice(notes, args.limit or None), sys.stdout, args.fields)
+
+
+def cmd_count(client, args):
+    print(client.count(**_filter(args)))
+
+
+def cmd_get(client, args):
+    found = {note.id: note for note in client.get_many(args.ids, fields=args.fields)}
+    write_ndjson((found[note_id] for note_id in args.ids if note_id in found), sys.stdout, args.fields)
+    missing = [note_id for note_id in args.ids if note_id not in found]
+    for note_id in missing:
+        print(f"Not found: {note_id}", file=sys.stderr)
+    return 1 if missing else 0
+
+
+def _add_filter_arguments(parser):
+    parser.add_argument("--tag", action="append", default=[],
+                        help="only notes with this tag; repeat for notes with all of them (rarest first)")
+    parser.add_argument("--owner", default="")
+    parser.add_argument("--notebook", default="")
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(description="NoteService bulk client (NDJSON in and out)")
+    parser.add_argument("--target", default=note_client.DEFAULT_TARGET, help="server address")
+    parser.add_argument("--timeout", type=float, default=None,
+                        help="per-call deadline in seconds (default: the client's service config)")
+    parser.add_argument("--compression", choices=sorted(server.COMPRESSION), default=server.DEFAULT_COMPRESSION)
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    import_parser = commands.add_parser("import", help="create notes from NDJSON")
+    import_parser.add_argument("file", nargs="?", default="-")
+    import_parser.set_defaults(handler=cmd_import)
+
+    export_parser = commands.add_parser("export", help="write every note as NDJSON")
+    export_parser.add_argument("file", nargs="?", default="-")
+    export_parser.add_argument("--order-by", default="")
+    _add_filter_arguments(export_parser)
+    export_parser.set_defaults(handler=cmd_export)
+
+    list_parser = commands.add_parser("list", help="write notes as NDJSON, titles only by default")
+    list_parser.add_argument("--order-by", default="")
+    list_parser.add_argument("--limit", type=int, default=0, help="stop after this many notes (0 = all)")
+    list_parser.add_argument("--fields", nargs="+", default=["title"], help="note fields to fetch")
+    _add_filter_arguments(list_parser)
+    list_parser.set_defaults(handler=cmd_list)
+
+    get_parser = commands.add_parser("get", help="write the given notes as NDJSON")
+    get_parser.add_argument("ids", nargs="+")
+    get_parser.add_argument("--fields", nargs="+", default=None)
+    get_parser.set_defaults(handler=cmd_get)
+
+    count_parser = commands.add_parser("count", help="print how many notes match the filters")
+    _add_filter_arguments(count_parser)
+    count_parser.set_defaults(handler=cmd_count)
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    client = note_client.NoteClient(args.target, compression=server.COMPRESSION[args.compression],
+                                    timeout=args.timeout)
+    try:
+        return args.handler(client, args) or 0
+    except grpc.RpcError as e:
+        print(f"Error: {e.code().name}: {e.details()}", file=sys.stderr)
+        return 1
+    except (ValueError, OSError) as e:
+        print(f"Error: {e}", file=sys.stderr)
+        return 1
+    finally:
+        client.close()
+
+
+if __name__ == '__main__':
+    sys.exit(main())
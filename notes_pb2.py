@@ -0,0 +1,122 @@
+# -*- coding: utf-8 -*-
+# Generated by the protocol buffer compiler.  DO NOT EDIT!
+# NO CHECKED-IN PROTOBUF GENCODE
+# source: notes.proto
+# Protobuf Python Version: 7.35.1
+"""Generated protocol buffer code."""
+from google.protobuf import descriptor as _descriptor
+from google.protobuf import descriptor_pool as _descriptor_pool
+from google.protobuf import runtime_version as _runtime_version
+from google.protobuf import symbol_database as _symbol_database
+from google.protobuf.internal import builder as _builder
+_runtime_version.ValidateProtobufRuntimeVersion(
+    _runtime_version.Domain.PUBLIC,
+    7,
+    35,
+    1,
+    '',
+    'notes.proto'
+)
+# @@protoc_insertion_point(imports)
+
+_sym_db = _symbol_database.Default()
+
+
+from google.protobuf import field_mask_pb2 as google_dot_protobuf_dot_field__mask__pb2
+from google.protobuf import timestamp_pb2 as google_dot_protobuf_dot_timestamp__pb2
+
+
+DESCRIPTOR = _descriptor_pool.Default().AddSerializedFile(b'\n\x0bnotes.proto\x12\x05notes\x1a google/protobuf/field_mask.proto\x1a\x1fgoogle/protobuf/timestamp.proto\"\xd2\x01\n\x04Note\x12\n\n\x02id\x18\x01 \x01(\t\x12\r\n\x05title\x18\x02 \x01(\t\x12\x0f\n\x07\x63ontent\x18\x03 \x01(\t\x12\x0f\n\x07version\x18\x04 \x01(\x03\x12.\n\ncreated_at\x18\x05 \x01(\x0b\x32\x1a.google.protobuf.Timestamp\x12.\n\nupdated_at\x18\x06 \x01(\x0b\x32\x1a.google.protobuf.Timestamp\x12\x0c\n\x04tags\x18\x07 \x03(\t\x12\r\n\x05owner\x18\x08 \x01(\t\x12\x10\n\x08notebook\x18\t \x01(\t\"b\n\x11\x43reateNoteRequest\x12\r\n\x05title\x18\x01 \x01(\t\x12\x0f\n\x07\x63ontent\x18\x02 \x01(\t\x12\x0c\n\x04tags\x18\x03 \x03(\t\x12\r\n\x05owner\x18\x04 \x01(\t\x12\x10\n\x08notebook\x18\x05 \x01(\t\" \n\x12\x43reateNoteResponse\x12\n\n\x02id\x18\x01 \x01(\t\"K\n\x0eGetNoteRequest\x12\n\n\x02id\x18\x01 \x01(\t\x12-\n\tread_mask\x18\x02 \x01(\x0b\x32\x1a.google.protobuf.FieldMask\",\n\x0fGetNoteResponse\x12\x19\n\x04note\x18\x01 \x01(\x0b\x32\x0b.notes.Note\"8\n\x16ReadNoteContentRequest\x12\n\n\x02id\x18\x01 \x01(\t\x12\x12\n\nchunk_size\x18\x02 \x01(\x05\"_\n\x10NoteContentChunk\x12\x19\n\x04note\x18\x01 \x01(\x0b\x32\x0b.notes.Note\x12\x12\n\ntotal_size\x18\x02 \x01(\x03\x12\x0e\n\x06offset\x18\x03 \x01(\x03\x12\x0c\n\x04\x64\x61ta\x18\x04 \x01(\x0c\"\x1f\n\x11\x44\x65leteNoteRequest\x12\n\n\x02id\x18\x01 \x01(\t\"6\n\x12\x44\x65leteNoteResponse\x12\x0f\n\x07success\x18\x01 \x01(\x08\x12\x0f\n\x07message\x18\x02 \x01(\t\"\xb9\x01\n\x11UpdateNoteRequest\x12\n\n\x02id\x18\x01 \x01(\t\x12\r\n\x05title\x18\x02 \x01(\t\x12\x0f\n\x07\x63ontent\x18\x03 \x01(\t\x12\x18\n\x10\x65xpected_version\x18\x04 \x01(\x03\x12/\n\x0bupdate_mask\x18\x05 \x01(\x0b\x32\x1a.google.protobuf.FieldMask\x12\x0c\n\x04tags\x18\x06 \x03(\t\x12\r\n\x05owner\x18\x07 \x01(\t\x12\x10\n\x08notebook\x18\x08 \x01(\t\"/\n\x12UpdateNoteResponse\x12\x19\n\x04note\x18\x01 \x01(\x0b\x32\x0b.notes.Note\"\xe3\x01\n\x10ListNotesRequest\x12\x11\n\tpage_size\x18\x01 \x01(\x05\x12\x12\n\npage_token\x18\x02 \x01(\t\x12-\n\tread_mask\x18\x03 \x01(\x0b\x32\x1a.google.protobuf.FieldMask\x12\x10\n\x08order_by\x18\x04 \x01(\t\x12!\n\x07\x63reated\x18\x05 \x01(\x0b\x32\x10.notes.TimeRange\x12!\n\x07updated\x18\x06 \x01(\x0b\x32\x10.notes.TimeRange\x12!\n\x06\x66ilter\x18\x07 \x01(\x0b\x32\x11.notes.NoteFilter\";\n\nNoteFilter\x12\x0c\n\x04tags\x18\x01 \x03(\t\x12\r\n\x05owner\x18\x02 \x01(\t\x12\x10\n\x08notebook\x18\x03 \x01(\t\"_\n\tTimeRange\x12)\n\x05start\x18\x01 \x01(\x0b\x32\x1a.google.protobuf.Timestamp\x12\'\n\x03\x65nd\x18\x02 \x01(\x0b\x32\x1a.google.protobuf.Timestamp\"\\\n\x11ListNotesResponse\x12\x1a\n\x05notes\x18\x01 \x03(\x0b\x32\x0b.notes.Note\x12\x17\n\x0fnext_page_token\x18\x02 \x01(\t\x12\x12\n\nchange_seq\x18\x03 \x01(\x03\"?\n\x0f\x42\x61tchItemStatus\x12\n\n\x02id\x18\x01 \x01(\t\x12\x0f\n\x07success\x18\x02 \x01(\x08\x12\x0f\n\x07message\x18\x03 \x01(\t\"B\n\x17\x42\x61tchCreateNotesRequest\x12\'\n\x05notes\x18\x01 \x03(\x0b\x32\x18.notes.CreateNoteRequest\"C\n\x18\x42\x61tchCreateNotesResponse\x12\'\n\x07results\x18\x01 \x03(\x0b\x32\x16.notes.BatchItemStatus\"R\n\x14\x42\x61tchGetNotesRequest\x12\x0b\n\x03ids\x18\x01 \x03(\t\x12-\n\tread_mask\x18\x02 \x01(\x0b\x32\x1a.google.protobuf.FieldMask\"H\n\x15\x42\x61tchGetNotesResponse\x12\x1a\n\x05notes\x18\x01 \x03(\x0b\x32\x0b.notes.Note\x12\x13\n\x0bmissing_ids\x18\x02 \x03(\t\"&\n\x17\x42\x61tchDeleteNotesRequest\x12\x0b\n\x03ids\x18\x01 \x03(\t\"C\n\x18\x42\x61tchDeleteNotesResponse\x12\'\n\x07results\x18\x01 \x03(\x0b\x32\x16.notes.BatchItemStatus\"-\n\x13ImportNotesResponse\x12\x16\n\x0eimported_count\x18\x01 \x01(\x05\"J\n\x12SearchNotesRequest\x12\r\n\x05query\x18\x01 \x01(\t\x12\x11\n\tpage_size\x18\x02 \x01(\x05\x12\x12\n\npage_token\x18\x03 \x01(\t\"H\n\x0cSearchResult\x12\x19\n\x04note\x18\x01 \x01(\x0b\x32\x0b.notes.Note\x12\x0f\n\x07snippet\x18\x02 \x01(\t\x12\x0c\n\x04rank\x18\x03 \x01(\x01\"T\n\x13SearchNotesResponse\x12$\n\x07results\x18\x01 \x03(\x0b\x32\x13.notes.SearchResult\x12\x17\n\x0fnext_page_token\x18\x02 \x01(\t\"9\n\x11WatchNotesRequest\x12\x16\n\tafter_seq\x18\x01 \x01(\x03H\x00\x88\x01\x01\x42\x0c\n\n_after_seq\"\xae\x01\n\tNoteEvent\x12\x0b\n\x03seq\x18\x01 \x01(\x03\x12#\n\x04type\x18\x02 \x01(\x0e\x32\x15.notes.NoteEvent.Type\x12\x0f\n\x07note_id\x18\x03 \x01(\t\x12\x19\n\x04note\x18\x04 \x01(\x0b\x32\x0b.notes.Note\"C\n\x04Type\x12\x14\n\x10TYPE_UNSPECIFIED\x10\x00\x12\x0b\n\x07\x43REATED\x10\x01\x12\x0b\n\x07UPDATED\x10\x02\x12\x0b\n\x07\x44\x45LETED\x10\x03\"|\n\x11\x43ountNotesRequest\x12!\n\x06\x66ilter\x18\x01 \x01(\x0b\x32\x11.notes.NoteFilter\x12!\n\x07\x63reated\x18\x02 \x01(\x0b\x32\x10.notes.TimeRange\x12!\n\x07updated\x18\x03 \x01(\x0b\x32\x10.notes.TimeRange\"#\n\x12\x43ountNotesResponse\x12\r\n\x05\x63ount\x18\x01 \x01(\x03\"/\n\x0fListTagsRequest\x12\r\n\x05owner\x18\x01 \x01(\t\x12\r\n\x05limit\x18\x02 \x01(\x05\"+\n\x08TagCount\x12\x0b\n\x03tag\x18\x01 \x01(\t\x12\x12\n\nnote_count\x18\x02 \x01(\x03\"1\n\x10ListTagsResponse\x12\x1d\n\x04tags\x18\x01 \x03(\x0b\x32\x0f.notes.TagCount\"\x1d\n\rBackupRequest\x12\x0c\n\x04name\x18\x01 \x01(\t\"R\n\x0e\x42\x61\x63kupResponse\x12\x0c\n\x04path\x18\x01 \x01(\t\x12\r\n\x05pages\x18\x02 \x01(\x03\x12\x12\n\nsize_bytes\x18\x03 \x01(\x03\x12\x0f\n\x07seconds\x18\x04 \x01(\x01\" \n\x0eReshardRequest\x12\x0e\n\x06shards\x18\x01 \x01(\x05\"G\n\x0fReshardResponse\x12\x0e\n\x06shards\x18\x01 \x01(\x05\x12\x13\n\x0bmoved_notes\x18\x02 \x01(\x03\x12\x0f\n\x07seconds\x18\x03 \x01(\x01\"L\n\x0eProfileRequest\x12\x0f\n\x07seconds\x18\x01 \x01(\x01\x12\x13\n\x0binterval_ms\x18\x02 \x01(\x05\x12\x14\n\x0cinclude_idle\x18\x03 \x01(\x08\"<\n\x0fProfileResponse\x12\x18\n\x10\x63ollapsed_stacks\x18\x01 \x01(\t\x12\x0f\n\x07samples\x18\x02 \x01(\x03\"l\n\x0eSnapshotHeader\x12\x16\n\x0e\x66ormat_version\x18\x01 \x01(\x05\x12.\n\ncreated_at\x18\x02 \x01(\x0b\x32\x1a.google.protobuf.Timestamp\x12\x12\n\nchange_seq\x18\x03 \x01(\x03\x32\x93\x08\n\x0bNoteService\x12\x41\n\nCreateNote\x12\x18.notes.CreateNoteRequest\x1a\x19.notes.CreateNoteResponse\x12\x38\n\x07GetNote\x12\x15.notes.GetNoteRequest\x1a\x16.notes.GetNoteResponse\x12K\n\x0fReadNoteContent\x12\x1d.notes.ReadNoteContentRequest\x1a\x17.notes.NoteContentChunk0\x01\x12\x41\n\nDeleteNote\x12\x18.notes.DeleteNoteRequest\x1a\x19.notes.DeleteNoteResponse\x12\x41\n\nUpdateNote\x12\x18.notes.UpdateNoteRequest\x1a\x19.notes.UpdateNoteResponse\x12>\n\tListNotes\x12\x17.notes.ListNotesRequest\x1a\x18.notes.ListNotesResponse\x12\x35\n\x0bStreamNotes\x12\x17.notes.ListNotesRequest\x1a\x0b.notes.Note0\x01\x12S\n\x10\x42\x61tchCreateNotes\x12\x1e.notes.BatchCreateNotesRequest\x1a\x1f.notes.BatchCreateNotesResponse\x12J\n\rBatchGetNotes\x12\x1b.notes.BatchGetNotesRequest\x1a\x1c.notes.BatchGetNotesResponse\x12S\n\x10\x42\x61tchDeleteNotes\x12\x1e.notes.BatchDeleteNotesRequest\x1a\x1f.notes.BatchDeleteNotesResponse\x12\x45\n\x0bImportNotes\x12\x18.notes.CreateNoteRequest\x1a\x1a.notes.ImportNotesResponse(\x01\x12\x44\n\x0bSearchNotes\x12\x19.notes.SearchNotesRequest\x1a\x1a.notes.SearchNotesResponse\x12:\n\nWatchNotes\x12\x18.notes.WatchNotesRequest\x1a\x10.notes.NoteEvent0\x01\x12\x41\n\nCountNotes\x12\x18.notes.CountNotesRequest\x1a\x19.notes.CountNotesResponse\x12;\n\x08ListTags\x12\x16.notes.ListTagsRequest\x1a\x17.notes.ListTagsResponse2\xb9\x01\n\x0c\x41\x64minService\x12\x35\n\x06\x42\x61\x63kup\x12\x14.notes.BackupRequest\x1a\x15.notes.BackupResponse\x12\x38\n\x07Reshard\x12\x15.notes.ReshardRequest\x1a\x16.notes.ReshardResponse\x12\x38\n\x07Profile\x12\x15.notes.ProfileRequest\x1a\x16.notes.ProfileResponseb\x06proto3')
+
+_globals = globals()
+_builder.BuildMessageAndEnumDescriptors(DESCRIPTOR, _globals)
+_builder.BuildTopDescriptorsAndMessages(DESCRIPTOR, 'notes_pb2', _globals)
+if not _descriptor._USE_C_DESCRIPTORS:
+  DESCRIPTOR._loaded_options = None
+  _globals['_NOTE']._serialized_start=90
+  _globals['_NOTE']._serialized_end=300
+  _globals['_CREATENOTEREQUEST']._serialized_start=302
+  _globals['_CREATENOTEREQUEST']._serialized_end=400
+  _globals['_CREATENOTERESPONSE']._serialized_start=402
+  _globals['_CREATENOTERESPONSE']._serialized_end=434
+  _globals['_GETNOTEREQUEST']._serialized_start=436
+  _globals['_GETNOTEREQUEST']._serialized_end=511
+  _globals['_GETNOTERESPONSE']._serialized_start=513
+  _globals['_GETNOTERESPONSE']._serialized_end=557
+  _globals['_READNOTECONTENTREQUEST']._serialized_start=559
+  _globals['_READNOTECONTENTREQUEST']._serialized_end=615
+  _globals['_NOTECONTENTCHUNK']._serialized_start=617
+  _globals['_NOTECONTENTCHUNK']._serialized_end=712
+  _globals['_DELETENOTEREQUEST']._serialized_start=714
+  _globals['_DELETENOTEREQUEST']._serialized_end=745
+  _globals['_DELETENOTERESPONSE']._serialized_start=747
+  _globals['_DELETENOTERESPONSE']._serialized_end=801
+  _globals['_UPDATENOTEREQUEST']._serialized_start=804
+  _globals['_UPDATENOTEREQUEST']._serialized_end=989
+  _globals['_UPDATENOTERESPONSE']._serialized_start=991
+  _globals['_UPDATENOTERESPONSE']._serialized_end=1038
+  _globals['_LISTNOTESREQUEST']._serialized_start=1041
+  _globals['_LISTNOTESREQUEST']._serialized_end=1268
+  _globals['_NOTEFILTER']._serialized_start=1270
+  _globals['_NOTEFILTER']._serialized_end=1329
+  _globals['_TIMERANGE']._serialized_start=1331
+  _globals['_TIMERANGE']._serialized_end=1426
+  _globals['_LISTNOTESRESPONSE']._serialized_start=1428
+  _globals['_LISTNOTESRESPONSE']._serialized_end=1520
+  _globals['_BATCHITEMSTATUS']._serialized_start=1522
+  _globals['_BATCHITEMSTATUS']._serialized_end=1585
+  _globals['_BATCHCREATENOTESREQUEST']._serialized_start=1587
+  _globals['_BATCHCREATENOTESREQUEST']._serialized_end=1653
+  _globals['_BATCHCREATENOTESRESPONSE']._serialized_start=1655
+  _globals['_BATCHCREATENOTESRESPONSE']._serialized_end=1722
+  _globals['_BATCHGETNOTESREQUEST']._serialized_start=1724
+  _globals['_BATCHGETNOTESREQUEST']._serialized_end=1806
+  _globals['_BATCHGETNOTESRESPONSE']._serialized_start=1808
+  _globals['_BATCHGETNOTESRESPONSE']._serialized_end=1880
+  _globals['_BATCHDELETENOTESREQUEST']._serialized_start=1882
+  _globals['_BATCHDELETENOTESREQUEST']._serialized_end=1920
+  _globals['_BATCHDELETENOTESRESPONSE']._serialized_start=1922
+  _globals['_BATCHDELETENOTESRESPONSE']._serialized_end=1989
+  _globals['_IMPORTNOTESRESPONSE']._serialized_start=1991
+  _globals['_IMPORTNOTESRESPONSE']._serialized_end=2036
+  _globals['_SEARCHNOTESREQUEST']._serialized_start=2038
+  _globals['_SEARCHNOTESREQUEST']._serialized_end=2112
+  _globals['_SEARCHRESULT']._serialized_start=2114
+  _globals['_SEARCHRESULT']._serialized_end=2186
+  _globals['_SEARCHNOTESRESPONSE']._serialized_start=2188
+  _globals['_SEARCHNOTESRESPONSE']._serialized_end=2272
+  _globals['_WATCHNOTESREQUEST']._serialized_start=2274
+  _globals['_WATCHNOTESREQUEST']._serialized_end=2331
+  _globals['_NOTEEVENT']._serialized_start=2334
+  _globals['_NOTEEVENT']._serialized_end=2508
+  _globals['_NOTEEVENT_TYPE']._serialized_start=2441
+  _globals['_NOTEEVENT_TYPE']._serialized_end=2508
+  _globals['_COUNTNOTESREQUEST']._serialized_start=2510
+  _globals['_COUNTNOTESREQUEST']._serialized_end=2634
+  _globals['_COUNTNOTESRESPONSE']._serialized_start=2636
+  _globals['_COUNTNOTESRESPONSE']._serialized_end=2671
+  _globals['_LISTTAGSREQUEST']._serialized_start=2673
+  _globals['_LISTTAGSREQUEST']._serialized_end=2720
+  _globals['_TAGCOUNT']._serialized_start=2722
+  _globals['_TAGCOUNT']._serialized_end=2765
+  _globals['_LISTTAGSRESPONSE']._serialized_start=2767
+  _globals['_LISTTAGSRESPONSE']._serialized_end=2816
+  _globals['_BACKUPREQUEST']._serialized_start=2818
+  _globals['_BACKUPREQUEST']._serialized_end=2847
+  _globals['_BACKUPRESPONSE']._serialized_start=2849
+  _globals['_BACKUPRESPONSE']._serialized_end=2931
+  _globals['_RESHARDREQUEST']._serialized_start=2933
+  _globals['_RESHARDREQUEST']._serialized_end=2965
+  _globals['_RESHARDRESPONSE']._serialized_start=2967
+  _globals['_RESHARDRESPONSE']._serialized_end=3038
+  _globals['_PROFILEREQUEST']._serialized_start=3040
+  _globals['_PROFILEREQUEST']._serialized_end=3116
+  _globals['_PROFILERESPONSE']._serialized_start=3118
+  _globals['_PROFILERESPONSE']._serialized_end=3178
+  _globals['_SNAPSHOTHEADER']._serialized_start=3180
+  _globals['_SNAPSHOTHEADER']._serialized_end=3288
+  _globals['_NOTESERVICE']._serialized_start=3291
+  _globals['_NOTESERVICE']._serialized_end=4334
+  _globals['_ADMINSERVICE']._serialized_start=4337
+  _globals['_ADMINSERVICE']._serialized_end=4522
+# @@protoc_insertion_point(module_scope)
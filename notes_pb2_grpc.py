@@ -0,0 +1,879 @@
+# Generated by the gRPC Python protocol compiler plugin. DO NOT EDIT!
+"""Client and server classes corresponding to protobuf-defined services."""
+import grpc
+import warnings
+
+import notes_pb2 as notes__pb2
+
+GRPC_GENERATED_VERSION = '1.84.0'
+GRPC_VERSION = grpc.__version__
+_version_not_supported = False
+
+try:
+    from grpc._utilities import first_version_is_lower
+    _version_not_supported = first_version_is_lower(GRPC_VERSION, GRPC_GENERATED_VERSION)
+except ImportError:
+    _version_not_supported = True
+
+if _version_not_supported:
+    raise RuntimeError(
+        f'The grpc package installed is at version {GRPC_VERSION},'
+        + ' but the generated code in notes_pb2_grpc.py depends on'
+        + f' grpcio>={GRPC_GENERATED_VERSION}.'
+        + f' Please upgrade your grpc module to grpcio>={GRPC_GENERATED_VERSION}'
+        + f' or downgrade your generated code using grpcio-tools<={GRPC_VERSION}.'
+    )
+
+
+class NoteServiceStub:
+    """The Note service definition.
+    """
+
+    def __init__(self, channel):
+        """Constructor.
+
+        Args:
+            channel: A grpc.Channel.
+        """
+        self.CreateNote = channel.unary_unary(
+                '/notes.NoteService/CreateNote',
+                request_serializer=notes__pb2.CreateNoteRequest.SerializeToString,
+                response_deserializer=notes__pb2.CreateNoteResponse.FromString,
+                _registered_method=True)
+        self.GetNote = channel.unary_unary(
+                '/notes.NoteService/GetNote',
+                request_serializer=notes__pb2.GetNoteRequest.SerializeToString,
+                response_deserializer=notes__pb2.GetNoteResponse.FromString,
+                _registered_method=True)
+        self.ReadNoteContent = channel.unary_stream(
+                '/notes.NoteService/ReadNoteContent',
+                request_serializer=notes__pb2.ReadNoteContentRequest.SerializeToString,
+                response_deserializer=notes__pb2.NoteContentChunk.FromString,
+                _registered_method=True)
+        self.DeleteNote = channel.unary_unary(
+                '/notes.NoteService/DeleteNote',
+                request_serializer=notes__pb2.DeleteNoteRequest.SerializeToString,
+                response_deserializer=notes__pb2.DeleteNoteResponse.FromString,
+                _registered_method=True)
+        self.UpdateNote = channel.unary_unary(
+                '/notes.NoteService/UpdateNote',
+                request_serializer=notes__pb2.UpdateNoteRequest.SerializeToString,
+                response_deserializer=notes__pb2.UpdateNoteResponse.FromString,
+                _registered_method=True)
+        self.ListNotes = channel.unary_unary(
+                '/notes.NoteService/ListNotes',
+                request_serializer=notes__pb2.ListNotesRequest.SerializeToString,
+                response_deserializer=notes__pb2.ListNotesResponse.FromString,
+                _registered_method=True)
+        self.StreamNotes = channel.unary_stream(
+                '/notes.NoteService/StreamNotes',
+                request_serializer=notes__pb2.ListNotesRequest.SerializeToString,
+                response_deserializer=notes__pb2.Note.FromString,
+                _registered_method=True)
+        self.BatchCreateNotes = channel.unary_unary(
+                '/notes.NoteService/BatchCreateNotes',
+                request_serializer=notes__pb2.BatchCreateNotesRequest.SerializeToString,
+                response_deserializer=notes__pb2.BatchCreateNotesResponse.FromString,
+                _registered_method=True)
+        self.BatchGetNotes = channel.unary_unary(
+                '/notes.NoteService/BatchGetNotes',
+                request_serializer=notes__pb2.BatchGetNotesRequest.SerializeToString,
+                response_deserializer=notes__pb2.BatchGetNotesResponse.FromString,
+                _registered_method=True)
+        self.BatchDeleteNotes = channel.unary_unary(
+                '/notes.NoteService/BatchDeleteNotes',
+                request_serializer=notes__pb2.BatchDeleteNotesRequest.SerializeToString,
+                response_deserializer=notes__pb2.BatchDeleteNotesResponse.FromString,
+                _registered_method=True)
+        self.ImportNotes = channel.stream_unary(
+                '/notes.NoteService/ImportNotes',
+                request_serializer=notes__pb2.CreateNoteRequest.SerializeToString,
+                response_deserializer=notes__pb2.ImportNotesResponse.FromString,
+                _registered_method=True)
+        self.SearchNotes = channel.unary_unary(
+                '/notes.NoteService/SearchNotes',
+                request_serializer=notes__pb2.SearchNotesRequest.SerializeToString,
+                response_deserializer=notes__pb2.SearchNotesResponse.FromString,
+                _registered_method=True)
+        self.WatchNotes = channel.unary_stream(
+                '/notes.NoteService/WatchNotes',
+                request_serializer=notes__pb2.WatchNotesRequest.SerializeToString,
+                response_deserializer=notes__pb2.NoteEvent.FromString,
+                _registered_method=True)
+        self.CountNotes = channel.unary_unary(
+                '/notes.NoteService/CountNotes',
+                request_serializer=notes__pb2.CountNotesRequest.SerializeToString,
+                response_deserializer=notes__pb2.CountNotesResponse.FromString,
+                _registered_method=True)
+        self.ListTags = channel.unary_unary(
+                '/notes.NoteService/ListTags',
+                request_serializer=notes__pb2.ListTagsRequest.SerializeToString,
+                response_deserializer=notes__pb2.ListTagsResponse.FromString,
+                _registered_method=True)
+
+
+class NoteServiceServicer:
+    """The Note service definition.
+    """
+
+    def CreateNote(self, request, context):
+        """Missing associated documentation comment in .proto file."""
+        context.set_code(grpc.StatusCode.UNIMPLEMENTED)
+        context.set_details('Method not implemented!')
+        raise NotImplementedError('Method not implemented!')
+
+    def GetNote(self, request, context):
+        """1. THIS LINE IS CHANGED
+        """
+        context.set_code(grpc.StatusCode.UNIMPLEMENTED)
+        context.set_details('Method not implemented!')
+        raise NotImplementedError('Method not implemented!')
+
+    def ReadNoteContent(self, request, context):
+        """Streams one note's content in chunks, for notes too big for one message
+        """
+        context.set_code(grpc.StatusCode.UNIMPLEMENTED)
+        context.set_details('Method not implemented!')
+        raise NotImplementedError('Method not implemented!')
+
+    def DeleteNote(self, request, context):
+        """Missing associated documentation comment in .proto file."""
+        context.set_code(grpc.StatusCode.UNIMPLEMENTED)
+        context.set_details('Method not implemented!')
+        raise NotImplementedError('Method not implemented!')
+
+    def UpdateNote(self, request, context):
+        """Edits a note in place; with expected_version set it only applies if nobody changed it meanwhile
+        """
+        context.set_code(grpc.StatusCode.UNIMPLEMENTED)
+        context.set_details('Method not implemented!')
+        raise NotImplementedError('Method not implemented!')
+
+    def ListNotes(self, request, context):
+        """Missing associated documentation comment in .proto file."""
+        context.set_code(grpc.StatusCode.UNIMPLEMENTED)
+        context.set_details('Method not implemented!')
+        raise NotImplementedError('Method not implemented!')
+
+    def StreamNotes(self, request, context):
+        """Streams every note (starting after page_token) straight from the DB cursor
+        """
+        context.set_code(grpc.StatusCode.UNIMPLEMENTED)
+        context.set_details('Method not implemented!')
+        raise NotImplementedError('Method not implemented!')
+
+    def BatchCreateNotes(self, request, context):
+        """Batch variants: one round-trip and one transaction per call
+        """
+        context.set_code(grpc.StatusCode.UNIMPLEMENTED)
+        context.set_details('Method not implemented!')
+        raise NotImplementedError('Method not implemented!')
+
+    def BatchGetNotes(self, request, context):
+        """Missing associated documentation comment in .proto file."""
+        context.set_code(grpc.StatusCode.UNIMPLEMENTED)
+        context.set_details('Method not implemented!')
+        raise NotImplementedError('Method not implemented!')
+
+    def BatchDeleteNotes(self, request, context):
+        """Missing associated documentation comment in .proto file."""
+        context.set_code(grpc.StatusCode.UNIMPLEMENTED)
+        context.set_details('Method not implemented!')
+        raise NotImplementedError('Method not implemented!')
+
+    def ImportNotes(self, request_iterator, context):
+        """Client-streaming bulk upload, committed in chunks
+        """
+        context.set_code(grpc.StatusCode.UNIMPLEMENTED)
+        context.set_details('Method not implemented!')
+        raise NotImplementedError('Method not implemented!')
+
+    def SearchNotes(self, request, context):
+        """Ranked full-text search over title and content (SQLite FTS5)
+        """
+        context.set_code(grpc.StatusCode.UNIMPLEMENTED)
+        context.set_details('Method not implemented!')
+        raise NotImplementedError('Method not implemented!')
+
+    def WatchNotes(self, request, context):
+        """Change feed: streams create/update/delete events as they are committed
+        """
+        context.set_code(grpc.StatusCode.UNIMPLEMENTED)
+        context.set_details('Method not implemented!')
+        raise NotImplementedError('Method not implemented!')
+
+    def CountNotes(self, request, context):
+        """Number of notes matching a filter, counted in the database
+        """
+        context.set_code(grpc.StatusCode.UNIMPLEMENTED)
+        context.set_details('Method not implemented!')
+        raise NotImplementedError('Method not implemented!')
+
+    def ListTags(self, request, context):
+        """Tags in use with their note counts, most used first
+        """
+        context.set_code(grpc.StatusCode.UNIMPLEMENTED)
+        context.set_details('Method not implemented!')
+        raise NotImplementedError('Method not implemented!')
+
+
+def add_NoteServiceServicer_to_server(servicer, server):
+    rpc_method_handlers = {
+            'CreateNote': grpc.unary_unary_rpc_method_handler(
+                    servicer.CreateNote,
+                    request_deserializer=notes__pb2.CreateNoteRequest.FromString,
+                    response_serializer=notes__pb2.CreateNoteResponse.SerializeToString,
+            ),
+            'GetNote': grpc.unary_unary_rpc_method_handler(
+                    servicer.GetNote,
+                    request_deserializer=notes__pb2.GetNoteRequest.FromString,
+                    response_serializer=notes__pb2.GetNoteResponse.SerializeToString,
+            ),
+            'ReadNoteContent': grpc.unary_stream_rpc_method_handler(
+                    servicer.ReadNoteContent,
+                    request_deserializer=notes__pb2.ReadNoteContentRequest.FromString,
+                    response_serializer=notes__pb2.NoteContentChunk.SerializeToString,
+            ),
+            'DeleteNote': grpc.unary_unary_rpc_method_handler(
+                    servicer.DeleteNote,
+                    request_deserializer=notes__pb2.DeleteNoteRequest.FromString,
+                    response_serializer=notes__pb2.DeleteNoteResponse.SerializeToString,
+            ),
+            'UpdateNote': grpc.unary_unary_rpc_method_handler(
+                    servicer.UpdateNote,
+                    request_deserializer=notes__pb2.UpdateNoteRequest.FromString,
+                    response_serializer=notes__pb2.UpdateNoteResponse.SerializeToString,
+            ),
+            'ListNotes': grpc.unary_unary_rpc_method_handler(
+                    servicer.ListNotes,
+                    request_deserializer=notes__pb2.ListNotesRequest.FromString,
+                    response_serializer=notes__pb2.ListNotesResponse.SerializeToString,
+            ),
+            'StreamNotes': grpc.unary_stream_rpc_method_handler(
+                    servicer.StreamNotes,
+                    request_deserializer=notes__pb2.ListNotesRequest.FromString,
+                    response_serializer=notes__pb2.Note.SerializeToString,
+            ),
+            'BatchCreateNotes': grpc.unary_unary_rpc_method_handler(
+                    servicer.BatchCreateNotes,
+                    request_deserializer=notes__pb2.BatchCreateNotesRequest.FromString,
+                    response_serializer=notes__pb2.BatchCreateNotesResponse.SerializeToString,
+            ),
+            'BatchGetNotes': grpc.unary_unary_rpc_method_handler(
+                    servicer.BatchGetNotes,
+                    request_deserializer=notes__pb2.BatchGetNotesRequest.FromString,
+                    response_serializer=notes__pb2.BatchGetNotesResponse.SerializeToString,
+            ),
+            'BatchDeleteNotes': grpc.unary_unary_rpc_method_handler(
+                    servicer.BatchDeleteNotes,
+                    request_deserializer=notes__pb2.BatchDeleteNotesRequest.FromString,
+                    response_serializer=notes__pb2.BatchDeleteNotesResponse.SerializeToString,
+            ),
+            'ImportNotes': grpc.stream_unary_rpc_method_handler(
+                    servicer.ImportNotes,
+                    request_deserializer=notes__pb2.CreateNoteRequest.FromString,
+                    response_serializer=notes__pb2.ImportNotesResponse.SerializeToString,
+            ),
+            'SearchNotes': grpc.unary_unary_rpc_method_handler(
+                    servicer.SearchNotes,
+                    request_deserializer=notes__pb2.SearchNotesRequest.FromString,
+                    response_serializer=notes__pb2.SearchNotesResponse.SerializeToString,
+            ),
+            'WatchNotes': grpc.unary_stream_rpc_method_handler(
+                    servicer.WatchNotes,
+                    request_deserializer=notes__pb2.WatchNotesRequest.FromString,
+                    response_serializer=notes__pb2.NoteEvent.SerializeToString,
+            ),
+            'CountNotes': grpc.unary_unary_rpc_method_handler(
+                    servicer.CountNotes,
+                    request_deserializer=notes__pb2.CountNotesRequest.FromString,
+                    response_serializer=notes__pb2.CountNotesResponse.SerializeToString,
+            ),
+            'ListTags': grpc.unary_unary_rpc_method_handler(
+                    servicer.ListTags,
+                    request_deserializer=notes__pb2.ListTagsRequest.FromString,
+                    response_serializer=notes__pb2.ListTagsResponse.SerializeToString,
+            ),
+    }
+    generic_handler = grpc.method_handlers_generic_handler(
+            'notes.NoteService', rpc_method_handlers)
+    server.add_generic_rpc_handlers((generic_handler,))
+    server.add_registered_method_handlers('notes.NoteService', rpc_method_handlers)
+
+
+ # This class is part of an EXPERIMENTAL API.
+class NoteService:
+    """The Note service definition.
+    """
+
+    @staticmethod
+    def CreateNote(request,
+            target,
+            options=(),
+            channel_credentials=None,
+            call_credentials=None,
+            insecure=False,
+            compression=None,
+            wait_for_ready=None,
+            timeout=None,
+            metadata=None):
+        return grpc.experimental.unary_unary(
+            request,
+            target,
+            '/notes.NoteService/CreateNote',
+            notes__pb2.CreateNoteRequest.SerializeToString,
+            notes__pb2.CreateNoteResponse.FromString,
+            options,
+            channel_credentials,
+            insecure,
+            call_credentials,
+            compression,
+            wait_for_ready,
+            timeout,
+            metadata,
+            _registered_method=True)
+
+    @staticmethod
+    def GetNote(request,
+            target,
+            options=(),
+            channel_credentials=None,
+            call_credentials=None,
+            insecure=False,
+            compression=None,
+            wait_for_ready=None,
+            timeout=None,
+            metadata=None):
+        return grpc.experimental.unary_unary(
+            request,
+            target,
+            '/notes.NoteService/GetNote',
+            notes__pb2.GetNoteRequest.SerializeToString,
+            notes__pb2.GetNoteResponse.FromString,
+            options,
+            channel_credentials,
+            insecure,
+            call_credentials,
+            compression,
+            wait_for_ready,
+            timeout,
+            metadata,
+            _registered_method=True)
+
+    @staticmethod
+    def ReadNoteContent(request,
+            target,
+            options=(),
+            channel_credentials=None,
+            call_credentials=None,
+            insecure=False,
+            compression=None,
+            wait_for_ready=None,
+            timeout=None,
+            metadata=None):
+        return grpc.experimental.unary_stream(
+            request,
+            target,
+            '/notes.NoteService/ReadNoteContent',
+            notes__pb2.ReadNoteContentRequest.SerializeToString,
+            notes__pb2.NoteContentChunk.FromString,
+            options,
+            channel_credentials,
+            insecure,
+            call_credentials,
+            compression,
+            wait_for_ready,
+            timeout,
+            metadata,
+            _registered_method=True)
+
+    @staticmethod
+    def DeleteNote(request,
+            target,
+            options=(),
+            channel_credentials=None,
+            call_credentials=None,
+            insecure=False,
+            compression=None,
+            wait_for_ready=None,
+            timeout=None,
+            metadata=None):
+        return grpc.experimental.unary_unary(
+            request,
+            target,
+            '/notes.NoteService/DeleteNote',
+            notes__pb2.DeleteNoteRequest.SerializeToString,
+            notes__pb2.DeleteNoteResponse.FromString,
+            options,
+            channel_credentials,
+            insecure,
+            call_credentials,
+            compression,
+            wait_for_ready,
+            timeout,
+            metadata,
+            _registered_method=True)
+
+    @staticmethod
+    def UpdateNote(request,
+            target,
+            options=(),
+            channel_credentials=None,
+            call_credentials=None,
+            insecure=False,
+            compression=None,
+            wait_for_ready=None,
+            timeout=None,
+            metadata=None):
+        return grpc.experimental.unary_unary(
+            request,
+            target,
+            '/notes.NoteService/UpdateNote',
+            notes__pb2.UpdateNoteRequest.SerializeToString,
+            notes__pb2.UpdateNoteResponse.FromString,
+            options,
+            channel_credentials,
+            insecure,
+            call_credentials,
+            compression,
+            wait_for_ready,
+            timeout,
+            metadata,
+            _registered_method=True)
+
+    @staticmethod
+    def ListNotes(request,
+            target,
+            options=(),
+            channel_credentials=None,
+            call_credentials=None,
+            insecure=False,
+            compression=None,
+            wait_for_ready=None,
+            timeout=None,
+            metadata=None):
+        return grpc.experimental.unary_unary(
+            request,
+            target,
+            '/notes.NoteService/ListNotes',
+            notes__pb2.ListNotesRequest.SerializeToString,
+            notes__pb2.ListNotesResponse.FromString,
+            options,
+            channel_credentials,
+            insecure,
+            call_credentials,
+            compression,
+            wait_for_ready,
+            timeout,
+            metadata,
+            _registered_method=True)
+
+    @staticmethod
+    def StreamNotes(request,
+            target,
+            options=(),
+            channel_credentials=None,
+            call_credentials=None,
+            insecure=False,
+            compression=None,
+            wait_for_ready=None,
+            timeout=None,
+            metadata=None):
+        return grpc.experimental.unary_stream(
+            request,
+            target,
+            '/notes.NoteService/StreamNotes',
+            notes__pb2.ListNotesRequest.SerializeToString,
+            notes__pb2.Note.FromString,
+            options,
+            channel_credentials,
+            insecure,
+            call_credentials,
+            compression,
+            wait_for_ready,
+            timeout,
+            metadata,
+            _registered_method=True)
+
+    @staticmethod
+    def BatchCreateNotes(request,
+            target,
+            options=(),
+            channel_credentials=None,
+            call_credentials=None,
+            insecure=False,
+            compression=None,
+            wait_for_ready=None,
+            timeout=None,
+            metadata=None):
+        return grpc.experimental.unary_unary(
+            request,
+            target,
+            '/notes.NoteService/BatchCreateNotes',
+            notes__pb2.BatchCreateNotesRequest.SerializeToString,
+            notes__pb2.BatchCreateNotesResponse.FromString,
+            options,
+            channel_credentials,
+            insecure,
+            call_credentials,
+            compression,
+            wait_for_ready,
+            timeout,
+            metadata,
+            _registered_method=True)
+
+    @staticmethod
+    def BatchGetNotes(request,
+            target,
+            options=(),
+            channel_credentials=None,
+            call_credentials=None,
+            insecure=False,
+            compression=None,
+            wait_for_ready=None,
+            timeout=None,
+            metadata=None):
+        return grpc.experimental.unary_unary(
+            request,
+            target,
+            '/notes.NoteService/BatchGetNotes',
+            notes__pb2.BatchGetNotesRequest.SerializeToString,
+            notes__pb2.BatchGetNotesResponse.FromString,
+            options,
+            channel_credentials,
+            insecure,
+            call_credentials,
+            compression,
+            wait_for_ready,
+            timeout,
+            metadata,
+            _registered_method=True)
+
+    @staticmethod
+    def BatchDeleteNotes(request,
+            target,
+            options=(),
+            channel_credentials=None,
+            call_credentials=None,
+            insecure=False,
+            compression=None,
+            wait_for_ready=None,
+            timeout=None,
+            metadata=None):
+        return grpc.experimental.unary_unary(
+            request,
+            target,
+            '/notes.NoteService/BatchDeleteNotes',
+            notes__pb2.BatchDeleteNotesRequest.SerializeToString,
+            notes__pb2.BatchDeleteNotesResponse.FromString,
+            options,
+            channel_credentials,
+            insecure,
+            call_credentials,
+            compression,
+            wait_for_ready,
+            timeout,
+            metadata,
+            _registered_method=True)
+
+    @staticmethod
+    def ImportNotes(request_iterator,
+            target,
+            options=(),
+            channel_credentials=None,
+            call_credentials=None,
+            insecure=False,
+            compression=None,
+            wait_for_ready=None,
+            timeout=None,
+            metadata=None):
+        return grpc.experimental.stream_unary(
+            request_iterator,
+            target,
+            '/notes.NoteService/ImportNotes',
+            notes__pb2.CreateNoteRequest.SerializeToString,
+            notes__pb2.ImportNotesResponse.FromString,
+            options,
+            channel_credentials,
+            insecure,
+            call_credentials,
+            compression,
+            wait_for_ready,
+            timeout,
+            metadata,
+            _registered_method=True)
+
+    @staticmethod
+    def SearchNotes(request,
+            target,
+            options=(),
+            channel_credentials=None,
+            call_credentials=None,
+            insecure=False,
+            compression=None,
+            wait_for_ready=None,
+            timeout=None,
+            metadata=None):
+        return grpc.experimental.unary_unary(
+            request,
+            target,
+            '/notes.NoteService/SearchNotes',
+            notes__pb2.SearchNotesRequest.SerializeToString,
+            notes__pb2.SearchNotesResponse.FromString,
+            options,
+            channel_credentials,
+            insecure,
+            call_credentials,
+            compression,
+            wait_for_ready,
+            timeout,
+            metadata,
+            _registered_method=True)
+
+    @staticmethod
+    def WatchNotes(request,
+            target,
+            options=(),
+            channel_credentials=None,
+            call_credentials=None,
+            insecure=False,
+            compression=None,
+            wait_for_ready=None,
+            timeout=None,
+            metadata=None):
+        return grpc.experimental.unary_stream(
+            request,
+            target,
+            '/notes.NoteService/WatchNotes',
+            notes__pb2.WatchNotesRequest.SerializeToString,
+            notes__pb2.NoteEvent.FromString,
+            options,
+            channel_credentials,
+            insecure,
+            call_credentials,
+            compression,
+            wait_for_ready,
+            timeout,
+            metadata,
+            _registered_method=True)
+
+    @staticmethod
+    def CountNotes(request,
+            target,
+            options=(),
+            channel_credentials=None,
+            call_credentials=None,
+            insecure=False,
+            compression=None,
+            wait_for_ready=None,
+            timeout=None,
+            metadata=None):
+        return grpc.experimental.unary_unary(
+            request,
+            target,
+            '/notes.NoteService/CountNotes',
+            notes__pb2.CountNotesRequest.SerializeToString,
+            notes__pb2.CountNotesResponse.FromString,
+            options,
+            channel_credentials,
+            insecure,
+            call_credentials,
+            compression,
+            wait_for_ready,
+            timeout,
+            metadata,
+            _registered_method=True)
+
+    @staticmethod
+    def ListTags(request,
+            target,
+            options=(),
+            channel_credentials=None,
+            call_credentials=None,
+            insecure=False,
+            compression=None,
+            wait_for_ready=None,
+            timeout=None,
+            metadata=None):
+        return grpc.experimental.unary_unary(
+            request,
+            target,
+            '/notes.NoteService/ListTags',
+            notes__pb2.ListTagsRequest.SerializeToString,
+            notes__pb2.ListTagsResponse.FromString,
+            options,
+            channel_credentials,
+            insecure,
+            call_credentials,
+            compression,
+            wait_for_ready,
+            timeout,
+            metadata,
+            _registered_method=True)
+
+
+class AdminServiceStub:
+    """Operational RPCs, separate from the note API
+    """
+
+    def __init__(self, channel):
+        """Constructor.
+
+        Args:
+            channel: A grpc.Channel.
+        """
+        self.Backup = channel.unary_unary(
+                '/notes.AdminService/Backup',
+                request_serializer=notes__pb2.BackupRequest.SerializeToString,
+                response_deserializer=notes__pb2.BackupResponse.FromString,
+                _registered_method=True)
+        self.Reshard = channel.unary_unary(
+                '/notes.AdminService/Reshard',
+                request_serializer=notes__pb2.ReshardRequest.SerializeToString,
+                response_deserializer=notes__pb2.ReshardResponse.FromString,
+                _registered_method=True)
+        self.Profile = channel.unary_unary(
+                '/notes.AdminService/Profile',
+                request_serializer=notes__pb2.ProfileRequest.SerializeToString,
+                response_deserializer=notes__pb2.ProfileResponse.FromString,
+                _registered_method=True)
+
+
+class AdminServiceServicer:
+    """Operational RPCs, separate from the note API
+    """
+
+    def Backup(self, request, context):
+        """Consistent copy of the SQLite database into the server's --backup-dir,
+        taken while the server keeps serving
+        """
+        context.set_code(grpc.StatusCode.UNIMPLEMENTED)
+        context.set_details('Method not implemented!')
+        raise NotImplementedError('Method not implemented!')
+
+    def Reshard(self, request, context):
+        """Changes the number of shards of a --store sharded server, moving notes
+        between shards while it keeps serving; returns when they are all moved
+        """
+        context.set_code(grpc.StatusCode.UNIMPLEMENTED)
+        context.set_details('Method not implemented!')
+        raise NotImplementedError('Method not implemented!')
+
+    def Profile(self, request, context):
+        """Samples every server thread's stack for a few seconds and returns them
+        as collapsed stacks (flamegraph.pl / speedscope input)
+        """
+        context.set_code(grpc.StatusCode.UNIMPLEMENTED)
+        context.set_details('Method not implemented!')
+        raise NotImplementedError('Method not implemented!')
+
+
+def add_AdminServiceServicer_to_server(servicer, server):
+    rpc_method_handlers = {
+            'Backup': grpc.unary_unary_rpc_method_handler(
+                    servicer.Backup,
+                    request_deserializer=notes__pb2.BackupRequest.FromString,
+                    response_serializer=notes__pb2.BackupResponse.SerializeToString,
+            ),
+            'Reshard': grpc.unary_unary_rpc_method_handler(
+                    servicer.Reshard,
+                    request_deserializer=notes__pb2.ReshardRequest.FromString,
+                    response_serializer=notes__pb2.ReshardResponse.SerializeToString,
+            ),
+            'Profile': grpc.unary_unary_rpc_method_handler(
+                    servicer.Profile,
+                    request_deserializer=notes__pb2.ProfileRequest.FromString,
+                    response_serializer=notes__pb2.ProfileResponse.SerializeToString,
+            ),
+    }
+    generic_handler = grpc.method_handlers_generic_handler(
+            'notes.AdminService', rpc_method_handlers)
+    server.add_generic_rpc_handlers((generic_handler,))
+    server.add_registered_method_handlers('notes.AdminService', rpc_method_handlers)
+
+
+ # This class is part of an EXPERIMENTAL API.
+class AdminService:
+    """Operational RPCs, separate from the note API
+    """
+
+    @staticmethod
+    def Backup(request,
+            target,
+            options=(),
+            channel_credentials=None,
+            call_credentials=None,
+            insecure=False,
+            compression=None,
+            wait_for_ready=None,
+            timeout=None,
+            metadata=None):
+        return grpc.experimental.unary_unary(
+            request,
+            target,
+            '/notes.AdminService/Backup',
+            notes__pb2.BackupRequest.SerializeToString,
+            notes__pb2.BackupResponse.FromString,
+            options,
+            channel_credentials,
+            insecure,
+            call_credentials,
+            compression,
+            wait_for_ready,
+            timeout,
+            metadata,
+            _registered_method=True)
+
+    @staticmethod
+    def Reshard(request,
+            target,
+            options=(),
+            channel_credentials=None,
+            call_credentials=None,
+            insecure=False,
+            compression=None,
+            wait_for_ready=None,
+            timeout=None,
+            metadata=None):
+        return grpc.experimental.unary_unary(
+            request,
+            target,
+            '/notes.AdminService/Reshard',
+            notes__pb2.ReshardRequest.SerializeToString,
+            notes__pb2.ReshardResponse.FromString,
+            options,
+            channel_credentials,
+            insecure,
+            call_credentials,
+            compression,
+            wait_for_ready,
+            timeout,
+            metadata,
+            _registered_method=True)
+
+    @staticmethod
+    def Profile(request,
+            target,
+            options=(),
+            channel_credentials=None,
+            call_credentials=None,
+            insecure=False,
+            compression=None,
+            wait_for_ready=None,
+            timeout=None,
+            metadata=None):
+        return grpc.experimental.unary_unary(
+            request,
+            target,
+            '/notes.AdminService/Profile',
+            notes__pb2.ProfileRequest.SerializeToString,
+            notes__pb2.ProfileResponse.FromString,
+            options,
+            channel_credentials,
+            insecure,
+            call_credentials,
+            compression,
+            wait_for_ready,
+            timeout,
+            metadata,
+            _registered_method=True)
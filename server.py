@@ -1,102 +1,925 @@
 import grpc
 from concurrent import futures
-import uuid
-import sqlite3
+import argparse
+import asyncio
+import base64
+import binascii
+import logging
+import os
+import signal
+import threading
+import admin
+import admission
+import changefeed
 import database  # Import our database initializer
+import ids
+import metrics
+import sharding
+import storage
+import tracing
+from cache import LRUCache
+from logging_utils import configure_logging
+from storage import StorageError, InvalidQueryError, VersionConflictError
 
 # These imports will fail in PyCharm but work in Docker
 import notes_pb2
 import notes_pb2_grpc
 
 DB_NAME = database.DB_NAME  # Use the path from database.py
+SERVER_ADDRESS = '[::]:50051'
+
+logger = logging.getLogger("notes.server")
+
+MAX_PAGE_SIZE = 1000
+STREAM_CHUNK_SIZE = storage.SCAN_CHUNK_SIZE
+DEFAULT_SEARCH_PAGE_SIZE = 20
+MAX_SEARCH_OFFSET = 10_000  # ranked results this deep are re-ranked for every page; refine the query instead
+MAX_BATCH_SIZE = 1000
+IMPORT_CHUNK_SIZE = 500  # notes committed per transaction by ImportNotes
+UPDATABLE_FIELDS = ("title", "content", "tags", "owner", "notebook")
+DEFAULT_UPDATE_FIELDS = ("title", "content")  # for an empty update_mask
+DEFAULT_CHUNK_SIZE = 64 * 1024  # ReadNoteContent bytes per message
+MAX_CHUNK_SIZE = 1024 * 1024
+
+# Channel compression; gRPC negotiates it per call, so clients without it still work
+COMPRESSION = {
+    "none": grpc.Compression.NoCompression,
+    "gzip": grpc.Compression.Gzip,
+    "deflate": grpc.Compression.Deflate,
+}
+DEFAULT_COMPRESSION = "gzip"
+
+# note_client pings every 60 s during calls; allow that even when no data
+# flows (an idle WatchNotes), or gRPC closes the connection for too_many_pings
+SERVER_OPTIONS = [("grpc.http2.min_ping_interval_without_data_ms", 30_000)]
+
+
+# --- Pagination helpers ---
+# Pages are keyed on the primary key (id), so the token is just the last id
+# of the previous page. It is base64 encoded to keep it opaque to clients.
+
+def encode_page_token(last_id):
+    return base64.urlsafe_b64encode(last_id.encode()).decode()
+
+
+def decode_page_token(token):
+    if not token:
+        return ""
+    try:
+        return base64.b64decode(token.encode(), altchars=b"-_", validate=True).decode()
+    except (binascii.Error, UnicodeDecodeError, ValueError):
+        raise ValueError("Invalid page_token")
+
+
+# Sorted listings page on (sort value, id) instead, so their token holds both
+
+def encode_cursor(note, order_by):
+    if order_by == "id":
+        return encode_page_token(note.id)
+    return encode_page_token(f"{getattr(note, order_by).ToMilliseconds()},{note.id}")
+
+
+def decode_cursor(token, order_by):
+    """Returns the scan_sorted() `after` for a page_token ("" = start); raises ValueError."""
+    text = decode_page_token(token)
+    if not text:
+        return None
+    if order_by == "id":
+        return text, text
+    value, _, note_id = text.partition(",")
+    try:
+        return int(value), note_id
+    except ValueError:
+        raise ValueError("Invalid page_token") from None
+
+
+# --- Sorting and time ranges ---
+
+def parse_order_by(order_by):
+    """Returns (sort key, descending) for a ListNotesRequest.order_by; raises ValueError."""
+    words = order_by.split()
+    if not words:
+        return "id", False
+    if words[0] not in storage.SORT_KEYS or len(words) > 2 or words[1:] not in ([], ["asc"], ["desc"]):
+        raise ValueError(f"Invalid order_by {order_by!r}; use one of {', '.join(storage.SORT_KEYS)} "
+                         f"optionally followed by asc or desc")
+    return words[0], words[1:] == ["desc"]
+
+
+def time_range(request, name):
+    """The (start, end) milliseconds of a TimeRange field, or None if it isn't set."""
+    if not request.HasField(name):
+        return None
+    bounds = getattr(request, name)
+    return (bounds.start.ToMilliseconds() if bounds.HasField("start") else None,
+            bounds.end.ToMilliseconds() if bounds.HasField("end") else None)
+
+
+def note_filter(request):
+    """Turns a request's NoteFilter and time ranges into scan_sorted() / count() arguments; raises ValueError."""
+    return {
+        "created": time_range(request, "created"),
+        "updated": time_range(request, "updated"),
+        # In the client's order: the scan starts from the first tag
+        "tags": storage.normalize_tags(request.filter.tags),
+        "owner": request.filter.owner or None,
+        "notebook": request.filter.notebook or None,
+    }
+
+
+def list_options(request):
+    """Turns a ListNotesRequest into scan_sorted() arguments; raises ValueError."""
+    order_by, descending = parse_order_by(request.order_by)
+    return {
+        "order_by": order_by,
+        "descending": descending,
+        "after": decode_cursor(request.page_token, order_by),
+        **note_filter(request),
+    }
+
+
+def new_note_row(note_id, request):
+    """The NoteStore row for a CreateNoteRequest; raises ValueError for bad tags."""
+    return note_id, request.title, request.content, storage.normalize_tags(request.tags), request.owner, \
+        request.notebook
+
+
+# --- Field masks ---
+
+def read_fields(mask):
+    """Turns a read_mask into NoteStore `fields` (None = every field); raises ValueError."""
+    if not mask.paths:
+        return None
+    return storage.check_fields(mask.paths)
+
+
+def project_note(note, fields):
+    if fields is None:
+        return note
+    return notes_pb2.Note(**{field: getattr(note, field) for field in fields})
+
+
+def content_chunks(note, chunk_size):
+    """Splits note.content into NoteContentChunks of at most chunk_size bytes."""
+    data = note.content.encode()
+    header = notes_pb2.Note(id=note.id, title=note.title, version=note.version,
+                            created_at=note.created_at, updated_at=note.updated_at, tags=note.tags,
+                            owner=note.owner, notebook=note.notebook)
+    if not data:
+        yield notes_pb2.NoteContentChunk(note=header, total_size=0)
+        return
+    for offset in range(0, len(data), chunk_size):
+        chunk = notes_pb2.NoteContentChunk(offset=offset, data=data[offset:offset + chunk_size])
+        if offset == 0:
+            chunk.note.CopyFrom(header)
+            chunk.total_size = len(data)
+        yield chunk
+
+
+EVENT_TYPES = {
+    "create": notes_pb2.NoteEvent.CREATED,
+    "update": notes_pb2.NoteEvent.UPDATED,
+    "delete": notes_pb2.NoteEvent.DELETED,
+}
+
+
+def event_to_proto(event):
+    seq, kind, note_id, note = event
+    return notes_pb2.NoteEvent(seq=seq, type=EVENT_TYPES[kind], note_id=note_id, note=note)
 
 
 class NoteService(notes_pb2_grpc.NoteServiceServicer):
 
-    def get_db_connection(self):
-        conn = sqlite3.connect(DB_NAME)
-        conn.row_factory = sqlite3.Row
-        return conn
+    def __init__(self, store=None, cache=None, feed=None, id_format=ids.DEFAULT_FORMAT, max_watchers=None):
+        # All reads and writes go through a storage.NoteStore
+        self.store = store or storage.SQLiteNoteStore(database.ConnectionPool(DB_NAME))
+        # Makes the ids of new notes (see ids.py)
+        self.new_id = ids.generator(id_format)
+        # Optional read-through cache of serialized GetNoteResponses (None = off)
+        self.cache = cache
+        # changefeed.ChangeFeed behind WatchNotes (None = WatchNotes is off)
+        self.feed = feed
+        # Each WatchNotes call holds a worker thread, so cap them to leave room for
+        # the other calls (None = no cap)
+        self.watcher_slots = threading.BoundedSemaphore(max_watchers) if max_watchers else None
+
+    def _invalidate(self, *note_ids):
+        if self.cache is not None:
+            for note_id in note_ids:
+                self.cache.invalidate(note_id)
+
+    def _notify_watchers(self):
+        # The feed would pick the change up on its next poll anyway; this
+        # just saves the wait
+        if self.feed is not None:
+            self.feed.notify()
 
     def CreateNote(self, request, context):
-        note_id = str(uuid.uuid4())
-        try:
-            with self.get_db_connection() as conn:
-                conn.execute(
-                    "INSERT INTO notes (id, title, content) VALUES (?, ?, ?)",
-                    (note_id, request.title, request.content)
-                )
-                conn.commit()
-            print(f"Note created with ID: {note_id}")
+        try:
+            row = new_note_row(self.new_id(), request)
+        except ValueError as e:
+            context.set_code(grpc.StatusCode.INVALID_ARGUMENT)
+            context.set_details(str(e))
+            return notes_pb2.CreateNoteResponse()
+        note_id = row[0]
+        try:
+            self.store.put(*row)
+            self._notify_watchers()
+            logger.info("Note created", extra={"note_id": note_id})
             # --- CORRECTED ---
             # Return only the string ID
             return notes_pb2.CreateNoteResponse(id=note_id)
-        except sqlite3.Error as e:
+        except StorageError as e:
             context.set_code(grpc.StatusCode.INTERNAL)
             context.set_details(f"Database error: {e}")
             return notes_pb2.CreateNoteResponse()
 
     def GetNote(self, request, context):
-        with self.get_db_connection() as conn:
-            cursor = conn.execute("SELECT id, title, content FROM notes WHERE id = ?", (request.id,))
-            row = cursor.fetchone()
+        try:
+            fields = read_fields(request.read_mask)
+        except ValueError as e:
+            context.set_code(grpc.StatusCode.INVALID_ARGUMENT)
+            context.set_details(str(e))
+            return notes_pb2.GetNoteResponse()
+
+        generation = None
+        if self.cache is not None:
+            cached = self.cache.get(request.id)
+            if cached is not None:
+                response = notes_pb2.GetNoteResponse.FromString(cached)
+                return notes_pb2.GetNoteResponse(note=project_note(response.note, fields))
+            generation = self.cache.generation
+
+        try:
+            # A masked read only selects the requested columns
+            note = self.store.get(request.id, fields=fields)
+        except StorageError as e:
+            context.set_code(grpc.StatusCode.INTERNAL)
+            context.set_details(f"Database error: {e}")
+            return notes_pb2.GetNoteResponse()
 
-        if row:
-            # Convert row to Note message
-            note_message = notes_pb2.Note(id=row['id'], title=row['title'], content=row['content'])
+        if note:
             # --- CORRECTED ---
             # Wrap the Note inside a GetNoteResponse
-            return notes_pb2.GetNoteResponse(note=note_message)
+            response = notes_pb2.GetNoteResponse(note=note)
+            # Only whole notes go in the cache
+            if self.cache is not None and fields is None:
+                self.cache.put(request.id, response.SerializeToString(), generation=generation)
+            return response
         else:
             context.set_code(grpc.StatusCode.NOT_FOUND)
             context.set_details('Note not found')
             # Return an empty GetNoteResponse
             return notes_pb2.GetNoteResponse()
 
+    def load_for_read(self, request, context):
+        """The Note a ReadNoteContent call streams, or None with the status set."""
+        if request.chunk_size < 0:
+            context.set_code(grpc.StatusCode.INVALID_ARGUMENT)
+            context.set_details("chunk_size must not be negative")
+            return None
+        try:
+            note = self.store.get(request.id)
+        except StorageError as e:
+            context.set_code(grpc.StatusCode.INTERNAL)
+            context.set_details(f"Database error: {e}")
+            return None
+        if note is None:
+            context.set_code(grpc.StatusCode.NOT_FOUND)
+            context.set_details('Note not found')
+        return note
+
+    def ReadNoteContent(self, request, context):
+        note = self.load_for_read(request, context)
+        if note is not None:
+            yield from content_chunks(note, min(request.chunk_size or DEFAULT_CHUNK_SIZE, MAX_CHUNK_SIZE))
+
     def DeleteNote(self, request, context):
         try:
-            with self.get_db_connection() as conn:
-                cursor = conn.execute("SELECT 1 FROM notes WHERE id = ?", (request.id,))
-                if cursor.fetchone() is None:
-                    return notes_pb2.DeleteNoteResponse(success=False, message="Note ID not found")
-                conn.execute("DELETE FROM notes WHERE id = ?", (request.id,))
-                conn.commit()
+            if not self.store.delete(request.id):
+                return notes_pb2.DeleteNoteResponse(success=False, message="Note ID not found")
+            self._invalidate(request.id)
+            self._notify_watchers()
             return notes_pb2.DeleteNoteResponse(success=True, message="Deleted successfully")
-        except sqlite3.Error as e:
+        except StorageError as e:
             context.set_code(grpc.StatusCode.INTERNAL)
             context.set_details(f"Database error: {e}")
             return notes_pb2.DeleteNoteResponse(success=False, message=str(e))
 
+    def UpdateNote(self, request, context):
+        paths = list(request.update_mask.paths) or list(DEFAULT_UPDATE_FIELDS)
+        unknown = sorted(set(paths) - set(UPDATABLE_FIELDS))
+        if unknown:
+            context.set_code(grpc.StatusCode.INVALID_ARGUMENT)
+            context.set_details(f"Can't update field(s): {', '.join(unknown)}")
+            return notes_pb2.UpdateNoteResponse()
+        changes = {field: getattr(request, field) for field in paths}
+        if "tags" in changes:
+            try:
+                changes["tags"] = storage.normalize_tags(changes["tags"])
+            except ValueError as e:
+                context.set_code(grpc.StatusCode.INVALID_ARGUMENT)
+                context.set_details(str(e))
+                return notes_pb2.UpdateNoteResponse()
+        try:
+            note = self.store.update(request.id, expected_version=request.expected_version or None, **changes)
+        except VersionConflictError as e:
+            context.set_code(grpc.StatusCode.ABORTED)
+            context.set_details(f"Version mismatch: {e}")
+            return notes_pb2.UpdateNoteResponse()
+        except StorageError as e:
+            context.set_code(grpc.StatusCode.INTERNAL)
+            context.set_details(f"Database error: {e}")
+            return notes_pb2.UpdateNoteResponse()
+        if note is None:
+            context.set_code(grpc.StatusCode.NOT_FOUND)
+            context.set_details('Note not found')
+            return notes_pb2.UpdateNoteResponse()
+        self._invalidate(request.id)
+        self._notify_watchers()
+        return notes_pb2.UpdateNoteResponse(note=note)
+
     def ListNotes(self, request, context):
-        all_notes = []
-        try:
-            with self.get_db_connection() as conn:
-                cursor = conn.execute("SELECT id, title, content FROM notes")
-                rows = cursor.fetchall()
-                for row in rows:
-                    all_notes.append(notes_pb2.Note(id=row['id'], title=row['title'], content=row['content']))
-            return notes_pb2.ListNotesResponse(notes=all_notes)
-        except sqlite3.Error as e:
+        if request.page_size < 0:
+            context.set_code(grpc.StatusCode.INVALID_ARGUMENT)
+            context.set_details("page_size must not be negative")
+            return notes_pb2.ListNotesResponse()
+        try:
+            options = list_options(request)
+            fields = read_fields(request.read_mask)
+        except ValueError as e:
+            context.set_code(grpc.StatusCode.INVALID_ARGUMENT)
+            context.set_details(str(e))
+            return notes_pb2.ListNotesResponse()
+        # The next page token needs the sort value, even if the mask leaves it out
+        order_by = options["order_by"]
+        scan_fields = fields
+        if fields is not None and order_by not in fields:
+            scan_fields = storage.check_fields(fields + (order_by,))
+
+        try:
+            # Read before the notes, so watching from here can't miss a change
+            change_seq = 0 if request.page_token else self.store.change_bounds()[1]
+            if request.page_size == 0:
+                # Unpaginated: return everything (kept for old clients)
+                return notes_pb2.ListNotesResponse(notes=list(self.store.scan_sorted(fields=fields, **options)),
+                                                   change_seq=change_seq)
+
+            page_size = min(request.page_size, MAX_PAGE_SIZE)
+            # Fetch one extra note to find out whether another page exists
+            notes = list(self.store.scan_sorted(limit=page_size + 1, fields=scan_fields, **options))
+        except StorageError as e:
             context.set_code(grpc.StatusCode.INTERNAL)
             context.set_details(f"Database error: {e}")
             return notes_pb2.ListNotesResponse()
 
+        next_page_token = ""
+        if len(notes) > page_size:
+            notes = notes[:page_size]
+            next_page_token = encode_cursor(notes[-1], order_by)
+        if scan_fields is not fields:
+            notes = [project_note(note, fields) for note in notes]
+        return notes_pb2.ListNotesResponse(notes=notes, next_page_token=next_page_token, change_seq=change_seq)
+
+    def StreamNotes(self, request, context):
+        try:
+            options = list_options(request)
+            fields = read_fields(request.read_mask)
+        except ValueError as e:
+            context.set_code(grpc.StatusCode.INVALID_ARGUMENT)
+            context.set_details(str(e))
+            return
+        chunk_size = min(request.page_size, MAX_PAGE_SIZE) if request.page_size > 0 else STREAM_CHUNK_SIZE
+
+        try:
+            yield from self.store.scan_sorted(chunk_size=chunk_size, fields=fields, **options)
+        except StorageError as e:
+            context.set_code(grpc.StatusCode.INTERNAL)
+            context.set_details(f"Database error: {e}")
+
+    # --- Batch RPCs ---
+
+    def _check_batch_size(self, size, context):
+        if size > MAX_BATCH_SIZE:
+            context.set_code(grpc.StatusCode.INVALID_ARGUMENT)
+            context.set_details(f"At most {MAX_BATCH_SIZE} items per batch")
+            return False
+        return True
+
+    def BatchCreateNotes(self, request, context):
+        if not self._check_batch_size(len(request.notes), context):
+            return notes_pb2.BatchCreateNotesResponse()
+        try:
+            rows = [new_note_row(self.new_id(), note) for note in request.notes]
+        except ValueError as e:
+            context.set_code(grpc.StatusCode.INVALID_ARGUMENT)
+            context.set_details(str(e))
+            return notes_pb2.BatchCreateNotesResponse()
+        try:
+            # One transaction (and one commit) for the whole batch
+            self.store.put_many(rows)
+            self._notify_watchers()
+            return notes_pb2.BatchCreateNotesResponse(results=[
+                notes_pb2.BatchItemStatus(id=row[0], success=True, message="Created successfully")
+                for row in rows
+            ])
+        except StorageError as e:
+            context.set_code(grpc.StatusCode.INTERNAL)
+            context.set_details(f"Database error: {e}")
+            return notes_pb2.BatchCreateNotesResponse()
+
+    def BatchGetNotes(self, request, context):
+        ids = list(request.ids)
+        if not self._check_batch_size(len(ids), context):
+            return notes_pb2.BatchGetNotesResponse()
+        try:
+            fields = read_fields(request.read_mask)
+        except ValueError as e:
+            context.set_code(grpc.StatusCode.INVALID_ARGUMENT)
+            context.set_details(str(e))
+            return notes_pb2.BatchGetNotesResponse()
+        try:
+            found = self.store.get_many(ids, fields=fields)
+        except StorageError as e:
+            context.set_code(grpc.StatusCode.INTERNAL)
+            context.set_details(f"Database error: {e}")
+            return notes_pb2.BatchGetNotesResponse()
+
+        response = notes_pb2.BatchGetNotesResponse()
+        for note_id in ids:
+            if note_id in found:
+                response.notes.append(found[note_id])
+            else:
+                response.missing_ids.append(note_id)
+        return response
+
+    def BatchDeleteNotes(self, request, context):
+        ids = list(request.ids)
+        if not self._check_batch_size(len(ids), context):
+            return notes_pb2.BatchDeleteNotesResponse()
+        try:
+            existing = self.store.delete_many(ids)
+            self._invalidate(*existing)
+            self._notify_watchers()
+        except StorageError as e:
+            context.set_code(grpc.StatusCode.INTERNAL)
+            context.set_details(f"Database error: {e}")
+            return notes_pb2.BatchDeleteNotesResponse(results=[
+                notes_pb2.BatchItemStatus(id=note_id, success=False, message=str(e)) for note_id in ids
+            ])
+
+        response = notes_pb2.BatchDeleteNotesResponse()
+        for note_id in ids:
+            if note_id in existing:
+                response.results.add(id=note_id, success=True, message="Deleted successfully")
+            else:
+                response.results.add(id=note_id, success=False, message="Note ID not found")
+        return response
+
+    def ImportNotes(self, request_iterator, context):
+        return self.import_notes(request_iterator, context)
+
+    def import_notes(self, request_iterator, context, offset=0):
+        """ImportNotes; `offset` notes were committed by earlier calls, which the error details count in.
+
+        AsyncNoteService imports in chunks and adds up the counts itself.
+        """
+        imported = 0
+        rows = []
+        try:
+            for note in request_iterator:
+                rows.append(new_note_row(self.new_id(), note))
+                if len(rows) >= IMPORT_CHUNK_SIZE:
+                    self.store.put_many(rows)
+                    imported += len(rows)
+                    rows = []
+                    self._notify_watchers()
+            if rows:
+                self.store.put_many(rows)
+                imported += len(rows)
+                self._notify_watchers()
+            return notes_pb2.ImportNotesResponse(imported_count=imported)
+        except ValueError as e:
+            context.set_code(grpc.StatusCode.INVALID_ARGUMENT)
+            context.set_details(f"{e} (after {offset + imported} imported notes)")
+            return notes_pb2.ImportNotesResponse(imported_count=imported)
+        except StorageError as e:
+            # Earlier chunks are already committed; report how far we got
+            context.set_code(grpc.StatusCode.INTERNAL)
+            context.set_details(f"Database error after {offset + imported} imported notes: {e}")
+            return notes_pb2.ImportNotesResponse(imported_count=imported)
 
-def serve():
-    # Initialize the database
-    database.init_db()
+    # --- Full-text search ---
+
+    def SearchNotes(self, request, context):
+        if not request.query.strip():
+            context.set_code(grpc.StatusCode.INVALID_ARGUMENT)
+            context.set_details("query must not be empty")
+            return notes_pb2.SearchNotesResponse()
+        if request.page_size < 0:
+            context.set_code(grpc.StatusCode.INVALID_ARGUMENT)
+            context.set_details("page_size must not be negative")
+            return notes_pb2.SearchNotesResponse()
+        page_size = min(request.page_size or DEFAULT_SEARCH_PAGE_SIZE, MAX_PAGE_SIZE)
+        # Ranked results have no stable key to seek on, so the token is an offset
+        try:
+            offset = int(decode_page_token(request.page_token) or 0)
+        except ValueError:
+            offset = -1
+        if not 0 <= offset <= MAX_SEARCH_OFFSET:
+            context.set_code(grpc.StatusCode.INVALID_ARGUMENT)
+            context.set_details("Invalid page_token")
+            return notes_pb2.SearchNotesResponse()
+
+        try:
+            results = self.store.search(request.query, page_size + 1, offset)
+        except InvalidQueryError as e:
+            context.set_code(grpc.StatusCode.INVALID_ARGUMENT)
+            context.set_details(f"Invalid search query: {e}")
+            return notes_pb2.SearchNotesResponse()
+        except StorageError as e:
+            context.set_code(grpc.StatusCode.INTERNAL)
+            context.set_details(f"Database error: {e}")
+            return notes_pb2.SearchNotesResponse()
+
+        next_page_token = ""
+        if len(results) > page_size:
+            results = results[:page_size]
+            if offset + page_size <= MAX_SEARCH_OFFSET:
+                next_page_token = encode_page_token(str(offset + page_size))
+        return notes_pb2.SearchNotesResponse(
+            results=[notes_pb2.SearchResult(note=note, snippet=snippet, rank=rank)
+                     for note, snippet, rank in results],
+            next_page_token=next_page_token
+        )
+
+    # --- Counts ---
+
+    def CountNotes(self, request, context):
+        try:
+            options = note_filter(request)
+        except ValueError as e:
+            context.set_code(grpc.StatusCode.INVALID_ARGUMENT)
+            context.set_details(str(e))
+            return notes_pb2.CountNotesResponse()
+        try:
+            return notes_pb2.CountNotesResponse(count=self.store.count(**options))
+        except StorageError as e:
+            context.set_code(grpc.StatusCode.INTERNAL)
+            context.set_details(f"Database error: {e}")
+            return notes_pb2.CountNotesResponse()
+
+    def ListTags(self, request, context):
+        if request.limit < 0:
+            context.set_code(grpc.StatusCode.INVALID_ARGUMENT)
+            context.set_details("limit must not be negative")
+            return notes_pb2.ListTagsResponse()
+        try:
+            counts = self.store.tag_counts(owner=request.owner or None, limit=request.limit or None)
+        except StorageError as e:
+            context.set_code(grpc.StatusCode.INTERNAL)
+            context.set_details(f"Database error: {e}")
+            return notes_pb2.ListTagsResponse()
+        return notes_pb2.ListTagsResponse(tags=[notes_pb2.TagCount(tag=tag, note_count=count)
+                                                for tag, count in counts])
+
+    # --- Change feed ---
+
+    def WatchNotes(self, request, context):
+        if self.feed is None:
+            context.set_code(grpc.StatusCode.UNIMPLEMENTED)
+            context.set_details("The change feed is not enabled on this server")
+            return
+        after_seq = request.after_seq if request.HasField("after_seq") else None
+        if after_seq is not None and after_seq < 0:
+            context.set_code(grpc.StatusCode.INVALID_ARGUMENT)
+            context.set_details("after_seq must not be negative")
+            return
+        # Holds a worker thread for as long as the client watches; the aio
+        # server is a better fit for many watchers
+        if self.watcher_slots is not None and not self.watcher_slots.acquire(blocking=False):
+            context.set_code(grpc.StatusCode.RESOURCE_EXHAUSTED)
+            context.set_details("Too many watchers on this server; retry later")
+            return
+        try:
+            for event in self.feed.watch(after_seq, is_active=context.is_active):
+                yield event_to_proto(event)
+        except changefeed.ResumeError as e:
+            context.set_code(grpc.StatusCode.OUT_OF_RANGE)
+            context.set_details(f"Can't resume: {e}")
+        except changefeed.SubscriberOverflow as e:
+            context.set_code(grpc.StatusCode.RESOURCE_EXHAUSTED)
+            context.set_details(f"Watcher fell behind ({e}); resume from the last seq received")
+        except StorageError as e:
+            context.set_code(grpc.StatusCode.INTERNAL)
+            context.set_details(f"Database error: {e}")
+        finally:
+            if self.watcher_slots is not None:
+                self.watcher_slots.release()
+
+
+# --- Liveness ---
+
+class CountingExecutor(futures.ThreadPoolExecutor):
+    """ThreadPoolExecutor that counts finished work items, so progress shows from outside."""
+
+    completed = 0
+
+    def submit(self, fn, /, *args, **kwargs):
+        future = super().submit(fn, *args, **kwargs)
+        future.add_done_callback(self._count)
+        return future
+
+    def _count(self, _):
+        self.completed += 1  # unlocked; it only has to keep moving
+
+
+class Liveness:
+    """Tells a busy server from a wedged one without sending it an RPC.
+
+    The supervisor's heartbeat (see supervisor.py) asks making_progress()
+    once a second. The server counts as live while it is started and either
+    has nothing queued or keeps finishing calls; on grpc.aio its event loop
+    must also still run callbacks.
+    """
+
+    def __init__(self):
+        self.serving = False
+        self._executor = None
+        self._completed = None
+        self._loop = None
+        self._loop_ticks = 0
+        self._seen_ticks = None
+
+    def watch_executor(self, executor):
+        self._executor = executor
+
+    def watch_loop(self, loop):
+        self._loop = loop
+
+    def _tick(self):
+        self._loop_ticks += 1
+
+    def making_progress(self):
+        if not self.serving:
+            return False  # not bound yet, or shutting down
+        live = True
+        if self._executor is not None:
+            completed = self._executor.completed
+            # Same private queue as metrics.ServiceMetrics.watch_executor()
+            live = completed != self._completed or self._executor._work_queue.qsize() == 0
+            self._completed = completed
+        if self._loop is not None:
+            # The tick scheduled last time must have run by now
+            live = live and self._loop_ticks != self._seen_ticks
+            self._seen_ticks = self._loop_ticks
+            try:
+                self._loop.call_soon_threadsafe(self._tick)
+            except RuntimeError:  # loop closed
+                return False
+        return live
+
+
+def create_server(store, cache=None, address=SERVER_ADDRESS, max_workers=10, service_metrics=None, options=None,
+                  feed=None, compression=None, id_format=ids.DEFAULT_FORMAT, backup_dir=admin.DEFAULT_BACKUP_DIR,
+                  admission_control=None, tracer=None, liveness=None, admin_service=False):
+    """Builds (but doesn't start) the thread pool server; returns (server, bound port).
+
+    admin_service adds AdminService (Backup, Reshard, Profile) on the same port. It
+    has no auth, so it's off unless the port is only reachable by operators.
+
+    admission_control is an admission.AdmissionController, or None to run every call.
+    tracer is a tracing.Tracer, or None for no tracing.
+    liveness is a Liveness to report progress to, or None.
+    """
+    executor = CountingExecutor(max_workers=max_workers)
+    if liveness is not None:
+        liveness.watch_executor(executor)
+    interceptors = []
+    if tracer is not None:
+        # Outermost, so the request span covers the other interceptors too
+        interceptors.append(tracing.TracingInterceptor(tracer))
+    if service_metrics is not None:
+        interceptors.append(metrics.MetricsInterceptor(service_metrics))
+        service_metrics.watch_executor(executor)
+        store = metrics.TimedStore(store, service_metrics.db_latency)
+        if cache is not None:
+            service_metrics.watch_cache(cache)
+    max_concurrent_rpcs = None
+    if admission_control is not None:
+        # After the metrics interceptor, so rejections show up in grpc_server_handled_total
+        interceptors.append(admission.AdmissionInterceptor(admission_control))
+        admission_control.watch_executor(executor)
+        admission_control.service_metrics = service_metrics
+        if admission_control.max_queue:
+            # Beyond this, grpc answers RESOURCE_EXHAUSTED without queueing the call
+            max_concurrent_rpcs = max_workers + admission_control.max_queue
+    server = grpc.server(executor, interceptors=interceptors, options=SERVER_OPTIONS + list(options or []),
+                         maximum_concurrent_rpcs=max_concurrent_rpcs, compression=compression)
+    notes_pb2_grpc.add_NoteServiceServicer_to_server(
+        NoteService(store, cache=cache, feed=feed, id_format=id_format, max_watchers=max(1, max_workers // 2)),
+        server)
+    if admin_service:
+        notes_pb2_grpc.add_AdminServiceServicer_to_server(admin.AdminService(store, backup_dir=backup_dir), server)
+    port = server.add_insecure_port(address)
+    return server, port
+
+
+def start_metrics(port):
+    """Returns ServiceMetrics served on http://0.0.0.0:<port>/metrics, or None if port is 0."""
+    if not port:
+        return None
+    service_metrics = metrics.ServiceMetrics()
+    metrics.start_http_server(service_metrics.registry, port)
+    print(f"Metrics available on http://0.0.0.0:{port}/metrics")
+    return service_metrics
+
+
+def serve(store=None, cache=None, metrics_port=0, address=SERVER_ADDRESS, options=None, compression=None,
+          id_format=ids.DEFAULT_FORMAT, backup_dir=admin.DEFAULT_BACKUP_DIR, admission_control=None, tracer=None,
+          liveness=None, admin_service=False):
+    # Initialize the database (the default SQLite store runs the migrations)
+    store = store or storage.open_store("sqlite")
 
     # --- PROTOC SECTION REMOVED ---
     # The build is now done in the Dockerfile
 
-    server = grpc.server(futures.ThreadPoolExecutor(max_workers=10))
-    notes_pb2_grpc.add_NoteServiceServicer_to_server(NoteService(), server)
-
-    server.add_insecure_port('[::]:50051')
-    print("Server started on port 50051...")
+    feed = changefeed.ChangeFeed(store).start()
+    server, port = create_server(store, cache=cache, address=address,
+                                 service_metrics=start_metrics(metrics_port), options=options, feed=feed,
+                                 compression=compression, id_format=id_format, backup_dir=backup_dir,
+                                 admission_control=admission_control, tracer=tracer, liveness=liveness,
+                                 admin_service=admin_service)
+    print(f"Server started on port {port}...")
     server.start()
-    server.wait_for_termination()
+    if liveness is not None:
+        liveness.serving = True
+
+    def shutdown():
+        # Watch streams never finish on their own, so end them first
+        feed.stop()
+        return server.stop(grace=5)
+
+    # `docker stop` sends SIGTERM: let in-flight RPCs finish before exiting
+    signal.signal(signal.SIGTERM, lambda *_: shutdown())
+    try:
+        server.wait_for_termination()
+    except KeyboardInterrupt:
+        shutdown().wait()
+    finally:
+        if liveness is not None:
+            liveness.serving = False
+        feed.stop()
+        store.close()
+        if tracer is not None:
+            tracer.close()
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(description="gRPC Note server")
+    parser.add_argument("--port", type=int, default=50051)
+    parser.add_argument("--db", default=DB_NAME, help="SQLite database file")
+    parser.add_argument("--workers", type=int, default=1,
+                        help="number of server processes sharing the port via SO_REUSEPORT")
+    parser.add_argument("--aio", action="store_true",
+                        help="run the asyncio (grpc.aio) server instead of the thread pool server")
+    parser.add_argument("--db-workers", type=int, default=8,
+                        help="size of the database executor used by --aio")
+    parser.add_argument("--sqlite-profile", choices=sorted(database.PROFILES), default=database.DEFAULT_PROFILE,
+                        help="PRAGMA set applied to every SQLite connection")
+    parser.add_argument("--store", choices=storage.STORE_KINDS, default="sqlite",
+                        help="storage engine: SQLite file, in-memory notes or SQLite files sharded by note id")
+    parser.add_argument("--shard-dir", default=sharding.DEFAULT_SHARD_DIR,
+                        help="directory of the SQLite shard files for --store sharded")
+    parser.add_argument("--shards", type=int, default=sharding.DEFAULT_SHARDS,
+                        help="number of shards for a new --store sharded directory (reshard to change it later)")
+    parser.add_argument("--memory-log", default=None,
+                        help="append-only log file that makes the memory store survive restarts")
+    parser.add_argument("--metrics-port", type=int, default=9100,
+                        help="port for the Prometheus /metrics endpoint (0 disables it)")
+    parser.add_argument("--log-level", default="INFO")
+    parser.add_argument("--log-sample-rate", type=float, default=0.01,
+                        help="fraction of per-request INFO logs that are written (warnings are never dropped)")
+    parser.add_argument("--compression", choices=sorted(COMPRESSION), default=DEFAULT_COMPRESSION,
+                        help="compression for responses (clients choose their own for requests)")
+    parser.add_argument("--compress-threshold", type=int, default=database.COMPRESS_THRESHOLD,
+                        help="store note content of at least this many bytes compressed in SQLite (0 = never)")
+    parser.add_argument("--group-commit", type=int, default=storage.GROUP_COMMIT_MAX_BATCH,
+                        help="max writes committed together by the SQLite writer thread (0 or 1 turns it off)")
+    parser.add_argument("--group-commit-delay-ms", type=float, default=storage.GROUP_COMMIT_MAX_DELAY * 1000,
+                        help="how long the writer waits for more writes before committing a batch")
+    parser.add_argument("--id-format", choices=sorted(ids.FORMATS), default=ids.DEFAULT_FORMAT,
+                        help="ids for new notes: time-ordered uuid7 (index friendly) or random uuid4")
+    parser.add_argument("--admin", action="store_true",
+                        help="also serve AdminService (Backup, Reshard, Profile) on --port; it has no auth, "
+                             "so only use it where the port is private")
+    parser.add_argument("--backup-dir", default=admin.DEFAULT_BACKUP_DIR,
+                        help="directory AdminService.Backup writes SQLite backups to")
+    parser.add_argument("--max-queue", type=int, default=admission.DEFAULT_MAX_QUEUE,
+                        help="calls allowed to wait for a worker before new ones get RESOURCE_EXHAUSTED (0 = no limit)")
+    parser.add_argument("--method-limit", action="append", default=[], metavar="METHOD=N",
+                        help="max concurrent calls of a method (0 = unlimited; none are limited by default); "
+                             "repeatable")
+    parser.add_argument("--rate-limit", type=float, default=0.0,
+                        help=f"calls per second allowed per client ({admission.CLIENT_ID_HEADER} header or "
+                             "peer address); 0 turns it off")
+    parser.add_argument("--rate-burst", type=float, default=None,
+                        help="calls a client may make at once before --rate-limit applies (default: the rate)")
+    parser.add_argument("--no-admission", action="store_true",
+                        help="turn off admission control (queue, rate and per-method limits, deadline shedding)")
+    parser.add_argument("--trace-file", default=None,
+                        help="write per-request spans (SQL, row conversion, serialization, ...) to this file")
+    parser.add_argument("--trace-format", choices=tracing.TRACE_FORMATS, default="chrome",
+                        help="chrome: Chrome trace / Perfetto JSON; otlp: OTLP/JSON, one request per line")
+    parser.add_argument("--trace-sample-rate", type=float, default=1.0,
+                        help="fraction of requests traced when --trace-file is set")
+    parser.add_argument("--slow-query-ms", type=float, default=0.0,
+                        help="log SQL statements slower than this, with their query plan (0 turns it off)")
+    parser.add_argument("--no-cache", action="store_true", help="disable the GetNote cache")
+    parser.add_argument("--cache-entries", type=int, default=10000, help="max notes kept in the GetNote cache")
+    parser.add_argument("--cache-mb", type=int, default=64, help="max size of the GetNote cache in MB")
+    parser.add_argument("--cache-ttl", type=float, default=60.0, help="seconds a cached note stays valid")
+    return parser
+
+
+def run(args, metrics_port=None, options=None, liveness=None):
+    """Runs one server process as configured by the command line."""
+    note_cache = None
+    # With --workers each process would cache separately, and a write through
+    # one wouldn't invalidate the others' copies, so only one process caches
+    if not args.no_cache and args.workers <= 1:
+        note_cache = LRUCache(max_entries=args.cache_entries,
+                              max_bytes=args.cache_mb * 1024 * 1024,
+                              ttl=args.cache_ttl)
+
+    # The traced connection class is only used when something reads its output
+    connection_factory = None
+    if args.trace_file or args.slow_query_ms:
+        connection_factory = tracing.connection_factory(args.slow_query_ms)
+    tracer = None
+    if args.trace_file:
+        trace_file = args.trace_file
+        if args.workers > 1:
+            # One file per worker process: data/trace.json -> data/trace.<pid>.json
+            root, ext = os.path.splitext(trace_file)
+            trace_file = f"{root}.{os.getpid()}{ext}"
+        tracer = tracing.Tracer(trace_file, args.trace_format, args.trace_sample_rate)
+    note_store = storage.open_store(args.store, profile=args.sqlite_profile, log_path=args.memory_log,
+                                    db_name=args.db, compress_threshold=args.compress_threshold,
+                                    group_commit=args.group_commit,
+                                    group_commit_delay=args.group_commit_delay_ms / 1000,
+                                    shard_dir=args.shard_dir, shards=args.shards,
+                                    connection_factory=connection_factory)
+    admission_control = None
+    if not args.no_admission:
+        admission_control = admission.AdmissionController(
+            method_limits=admission.parse_method_limits(args.method_limit), rate=args.rate_limit,
+            burst=args.rate_burst, max_queue=args.max_queue)
+    compression = COMPRESSION[args.compression]
+    address = f"[::]:{args.port}"
+    if metrics_port is None:
+        metrics_port = args.metrics_port
+
+    if args.aio:
+        import aio_server
+        asyncio.run(aio_server.serve(note_store, db_workers=args.db_workers, cache=note_cache,
+                                     metrics_port=metrics_port, address=address, options=options,
+                                     compression=compression, id_format=args.id_format,
+                                     backup_dir=args.backup_dir, admission_control=admission_control,
+                                     tracer=tracer, liveness=liveness, admin_service=args.admin))
+    else:
+        serve(note_store, cache=note_cache, metrics_port=metrics_port, address=address, options=options,
+              compression=compression, id_format=args.id_format, backup_dir=args.backup_dir,
+              admission_control=admission_control, tracer=tracer, liveness=liveness, admin_service=args.admin)
+
+
+def main(argv=None):
+    parser = build_parser()
+    args = parser.parse_args(argv)
+    if args.workers > 1 and args.store == "memory":
+        parser.error("--store memory keeps notes inside one process; it can't be used with --workers")
+    if args.workers > 1 and args.store == "sharded":
+        parser.error("--store sharded merges the shards' change logs inside one process; "
+                     "it can't be used with --workers")
+    if args.shards < 1:
+        parser.error("--shards must be at least 1")
+    if not 0 < args.trace_sample_rate <= 1:
+        parser.error("--trace-sample-rate must be more than 0 and at most 1")
+    try:
+        admission.parse_method_limits(args.method_limit)
+    except ValueError as e:
+        parser.error(f"--method-limit: {e}")
+
+    log_listener = configure_logging(args.log_level, args.log_sample_rate)
+    try:
+        if args.workers > 1:
+            import supervisor
+            supervisor.Supervisor(args).run()
+        else:
+            run(args)
+    finally:
+        log_listener.stop()
 
 
 if __name__ == '__main__':
-    serve()
\ No newline at end of file
+    main()
@@ -0,0 +1,516 @@
+"""Sharded storage: notes spread over several SQLite files.
+
+A note lives in the shard its id hashes to on a consistent hash ring, so
+GetNote / UpdateNote / DeleteNote touch one file, and every shard has its
+own write lock (and, with group commit, its own writer thread): writes to
+different shards don't wait for each other. Listings read every shard and
+merge the already ordered streams, so ListNotes pages and cursors work as
+with one file. Batch writes are only atomic per shard.
+
+The shard count is kept in <shard dir>/manifest.json. AdminService.Reshard
+changes it while the server runs: the ring switches to the new count and
+the notes whose shard changed (about 1/N of them when adding one shard)
+are copied over and deleted from their old shard in batches. Until that
+is done, lookups try the new shard and then the old one, with the notes
+involved locked so a move can't slip between the two reads. A reshard
+interrupted by a restart picks up where it left off.
+
+Each shard has its own change log with its own seqs. The store reads
+them all into one log in memory, numbered from the sum of the shards'
+seqs, so seqs keep going up across restarts; as with the memory store,
+watchers can't resume across a restart. Moves made by a reshard are left
+out of it. One process only: with --workers each process would number the
+changes differently.
+"""
+import bisect
+import collections
+import hashlib
+import json
+import logging
+import os
+import threading
+import zlib
+from contextlib import ExitStack, contextmanager
+from heapq import merge
+
+import database
+import storage
+from storage import CHANGE_RETENTION, SCAN_CHUNK_SIZE, NoteStore, StorageError, check_fields
+
+DEFAULT_SHARD_DIR = "data/shards"
+DEFAULT_SHARDS = 4
+VNODES = 64  # ring points per shard; more of them evens out the shard sizes
+NOTE_LOCKS = 256  # lock stripes for notes being moved
+RESHARD_BATCH = 500  # notes moved per transaction
+PULL_BATCH = 500  # shard change log rows read per query
+MANIFEST = "manifest.json"
+
+logger = logging.getLogger("notes.sharding")
+
+
+class ReshardInProgressError(StorageError):
+    """Another reshard is still moving notes."""
+
+
+def _hash(text):
+    return int.from_bytes(hashlib.blake2b(text.encode(), digest_size=8).digest(), "big")
+
+
+class HashRing:
+    """Consistent hashing of note ids onto shards 0..shards-1.
+
+    Adding shard N only takes ids away from the other shards (about
+    1/(N+1) of them); nothing moves between the existing ones.
+    """
+
+    def __init__(self, shards, vnodes=VNODES):
+        if shards < 1:
+            raise ValueError("Need at least one shard")
+        self.shards = shards
+        points = sorted((_hash(f"shard-{shard}-{i}"), shard) for shard in range(shards) for i in range(vnodes))
+        self._keys = [key for key, _ in points]
+        self._owners = [shard for _, shard in points]
+
+    def shard_for(self, note_id):
+        index = bisect.bisect_right(self._keys, _hash(note_id))
+        return self._owners[index % len(self._owners)]
+
+
+def shard_path(shard_dir, index):
+    return os.path.join(shard_dir, f"notes-{index}.db")
+
+
+def _sort_key(order_by):
+    if order_by == "id":
+        return lambda note: note.id
+    return lambda note: (getattr(note, order_by).ToMilliseconds(), note.id)
+
+
+def _merged(streams, key, descending=False, limit=None):
+    """Merges ordered note streams, dropping the second copy of a note caught mid-move."""
+    count, last_id = 0, None
+    for note in merge(*streams, key=key, reverse=descending):
+        if note.id == last_id:
+            continue
+        last_id = note.id
+        yield note
+        count += 1
+        if limit is not None and count >= limit:
+            return
+
+
+class ShardedNoteStore(NoteStore):
+    """A NoteStore over several stores, one per SQLite file in `shard_dir`.
+
+    open_shard(path) returns the store for one shard file. `shards` is only
+    used when the directory has no manifest yet.
+    """
+
+    def __init__(self, shard_dir, open_shard, shards=DEFAULT_SHARDS, vnodes=VNODES):
+        self.shard_dir = shard_dir
+        self.vnodes = vnodes
+        self._open_shard = open_shard
+        os.makedirs(shard_dir, exist_ok=True)
+        manifest = self._read_manifest()
+        if manifest is None:
+            manifest = {"shards": shards}
+            self._write_manifest(manifest)
+        elif manifest["shards"] != shards:
+            logger.info("Using the %d shards in the manifest; reshard to change that", manifest["shards"])
+        self._retired_seq = manifest.get("retired_seq", 0)
+        previous = manifest.get("resharding_from")
+        self.shards = [open_shard(shard_path(shard_dir, index))
+                       for index in range(max(manifest["shards"], previous or 0))]
+        self._retired = []
+        self.ring = HashRing(manifest["shards"], vnodes)
+        self._old_ring = HashRing(previous, vnodes) if previous else None
+
+        # Writes in flight per epoch; a ring switch waits for the older ones
+        self._state = threading.Condition()
+        self._epoch = 0
+        self._active = collections.Counter()
+        self._note_locks = [threading.Lock() for _ in range(NOTE_LOCKS)]
+        self._reshard_lock = threading.Lock()
+
+        # The merged change log: (seq, kind, note_id), consecutive seqs
+        # from _first_seq, like MemoryNoteStore's
+        self._log_lock = threading.Lock()
+        self._observed = [shard.change_bounds()[1] for shard in self.shards]
+        self._first_seq = sum(self._observed) + self._retired_seq + 1
+        self._changes = []
+        self._moving = {}  # note_id -> {"delete": source shard, "create": target shard}
+        self.change_retention = CHANGE_RETENTION
+
+        self._resume_thread = None
+        if previous:
+            self._resume_thread = threading.Thread(target=self._resume, name="reshard", daemon=True)
+            self._resume_thread.start()
+
+    # --- manifest ---
+
+    def _read_manifest(self):
+        try:
+            with open(os.path.join(self.shard_dir, MANIFEST), encoding="utf-8") as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return None
+        except (OSError, ValueError) as e:
+            raise StorageError(f"Unreadable shard manifest: {e}") from e
+
+    def _write_manifest(self, manifest):
+        path = os.path.join(self.shard_dir, MANIFEST)
+        with open(path + ".tmp", "w", encoding="utf-8") as f:
+            json.dump(manifest, f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(path + ".tmp", path)
+
+    # --- routing ---
+
+    def _locks_for(self, note_ids):
+        indexes = sorted({zlib.crc32(note_id.encode()) % NOTE_LOCKS for note_id in note_ids})
+        return [self._note_locks[index] for index in indexes]
+
+    @contextmanager
+    def _routing(self, note_ids=()):
+        """Yields owners(note_id): the shards to try, in order, for one call.
+
+        While a reshard runs that is the new shard, then the old one, and
+        the notes are locked against being moved in between.
+        """
+        with self._state:
+            epoch = self._epoch
+            self._active[epoch] += 1
+            ring, old_ring = self.ring, self._old_ring
+        try:
+            with ExitStack() as stack:
+                if old_ring is None:
+                    yield lambda note_id: (ring.shard_for(note_id),)
+                else:
+                    for lock in self._locks_for(note_ids):
+                        stack.enter_context(lock)
+
+                    def owners(note_id):
+                        new, old = ring.shard_for(note_id), old_ring.shard_for(note_id)
+                        return (new,) if new == old else (new, old)
+                    yield owners
+        finally:
+            with self._state:
+                self._active[epoch] -= 1
+                if not self._active[epoch]:
+                    del self._active[epoch]
+                    self._state.notify_all()
+
+    def _switch(self, ring, old_ring):
+        """Routes new calls with the given rings, then waits for the calls routed before."""
+        with self._state:
+            self.ring, self._old_ring = ring, old_ring
+            self._epoch += 1
+            self._state.wait_for(lambda: all(epoch >= self._epoch for epoch in self._active))
+
+    @staticmethod
+    def _group(items, shard_of):
+        grouped = {}
+        for item in items:
+            grouped.setdefault(shard_of(item), []).append(item)
+        return grouped
+
+    # --- NoteStore ---
+
+    def get(self, note_id, fields=None):
+        with self._routing([note_id]) as owners:
+            for index in owners(note_id):
+                note = self.shards[index].get(note_id, fields)
+                if note is not None:
+                    return note
+        return None
+
+    def get_many(self, note_ids, fields=None):
+        found = {}
+        with self._routing(note_ids) as owners:
+            missing = list(note_ids)
+            for attempt in range(2):
+                grouped = self._group([note_id for note_id in missing if len(owners(note_id)) > attempt],
+                                      lambda note_id: owners(note_id)[attempt])
+                for index, ids in grouped.items():
+                    found.update(self.shards[index].get_many(ids, fields))
+                missing = [note_id for note_id in missing if note_id not in found]
+        return found
+
+    def put_many(self, rows):
+        # New ids: they always go to their shard on the new ring
+        with self._routing() as owners:
+            for index, group in self._group(rows, lambda row: owners(row[0])[0]).items():
+                self.shards[index].put_many(group)
+
+    def restore_many(self, notes):
+        notes = list(notes)
+        with self._routing([note.id for note in notes]) as owners:
+            for index, group in self._group(notes, lambda note: owners(note.id)[0]).items():
+                self.shards[index].restore_many(group)
+            # Mid-reshard, a note restored to its new shard may still be in its old one
+            stale = self._group([note.id for note in notes if len(owners(note.id)) > 1],
+                                lambda note_id: owners(note_id)[1])
+            for index, ids in stale.items():
+                ids = list(self.shards[index].get_many(ids, fields=("id",)))
+                with self._log_lock:
+                    for note_id in ids:
+                        self._moving[note_id] = {"delete": index}
+                self.shards[index].delete_many(ids)
+
+    def update(self, note_id, title=None, content=None, expected_version=None, tags=None, owner=None,
+               notebook=None):
+        with self._routing([note_id]) as owners:
+            for index in owners(note_id):
+                note = self.shards[index].update(note_id, title=title, content=content,
+                                                 expected_version=expected_version, tags=tags, owner=owner,
+                                                 notebook=notebook)
+                if note is not None:
+                    return note
+        return None
+
+    def delete_many(self, note_ids):
+        deleted = set()
+        with self._routing(note_ids) as owners:
+            missing = list(note_ids)
+            for attempt in range(2):
+                grouped = self._group([note_id for note_id in missing if len(owners(note_id)) > attempt],
+                                      lambda note_id: owners(note_id)[attempt])
+                for index, ids in grouped.items():
+                    deleted |= self.shards[index].delete_many(ids)
+                missing = [note_id for note_id in missing if note_id not in deleted]
+        return deleted
+
+    def scan(self, after_id="", limit=None, chunk_size=SCAN_CHUNK_SIZE, fields=None):
+        streams = [shard.scan(after_id, limit=limit, chunk_size=chunk_size, fields=fields)
+                   for shard in list(self.shards)]
+        return _merged(streams, _sort_key("id"), limit=limit)
+
+    def scan_sorted(self, order_by="id", descending=False, after=None, created=None, updated=None,
+                    limit=None, chunk_size=SCAN_CHUNK_SIZE, fields=None, tags=(), owner=None, notebook=None):
+        if order_by not in storage.SORT_KEYS:
+            raise ValueError(f"Can't sort by {order_by}")
+        # The merge needs the sort key even if the caller didn't ask for it
+        extra = fields and order_by not in check_fields(fields)
+        read_fields = tuple(fields) + (order_by,) if extra else fields
+        streams = [shard.scan_sorted(order_by, descending, after=after, created=created, updated=updated,
+                                     limit=limit, chunk_size=chunk_size, fields=read_fields, tags=tags,
+                                     owner=owner, notebook=notebook)
+                   for shard in list(self.shards)]
+        notes = _merged(streams, _sort_key(order_by), descending, limit)
+        if not extra:
+            return notes
+        return (self._without(note, order_by) for note in notes)
+
+    @staticmethod
+    def _without(note, field):
+        note.ClearField(field)
+        return note
+
+    def count(self, created=None, updated=None, tags=(), owner=None, notebook=None):
+        if self._old_ring is not None:
+            # A note caught mid-move is in two shards; count the merged ids so it counts once
+            return sum(1 for _ in self.scan_sorted(created=created, updated=updated, fields=("id",), tags=tags,
+                                                   owner=owner, notebook=notebook))
+        return sum(shard.count(created, updated, tags, owner, notebook) for shard in list(self.shards))
+
+    def tag_counts(self, owner=None, limit=None):
+        totals = collections.Counter()
+        for shard in list(self.shards):
+            for tag, count in shard.tag_counts(owner):
+                totals[tag] += count
+        ranked = sorted(totals.items(), key=lambda item: (-item[1], item[0]))
+        return ranked if limit is None else ranked[:limit]
+
+    def search(self, query, limit, offset=0):
+        # Each shard ranks against its own term statistics, which are close
+        # enough to each other once shards hold more than a few notes
+        results = []
+        for shard in list(self.shards):
+            results.extend(shard.search(query, offset + limit))
+        results.sort(key=lambda result: (result[2], result[0].id))
+        # Keep the best ranked copy of a note caught mid-move
+        seen = set()
+        results = [result for result in results if not (result[0].id in seen or seen.add(result[0].id))]
+        return results[offset:offset + limit]
+
+    def backup(self, dest_path):
+        """Backs every shard up into the directory dest_path, with the manifest."""
+        if self._old_ring is not None:
+            raise ReshardInProgressError("Can't back up while a reshard is moving notes")
+        if os.path.exists(dest_path):
+            raise FileExistsError(f"{dest_path} already exists")
+        os.makedirs(dest_path)
+        pages = sum(shard.backup(shard_path(dest_path, index)) for index, shard in enumerate(list(self.shards)))
+        with open(os.path.join(dest_path, MANIFEST), "w", encoding="utf-8") as f:
+            json.dump({"shards": self.ring.shards}, f)
+        return pages
+
+    # --- change log ---
+
+    def _is_move(self, index, kind, note_id):
+        """True for the change log entries a move between shards left behind."""
+        pending = self._moving.get(note_id)
+        if pending is None:
+            return False
+        side = "delete" if kind == "delete" else "create"
+        if pending.get(side) != index:
+            return False
+        del pending[side]
+        if not pending:
+            del self._moving[note_id]
+        return True
+
+    def _pull(self):
+        """Appends new entries from every shard's change log; call with _log_lock held."""
+        for index, shard in enumerate(self.shards):
+            while True:
+                entries = shard.changes(self._observed[index], PULL_BATCH)
+                for _, kind, note_id, _ in entries:
+                    if not self._is_move(index, kind, note_id):
+                        self._changes.append((self._first_seq + len(self._changes), kind, note_id))
+                if entries:
+                    self._observed[index] = entries[-1][0]
+                if len(entries) < PULL_BATCH:
+                    break
+        if len(self._changes) > 2 * self.change_retention:
+            self._trim_changes(self.change_retention)
+
+    def _trim_changes(self, keep):
+        drop = max(0, len(self._changes) - keep)
+        del self._changes[:drop]
+        self._first_seq += drop
+
+    def changes(self, after_seq, limit):
+        with self._log_lock:
+            self._pull()
+            start = max(0, after_seq - self._first_seq + 1)
+            entries = self._changes[start:start + limit]
+        notes = self.get_many([note_id for _, kind, note_id in entries if kind != "delete"])
+        return [(seq, kind, note_id, notes.get(note_id) if kind != "delete" else None)
+                for seq, kind, note_id in entries]
+
+    def change_bounds(self):
+        with self._log_lock:
+            self._pull()
+            return self._first_seq, self._first_seq + len(self._changes) - 1
+
+    def prune_changes(self, keep=CHANGE_RETENTION):
+        with self._log_lock:
+            self._pull()
+            self._trim_changes(keep)
+            for shard in self.shards:
+                shard.prune_changes(keep)
+
+    # --- resharding ---
+
+    @property
+    def resharding(self):
+        return self._old_ring is not None
+
+    def reshard(self, shards, batch_size=RESHARD_BATCH):
+        """Moves to `shards` shards while the store stays in use; returns how many notes moved.
+
+        Raises ReshardInProgressError if a reshard is already running.
+        """
+        if shards < 1:
+            raise ValueError("Need at least one shard")
+        if not self._reshard_lock.acquire(blocking=False):
+            raise ReshardInProgressError("A reshard is already running")
+        try:
+            previous = self.ring.shards
+            if shards == previous:
+                return 0
+            with self._log_lock:
+                while len(self.shards) < shards:
+                    index = len(self.shards)
+                    self.shards.append(self._open_shard(shard_path(self.shard_dir, index)))
+                    self._observed.append(self.shards[index].change_bounds()[1])
+            # Written first, so a restart finishes the job
+            self._write_manifest({"shards": shards, "resharding_from": previous, "retired_seq": self._retired_seq})
+            logger.info("Resharding from %d to %d shards", previous, shards)
+            self._switch(HashRing(shards, self.vnodes), self.ring)
+            moved = self._migrate(batch_size)
+            self._finish()
+            logger.info("Reshard done: %d notes moved", moved)
+            return moved
+        finally:
+            self._reshard_lock.release()
+
+    def _resume(self):
+        with self._reshard_lock:
+            logger.info("Resuming the reshard to %d shards", self.ring.shards)
+            try:
+                moved = self._migrate(RESHARD_BATCH)
+                self._finish()
+            except StorageError:
+                logger.exception("Reshard failed; it resumes on the next start")
+                return
+            logger.info("Reshard done: %d notes moved", moved)
+
+    def _migrate(self, batch_size):
+        moved = 0
+        for index in range(len(self.shards)):
+            after_id = ""
+            while True:
+                ids = [note.id for note in self.shards[index].scan(after_id, limit=batch_size, fields=("id",))]
+                if not ids:
+                    break
+                after_id = ids[-1]
+                misplaced = [note_id for note_id in ids if self.ring.shard_for(note_id) != index]
+                if misplaced:
+                    moved += self._move(index, misplaced)
+        return moved
+
+    def _move(self, source, note_ids):
+        with ExitStack() as stack:
+            for lock in self._locks_for(note_ids):
+                stack.enter_context(lock)
+            # Read under the locks: what is there now is what gets moved
+            notes = list(self.shards[source].get_many(note_ids).values())
+            with self._log_lock:
+                for note in notes:
+                    self._moving[note.id] = {"delete": source, "create": self.ring.shard_for(note.id)}
+            try:
+                for index, group in self._group(notes, lambda note: self.ring.shard_for(note.id)).items():
+                    self.shards[index].restore_many(group)
+                self.shards[source].delete_many([note.id for note in notes])
+            except StorageError:
+                with self._log_lock:
+                    for note in notes:
+                        self._moving.pop(note.id, None)
+                raise
+        return len(notes)
+
+    def _finish(self):
+        shards = self.ring.shards
+        self._switch(self.ring, None)
+        with self._log_lock:
+            self._pull()
+            # Shards beyond the new count are empty now; their seqs still
+            # count towards where the merged log starts after a restart
+            self._retired_seq += sum(self._observed[shards:])
+            self._retired.extend(self.shards[shards:])
+            del self.shards[shards:]
+            del self._observed[shards:]
+        self._write_manifest({"shards": shards, "retired_seq": self._retired_seq})
+
+    def close(self):
+        for shard in self.shards + self._retired:
+            shard.close()
+
+
+def open_sharded_store(shard_dir=DEFAULT_SHARD_DIR, shards=DEFAULT_SHARDS, profile=database.DEFAULT_PROFILE,
+                       compress_threshold=database.COMPRESS_THRESHOLD, group_commit=0,
+                       group_commit_delay=storage.GROUP_COMMIT_MAX_DELAY, connection_factory=None):
+    """A ShardedNoteStore of SQLite files, each behind its own GroupCommitStore if group_commit > 1."""
+    def open_shard(path):
+        database.init_db(profile, path)
+        shard = storage.SQLiteNoteStore(database.ConnectionPool(path, profile=profile,
+                                                                connection_factory=connection_factory),
+                                        compress_threshold=compress_threshold)
+        if group_commit > 1:
+            shard = storage.GroupCommitStore(shard, max_batch=group_commit, max_delay=group_commit_delay)
+        return shard
+
+    return ShardedNoteStore(shard_dir, open_shard, shards=shards)
@@ -0,0 +1,203 @@
+"""Backups and snapshots of the note store.
+
+    python snapshot.py backup data/backups/notes-copy.db   # online SQLite copy
+    python snapshot.py export notes.snap.gz                # every note, with ids and versions
+    python snapshot.py import notes.snap.gz --db data/replica.db
+
+backup copies the database file page by page with SQLite's backup API
+while the server keeps running (the AdminService.Backup RPC does the same
+thing from inside the server). export writes a snapshot file: "NOTESNAP",
+a length-delimited SnapshotHeader, then one length-delimited Note per
+note, gzipped when the name ends in .gz. import loads one into a store
+in large transactions, keeping ids, versions and timestamps, which is
+much faster than replaying the notes through CreateNote.
+"""
+import argparse
+import gzip
+import sqlite3
+import sys
+import time
+
+import database
+import storage
+
+# These imports will fail in PyCharm but work in Docker
+import notes_pb2
+from google.protobuf.message import DecodeError
+
+MAGIC = b"NOTESNAP"
+FORMAT_VERSION = 1
+IMPORT_BATCH_SIZE = 2000  # notes per transaction
+
+
+class SnapshotError(Exception):
+    """Raised for a file that isn't a (complete) snapshot."""
+
+
+# --- Length-delimited messages ---
+# The same framing as protobuf's writeDelimitedTo / parseDelimitedFrom in
+# other languages: the message size as a base-128 varint, then the message.
+
+def write_delimited(stream, message):
+    data = message.SerializeToString()
+    size = len(data)
+    prefix = bytearray()
+    while size > 0x7F:
+        prefix.append(size & 0x7F | 0x80)
+        size >>= 7
+    prefix.append(size)
+    stream.write(bytes(prefix) + data)
+
+
+def read_delimited(stream, message_class):
+    """Returns the next message, or None at a clean end of the stream."""
+    size = shift = 0
+    while True:
+        byte = stream.read(1)
+        if not byte:
+            if shift:
+                raise SnapshotError("Snapshot ends inside a size prefix")
+            return None
+        size |= (byte[0] & 0x7F) << shift
+        if not byte[0] & 0x80:
+            break
+        shift += 7
+    data = stream.read(size)
+    if len(data) < size:
+        raise SnapshotError("Snapshot ends inside a message")
+    try:
+        return message_class.FromString(data)
+    except DecodeError as e:
+        raise SnapshotError(f"Corrupt snapshot: {e}") from None
+
+
+def _open(path, mode):
+    if path.endswith(".gz"):
+        return gzip.open(path, mode)
+    return open(path, mode)
+
+
+# --- Export / import ---
+
+def export_snapshot(store, stream):
+    """Writes every note in the store to a binary stream; returns how many."""
+    header = notes_pb2.SnapshotHeader(format_version=FORMAT_VERSION,
+                                      created_at=storage.to_timestamp(storage.now_ms()),
+                                      change_seq=store.change_bounds()[1])
+    stream.write(MAGIC)
+    write_delimited(stream, header)
+    count = 0
+    for note in store.scan():
+        write_delimited(stream, note)
+        count += 1
+    return count
+
+
+def read_snapshot(stream):
+    """Returns (SnapshotHeader, iterator of Notes) for a binary stream."""
+    if stream.read(len(MAGIC)) != MAGIC:
+        raise SnapshotError("Not a note snapshot")
+    header = read_delimited(stream, notes_pb2.SnapshotHeader)
+    if header is None:
+        raise SnapshotError("Snapshot has no header")
+    if header.format_version > FORMAT_VERSION:
+        raise SnapshotError(f"Snapshot format {header.format_version} is newer than this version "
+                            f"({FORMAT_VERSION})")
+
+    def notes():
+        while True:
+            note = read_delimited(stream, notes_pb2.Note)
+            if note is None:
+                return
+            yield note
+
+    return header, notes()
+
+
+def import_snapshot(store, stream, batch_size=IMPORT_BATCH_SIZE):
+    """Loads a snapshot into the store; returns (SnapshotHeader, notes imported)."""
+    header, notes = read_snapshot(stream)
+    count = 0
+    batch = []
+    for note in notes:
+        batch.append(note)
+        if len(batch) >= batch_size:
+            store.restore_many(batch)
+            count += len(batch)
+            batch = []
+    if batch:
+        store.restore_many(batch)
+        count += len(batch)
+    return header, count
+
+
+# --- CLI ---
+
+def cmd_backup(args):
+    started = time.perf_counter()
+
+    def progress(remaining, total):
+        if args.verbose:
+            print(f"\r{total - remaining}/{total} pages", end="", file=sys.stderr)
+
+    pages = database.backup(args.db, args.dest, step_pages=args.step_pages, progress=progress)
+    if args.verbose:
+        print(file=sys.stderr)
+    print(f"Backed up {pages} pages to {args.dest} in {time.perf_counter() - started:.1f}s", file=sys.stderr)
+
+
+def cmd_export(args):
+    store = storage.open_store("sqlite", db_name=args.db)
+    try:
+        with _open(args.file, "wb") as stream:
+            count = export_snapshot(store, stream)
+    finally:
+        store.close()
+    print(f"Exported {count} notes to {args.file}", file=sys.stderr)
+
+
+def cmd_import(args):
+    store = storage.open_store("sqlite", db_name=args.db)
+    try:
+        with _open(args.file, "rb") as stream:
+            header, count = import_snapshot(store, stream)
+    finally:
+        store.close()
+    print(f"Imported {count} notes; watch the source from change_seq {header.change_seq} to catch up",
+          file=sys.stderr)
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(description="Online backups and note snapshots")
+    parser.add_argument("--db", default=database.DB_NAME, help="SQLite database file")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    backup_parser = commands.add_parser("backup", help="copy the database file while it is in use")
+    backup_parser.add_argument("dest")
+    backup_parser.add_argument("--step-pages", type=int, default=database.BACKUP_STEP_PAGES,
+                               help="pages copied per step")
+    backup_parser.add_argument("-v", "--verbose", action="store_true", help="show progress")
+    backup_parser.set_defaults(handler=cmd_backup)
+
+    export_parser = commands.add_parser("export", help="write every note to a snapshot file")
+    export_parser.add_argument("file")
+    export_parser.set_defaults(handler=cmd_export)
+
+    import_parser = commands.add_parser("import", help="load a snapshot file into the database")
+    import_parser.add_argument("file")
+    import_parser.set_defaults(handler=cmd_import)
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    try:
+        args.handler(args)
+    except (SnapshotError, storage.StorageError, sqlite3.Error, OSError) as e:
+        print(f"Error: {e}", file=sys.stderr)
+        return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,1091 @@
+import heapq
+import json
+import os
+import queue
+import sqlite3
+import threading
+import time
+from concurrent.futures import Future
+from contextlib import contextmanager
+
+import database
+import tracing
+
+# These imports will fail in PyCharm but work in Docker
+import notes_pb2
+from google.protobuf.timestamp_pb2 import Timestamp
+
+SQL_VARIABLE_CHUNK = 500  # stays under SQLite's bound-parameter limit
+SCAN_CHUNK_SIZE = 500  # rows pulled from the cursor per fetchmany()
+NOTE_FIELDS = ("id", "title", "content", "version", "created_at", "updated_at", "tags", "owner", "notebook")
+TIME_FIELDS = ("created_at", "updated_at")  # stored as milliseconds since the epoch
+SORT_KEYS = ("id",) + TIME_FIELDS
+ROW_DEFAULTS = ((), "", "")  # tags, owner, notebook of an (id, title, content) row
+MAX_TAGS = 32  # per note
+MAX_TAG_LENGTH = 64
+CHANGE_RETENTION = 100_000  # change log entries kept for resuming watchers
+# The memory store's log is rewritten once it holds this many entries per live note
+LOG_COMPACT_RATIO = 4
+LOG_COMPACT_MIN_ENTRIES = 10_000
+# Messages sqlite gives for a MATCH expression it can't parse
+FTS_QUERY_ERRORS = ("fts5: syntax error", "no such column", "unterminated string", "unknown special query")
+
+
+class StorageError(Exception):
+    """Raised by a NoteStore when the underlying engine fails."""
+
+
+class InvalidQueryError(StorageError):
+    """Raised by NoteStore.search() for a query the engine can't parse."""
+
+
+class VersionConflictError(StorageError):
+    """Raised by NoteStore.update() when the note isn't at the expected version."""
+
+    def __init__(self, note_id, current_version):
+        super().__init__(f"Note {note_id} is at version {current_version}")
+        self.current_version = current_version
+
+
+def chunked(items, size):
+    for start in range(0, len(items), size):
+        yield items[start:start + size]
+
+
+def now_ms():
+    return time.time_ns() // 1_000_000
+
+
+def to_timestamp(ms):
+    return Timestamp(seconds=ms // 1000, nanos=ms % 1000 * 1_000_000)
+
+
+def full_row(row):
+    """Pads an (id, title, content) row to (id, title, content, tags, owner, notebook)."""
+    return tuple(row) + ROW_DEFAULTS[len(row) - 3:]
+
+
+def normalize_tags(tags):
+    """Returns tags stripped, lowercased and deduplicated, in the order given; raises ValueError."""
+    normalized = tuple(dict.fromkeys(tag.strip().lower() for tag in tags if tag.strip()))
+    if len(normalized) > MAX_TAGS:
+        raise ValueError(f"A note can have at most {MAX_TAGS} tags")
+    for tag in normalized:
+        if len(tag) > MAX_TAG_LENGTH:
+            raise ValueError(f"Tags can be at most {MAX_TAG_LENGTH} characters long: {tag[:20]!r}...")
+        if not tag.isprintable():
+            raise ValueError(f"Tags can't contain control characters: {tag!r}")
+    return normalized
+
+
+def check_fields(fields):
+    """Returns the Note fields to read (id always first), or all of them for None."""
+    if not fields:
+        return NOTE_FIELDS
+    unknown = set(fields) - set(NOTE_FIELDS)
+    if unknown:
+        raise ValueError(f"Unknown note field(s): {', '.join(sorted(unknown))}")
+    return ("id",) + tuple(field for field in NOTE_FIELDS[1:] if field in fields)
+
+
+class NoteStore:
+    """What NoteService needs from a storage engine.
+
+    Notes go in as (id, title, content) tuples, optionally followed by
+    (tags, owner, notebook) with tags already normalize_tags()-ed, and come
+    out as notes_pb2.Note messages. Engines raise StorageError on failure.
+    Read methods take an optional `fields` subset of NOTE_FIELDS; the
+    other fields are left unset.
+    """
+
+    def get(self, note_id, fields=None):
+        """Returns the Note, or None if it doesn't exist."""
+        raise NotImplementedError
+
+    def get_many(self, note_ids, fields=None):
+        """Returns {id: Note} for the ids that exist."""
+        raise NotImplementedError
+
+    def put(self, note_id, title, content, tags=(), owner="", notebook=""):
+        self.put_many([(note_id, title, content, tags, owner, notebook)])
+
+    def put_many(self, rows):
+        """Inserts all rows atomically."""
+        raise NotImplementedError
+
+    def update(self, note_id, title=None, content=None, expected_version=None, tags=None, owner=None,
+               notebook=None):
+        """Sets the given fields (tags replaces all of them) and bumps the version.
+
+        Returns the Note, or None if missing.
+
+        Raises VersionConflictError if expected_version is given and doesn't match.
+        """
+        raise NotImplementedError
+
+    def delete(self, note_id):
+        """Returns True if the note existed."""
+        return note_id in self.delete_many([note_id])
+
+    def delete_many(self, note_ids):
+        """Deletes atomically and returns the set of ids that existed."""
+        raise NotImplementedError
+
+    def restore_many(self, notes):
+        """Stores whole Notes as they are (ids, versions and timestamps included) in one transaction.
+
+        Notes with an existing id replace it. Used to load snapshots.
+        """
+        raise NotImplementedError
+
+    def write_batch(self, writes):
+        """Runs [(method name, args, kwargs)] of put_many/update/delete_many.
+
+        Returns one result per write, or the StorageError it raised. Engines
+        that can commit them together should override this.
+        """
+        results = []
+        for name, args, kwargs in writes:
+            try:
+                results.append(getattr(self, name)(*args, **kwargs))
+            except StorageError as e:
+                results.append(e)
+        return results
+
+    def scan(self, after_id="", limit=None, chunk_size=SCAN_CHUNK_SIZE, fields=None):
+        """Yields notes with id > after_id in id order, at most `limit` of them."""
+        raise NotImplementedError
+
+    def scan_sorted(self, order_by="id", descending=False, after=None, created=None, updated=None,
+                    limit=None, chunk_size=SCAN_CHUNK_SIZE, fields=None, tags=(), owner=None, notebook=None):
+        """Yields notes ordered by a SORT_KEYS column, ties broken by id.
+
+        `after` is the (sort value, id) of the last note already seen, with
+        times in milliseconds. `created` and `updated` are (start, end)
+        millisecond ranges, start inclusive, end exclusive, None for open.
+        Only notes with every one of `tags` (and the owner / notebook, unless
+        None) are returned.
+        """
+        raise NotImplementedError
+
+    def count(self, created=None, updated=None, tags=(), owner=None, notebook=None):
+        """Number of notes scan_sorted() would return for the same filters."""
+        raise NotImplementedError
+
+    def tag_counts(self, owner=None, limit=None):
+        """Returns [(tag, number of notes)], most used first, counting only `owner`'s notes if given."""
+        raise NotImplementedError
+
+    def search(self, query, limit, offset=0):
+        """Returns [(Note, snippet, rank)] best match (lowest rank) first."""
+        raise NotImplementedError
+
+    # --- change log ---
+
+    def changes(self, after_seq, limit):
+        """Returns [(seq, kind, note_id, Note or None)] with seq > after_seq, oldest first.
+
+        The Note is its current state (None for deletes or if deleted since).
+        """
+        raise NotImplementedError
+
+    def change_bounds(self):
+        """Returns (first, last): the oldest retained and the latest seq.
+
+        first is last + 1 when the log is empty.
+        """
+        raise NotImplementedError
+
+    def prune_changes(self, keep=CHANGE_RETENTION):
+        """Drops all but the latest `keep` change log entries."""
+        raise NotImplementedError
+
+    def backup(self, dest_path):
+        """Writes a consistent copy of the store to dest_path without stopping writes.
+
+        Returns the number of pages copied. Engines without a file to
+        copy raise NotImplementedError.
+        """
+        raise NotImplementedError
+
+    def close(self):
+        pass
+
+
+# --- SQLite engine ---
+
+@contextmanager
+def _sqlite_errors():
+    try:
+        yield
+    except sqlite3.Error as e:
+        raise StorageError(str(e)) from e
+
+
+# A note's tags, read from note_tags through its (note_id) index and joined
+# with the unit separator, which normalize_tags() doesn't allow in a tag
+TAGS_COLUMN = """(SELECT group_concat(tags.name, char(31)) FROM note_tags
+    JOIN tags ON tags.tag_id = note_tags.tag_id WHERE note_tags.note_id = notes.id) AS tags"""
+
+
+def row_to_note(row):
+    trace = tracing.current()
+    started = time.time_ns() if trace is not None else 0
+    # Rows may hold only some of the columns (see NoteStore `fields`)
+    values = {key: row[key] for key in row.keys() if key in NOTE_FIELDS}
+    if "content" in values:
+        values["content"] = database.decode_content(values["content"], row["compressed"])
+    for key in TIME_FIELDS:
+        if key in values:
+            values[key] = to_timestamp(values[key])
+    if "tags" in values:
+        values["tags"] = sorted(values["tags"].split("\x1f")) if values["tags"] else []
+    note = notes_pb2.Note(**values)
+    if trace is not None:
+        trace.accumulate("convert", started)
+    return note
+
+
+def select_columns(fields=None):
+    # `compressed` always travels with `content` so row_to_note can decode it
+    columns = [f"notes.{field}" if field != "tags" else TAGS_COLUMN for field in check_fields(fields)]
+    if "notes.content" in columns:
+        columns.append("notes.compressed")
+    return ", ".join(columns)
+
+
+class SQLiteNoteStore(NoteStore):
+
+    def __init__(self, pool, compress_threshold=database.COMPRESS_THRESHOLD):
+        # Connections are reused per worker thread instead of opened per call
+        self.pool = pool
+        # Content at least this many bytes long is stored compressed (0 = never)
+        self.compress_threshold = compress_threshold
+
+    def get_db_connection(self):
+        return self.pool.get_connection()
+
+    def get(self, note_id, fields=None):
+        columns = select_columns(fields)
+        with _sqlite_errors():
+            conn = self.get_db_connection()
+            row = conn.execute(f"SELECT {columns} FROM notes WHERE id = ?", (note_id,)).fetchone()
+        return row_to_note(row) if row else None
+
+    def _fetch_rows_by_id(self, conn, note_ids, columns=select_columns()):
+        rows = {}
+        for chunk in chunked(list(note_ids), SQL_VARIABLE_CHUNK):
+            placeholders = ",".join("?" * len(chunk))
+            cursor = conn.execute(f"SELECT {columns} FROM notes WHERE id IN ({placeholders})", chunk)
+            for row in cursor:
+                rows[row['id']] = row
+        return rows
+
+    def get_many(self, note_ids, fields=None):
+        columns = select_columns(fields)
+        with _sqlite_errors():
+            rows = self._fetch_rows_by_id(self.get_db_connection(), note_ids, columns)
+        return {note_id: row_to_note(row) for note_id, row in rows.items()}
+
+    # Each write is split into a public method (one transaction) and a
+    # _write_* step that runs on a given connection, so write_batch() can
+    # run many of them in a single transaction.
+
+    def _write_tags(self, conn, tagged, replace=False):
+        """Gives each note in [(note_id, tags)] its tags; replace drops the tags it had."""
+        if replace:
+            conn.executemany("DELETE FROM note_tags WHERE note_id = ?", [(note_id,) for note_id, _ in tagged])
+        pairs = [(note_id, tag) for note_id, tags in tagged for tag in tags]
+        if not pairs:
+            return
+        conn.executemany("INSERT OR IGNORE INTO tags (name) VALUES (?)", [(tag,) for tag in {tag for _, tag in pairs}])
+        conn.executemany("INSERT OR IGNORE INTO note_tags (tag_id, note_id) "
+                         "SELECT tag_id, ? FROM tags WHERE name = ?", pairs)
+
+    def _write_put_many(self, conn, rows):
+        now = now_ms()
+        rows = [full_row(row) for row in rows]
+        conn.executemany("INSERT INTO notes (id, title, content, compressed, created_at, updated_at, owner, notebook) "
+                         "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                         [(note_id, title) + database.encode_content(content, self.compress_threshold)
+                          + (now, now, owner, notebook)
+                          for note_id, title, content, _, owner, notebook in rows])
+        self._write_tags(conn, [(row[0], row[3]) for row in rows])
+
+    def _write_restore_many(self, conn, notes):
+        conn.executemany(
+            """
+            INSERT INTO notes (id, title, content, compressed, version, created_at, updated_at, owner, notebook)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+            ON CONFLICT (id) DO UPDATE SET
+                title = excluded.title, content = excluded.content, compressed = excluded.compressed,
+                version = excluded.version, created_at = excluded.created_at, updated_at = excluded.updated_at,
+                owner = excluded.owner, notebook = excluded.notebook
+            """,
+            [(note.id, note.title) + database.encode_content(note.content, self.compress_threshold)
+             + (note.version, note.created_at.ToMilliseconds(), note.updated_at.ToMilliseconds(),
+                note.owner, note.notebook)
+             for note in notes])
+        self._write_tags(conn, [(note.id, note.tags) for note in notes], replace=True)
+
+    def _write_update(self, conn, note_id, title=None, content=None, expected_version=None, tags=None,
+                      owner=None, notebook=None):
+        changes = {}
+        if title is not None:
+            changes["title"] = title
+        if content is not None:
+            changes["content"], changes["compressed"] = database.encode_content(content, self.compress_threshold)
+        if owner is not None:
+            changes["owner"] = owner
+        if notebook is not None:
+            changes["notebook"] = notebook
+        assignments = "".join(f"{name} = ?, " for name in changes)
+        query = f"UPDATE notes SET {assignments}version = version + 1, updated_at = ? WHERE id = ?"
+        params = list(changes.values()) + [now_ms(), note_id]
+        if expected_version is not None:
+            query += " AND version = ?"
+            params.append(expected_version)
+        # The version check and the write are one statement, so two
+        # concurrent updates can't both pass the check
+        updated = conn.execute(query, params).rowcount
+        if updated and tags is not None:
+            self._write_tags(conn, [(note_id, tags)], replace=True)
+        row = conn.execute(f"SELECT {select_columns()} FROM notes WHERE id = ?", (note_id,)).fetchone()
+        if row is None:
+            return None
+        if not updated:
+            raise VersionConflictError(note_id, row['version'])
+        return row_to_note(row)
+
+    def _write_delete_many(self, conn, note_ids):
+        existing = set(self._fetch_rows_by_id(conn, note_ids, columns="id"))
+        conn.executemany("DELETE FROM notes WHERE id = ?", [(note_id,) for note_id in existing])
+        return existing
+
+    def put_many(self, rows):
+        with _sqlite_errors():
+            # One transaction (and one commit) for the whole batch
+            with self.get_db_connection() as conn:
+                self._write_put_many(conn, rows)
+
+    def restore_many(self, notes):
+        with _sqlite_errors():
+            with self.get_db_connection() as conn:
+                self._write_restore_many(conn, notes)
+
+    def update(self, note_id, title=None, content=None, expected_version=None, tags=None, owner=None,
+               notebook=None):
+        with _sqlite_errors():
+            with self.get_db_connection() as conn:
+                return self._write_update(conn, note_id, title, content, expected_version, tags, owner, notebook)
+
+    def delete_many(self, note_ids):
+        with _sqlite_errors():
+            with self.get_db_connection() as conn:
+                return self._write_delete_many(conn, note_ids)
+
+    def write_batch(self, writes):
+        # One BEGIN/COMMIT (and one fsync) for all of them; a savepoint per
+        # write keeps a failing one from undoing the others
+        results = []
+        with _sqlite_errors():
+            conn = self.get_db_connection()
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                for name, args, kwargs in writes:
+                    conn.execute("SAVEPOINT batch_write")
+                    try:
+                        results.append(getattr(self, f"_write_{name}")(conn, *args, **kwargs))
+                    except (sqlite3.Error, StorageError) as e:
+                        conn.execute("ROLLBACK TO batch_write")
+                        results.append(e if isinstance(e, StorageError) else StorageError(str(e)))
+                    conn.execute("RELEASE batch_write")
+                conn.commit()
+            except BaseException:
+                conn.rollback()
+                raise
+        return results
+
+    def scan(self, after_id="", limit=None, chunk_size=SCAN_CHUNK_SIZE, fields=None):
+        query = f"SELECT {select_columns(fields)} FROM notes WHERE id > ? ORDER BY id"
+        params = (after_id,)
+        if limit is not None:
+            query += " LIMIT ?"
+            params += (limit,)
+        return self._iter_notes(query, params, chunk_size)
+
+    @staticmethod
+    def _filter(created=None, updated=None, tags=(), owner=None, notebook=None):
+        """Returns (FROM clause, id column, conditions, params) selecting the notes that match."""
+        conditions, params = [], []
+        source, id_column = "notes", "notes.id"
+        if tags:
+            # Read the first tag's range of note_tags, which is in id order,
+            # and look the other tags up by primary key. Only notes with the
+            # first tag are visited, so put the rarest tag first.
+            source = "note_tags AS first_tag JOIN notes ON notes.id = first_tag.note_id"
+            id_column = "first_tag.note_id"
+            conditions.append("first_tag.tag_id = (SELECT tag_id FROM tags WHERE name = ?)")
+            params.append(tags[0])
+            for tag in tags[1:]:
+                conditions.append("EXISTS (SELECT 1 FROM note_tags AS other_tag WHERE other_tag.tag_id = "
+                                  "(SELECT tag_id FROM tags WHERE name = ?) AND other_tag.note_id = notes.id)")
+                params.append(tag)
+        for column, value in (("owner", owner), ("notebook", notebook)):
+            if value is not None:
+                conditions.append(f"notes.{column} = ?")
+                params.append(value)
+        for column, bounds in (("created_at", created), ("updated_at", updated)):
+            start, end = bounds or (None, None)
+            if start is not None:
+                conditions.append(f"notes.{column} >= ?")
+                params.append(start)
+            if end is not None:
+                conditions.append(f"notes.{column} < ?")
+                params.append(end)
+        return source, id_column, conditions, params
+
+    def scan_sorted(self, order_by="id", descending=False, after=None, created=None, updated=None,
+                    limit=None, chunk_size=SCAN_CHUNK_SIZE, fields=None, tags=(), owner=None, notebook=None):
+        if order_by not in SORT_KEYS:
+            raise ValueError(f"Can't sort by {order_by}")
+        source, id_column, conditions, params = self._filter(created, updated, tags, owner, notebook)
+        direction, comparison = ("DESC", "<") if descending else ("ASC", ">")
+        if order_by == "id":
+            order = f"{id_column} {direction}"
+            if after is not None:
+                conditions.append(f"{id_column} {comparison} ?")
+                params.append(after[1])
+        else:
+            # Row values let the (time, id) index seek straight to the cursor
+            order = f"notes.{order_by} {direction}, notes.id {direction}"
+            if after is not None:
+                conditions.append(f"(notes.{order_by}, notes.id) {comparison} (?, ?)")
+                params.extend(after)
+        query = f"SELECT {select_columns(fields)} FROM {source}"
+        if conditions:
+            query += " WHERE " + " AND ".join(conditions)
+        query += f" ORDER BY {order}"
+        if limit is not None:
+            query += " LIMIT ?"
+            params.append(limit)
+        return self._iter_notes(query, params, chunk_size)
+
+    def count(self, created=None, updated=None, tags=(), owner=None, notebook=None):
+        source, _, conditions, params = self._filter(created, updated, tags, owner, notebook)
+        query = f"SELECT COUNT(*) FROM {source}"
+        if conditions:
+            query += " WHERE " + " AND ".join(conditions)
+        with _sqlite_errors():
+            return self.get_db_connection().execute(query, params).fetchone()[0]
+
+    def tag_counts(self, owner=None, limit=None):
+        query = "SELECT tags.name, COUNT(*) AS notes FROM note_tags JOIN tags ON tags.tag_id = note_tags.tag_id"
+        params = []
+        if owner is not None:
+            query += " JOIN notes ON notes.id = note_tags.note_id WHERE notes.owner = ?"
+            params.append(owner)
+        query += " GROUP BY note_tags.tag_id ORDER BY notes DESC, tags.name"
+        if limit is not None:
+            query += " LIMIT ?"
+            params.append(limit)
+        with _sqlite_errors():
+            return [(row[0], row[1]) for row in self.get_db_connection().execute(query, params)]
+
+    def _iter_notes(self, query, params, chunk_size):
+        with _sqlite_errors():
+            cursor = self.get_db_connection().execute(query, params)
+            try:
+                # Only one chunk of rows is held in memory at a time
+                while True:
+                    rows = cursor.fetchmany(chunk_size)
+                    if not rows:
+                        break
+                    for row in rows:
+                        yield row_to_note(row)
+            finally:
+                cursor.close()
+
+    def search(self, query, limit, offset=0):
+        try:
+            rows = self.get_db_connection().execute(
+                f"""
+                SELECT {select_columns()},
+                       snippet(notes_fts, -1, '[', ']', '...', 10) AS snippet,
+                       bm25(notes_fts) AS rank
+                FROM notes_fts JOIN notes ON notes.rowid = notes_fts.rowid
+                WHERE notes_fts MATCH ?
+                ORDER BY rank
+                LIMIT ? OFFSET ?
+                """,
+                (query, limit, offset)
+            ).fetchall()
+        except sqlite3.OperationalError as e:
+            # Malformed FTS5 query (unbalanced quotes, unknown column, ...);
+            # anything else (locked, I/O, corrupt) is the engine's fault
+            if str(e).startswith(FTS_QUERY_ERRORS):
+                raise InvalidQueryError(str(e)) from e
+            raise StorageError(str(e)) from e
+        except sqlite3.Error as e:
+            raise StorageError(str(e)) from e
+        return [(row_to_note(row), row['snippet'], row['rank']) for row in rows]
+
+    def changes(self, after_seq, limit):
+        with _sqlite_errors():
+            rows = self.get_db_connection().execute(
+                f"""
+                SELECT note_changes.seq, note_changes.kind, note_changes.note_id, {select_columns()}
+                FROM note_changes LEFT JOIN notes ON notes.id = note_changes.note_id
+                WHERE note_changes.seq > ?
+                ORDER BY note_changes.seq
+                LIMIT ?
+                """,
+                (after_seq, limit)
+            ).fetchall()
+        return [(row['seq'], row['kind'], row['note_id'],
+                 row_to_note(row) if row['id'] is not None and row['kind'] != "delete" else None)
+                for row in rows]
+
+    def change_bounds(self):
+        with _sqlite_errors():
+            conn = self.get_db_connection()
+            # sqlite_sequence remembers the last seq even after everything was pruned
+            last = conn.execute("SELECT seq FROM sqlite_sequence WHERE name = 'note_changes'").fetchone()
+            last = last[0] if last else 0
+            first = conn.execute("SELECT MIN(seq) FROM note_changes").fetchone()[0]
+        return (first if first is not None else last + 1), last
+
+    def prune_changes(self, keep=CHANGE_RETENTION):
+        with _sqlite_errors():
+            with self.get_db_connection() as conn:
+                conn.execute("DELETE FROM note_changes WHERE seq <= "
+                             "(SELECT MAX(seq) FROM note_changes) - ?", (keep,))
+
+    def backup(self, dest_path):
+        with _sqlite_errors():
+            return database.backup(self.pool.db_name, dest_path)
+
+    def close(self):
+        self.pool.close_all()
+
+
+# --- In-memory engine ---
+
+def _snippet(text, term, width=40):
+    position = text.lower().find(term)
+    if position < 0:
+        return text[:width]
+    start = max(0, position - width // 2)
+    end = position + len(term)
+    prefix = "..." if start > 0 else ""
+    suffix = "..." if end + width // 2 < len(text) else ""
+    return f"{prefix}{text[start:position]}[{text[position:end]}]{text[end:end + width // 2]}{suffix}"
+
+
+class MemoryNoteStore(NoteStore):
+    """Pure-RAM engine for ephemeral notes.
+
+    Notes are spread over `stripes` dicts, each with its own lock, so
+    writers to different notes don't contend. With `log_path` every
+    mutation is appended to a JSON-lines log that is replayed on start.
+    The log is compacted (rewritten from the current state) on start and
+    whenever it outgrows `compact_ratio` entries per live note; 0 turns
+    that off and leaves it to compact(). The change log lives in memory
+    only, so after a restart watchers start over.
+    """
+
+    def __init__(self, stripes=16, log_path=None, fsync=False, change_retention=CHANGE_RETENTION,
+                 compact_ratio=LOG_COMPACT_RATIO):
+        self._stripes = [({}, threading.Lock()) for _ in range(stripes)]
+        # (seq, kind, note_id); seqs are consecutive, so _changes[i] has seq _first_seq + i
+        self._changes = []
+        self._first_seq = 1
+        self._changes_lock = threading.Lock()
+        self.change_retention = change_retention
+        self.log_path = log_path
+        self.fsync = fsync
+        self._log_lock = threading.Lock()
+        self._log = None
+        self._log_entries = 0
+        self.compact_ratio = compact_ratio
+        self._compact_lock = threading.Lock()
+        if log_path:
+            self._replay(log_path)
+            self._log = open(log_path, "a", encoding="utf-8")
+            self._maybe_compact()
+
+    def _stripe(self, note_id):
+        return self._stripes[hash(note_id) % len(self._stripes)]
+
+    def _stripes_for(self, note_ids):
+        # Group ids by stripe; stripes are always locked in index order
+        grouped = {}
+        for note_id in note_ids:
+            index = hash(note_id) % len(self._stripes)
+            grouped.setdefault(index, []).append(note_id)
+        return [(self._stripes[index], grouped[index]) for index in sorted(grouped)]
+
+    # --- append-only log ---
+
+    def _replay(self, log_path):
+        if not os.path.exists(log_path):
+            return
+        good_end = 0
+        replayed_at = to_timestamp(now_ms())  # for entries written before notes had timestamps
+        with open(log_path, "rb") as log:
+            for line in log:
+                try:
+                    if not line.endswith(b"\n"):
+                        raise ValueError("incomplete line")
+                    entry = json.loads(line)
+                except ValueError:
+                    break  # torn last write after a crash
+                notes, _ = self._stripe(entry["id"])
+                if entry["op"] == "put":
+                    notes[entry["id"]] = notes_pb2.Note(
+                        id=entry["id"], title=entry["title"], content=entry["content"],
+                        version=entry.get("version", 1),
+                        created_at=to_timestamp(entry["created_at"]) if "created_at" in entry else replayed_at,
+                        updated_at=to_timestamp(entry["updated_at"]) if "updated_at" in entry else replayed_at,
+                        tags=entry.get("tags", []), owner=entry.get("owner", ""),
+                        notebook=entry.get("notebook", ""))
+                else:
+                    notes.pop(entry["id"], None)
+                good_end += len(line)
+                self._log_entries += 1
+        if good_end < os.path.getsize(log_path):
+            # Drop the torn tail so new entries don't get glued onto it
+            with open(log_path, "r+b") as log:
+                log.truncate(good_end)
+
+    def _append(self, entries):
+        if self._log is None:
+            return
+        data = "".join(json.dumps(entry) + "\n" for entry in entries)
+        try:
+            with self._log_lock:
+                self._log.write(data)
+                self._log.flush()
+                if self.fsync:
+                    os.fsync(self._log.fileno())
+                self._log_entries += len(entries)
+        except OSError as e:
+            raise StorageError(f"Could not write log: {e}") from e
+
+    @staticmethod
+    def _put_entry(note):
+        return {"op": "put", "id": note.id, "title": note.title, "content": note.content,
+                "version": note.version, "created_at": note.created_at.ToMilliseconds(),
+                "updated_at": note.updated_at.ToMilliseconds(), "tags": list(note.tags), "owner": note.owner,
+                "notebook": note.notebook}
+
+    def compact(self):
+        if self._log is None:
+            return
+        tmp_path = self.log_path + ".tmp"
+        # Same lock order as writers (stripes, then log); writes pause meanwhile
+        locks = [lock for _, lock in self._stripes]
+        for lock in locks:
+            lock.acquire()
+        try:
+            with self._log_lock:
+                with open(tmp_path, "w", encoding="utf-8") as tmp:
+                    for notes, _ in self._stripes:
+                        for note in notes.values():
+                            tmp.write(json.dumps(self._put_entry(note)) + "\n")
+                    tmp.flush()
+                    os.fsync(tmp.fileno())
+                self._log.close()
+                os.replace(tmp_path, self.log_path)
+                self._log = open(self.log_path, "a", encoding="utf-8")
+                self._log_entries = sum(len(notes) for notes, _ in self._stripes)
+        finally:
+            for lock in locks:
+                lock.release()
+
+    def _maybe_compact(self):
+        # Called by writers once their stripe locks are released; compact() takes them all
+        if self._log is None or not self.compact_ratio:
+            return
+        live = sum(len(notes) for notes, _ in self._stripes)
+        if self._log_entries <= self.compact_ratio * max(live, LOG_COMPACT_MIN_ENTRIES):
+            return
+        if self._compact_lock.acquire(blocking=False):  # one writer compacts, the rest carry on
+            try:
+                self.compact()
+            finally:
+                self._compact_lock.release()
+
+    def _record(self, kind, note_ids):
+        # Called with the notes' stripe locks held, so seq order matches the
+        # order the changes became visible
+        with self._changes_lock:
+            next_seq = self._first_seq + len(self._changes)
+            self._changes.extend((next_seq + i, kind, note_id) for i, note_id in enumerate(note_ids))
+            if len(self._changes) > 2 * self.change_retention:
+                self._trim_changes(self.change_retention)
+
+    def _trim_changes(self, keep):
+        drop = max(0, len(self._changes) - keep)
+        del self._changes[:drop]
+        self._first_seq += drop
+
+    # --- NoteStore ---
+
+    @staticmethod
+    def _project(note, fields):
+        if fields is None:
+            return note
+        return notes_pb2.Note(**{field: getattr(note, field) for field in fields})
+
+    def get(self, note_id, fields=None):
+        fields = check_fields(fields) if fields else None
+        notes, lock = self._stripe(note_id)
+        with lock:
+            note = notes.get(note_id)
+        return self._project(note, fields) if note else None
+
+    def get_many(self, note_ids, fields=None):
+        fields = check_fields(fields) if fields else None
+        found = {}
+        for (notes, lock), ids in self._stripes_for(note_ids):
+            with lock:
+                for note_id in ids:
+                    if note_id in notes:
+                        found[note_id] = self._project(notes[note_id], fields)
+        return found
+
+    def put_many(self, rows):
+        grouped = self._stripes_for([row[0] for row in rows])
+        now = to_timestamp(now_ms())
+        new_notes = {note_id: notes_pb2.Note(id=note_id, title=title, content=content, version=1,
+                                             created_at=now, updated_at=now, tags=sorted(tags), owner=owner,
+                                             notebook=notebook)
+                     for note_id, title, content, tags, owner, notebook in map(full_row, rows)}
+        locks = [lock for (_, lock), _ in grouped]
+        for lock in locks:
+            lock.acquire()
+        try:
+            # Log first so a failed write leaves memory untouched
+            self._append([self._put_entry(note) for note in new_notes.values()])
+            for (notes, _), ids in grouped:
+                for note_id in ids:
+                    notes[note_id] = new_notes[note_id]
+            self._record("create", [row[0] for row in rows])
+        finally:
+            for lock in locks:
+                lock.release()
+        self._maybe_compact()
+
+    def restore_many(self, notes):
+        new_notes = {note.id: note for note in notes}
+        grouped = self._stripes_for(list(new_notes))
+        locks = [lock for (_, lock), _ in grouped]
+        for lock in locks:
+            lock.acquire()
+        try:
+            self._append([self._put_entry(note) for note in new_notes.values()])
+            created, updated = [], []
+            for (stripe, _), ids in grouped:
+                for note_id in ids:
+                    (updated if note_id in stripe else created).append(note_id)
+                    stripe[note_id] = new_notes[note_id]
+            self._record("create", created)
+            self._record("update", updated)
+        finally:
+            for lock in locks:
+                lock.release()
+        self._maybe_compact()
+
+    def update(self, note_id, title=None, content=None, expected_version=None, tags=None, owner=None,
+               notebook=None):
+        notes, lock = self._stripe(note_id)
+        with lock:
+            note = notes.get(note_id)
+            if note is None:
+                return None
+            if expected_version is not None and note.version != expected_version:
+                raise VersionConflictError(note_id, note.version)
+            updated = notes_pb2.Note(id=note_id,
+                                     title=note.title if title is None else title,
+                                     content=note.content if content is None else content,
+                                     version=note.version + 1, created_at=note.created_at,
+                                     updated_at=to_timestamp(now_ms()),
+                                     tags=note.tags if tags is None else sorted(tags),
+                                     owner=note.owner if owner is None else owner,
+                                     notebook=note.notebook if notebook is None else notebook)
+            self._append([self._put_entry(updated)])
+            notes[note_id] = updated
+            self._record("update", [note_id])
+        self._maybe_compact()
+        return updated
+
+    def delete_many(self, note_ids):
+        grouped = self._stripes_for(note_ids)
+        locks = [lock for (_, lock), _ in grouped]
+        for lock in locks:
+            lock.acquire()
+        try:
+            existing = {note_id for (notes, _), ids in grouped for note_id in ids if note_id in notes}
+            self._append([{"op": "del", "id": note_id} for note_id in existing])
+            for (notes, _), ids in grouped:
+                for note_id in ids:
+                    notes.pop(note_id, None)
+            self._record("delete", [note_id for note_id in dict.fromkeys(note_ids) if note_id in existing])
+        finally:
+            for lock in locks:
+                lock.release()
+        self._maybe_compact()
+        return existing
+
+    def _snapshot(self):
+        for notes, lock in self._stripes:
+            with lock:
+                yield from list(notes.values())
+
+    def scan(self, after_id="", limit=None, chunk_size=SCAN_CHUNK_SIZE, fields=None):
+        fields = check_fields(fields) if fields else None
+        matching = (note for note in self._snapshot() if note.id > after_id)
+        if limit is not None:
+            ordered = heapq.nsmallest(limit, matching, key=lambda note: note.id)
+        else:
+            ordered = sorted(matching, key=lambda note: note.id)
+        for note in ordered:
+            yield self._project(note, fields)
+
+    @staticmethod
+    def _matcher(created=None, updated=None, tags=(), owner=None, notebook=None):
+        tags = set(tags)
+
+        def matches(note):
+            if (owner is not None and note.owner != owner) or (notebook is not None and note.notebook != notebook):
+                return False
+            if tags and not tags.issubset(note.tags):
+                return False
+            for field, bounds in (("created_at", created), ("updated_at", updated)):
+                if bounds is None:
+                    continue
+                value = getattr(note, field).ToMilliseconds()
+                start, end = bounds
+                if (start is not None and value < start) or (end is not None and value >= end):
+                    return False
+            return True
+
+        return matches
+
+    def scan_sorted(self, order_by="id", descending=False, after=None, created=None, updated=None,
+                    limit=None, chunk_size=SCAN_CHUNK_SIZE, fields=None, tags=(), owner=None, notebook=None):
+        if order_by not in SORT_KEYS:
+            raise ValueError(f"Can't sort by {order_by}")
+        fields = check_fields(fields) if fields else None
+        matches = self._matcher(created, updated, tags, owner, notebook)
+
+        def sort_key(note):
+            if order_by == "id":
+                return note.id, note.id
+            return getattr(note, order_by).ToMilliseconds(), note.id
+
+        # No index here: every call filters and sorts a snapshot
+        matching = [(sort_key(note), note) for note in self._snapshot() if matches(note)]
+        if after is not None:
+            after = tuple(after)
+            matching = [(key, note) for key, note in matching if (key < after if descending else key > after)]
+        pick = heapq.nlargest if descending else heapq.nsmallest
+        if limit is not None:
+            ordered = pick(limit, matching, key=lambda item: item[0])
+        else:
+            ordered = sorted(matching, key=lambda item: item[0], reverse=descending)
+        for _, note in ordered:
+            yield self._project(note, fields)
+
+    def count(self, created=None, updated=None, tags=(), owner=None, notebook=None):
+        matches = self._matcher(created, updated, tags, owner, notebook)
+        return sum(1 for note in self._snapshot() if matches(note))
+
+    def tag_counts(self, owner=None, limit=None):
+        counts = {}
+        for note in self._snapshot():
+            if owner is None or note.owner == owner:
+                for tag in note.tags:
+                    counts[tag] = counts.get(tag, 0) + 1
+        ordered = sorted(counts.items(), key=lambda item: (-item[1], item[0]))
+        return ordered[:limit] if limit is not None else ordered
+
+    def search(self, query, limit, offset=0):
+        terms = [term.strip('"').lower() for term in query.split()]
+        terms = [term for term in terms if term and term not in ("and", "or", "not")]
+        if not terms:
+            raise InvalidQueryError("query has no search terms")
+        results = []
+        for note in self._snapshot():
+            text = f"{note.title} {note.content}".lower()
+            if all(term in text for term in terms):
+                hits = sum(text.count(term) for term in terms)
+                body = note.content if terms[0] in note.content.lower() else note.title
+                results.append((note, _snippet(body, terms[0]), -float(hits)))
+        results.sort(key=lambda result: (result[2], result[0].id))
+        return results[offset:offset + limit]
+
+    def changes(self, after_seq, limit):
+        with self._changes_lock:
+            start = max(0, after_seq - self._first_seq + 1)
+            entries = self._changes[start:start + limit]
+        return [(seq, kind, note_id, self.get(note_id) if kind != "delete" else None)
+                for seq, kind, note_id in entries]
+
+    def change_bounds(self):
+        with self._changes_lock:
+            return self._first_seq, self._first_seq + len(self._changes) - 1
+
+    def prune_changes(self, keep=CHANGE_RETENTION):
+        with self._changes_lock:
+            self._trim_changes(keep)
+
+    def close(self):
+        if self._log is not None:
+            with self._log_lock:
+                self._log.close()
+                self._log = None
+
+
+# --- Group commit ---
+
+GROUP_COMMIT_MAX_BATCH = 256
+GROUP_COMMIT_MAX_DELAY = 0.0  # seconds; 0 = only batch what piled up during the last commit
+
+
+class GroupCommitStore:
+    """Funnels writes from all RPC threads through one writer thread.
+
+    Callers block until their write is committed, exactly as before, but
+    the writer commits whatever has queued up (up to `max_batch` writes,
+    waiting at most `max_delay` for more) in one transaction. Under load
+    that is one fsync and one trip through SQLite's write lock per batch
+    instead of per RPC. Reads go straight to the wrapped store.
+    """
+
+    def __init__(self, store, max_batch=GROUP_COMMIT_MAX_BATCH, max_delay=GROUP_COMMIT_MAX_DELAY):
+        self.store = store
+        self.max_batch = max_batch
+        self.max_delay = max_delay
+        self.batches = 0
+        self.writes = 0
+        self._queue = queue.SimpleQueue()
+        self._closed = False
+        self._writer = threading.Thread(target=self._run, name="group-commit", daemon=True)
+        self._writer.start()
+
+    def __getattr__(self, name):
+        return getattr(self.store, name)
+
+    def _submit(self, name, *args, **kwargs):
+        if self._closed:
+            raise StorageError("Store is closed")
+        future = Future()
+        self._queue.put((name, args, kwargs, future, tracing.current()))
+        with tracing.span("group_commit"):
+            return future.result()
+
+    def put(self, note_id, title, content, tags=(), owner="", notebook=""):
+        self.put_many([(note_id, title, content, tags, owner, notebook)])
+
+    def put_many(self, rows):
+        return self._submit("put_many", rows)
+
+    def update(self, note_id, title=None, content=None, expected_version=None, tags=None, owner=None,
+               notebook=None):
+        return self._submit("update", note_id, title=title, content=content, expected_version=expected_version,
+                            tags=tags, owner=owner, notebook=notebook)
+
+    def delete(self, note_id):
+        return note_id in self.delete_many([note_id])
+
+    def delete_many(self, note_ids):
+        return self._submit("delete_many", note_ids)
+
+    def _next_batch(self):
+        first = self._queue.get()
+        if first is None:
+            return None
+        batch = [first]
+        deadline = time.monotonic() + self.max_delay
+        while len(batch) < self.max_batch:
+            try:
+                remaining = deadline - time.monotonic()
+                item = self._queue.get(timeout=remaining) if remaining > 0 else self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if item is None:
+                self._queue.put(None)  # finish this batch, then stop
+                break
+            batch.append(item)
+        return batch
+
+    def _run(self):
+        while True:
+            batch = self._next_batch()
+            if batch is None:
+                break
+            try:
+                with tracing.shared(trace for *_, trace in batch):
+                    results = self.store.write_batch([(name, args, kwargs) for name, args, kwargs, _, _ in batch])
+            except Exception as e:
+                # Nothing in the batch was committed
+                results = [e] * len(batch)
+            self.batches += 1
+            self.writes += len(batch)
+            for (_, _, _, future, _), result in zip(batch, results):
+                if isinstance(result, Exception):
+                    future.set_exception(result)
+                else:
+                    future.set_result(result)
+        # Writes that raced with close()
+        while True:
+            try:
+                item = self._queue.get_nowait()
+            except queue.Empty:
+                return
+            if item is not None:
+                item[3].set_exception(StorageError("Store is closed"))
+
+    def stats(self):
+        return {"batches": self.batches, "writes": self.writes}
+
+    def close(self):
+        if not self._closed:
+            self._closed = True
+            self._queue.put(None)
+            self._writer.join()
+        self.store.close()
+
+
+STORE_KINDS = ("sqlite", "memory", "sharded")
+
+
+def open_store(kind="sqlite", profile=database.DEFAULT_PROFILE, log_path=None, db_name=None,
+               compress_threshold=database.COMPRESS_THRESHOLD, group_commit=0,
+               group_commit_delay=GROUP_COMMIT_MAX_DELAY, shard_dir=None, shards=None, connection_factory=None):
+    """group_commit > 1 puts SQLite writes behind a GroupCommitStore with that max batch size.
+
+    connection_factory is the sqlite3.Connection class for the pool (see tracing.connection_factory()).
+
+    "sharded" spreads notes over `shards` SQLite files in `shard_dir` (see sharding.py).
+    """
+    if kind == "sqlite":
+        db_name = db_name or database.DB_NAME
+        database.init_db(profile, db_name)
+        store = SQLiteNoteStore(database.ConnectionPool(db_name, profile=profile,
+                                                        connection_factory=connection_factory),
+                                compress_threshold=compress_threshold)
+        if group_commit > 1:
+            store = GroupCommitStore(store, max_batch=group_commit, max_delay=group_commit_delay)
+        return store
+    if kind == "memory":
+        return MemoryNoteStore(log_path=log_path)
+    if kind == "sharded":
+        import sharding
+        return sharding.open_sharded_store(shard_dir or sharding.DEFAULT_SHARD_DIR, shards or sharding.DEFAULT_SHARDS,
+                                           profile=profile, compress_threshold=compress_threshold,
+                                           group_commit=group_commit, group_commit_delay=group_commit_delay,
+                                           connection_factory=connection_factory)
+    raise ValueError(f"Unknown store kind: {kind}")
@@ -0,0 +1,157 @@
+"""Multi-process server mode (`python server.py --workers N`).
+
+One Python process can only run servicer code on one core at a time (the
+GIL), so the supervisor starts N worker processes that all bind the same
+port with SO_REUSEPORT and lets the kernel spread connections across them.
+All workers share the SQLite file; WAL mode plus busy_timeout (see
+database.PROFILES) keeps concurrent writers from failing.
+
+Workers only send heartbeats while their server is started and getting
+through its work (see server.Liveness), so one that failed to bind or has
+wedged gets restarted, while one that is merely busy doesn't.
+
+Signals: SIGTERM/SIGINT stop the workers one at a time, SIGHUP restarts
+them one at a time, so the port never goes dark.
+"""
+import multiprocessing
+import signal
+import threading
+import time
+
+import database
+import server
+from logging_utils import configure_logging
+
+REUSEPORT_OPTIONS = [("grpc.so_reuseport", 1)]
+HEARTBEAT_INTERVAL = 1.0
+HEARTBEAT_TIMEOUT = 10.0  # a worker that hasn't beaten for this long is restarted
+STARTUP_GRACE = 15.0  # time a new worker gets before heartbeats are checked
+STOP_TIMEOUT = 10.0  # server.serve() drains for 5 s on SIGTERM; kill after this
+RESTART_BACKOFF = 1.0
+
+# gRPC's core doesn't survive fork(), so workers are always spawned fresh
+_mp = multiprocessing.get_context("spawn")
+
+
+def _heartbeat(beat, liveness, stopped):
+    # No RPC: a probe would queue behind the very calls keeping a busy worker busy
+    while not stopped.wait(HEARTBEAT_INTERVAL):
+        if liveness.making_progress():
+            beat.value = time.time()
+
+
+def worker_main(index, args, beat):
+    log_listener = configure_logging(args.log_level, args.log_sample_rate)
+    liveness = server.Liveness()
+    stopped = threading.Event()
+    threading.Thread(target=_heartbeat, args=(beat, liveness, stopped), name="heartbeat", daemon=True).start()
+    # Each worker gets its own metrics port: base, base + 1, ...
+    metrics_port = args.metrics_port + index if args.metrics_port else 0
+    try:
+        server.run(args, metrics_port=metrics_port, options=REUSEPORT_OPTIONS, liveness=liveness)
+    finally:
+        stopped.set()
+        log_listener.stop()
+
+
+class Worker:
+
+    def __init__(self, index, args):
+        self.index = index
+        self.beat = _mp.Value("d", 0.0)
+        self.started_at = time.time()
+        self.process = _mp.Process(target=worker_main, args=(index, args, self.beat),
+                                   name=f"notes-worker-{index}", daemon=False)
+        self.process.start()
+
+    def is_healthy(self, now):
+        if not self.process.is_alive():
+            return False
+        last_beat = self.beat.value or self.started_at
+        limit = HEARTBEAT_TIMEOUT if self.beat.value else STARTUP_GRACE
+        return now - last_beat < limit
+
+    def stop(self, timeout=STOP_TIMEOUT):
+        if self.process.is_alive():
+            self.process.terminate()  # SIGTERM -> graceful server.stop()
+            self.process.join(timeout)
+        if self.process.is_alive():
+            self.process.kill()
+            self.process.join()
+
+    def status(self, now):
+        return {
+            "index": self.index,
+            "pid": self.process.pid,
+            "alive": self.process.is_alive(),
+            "heartbeat_age": round(now - self.beat.value, 1) if self.beat.value else None,
+            "healthy": self.is_healthy(now),
+        }
+
+
+class Supervisor:
+
+    def __init__(self, args, workers=None):
+        self.args = args
+        self.count = workers or args.workers
+        self.workers = []
+        self._stopping = threading.Event()
+        self._restart_requested = threading.Event()
+
+    def start(self):
+        # Migrate once up front so workers don't all race to do it
+        database.init_db(self.args.sqlite_profile, self.args.db)
+        self.workers = [Worker(index, self.args) for index in range(self.count)]
+        print(f"Supervisor started {self.count} workers on port {self.args.port}...")
+
+    def status(self):
+        now = time.time()
+        return [worker.status(now) for worker in self.workers]
+
+    def check_workers(self):
+        """Replaces workers that died or stopped sending heartbeats."""
+        now = time.time()
+        for position, worker in enumerate(self.workers):
+            if self._stopping.is_set():
+                return
+            if worker.is_healthy(now):
+                continue
+            print(f"Worker {worker.index} (pid {worker.process.pid}) is unhealthy "
+                  f"(exit code {worker.process.exitcode}); restarting")
+            worker.stop()
+            if now - worker.started_at < RESTART_BACKOFF:
+                time.sleep(RESTART_BACKOFF)  # don't spin on a worker that crashes at startup
+            self.workers[position] = Worker(worker.index, self.args)
+
+    def rolling_restart(self):
+        # Start the replacement before stopping the old worker, so the
+        # number of processes accepting connections never drops
+        for position, worker in enumerate(list(self.workers)):
+            replacement = Worker(worker.index, self.args)
+            deadline = time.time() + STARTUP_GRACE
+            while not replacement.beat.value and replacement.process.is_alive() and time.time() < deadline:
+                time.sleep(0.1)
+            worker.stop()
+            self.workers[position] = replacement
+        print("Rolling restart finished")
+
+    def stop(self):
+        self._stopping.set()
+        # One at a time: the others keep serving while each one drains
+        for worker in self.workers:
+            worker.stop()
+        print("All workers stopped")
+
+    def run(self):
+        self.start()
+        signal.signal(signal.SIGTERM, lambda *_: self._stopping.set())
+        signal.signal(signal.SIGINT, lambda *_: self._stopping.set())
+        signal.signal(signal.SIGHUP, lambda *_: self._restart_requested.set())
+        try:
+            while not self._stopping.wait(HEARTBEAT_INTERVAL):
+                if self._restart_requested.is_set():
+                    self._restart_requested.clear()
+                    self.rolling_restart()
+                self.check_workers()
+        finally:
+            self.stop()
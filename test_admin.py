@@ -0,0 +1,38 @@
+import os
+
+import grpc
+from pytest_mock import MockerFixture
+
+import admin
+import database
+import storage
+
+# These imports will fail in PyCharm but work in Docker
+import notes_pb2
+
+
+def test_backup(tmp_path, mocker: MockerFixture):
+    database.init_db(db_name=str(tmp_path / "notes.db"))
+    store = storage.SQLiteNoteStore(database.ConnectionPool(str(tmp_path / "notes.db")))
+    store.put("a", "Backed up", "content")
+    service = admin.AdminService(store, backup_dir=str(tmp_path / "backups"))
+    mock_context = mocker.Mock()
+
+    response = service.Backup(notes_pb2.BackupRequest(name="first.db"), mock_context)
+    assert response.path == os.path.join(str(tmp_path / "backups"), "first.db")
+    assert response.pages > 0 and response.size_bytes > 0
+    mock_context.set_code.assert_not_called()
+
+    service.Backup(notes_pb2.BackupRequest(name="first.db"), mock_context)
+    mock_context.set_code.assert_called_with(grpc.StatusCode.ALREADY_EXISTS)
+    service.Backup(notes_pb2.BackupRequest(name="../escape.db"), mock_context)
+    mock_context.set_code.assert_called_with(grpc.StatusCode.INVALID_ARGUMENT)
+    assert service.Backup(notes_pb2.BackupRequest(), mocker.Mock()).path.endswith("Z.db")
+    store.close()
+
+
+def test_backup_needs_a_database_file(tmp_path, mocker: MockerFixture):
+    service = admin.AdminService(storage.MemoryNoteStore(), backup_dir=str(tmp_path))
+    mock_context = mocker.Mock()
+    service.Backup(notes_pb2.BackupRequest(), mock_context)
+    mock_context.set_code.assert_called_with(grpc.StatusCode.UNIMPLEMENTED)
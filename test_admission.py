@@ -0,0 +1,161 @@
+import asyncio
+from concurrent import futures
+
+import grpc
+import pytest
+from pytest_mock import MockerFixture
+
+import admission
+import aio_server
+import metrics
+import server
+import storage
+
+# These imports will fail in PyCharm but work in Docker
+import notes_pb2
+import notes_pb2_grpc
+
+
+def _context(mocker, time_remaining=None, peer="ipv4:127.0.0.1:50000"):
+    mock_context = mocker.Mock()
+    mock_context.time_remaining.return_value = time_remaining
+    mock_context.peer.return_value = peer
+    return mock_context
+
+
+def test_token_bucket_refills():
+    bucket = admission.TokenBucket(rate=2, burst=2)
+    now = bucket.updated
+    assert bucket.take(now) and bucket.take(now)
+    assert not bucket.take(now)
+    assert bucket.take(now + 0.5)  # one token back after half a second
+
+
+def test_expired_deadline_is_skipped(mocker: MockerFixture):
+    controller = admission.AdmissionController()
+    code, _ = controller.admit("GetNote", (), _context(mocker, time_remaining=0.0))
+    assert code == grpc.StatusCode.DEADLINE_EXCEEDED
+    assert controller.admit("GetNote", (), _context(mocker, time_remaining=5.0)) is None
+    assert controller.admit("GetNote", (), _context(mocker)) is None  # no deadline
+    assert controller.stats()["rejected"] == {"deadline": 1}
+
+
+def test_method_concurrency_limit(mocker: MockerFixture):
+    controller = admission.AdmissionController(method_limits={"ListNotes": 2})
+    assert controller.admit("ListNotes", (), _context(mocker)) is None
+    assert controller.admit("ListNotes", (), _context(mocker)) is None
+    code, details = controller.admit("ListNotes", (), _context(mocker))
+    assert code == grpc.StatusCode.RESOURCE_EXHAUSTED and "ListNotes" in details
+    assert controller.admit("GetNote", (), _context(mocker)) is None  # other methods aren't limited
+
+    controller.release("ListNotes")
+    assert controller.admit("ListNotes", (), _context(mocker)) is None
+    assert controller.stats()["running"] == {"ListNotes": 2, "GetNote": 1}
+
+
+def test_deep_queue_sheds_load(mocker: MockerFixture):
+    controller = admission.AdmissionController(max_queue=10)
+    depth = 11
+    controller.queue_depth = lambda: depth
+    code, _ = controller.admit("GetNote", (), _context(mocker))
+    assert code == grpc.StatusCode.RESOURCE_EXHAUSTED
+    depth = 10
+    assert controller.admit("GetNote", (), _context(mocker)) is None
+
+
+def test_rate_limit_per_client(mocker: MockerFixture):
+    controller = admission.AdmissionController(rate=0.001, burst=1)
+    alice = (("x-client-id", "alice"),)
+    assert controller.admit("GetNote", alice, _context(mocker)) is None
+    code, _ = controller.admit("GetNote", alice, _context(mocker))
+    assert code == grpc.StatusCode.RESOURCE_EXHAUSTED
+    assert controller.admit("GetNote", (("x-client-id", "bob"),), _context(mocker)) is None
+
+    # Without the header, calls from one host share a bucket whatever their port
+    assert controller.admit("GetNote", (), _context(mocker, peer="ipv4:10.0.0.7:1111")) is None
+    code, _ = controller.admit("GetNote", (), _context(mocker, peer="ipv4:10.0.0.7:2222"))
+    assert code == grpc.StatusCode.RESOURCE_EXHAUSTED
+
+
+def test_parse_method_limits():
+    assert admission.parse_method_limits([]) == {}  # opt-in
+    limits = admission.parse_method_limits(["ListNotes=8", "StreamNotes=2", "GetNote=100", "StreamNotes=0"])
+    assert limits == {"ListNotes": 8, "GetNote": 100}
+    with pytest.raises(ValueError):
+        admission.parse_method_limits(["ListNotes"])
+
+
+def test_server_rejects_over_rate():
+    service_metrics = metrics.ServiceMetrics()
+    controller = admission.AdmissionController(rate=0.001, burst=2)
+    grpc_server, port = server.create_server(storage.MemoryNoteStore(), address="127.0.0.1:0",
+                                             service_metrics=service_metrics, admission_control=controller)
+    grpc_server.start()
+    channel = grpc.insecure_channel(f"127.0.0.1:{port}")
+    stub = notes_pb2_grpc.NoteServiceStub(channel)
+    try:
+        metadata = (("x-client-id", "batch-job"),)
+        stub.CreateNote(notes_pb2.CreateNoteRequest(title="One"), metadata=metadata)
+        list(stub.StreamNotes(notes_pb2.ListNotesRequest(), metadata=metadata))
+        with pytest.raises(grpc.RpcError) as e:
+            stub.CreateNote(notes_pb2.CreateNoteRequest(title="Three"), metadata=metadata)
+        assert e.value.code() == grpc.StatusCode.RESOURCE_EXHAUSTED
+        stub.CreateNote(notes_pb2.CreateNoteRequest(title="Other client"), metadata=(("x-client-id", "gui"),))
+
+        assert service_metrics.rejected.value("CreateNote", "rate") == 1
+        assert service_metrics.handled.value("CreateNote", "RESOURCE_EXHAUSTED") == 1
+        assert controller.stats()["running"] == {}  # the stream released its slot
+    finally:
+        channel.close()
+        grpc_server.stop(grace=None).wait()
+
+
+def test_aio_server_rejects_over_rate():
+    controller = admission.AdmissionController(rate=0.001, burst=1)
+    store = storage.MemoryNoteStore()
+
+    async def scenario():
+        executor = futures.ThreadPoolExecutor(max_workers=2)
+        grpc_server = grpc.aio.server(interceptors=[admission.AioAdmissionInterceptor(controller)])
+        notes_pb2_grpc.add_NoteServiceServicer_to_server(
+            aio_server.AsyncNoteService(server.NoteService(store), executor), grpc_server)
+        port = grpc_server.add_insecure_port("127.0.0.1:0")
+        await grpc_server.start()
+        async with grpc.aio.insecure_channel(f"127.0.0.1:{port}") as channel:
+            stub = notes_pb2_grpc.NoteServiceStub(channel)
+            await stub.CreateNote(notes_pb2.CreateNoteRequest(title="Allowed"))
+            with pytest.raises(grpc.aio.AioRpcError) as e:
+                await stub.CreateNote(notes_pb2.CreateNoteRequest(title="Rejected"))
+        await grpc_server.stop(None)
+        executor.shutdown()
+        return e.value.code()
+
+    assert asyncio.run(scenario()) == grpc.StatusCode.RESOURCE_EXHAUSTED
+    assert len(list(store.scan())) == 1
+
+
+def test_aio_streams_are_not_counted():
+    controller = admission.AdmissionController(method_limits={"StreamNotes": 1, "ListNotes": 1})
+    store = storage.MemoryNoteStore()
+    store.put("a", "Note", "")
+
+    async def scenario():
+        executor = futures.ThreadPoolExecutor(max_workers=2)
+        grpc_server = grpc.aio.server(interceptors=[admission.AioAdmissionInterceptor(controller)])
+        notes_pb2_grpc.add_NoteServiceServicer_to_server(
+            aio_server.AsyncNoteService(server.NoteService(store), executor), grpc_server)
+        port = grpc_server.add_insecure_port("127.0.0.1:0")
+        await grpc_server.start()
+        async with grpc.aio.insecure_channel(f"127.0.0.1:{port}") as channel:
+            stub = notes_pb2_grpc.NoteServiceStub(channel)
+            # Both streams are open at once, over a limit of 1
+            first = stub.StreamNotes(notes_pb2.ListNotesRequest())
+            second = stub.StreamNotes(notes_pb2.ListNotesRequest())
+            notes = [await first.read(), await second.read()]
+            await stub.ListNotes(notes_pb2.ListNotesRequest())
+        await grpc_server.stop(None)
+        executor.shutdown()
+        return notes
+
+    assert [note.id for note in asyncio.run(scenario())] == ["a", "a"]
+    assert controller.stats() == {"running": {}, "rejected": {}}
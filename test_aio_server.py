@@ -0,0 +1,138 @@
+import asyncio
+from concurrent import futures
+
+import grpc
+import pytest
+from pytest_mock import MockerFixture
+
+import aio_server
+import changefeed
+import database
+import notes_pb2
+import server
+import storage
+import tracing
+
+
+@pytest.fixture
+def async_service(monkeypatch, tmp_path):
+    monkeypatch.setattr(database, "DB_NAME", str(tmp_path / "notes.db"))
+    database.init_db()
+    store = storage.SQLiteNoteStore(database.ConnectionPool(database.DB_NAME))
+    executor = futures.ThreadPoolExecutor(max_workers=2)
+    yield aio_server.AsyncNoteService(server.NoteService(store), executor)
+    executor.shutdown(wait=True)
+    store.close()
+
+
+def test_async_create_and_get(async_service: aio_server.AsyncNoteService, mocker: MockerFixture):
+    mock_context = mocker.Mock()
+
+    async def scenario():
+        created = await async_service.CreateNote(notes_pb2.CreateNoteRequest(title="Async"), mock_context)
+        return await async_service.GetNote(notes_pb2.GetNoteRequest(id=created.id), mock_context)
+
+    response = asyncio.run(scenario())
+    assert response.note.title == "Async"
+
+
+def test_async_get_not_found(async_service: aio_server.AsyncNoteService, mocker: MockerFixture):
+    mock_context = mocker.Mock()
+    asyncio.run(async_service.GetNote(notes_pb2.GetNoteRequest(id="non-existent-uuid"), mock_context))
+    mock_context.set_code.assert_called_with(grpc.StatusCode.NOT_FOUND)
+
+
+def test_async_import_and_stream(async_service: aio_server.AsyncNoteService, mocker: MockerFixture):
+    mock_context = mocker.Mock()
+
+    async def upload():
+        for i in range(5):
+            yield notes_pb2.CreateNoteRequest(title=f"Note {i}")
+
+    async def scenario():
+        imported = await async_service.ImportNotes(upload(), mock_context)
+        streamed = [note async for note in
+                    async_service.StreamNotes(notes_pb2.ListNotesRequest(page_size=2), mock_context)]
+        return imported, streamed
+
+    imported, streamed = asyncio.run(scenario())
+    assert imported.imported_count == 5
+    assert len(streamed) == 5
+
+
+def test_async_import_errors_keep_servicer_details(async_service: aio_server.AsyncNoteService,
+                                                   mocker: MockerFixture):
+    chunk = server.IMPORT_CHUNK_SIZE
+
+    async def upload(bad_index):
+        for i in range(chunk + 2):
+            tags = ["x" * 100] if i == bad_index else []
+            yield notes_pb2.CreateNoteRequest(title=f"Note {i}", tags=tags)
+
+    mock_context = mocker.Mock()
+    imported = asyncio.run(async_service.ImportNotes(upload(chunk + 1), mock_context))
+    assert imported.imported_count == chunk
+    mock_context.set_code.assert_called_once_with(grpc.StatusCode.INVALID_ARGUMENT)
+    details = mock_context.set_details.call_args.args[0]
+    assert details.startswith("Tags can be at most") and details.endswith(f"(after {chunk} imported notes)")
+
+    mocker.patch.object(async_service.service.store, "put_many",
+                        side_effect=[None, storage.StorageError("disk full")])
+    mock_context = mocker.Mock()
+    imported = asyncio.run(async_service.ImportNotes(upload(None), mock_context))
+    assert imported.imported_count == chunk
+    mock_context.set_code.assert_called_once_with(grpc.StatusCode.INTERNAL)
+    mock_context.set_details.assert_called_once_with(f"Database error after {chunk} imported notes: disk full")
+
+
+def test_async_watch_notes(async_service: aio_server.AsyncNoteService, mocker: MockerFixture):
+    mock_context = mocker.Mock()
+    feed = changefeed.ChangeFeed(async_service.service.store, poll_interval=0.01).start()
+    async_service.service.feed = feed
+
+    async def scenario():
+        watch = async_service.WatchNotes(notes_pb2.WatchNotesRequest(), mock_context)
+        first = asyncio.ensure_future(watch.__anext__())
+        await asyncio.sleep(0.05)  # subscribed from "now"
+        created = await async_service.CreateNote(notes_pb2.CreateNoteRequest(title="Live"), mock_context)
+        event = await asyncio.wait_for(first, timeout=5)
+        await watch.aclose()
+        return created, event
+
+    try:
+        created, event = asyncio.run(scenario())
+    finally:
+        feed.stop()
+    assert event.type == notes_pb2.NoteEvent.CREATED
+    assert event.note.title == "Live" and event.note_id == created.id
+    assert feed.subscriber_count == 0
+
+
+def test_async_watch_on_a_stopped_feed_ends(async_service: aio_server.AsyncNoteService, mocker: MockerFixture):
+    feed = changefeed.ChangeFeed(async_service.service.store, poll_interval=0.01).start()
+    feed.stop()
+    async_service.service.feed = feed
+
+    async def scenario():
+        watch = async_service.WatchNotes(notes_pb2.WatchNotesRequest(), mocker.Mock())
+        return [event async for event in watch]
+
+    assert asyncio.run(asyncio.wait_for(scenario(), timeout=5)) == []
+
+
+def test_async_admin_calls_keep_the_trace(mocker: MockerFixture):
+    seen = []
+    service = mocker.Mock()
+    service.Profile.side_effect = lambda request, context: seen.append(tracing.current())
+    executor = futures.ThreadPoolExecutor(max_workers=1)
+    trace = tracing.Trace("Profile")
+
+    async def scenario():
+        tracing._current.set(trace)
+        await aio_server.AsyncAdminService(service, executor).Profile(notes_pb2.ProfileRequest(), mocker.Mock())
+
+    try:
+        asyncio.run(scenario())
+    finally:
+        executor.shutdown()
+    assert seen == [trace]
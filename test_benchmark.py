@@ -0,0 +1,27 @@
+import json
+
+import benchmark
+import server
+
+
+def test_percentile():
+    values = sorted(range(1, 101))
+    assert benchmark.percentile(values, 50) == 50
+    assert benchmark.percentile(values, 99) == 99
+    assert benchmark.percentile([], 50) == 0.0
+
+
+def test_parse_mix():
+    assert benchmark.parse_mix("create=1,get=3") == {"create": 1.0, "get": 3.0}
+
+
+def test_benchmark_report(tmp_path):
+    output = tmp_path / "bench.json"
+    benchmark.main(["--store", "memory", "--clients", "2", "--duration", "0.3", "--prefill", "20",
+                    "--sweep", "10", "--output", str(output)])
+    report = json.loads(output.read_text())
+    assert set(report["mix"]) == {"create", "get", "list", "delete", "total"}
+    assert report["mix"]["total"]["count"] > 0
+    assert report["list_sweep"][0]["size"] == 10
+    # Measured with the same compression the server uses by default
+    assert report["config"]["compression"] == server.DEFAULT_COMPRESSION
@@ -0,0 +1,55 @@
+from cache import LRUCache
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def test_get_and_put():
+    cache = LRUCache()
+    assert cache.get("a") is None
+    cache.put("a", b"value")
+    assert cache.get("a") == b"value"
+    assert cache.stats()["hits"] == 1
+    assert cache.stats()["misses"] == 1
+
+
+def test_evicts_least_recently_used():
+    cache = LRUCache(max_entries=2)
+    cache.put("a", b"1")
+    cache.put("b", b"2")
+    cache.get("a")
+    cache.put("c", b"3")
+    assert cache.get("b") is None
+    assert cache.get("a") == b"1"
+    assert cache.stats()["evictions"] == 1
+
+
+def test_byte_limit():
+    cache = LRUCache(max_bytes=10)
+    cache.put("a", b"x" * 6)
+    cache.put("b", b"y" * 6)
+    assert cache.get("a") is None
+    assert cache.stats()["bytes"] == 6
+    cache.put("huge", b"z" * 11)
+    assert cache.get("huge") is None
+
+
+def test_ttl_expiry():
+    clock = FakeClock()
+    cache = LRUCache(ttl=5, clock=clock)
+    cache.put("a", b"1")
+    clock.now = 5
+    assert cache.get("a") is None
+
+
+def test_put_after_invalidation_is_dropped():
+    cache = LRUCache()
+    generation = cache.generation
+    cache.invalidate("a")
+    cache.put("a", b"stale", generation=generation)
+    assert cache.get("a") is None
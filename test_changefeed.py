@@ -0,0 +1,91 @@
+import itertools
+import threading
+
+import pytest
+
+import changefeed
+import database
+import storage
+
+
+@pytest.fixture(params=["sqlite", "memory"])
+def store(request, tmp_path):
+    if request.param == "sqlite":
+        pool = database.ConnectionPool(str(tmp_path / "notes.db"))
+        database.migrate(pool.get_connection())
+        note_store = storage.SQLiteNoteStore(pool)
+    else:
+        note_store = storage.MemoryNoteStore()
+    yield note_store
+    note_store.close()
+
+
+def kinds(events):
+    return [(kind, note_id) for _, kind, note_id, _ in events]
+
+
+def test_store_logs_every_mutation(store):
+    store.put_many([("a", "First", ""), ("b", "Second", "")])
+    store.update("a", title="First!")
+    store.delete_many(["b", "missing"])
+    events = store.changes(0, 100)
+    assert kinds(events) == [("create", "a"), ("create", "b"), ("update", "a"), ("delete", "b")]
+    assert [seq for seq, *_ in events] == [1, 2, 3, 4]
+    # Notes are read as they are now
+    assert events[0][3].title == "First!"
+    assert events[1][3] is None
+    assert store.change_bounds() == (1, 4)
+
+
+def test_prune_keeps_latest_changes(store):
+    for i in range(5):
+        store.put(str(i), "", "")
+    store.prune_changes(keep=2)
+    assert store.change_bounds() == (4, 5)
+    assert kinds(store.changes(0, 100)) == [("create", "3"), ("create", "4")]
+
+
+def test_feed_pushes_to_subscribers(store):
+    feed = changefeed.ChangeFeed(store)
+    first, second = feed.subscribe(), feed.subscribe()
+    store.put("a", "", "")
+    assert feed.poll() == 1
+    assert kinds(first.get(timeout=0)) == [("create", "a")]
+    assert kinds(second.get(timeout=0)) == [("create", "a")]
+    first.close()
+    assert feed.subscriber_count == 1
+
+
+def test_slow_subscriber_is_dropped(store):
+    feed = changefeed.ChangeFeed(store, buffer_size=2)
+    subscription = feed.subscribe()
+    store.put_many([(str(i), "", "") for i in range(3)])
+    feed.poll()
+    with pytest.raises(changefeed.SubscriberOverflow):
+        subscription.get(timeout=0)
+    assert feed.subscriber_count == 0
+
+
+def test_watch_resumes_from_log_then_follows_live_changes(store):
+    store.put_many([("a", "", ""), ("b", "", "")])
+    feed = changefeed.ChangeFeed(store, poll_interval=0.01).start()
+    try:
+        watch = feed.watch(after_seq=1, timeout=0.1)
+        assert kinds(itertools.islice(watch, 1)) == [("create", "b")]  # from the log
+        threading.Timer(0.05, lambda: store.delete("a")).start()
+        assert kinds(itertools.islice(watch, 1)) == [("delete", "a")]  # pushed by the poller
+        watch.close()
+    finally:
+        feed.stop()
+    assert feed.subscriber_count == 0
+
+
+def test_watch_rejects_pruned_resume_point(store):
+    for i in range(5):
+        store.put(str(i), "", "")
+    store.prune_changes(keep=2)
+    feed = changefeed.ChangeFeed(store)
+    with pytest.raises(changefeed.ResumeError):
+        next(feed.watch(after_seq=1))
+    with pytest.raises(changefeed.ResumeError):
+        next(feed.watch(after_seq=99))
@@ -0,0 +1,77 @@
+import sqlite3
+import threading
+
+import pytest
+
+import database
+
+
+@pytest.fixture
+def pool(tmp_path):
+    pool = database.ConnectionPool(str(tmp_path / "notes.db"))
+    yield pool
+    pool.close_all()
+
+
+def test_pool_reuses_connection_per_thread(pool: database.ConnectionPool):
+    assert pool.get_connection() is pool.get_connection()
+    assert pool.size() == 1
+
+
+def test_pool_gives_each_thread_its_own_connection(pool: database.ConnectionPool):
+    main_conn = pool.get_connection()
+    other = []
+    worker = threading.Thread(target=lambda: other.append(pool.get_connection()))
+    worker.start()
+    worker.join()
+    assert other[0] is not main_conn
+    assert pool.size() == 2
+
+
+def test_pool_replaces_broken_connection(pool: database.ConnectionPool):
+    pool.health_check_interval = 0
+    conn = pool.get_connection()
+    conn.close()
+    new_conn = pool.get_connection()
+    assert new_conn is not conn
+    assert new_conn.execute("SELECT 1").fetchone()[0] == 1
+
+
+def test_pool_close_all(pool: database.ConnectionPool):
+    conn = pool.get_connection()
+    pool.close_all()
+    with pytest.raises(sqlite3.ProgrammingError):
+        conn.execute("SELECT 1")
+    with pytest.raises(sqlite3.ProgrammingError):
+        pool.get_connection()
+
+
+def test_pool_applies_profile(pool: database.ConnectionPool):
+    conn = pool.get_connection()
+    assert conn.execute("PRAGMA journal_mode").fetchone()[0] == "wal"
+    assert conn.execute("PRAGMA busy_timeout").fetchone()[0] == 5000
+
+
+def test_migrate_fresh_database():
+    conn = sqlite3.connect(":memory:")
+    database.migrate(conn)
+    assert database.get_schema_version(conn) == database.MIGRATIONS[-1][0]
+    columns = [row[1] for row in conn.execute("PRAGMA table_info(notes)")]
+    assert columns[:4] == ["seq", "id", "title", "content"]
+    # Running it again is a no-op
+    database.migrate(conn)
+    assert conn.execute("SELECT COUNT(*) FROM schema_version").fetchone()[0] == len(database.MIGRATIONS)
+
+
+def test_migrate_legacy_database_keeps_notes():
+    conn = sqlite3.connect(":memory:")
+    conn.execute("CREATE TABLE notes (id TEXT PRIMARY KEY, title TEXT NOT NULL, content TEXT)")
+    conn.execute("INSERT INTO notes (id, title, content) VALUES ('a', 'Old note', 'written before migrations')")
+    conn.commit()
+    database.migrate(conn)
+    assert conn.execute("SELECT title FROM notes WHERE id = 'a'").fetchone()[0] == "Old note"
+    # Notes from before the timestamp columns get the migration time
+    created_at, updated_at = conn.execute("SELECT created_at, updated_at FROM notes WHERE id = 'a'").fetchone()
+    assert created_at == updated_at > 0
+    match = conn.execute("SELECT rowid FROM notes_fts WHERE notes_fts MATCH 'migrations'").fetchall()
+    assert len(match) == 1
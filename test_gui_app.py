@@ -0,0 +1,118 @@
+import threading
+import time
+
+import grpc
+
+import gui_app
+
+# These imports will fail in PyCharm but work in Docker
+import notes_pb2
+
+
+def note(note_id, title="t"):
+    return notes_pb2.Note(id=note_id, title=title, content="c")
+
+
+def test_model_pages_and_incremental_updates():
+    model = gui_app.NoteListModel()
+    assert [n.id for n in model.add_page([note("a"), note("c")], "token")] == ["a", "c"]
+    assert not model.exhausted
+
+    # Inside the loaded range: slotted in place. Past the end: left for the next page
+    assert model.insert(note("b")) == 1
+    assert model.insert(note("z")) is None
+    assert model.row_ids == ["a", "b", "c"]
+
+    assert [n.id for n in model.add_page([note("d"), note("z")], "")] == ["d", "z"]
+    assert model.exhausted
+    assert model.insert(note("zz")) == 5
+
+    assert model.remove("b") == 1
+    assert model.remove("missing") is None
+    assert "b" not in model.notes
+    assert "a" not in model.notes  # pages are title-only, so not cached
+    assert model.row_ids == ["a", "c", "d", "z", "zz"]
+
+
+def test_model_set_rows_keeps_order_and_caches_notes():
+    model = gui_app.NoteListModel()
+    model.set_rows([note("b"), note("a")])
+    assert model.row_ids == ["b", "a"]
+    assert model.exhausted
+    assert model.notes["a"].content == "c"
+
+
+class FakeRpcError(grpc.RpcError):
+
+    def __init__(self, code=grpc.StatusCode.UNAVAILABLE):
+        self._code = code
+
+    def code(self):
+        return self._code
+
+    def details(self):
+        return "details"
+
+
+def test_background_calls_deliver_results_on_drain():
+    calls = gui_app.BackgroundCalls()
+    results, errors = [], []
+    done = threading.Event()
+
+    calls.submit(lambda: 42, results.append)
+
+    def fail():
+        try:
+            raise FakeRpcError()
+        finally:
+            done.set()
+
+    calls.submit(fail, results.append, errors.append)
+    done.wait(5)
+    calls._executor.shutdown(wait=True)
+    # Nothing runs until the owning (Tk) thread drains the queue
+    assert results == [] and errors == []
+    calls.drain()
+    assert results == [42]
+    assert len(errors) == 1 and isinstance(errors[0], FakeRpcError)
+
+
+def test_background_stream_delivers_each_item():
+    calls = gui_app.BackgroundCalls()
+    items, errors = [], []
+    done = threading.Event()
+
+    def call():
+        yield 1
+        yield 2
+        done.set()
+        raise FakeRpcError()
+
+    calls.stream(call(), items.append, errors.append)
+    done.wait(5)
+    for _ in range(50):
+        calls.drain()
+        if errors:
+            break
+        time.sleep(0.01)
+    calls.shutdown()
+    assert items == [1, 2]
+    assert len(errors) == 1
+
+
+def test_watch_failures_keep_the_list_or_retry(mocker):
+    app = mocker.Mock(list_generation=1, watch_seq=7)
+
+    # No change feed on the server: stay on the static list, quietly
+    gui_app.NoteApp.on_watch_failed(app, 1, FakeRpcError(grpc.StatusCode.UNIMPLEMENTED))
+    assert not app.set_status.called and not app.after.called
+
+    # At the watcher limit: try again later from the last change seen
+    gui_app.NoteApp.on_watch_failed(app, 1, FakeRpcError(grpc.StatusCode.RESOURCE_EXHAUSTED))
+    assert app.after.call_args.args[0] == gui_app.WATCH_RETRY_MS
+    gui_app.NoteApp.retry_watch(app, 1)
+    app.start_watch.assert_called_once_with(1, 7)
+
+    # The list was reset meanwhile; that list started its own watch
+    gui_app.NoteApp.retry_watch(app, 0)
+    assert app.start_watch.call_count == 1
@@ -0,0 +1,30 @@
+import time
+import uuid
+
+import pytest
+from pytest_mock import MockerFixture
+
+import ids
+
+
+def test_uuid7_ids_sort_in_creation_order():
+    new_id = ids.generator("uuid7")
+    made = [new_id() for _ in range(10000)]
+    assert made == sorted(made)
+    assert len(set(made)) == len(made)
+    assert uuid.UUID(made[0]).version == 7
+    assert abs(ids.uuid7_time(made[0]) - time.time() * 1000) < 5000
+
+
+def test_uuid7_keeps_order_when_the_clock_goes_back(mocker: MockerFixture):
+    new_id = ids.generator("uuid7")
+    mocker.patch("ids.time.time_ns", side_effect=[2_000_000_000_000_000, 1_000_000_000_000_000])
+    first, second = new_id(), new_id()
+    assert second > first
+    assert ids.uuid7_time(second) == ids.uuid7_time(first) == 2_000_000_000
+
+
+def test_unknown_id_format():
+    assert uuid.UUID(ids.generator("uuid4")()).version == 4
+    with pytest.raises(ValueError):
+        ids.generator("sequential")
@@ -0,0 +1,146 @@
+import asyncio
+import io
+import json
+import logging
+import time
+import urllib.request
+from concurrent import futures
+
+import grpc
+import pytest
+
+import aio_server
+import changefeed
+import metrics
+import server
+import storage
+from logging_utils import SamplingFilter, configure_logging
+
+# These imports will fail in PyCharm but work in Docker
+import notes_pb2
+import notes_pb2_grpc
+
+
+@pytest.fixture
+def instrumented():
+    service_metrics = metrics.ServiceMetrics()
+    store = storage.MemoryNoteStore()
+    grpc_server, port = server.create_server(store, address="127.0.0.1:0", service_metrics=service_metrics)
+    grpc_server.start()
+    channel = grpc.insecure_channel(f"127.0.0.1:{port}")
+    yield service_metrics, notes_pb2_grpc.NoteServiceStub(channel)
+    channel.close()
+    grpc_server.stop(grace=None).wait()
+
+
+def test_interceptor_records_codes_and_latency(instrumented):
+    service_metrics, stub = instrumented
+    created = stub.CreateNote(notes_pb2.CreateNoteRequest(title="Metered"))
+    stub.GetNote(notes_pb2.GetNoteRequest(id=created.id))
+    with pytest.raises(grpc.RpcError):
+        stub.GetNote(notes_pb2.GetNoteRequest(id="non-existent-uuid"))
+    list(stub.StreamNotes(notes_pb2.ListNotesRequest()))
+
+    assert service_metrics.handled.value("GetNote", "OK") == 1
+    assert service_metrics.handled.value("GetNote", "NOT_FOUND") == 1
+    assert service_metrics.latency.count("GetNote") == 2
+    assert service_metrics.sent_bytes.count("StreamNotes") == 1
+    assert service_metrics.in_flight.value("GetNote") == 0
+    assert service_metrics.db_latency.count("put") == 1
+
+
+def test_client_cancel_is_counted_as_cancelled():
+    service_metrics = metrics.ServiceMetrics()
+    store = storage.MemoryNoteStore()
+    feed = changefeed.ChangeFeed(store, poll_interval=0.01).start()
+    grpc_server, port = server.create_server(store, address="127.0.0.1:0", service_metrics=service_metrics,
+                                             feed=feed)
+    grpc_server.start()
+    try:
+        with grpc.insecure_channel(f"127.0.0.1:{port}") as channel:
+            watch = notes_pb2_grpc.NoteServiceStub(channel).WatchNotes(notes_pb2.WatchNotesRequest())
+            deadline = time.time() + 5
+            while not service_metrics.in_flight.value("WatchNotes") and time.time() < deadline:
+                time.sleep(0.01)
+            watch.cancel()
+            while service_metrics.in_flight.value("WatchNotes") and time.time() < deadline:
+                time.sleep(0.01)
+    finally:
+        feed.stop()
+        grpc_server.stop(grace=None).wait()
+    assert service_metrics.handled.value("WatchNotes", "CANCELLED") == 1
+    assert service_metrics.handled.value("WatchNotes", "UNKNOWN") == 0
+
+
+def test_final_code_on_aio(mocker):
+    context = mocker.Mock(spec=grpc.aio.ServicerContext)
+    context.code.return_value = None
+    context.cancelled.return_value = False
+    assert metrics._final_code(context, asyncio.CancelledError()) == grpc.StatusCode.CANCELLED
+    assert metrics._final_code(context, ValueError("bug")) == grpc.StatusCode.UNKNOWN
+    assert metrics._final_code(context) is None
+    context.cancelled.return_value = True
+    assert metrics._final_code(context) == grpc.StatusCode.CANCELLED
+
+
+def test_metrics_endpoint(instrumented):
+    service_metrics, stub = instrumented
+    stub.ListNotes(notes_pb2.ListNotesRequest())
+    http_server = metrics.start_http_server(service_metrics.registry, 0, address="127.0.0.1")
+    try:
+        url = f"http://127.0.0.1:{http_server.server_address[1]}/metrics"
+        body = urllib.request.urlopen(url, timeout=5).read().decode()
+    finally:
+        http_server.shutdown()
+    assert 'grpc_server_handled_total{method="ListNotes",code="OK"} 1' in body
+    assert 'grpc_server_handling_seconds_bucket{method="ListNotes",le="+Inf"} 1' in body
+    assert "grpc_server_queue_depth 0" in body
+
+
+def test_sampling_filter_keeps_warnings():
+    drop_all = SamplingFilter(0.0)
+    info = logging.LogRecord("notes", logging.INFO, "", 0, "info", (), None)
+    warning = logging.LogRecord("notes", logging.WARNING, "", 0, "warning", (), None)
+    assert not drop_all.filter(info)
+    assert drop_all.filter(warning)
+
+
+def test_configure_logging_only_samples_request_logs():
+    root = logging.getLogger()
+    saved = root.handlers[:], root.level
+    stream = io.StringIO()
+    listener = configure_logging("INFO", sample_rate=0.0, stream=stream)
+    try:
+        logging.getLogger("notes.server").info("Note created")
+        logging.getLogger("notes.admin").info("Backup written")
+        logging.getLogger("notes.server").warning("Slow request")
+    finally:
+        listener.stop()
+        root.handlers[:], level = saved
+        root.setLevel(level)
+        logging.getLogger("notes.server").filters.clear()
+    messages = [json.loads(line)["msg"] for line in stream.getvalue().splitlines()]
+    assert messages == ["Backup written", "Slow request"]
+
+
+def test_aio_interceptor():
+    service_metrics = metrics.ServiceMetrics()
+
+    async def scenario():
+        executor = futures.ThreadPoolExecutor(max_workers=2)
+        grpc_server = grpc.aio.server(interceptors=[metrics.AioMetricsInterceptor(service_metrics)])
+        notes_pb2_grpc.add_NoteServiceServicer_to_server(
+            aio_server.AsyncNoteService(server.NoteService(storage.MemoryNoteStore()), executor), grpc_server)
+        port = grpc_server.add_insecure_port("127.0.0.1:0")
+        await grpc_server.start()
+        async with grpc.aio.insecure_channel(f"127.0.0.1:{port}") as channel:
+            stub = notes_pb2_grpc.NoteServiceStub(channel)
+            await stub.CreateNote(notes_pb2.CreateNoteRequest(title="Async metered"))
+            notes = [note async for note in stub.StreamNotes(notes_pb2.ListNotesRequest())]
+        await grpc_server.stop(None)
+        executor.shutdown()
+        return notes
+
+    assert len(asyncio.run(scenario())) == 1
+    assert service_metrics.handled.value("CreateNote", "OK") == 1
+    assert service_metrics.sent_bytes.count("StreamNotes") == 1
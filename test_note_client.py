@@ -0,0 +1,101 @@
+import asyncio
+
+import grpc
+import pytest
+
+import note_client
+import server
+import storage
+
+# These imports will fail in PyCharm but work in Docker
+import notes_pb2_grpc
+
+
+@pytest.fixture
+def target():
+    store = storage.MemoryNoteStore()
+    grpc_server, port = server.create_server(store, address="127.0.0.1:0")
+    grpc_server.start()
+    yield f"127.0.0.1:{port}"
+    grpc_server.stop(grace=None).wait()
+    store.close()
+
+
+def test_client_round_trip(target):
+    with note_client.NoteClient(target, pool_size=2) as client:
+        note_id = client.create("First", "one")
+        assert client.get(note_id).content == "one"
+        assert client.get(note_id, fields=["title"]).content == ""
+        assert client.update(note_id, content="two", expected_version=1).version == 2
+        with pytest.raises(grpc.RpcError) as conflict:
+            client.update(note_id, title="stale", expected_version=1)
+        assert conflict.value.code() == grpc.StatusCode.ABORTED
+        assert client.delete(note_id) is True
+        assert client.get(note_id) is None
+
+
+def test_client_pipelines_and_paginates(target):
+    with note_client.NoteClient(target) as client:
+        created = list(client.create_many(((f"Note {i}", "c") for i in range(25)), window=8))
+        assert len(set(created)) == 25
+        # Pages of 4 are fetched as the iterator is consumed
+        listed = list(client.list(page_size=4, order_by="created_at desc", fields=["title", "created_at"]))
+        assert sorted(note.id for note in listed) == sorted(created)
+        times = [note.created_at.ToMilliseconds() for note in listed]
+        assert times == sorted(times, reverse=True)
+        assert [note.id for note in client.stream()] == sorted(created)
+        assert {note.id for note in client.get_many(created[:3] + ["missing"])} == set(created[:3])
+        assert client.import_notes([("Imported", "x")] * 3) == 3
+        assert len([result for result in client.search("imported")]) == 3
+
+
+def test_client_tags_and_counts(target):
+    with note_client.NoteClient(target) as client:
+        note_id = client.create("Tagged", tags=["work", "urgent"], owner="alice")
+        client.import_notes([("Imported", "", ["work"], "bob", "inbox"), ("Plain", "")])
+        assert [note.title for note in client.list(tags=["work"], owner="alice", fields=["title"])] == ["Tagged"]
+        assert client.count(tags=["work"]) == 2
+        assert client.count(owner="bob", notebook="inbox") == 1
+        assert client.tags() == [("work", 2), ("urgent", 1)]
+        assert list(client.update(note_id, tags=[]).tags) == []
+        assert client.tags(owner="alice") == []
+
+
+def test_client_retries_unavailable_reads():
+    attempts = []
+
+    class FlakyService(server.NoteService):
+        def GetNote(self, request, context):
+            attempts.append(request.id)
+            if len(attempts) < 3:
+                context.abort(grpc.StatusCode.UNAVAILABLE, "try again")
+            return super().GetNote(request, context)
+
+    store = storage.MemoryNoteStore()
+    store.put("a", "Flaky", "content")
+    grpc_server = grpc.server(server.futures.ThreadPoolExecutor(max_workers=2))
+    notes_pb2_grpc.add_NoteServiceServicer_to_server(FlakyService(store), grpc_server)
+    port = grpc_server.add_insecure_port("127.0.0.1:0")
+    grpc_server.start()
+    try:
+        with note_client.NoteClient(f"127.0.0.1:{port}", pool_size=1) as client:
+            assert client.get("a").title == "Flaky"
+        assert attempts == ["a", "a", "a"]
+    finally:
+        grpc_server.stop(grace=None).wait()
+        store.close()
+
+
+def test_async_client(target):
+    async def scenario():
+        async with note_client.AsyncNoteClient(target, pool_size=2) as client:
+            created = await client.create_many([(f"Note {i}", "c") for i in range(10)], window=4)
+            listed = [note.id async for note in client.list(page_size=3)]
+            streamed = [note.id async for note in client.stream(fields=["title"])]
+            missing = await client.get("missing")
+            return created, listed, streamed, missing
+
+    created, listed, streamed, missing = asyncio.run(scenario())
+    assert listed == sorted(created)
+    assert streamed == sorted(created)
+    assert missing is None
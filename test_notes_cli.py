@@ -0,0 +1,67 @@
+import json
+
+import pytest
+
+import notes_cli
+import server
+import storage
+
+
+@pytest.fixture
+def target():
+    store = storage.MemoryNoteStore()
+    grpc_server, port = server.create_server(store, address="127.0.0.1:0")
+    grpc_server.start()
+    yield f"127.0.0.1:{port}"
+    grpc_server.stop(grace=None).wait()
+    store.close()
+
+
+def test_import_export_list_get(target, tmp_path, capsys):
+    source = tmp_path / "in.ndjson"
+    source.write_text('{"title": "One", "content": "first"}\n\n{"title": "Two"}\n', encoding="utf-8")
+    assert notes_cli.main(["--target", target, "import", str(source)]) == 0
+
+    exported = tmp_path / "out.ndjson"
+    assert notes_cli.main(["--target", target, "export", str(exported), "--order-by", "created_at"]) == 0
+    notes = [json.loads(line) for line in exported.read_text(encoding="utf-8").splitlines()]
+    assert [(note["title"], note["content"], note["version"]) for note in notes] == [("One", "first", 1),
+                                                                                   ("Two", "", 1)]
+    assert notes[0]["created_at"].endswith("Z")
+
+    capsys.readouterr()
+    assert notes_cli.main(["--target", target, "list", "--order-by", "created_at desc", "--limit", "1"]) == 0
+    assert [json.loads(line) for line in capsys.readouterr().out.splitlines()] == [
+        {"id": notes[1]["id"], "title": "Two"}]
+
+    assert notes_cli.main(["--target", target, "get", notes[0]["id"], "missing"]) == 1
+    out = capsys.readouterr()
+    assert json.loads(out.out)["content"] == "first"
+    assert "Not found: missing" in out.err
+
+
+def test_import_rejects_bad_lines(target, tmp_path, capsys):
+    source = tmp_path / "in.ndjson"
+    source.write_text('{"title": "One"}\n{"content": "no title"}\n', encoding="utf-8")
+    assert notes_cli.main(["--target", target, "import", str(source)]) == 1
+    assert "line 2" in capsys.readouterr().err
+
+
+def test_export_to_stdout(target, capsys):
+    assert notes_cli.main(["--target", target, "export"]) == 0
+    assert notes_cli.main(["--target", target, "export", "-"]) == 0
+    assert "Exported 0 notes" in capsys.readouterr().err
+
+
+def test_tags_survive_export_and_import(target, tmp_path, capsys):
+    source = tmp_path / "in.ndjson"
+    source.write_text('{"title": "One", "tags": ["Work"], "owner": "alice"}\n{"title": "Two"}\n', encoding="utf-8")
+    assert notes_cli.main(["--target", target, "import", str(source)]) == 0
+    exported = tmp_path / "out.ndjson"
+    assert notes_cli.main(["--target", target, "export", str(exported), "--tag", "work"]) == 0
+    [note] = [json.loads(line) for line in exported.read_text(encoding="utf-8").splitlines()]
+    assert (note["title"], note["tags"], note["owner"]) == ("One", ["work"], "alice")
+
+    capsys.readouterr()
+    assert notes_cli.main(["--target", target, "count", "--owner", "alice"]) == 0
+    assert capsys.readouterr().out == "1\n"
@@ -1,28 +1,31 @@
+import itertools
 import pytest
 import grpc
+import changefeed
 import server
+import sharding
 import database
 import notes_pb2
-import sqlite3
+import notes_pb2_grpc
+import storage
 from pytest_mock import MockerFixture
+from cache import LRUCache
 
-@pytest.fixture
-def service(monkeypatch, mocker: MockerFixture):
-    conn = sqlite3.connect(":memory:")
-    conn.row_factory = sqlite3.Row
-    create_table_query = """
-    CREATE TABLE IF NOT EXISTS notes (
-        id TEXT PRIMARY KEY,
-        title TEXT NOT NULL,
-        content TEXT
-    );
-    """
-    conn.execute(create_table_query)
-    conn.commit()
-    note_service = server.NoteService()
-    monkeypatch.setattr(note_service, "get_db_connection", lambda: conn)
+@pytest.fixture(params=["sqlite", "sqlite-group-commit", "memory", "sharded"])
+def service(request, tmp_path):
+    if request.param == "sharded":
+        store = sharding.open_sharded_store(str(tmp_path / "shards"), shards=3)
+    elif request.param.startswith("sqlite"):
+        pool = database.ConnectionPool(str(tmp_path / "notes.db"))
+        database.migrate(pool.get_connection())
+        store = storage.SQLiteNoteStore(pool)
+        if request.param == "sqlite-group-commit":
+            store = storage.GroupCommitStore(store)
+    else:
+        store = storage.MemoryNoteStore()
+    note_service = server.NoteService(store)
     yield note_service
-    conn.close()
+    store.close()
 
 # --- توابع تست ---
 
@@ -71,4 +74,437 @@ def test_delete_note_not_found(service: server.NoteService, mocker: MockerFixtur
     assert delete_res.success == False
     assert "Note ID not found" in delete_res.message
 
-# --- تست‌های Search حذف شدند ---
\ No newline at end of file
+# --- Search tests ---
+
+def test_search_notes(service: server.NoteService, mocker: MockerFixture):
+    mock_context = mocker.Mock()
+    service.CreateNote(notes_pb2.CreateNoteRequest(title="Shopping", content="milk and eggs"), mock_context)
+    service.CreateNote(notes_pb2.CreateNoteRequest(title="Meeting", content="discuss grpc rollout"), mock_context)
+    response = service.SearchNotes(notes_pb2.SearchNotesRequest(query="grpc"), mock_context)
+    assert [result.note.title for result in response.results] == ["Meeting"]
+    assert "[grpc]" in response.results[0].snippet
+
+
+def test_search_notes_paginated(service: server.NoteService, mocker: MockerFixture):
+    mock_context = mocker.Mock()
+    for i in range(3):
+        service.CreateNote(notes_pb2.CreateNoteRequest(title=f"Report {i}", content="quarterly"), mock_context)
+    first = service.SearchNotes(notes_pb2.SearchNotesRequest(query="quarterly", page_size=2), mock_context)
+    second = service.SearchNotes(notes_pb2.SearchNotesRequest(
+        query="quarterly", page_size=2, page_token=first.next_page_token), mock_context)
+    assert len(first.results) == 2
+    assert len(second.results) == 1
+    assert second.next_page_token == ""
+
+
+def test_search_rejects_out_of_range_offsets(service: server.NoteService, mocker: MockerFixture):
+    service.CreateNote(notes_pb2.CreateNoteRequest(title="Report", content="quarterly"), mocker.Mock())
+    for offset in (-1, server.MAX_SEARCH_OFFSET + 1):
+        mock_context = mocker.Mock()
+        response = service.SearchNotes(notes_pb2.SearchNotesRequest(
+            query="quarterly", page_token=server.encode_page_token(str(offset))), mock_context)
+        mock_context.set_code.assert_called_once_with(grpc.StatusCode.INVALID_ARGUMENT)
+        assert not response.results
+
+
+def test_search_sees_deletes(service: server.NoteService, mocker: MockerFixture):
+    mock_context = mocker.Mock()
+    create_res = service.CreateNote(notes_pb2.CreateNoteRequest(title="Ephemeral"), mock_context)
+    service.DeleteNote(notes_pb2.DeleteNoteRequest(id=create_res.id), mock_context)
+    response = service.SearchNotes(notes_pb2.SearchNotesRequest(query="ephemeral"), mock_context)
+    assert len(response.results) == 0
+
+
+def test_search_invalid_query(service: server.NoteService, mocker: MockerFixture):
+    if isinstance(service.store, storage.MemoryNoteStore):
+        pytest.skip("the memory store has no FTS query syntax")
+    mock_context = mocker.Mock()
+    service.SearchNotes(notes_pb2.SearchNotesRequest(query='"unbalanced'), mock_context)
+    mock_context.set_code.assert_called_with(grpc.StatusCode.INVALID_ARGUMENT)
+
+def test_list_notes_paginated(service: server.NoteService, mocker: MockerFixture):
+    mock_context = mocker.Mock()
+    for i in range(5):
+        service.CreateNote(notes_pb2.CreateNoteRequest(title=f"Note {i}"), mock_context)
+    seen = []
+    page_token = ""
+    while True:
+        page = service.ListNotes(notes_pb2.ListNotesRequest(page_size=2, page_token=page_token), mock_context)
+        assert len(page.notes) <= 2
+        seen.extend(note.id for note in page.notes)
+        page_token = page.next_page_token
+        if not page_token:
+            break
+    assert len(seen) == 5
+    assert seen == sorted(seen)
+
+
+
+def test_list_notes_by_created_at_desc(service: server.NoteService, mocker: MockerFixture):
+    mocker.patch("storage.now_ms", side_effect=itertools.count(1_000_000, 1000).__next__)
+    mock_context = mocker.Mock()
+    created = [service.CreateNote(notes_pb2.CreateNoteRequest(title=f"Note {i}"), mock_context).id
+               for i in range(5)]
+    seen = []
+    page_token = ""
+    while True:
+        page = service.ListNotes(notes_pb2.ListNotesRequest(page_size=2, page_token=page_token,
+                                                            order_by="created_at desc",
+                                                            read_mask={"paths": ["title"]}), mock_context)
+        # The cursor needs created_at, but the mask still applies to the response
+        assert all(not note.HasField("created_at") for note in page.notes)
+        seen.extend(note.id for note in page.notes)
+        page_token = page.next_page_token
+        if not page_token:
+            break
+    assert seen == created[::-1]
+
+
+def test_list_notes_time_ranges(service: server.NoteService, mocker: MockerFixture):
+    # Note i is created at second 1000 + i; note 0 is updated at second 1004
+    mocker.patch("storage.now_ms", side_effect=itertools.count(1_000_000, 1000).__next__)
+    mock_context = mocker.Mock()
+    created = [service.CreateNote(notes_pb2.CreateNoteRequest(title=f"Note {i}"), mock_context).id
+               for i in range(4)]
+    updated = service.UpdateNote(notes_pb2.UpdateNoteRequest(id=created[0], title="Edited"), mock_context).note
+    assert updated.updated_at.seconds == 1004 and updated.created_at.seconds == 1000
+
+    page = service.ListNotes(notes_pb2.ListNotesRequest(
+        created={"start": {"seconds": 1001}, "end": {"seconds": 1003}}), mock_context)
+    assert [note.id for note in page.notes] == created[1:3]
+
+    page = service.ListNotes(notes_pb2.ListNotesRequest(
+        order_by="updated_at", updated={"start": {"seconds": 1002}}, page_size=10), mock_context)
+    assert [note.id for note in page.notes] == [created[2], created[3], created[0]]
+    assert [note.updated_at.seconds for note in page.notes] == [1002, 1003, 1004]
+
+    streamed = service.StreamNotes(notes_pb2.ListNotesRequest(
+        order_by="created_at desc", created={"end": {"seconds": 1002}}), mock_context)
+    assert [note.id for note in streamed] == [created[1], created[0]]
+
+
+@pytest.mark.parametrize("order_by", ["title", "created_at sideways", "id asc desc"])
+def test_list_notes_invalid_order_by(service: server.NoteService, mocker: MockerFixture, order_by):
+    mock_context = mocker.Mock()
+    service.ListNotes(notes_pb2.ListNotesRequest(order_by=order_by), mock_context)
+    mock_context.set_code.assert_called_with(grpc.StatusCode.INVALID_ARGUMENT)
+
+def test_list_notes_invalid_page_token(service: server.NoteService, mocker: MockerFixture):
+    mock_context = mocker.Mock()
+    service.ListNotes(notes_pb2.ListNotesRequest(page_size=2, page_token="%%%"), mock_context)
+    mock_context.set_code.assert_called_with(grpc.StatusCode.INVALID_ARGUMENT)
+
+
+
+# --- Tags, owner and notebook ---
+
+def test_tags_owner_and_notebook(service: server.NoteService, mocker: MockerFixture):
+    mock_context = mocker.Mock()
+    work = service.CreateNote(notes_pb2.CreateNoteRequest(
+        title="Plan", tags=[" Work", "urgent", "work"], owner="alice", notebook="q3"), mock_context).id
+    service.BatchCreateNotes(notes_pb2.BatchCreateNotesRequest(notes=[
+        notes_pb2.CreateNoteRequest(title="Errands", tags=["home", "urgent"], owner="alice"),
+        notes_pb2.CreateNoteRequest(title="Review", tags=["work"], owner="bob"),
+        notes_pb2.CreateNoteRequest(title="Untagged", owner="alice"),
+    ]), mock_context)
+    note = service.GetNote(notes_pb2.GetNoteRequest(id=work), mock_context).note
+    assert list(note.tags) == ["urgent", "work"]
+    assert (note.owner, note.notebook) == ("alice", "q3")
+
+    def titles(**note_filter):
+        page = service.ListNotes(notes_pb2.ListNotesRequest(filter=note_filter, page_size=1), mock_context)
+        listed = [note.title for note in page.notes]
+        if page.next_page_token:
+            rest = service.ListNotes(notes_pb2.ListNotesRequest(filter=note_filter, page_token=page.next_page_token,
+                                                                page_size=10), mock_context)
+            listed += [note.title for note in rest.notes]
+        return sorted(listed)
+
+    assert titles(tags=["WORK"]) == ["Plan", "Review"]
+    assert titles(tags=["urgent", "work"]) == ["Plan"]
+    assert titles(tags=["work"], owner="alice") == ["Plan"]
+    assert titles(owner="alice") == ["Errands", "Plan", "Untagged"]
+    assert titles(owner="alice", notebook="q3") == ["Plan"]
+    assert titles(tags=["missing"]) == []
+    streamed = service.StreamNotes(notes_pb2.ListNotesRequest(filter={"tags": ["urgent"]}), mock_context)
+    assert sorted(note.title for note in streamed) == ["Errands", "Plan"]
+
+    count = service.CountNotes(notes_pb2.CountNotesRequest(filter={"tags": ["urgent"], "owner": "alice"}),
+                               mock_context)
+    assert count.count == 2
+    assert service.CountNotes(notes_pb2.CountNotesRequest(), mock_context).count == 4
+    tags = service.ListTags(notes_pb2.ListTagsRequest(), mock_context).tags
+    assert [(tag.tag, tag.note_count) for tag in tags] == [("urgent", 2), ("work", 2), ("home", 1)]
+    tags = service.ListTags(notes_pb2.ListTagsRequest(owner="bob"), mock_context).tags
+    assert [(tag.tag, tag.note_count) for tag in tags] == [("work", 1)]
+    mock_context.set_code.assert_not_called()
+
+
+def test_update_tags_and_owner(service: server.NoteService, mocker: MockerFixture):
+    mock_context = mocker.Mock()
+    note_id = service.CreateNote(notes_pb2.CreateNoteRequest(title="Move me", tags=["old"]), mock_context).id
+    updated = service.UpdateNote(notes_pb2.UpdateNoteRequest(
+        id=note_id, tags=["new", "shiny"], owner="carol", update_mask={"paths": ["tags", "owner"]}),
+        mock_context).note
+    assert list(updated.tags) == ["new", "shiny"] and updated.owner == "carol" and updated.title == "Move me"
+    # An empty mask still only changes title and content
+    updated = service.UpdateNote(notes_pb2.UpdateNoteRequest(id=note_id, title="Moved"), mock_context).note
+    assert list(updated.tags) == ["new", "shiny"] and updated.owner == "carol"
+
+    assert service.CountNotes(notes_pb2.CountNotesRequest(filter={"tags": ["old"]}), mock_context).count == 0
+    service.DeleteNote(notes_pb2.DeleteNoteRequest(id=note_id), mock_context)
+    assert service.CountNotes(notes_pb2.CountNotesRequest(filter={"tags": ["new"]}), mock_context).count == 0
+    assert list(service.ListTags(notes_pb2.ListTagsRequest(), mock_context).tags) == []
+
+
+@pytest.mark.parametrize("tags", [["x" * 65], [f"tag{i}" for i in range(33)], ["tab\there"]])
+def test_invalid_tags(service: server.NoteService, mocker: MockerFixture, tags):
+    mock_context = mocker.Mock()
+    service.CreateNote(notes_pb2.CreateNoteRequest(title="Bad", tags=tags), mock_context)
+    mock_context.set_code.assert_called_with(grpc.StatusCode.INVALID_ARGUMENT)
+    assert service.CountNotes(notes_pb2.CountNotesRequest(), mocker.Mock()).count == 0
+
+
+def test_stream_notes(service: server.NoteService, mocker: MockerFixture):
+    mock_context = mocker.Mock()
+    for i in range(3):
+        service.CreateNote(notes_pb2.CreateNoteRequest(title=f"Note {i}"), mock_context)
+    streamed = list(service.StreamNotes(notes_pb2.ListNotesRequest(page_size=1), mock_context))
+    assert len(streamed) == 3
+
+
+def test_batch_create_and_get_notes(service: server.NoteService, mocker: MockerFixture):
+    mock_context = mocker.Mock()
+    create_res = service.BatchCreateNotes(notes_pb2.BatchCreateNotesRequest(notes=[
+        notes_pb2.CreateNoteRequest(title="A"),
+        notes_pb2.CreateNoteRequest(title="B"),
+    ]), mock_context)
+    assert all(result.success for result in create_res.results)
+    ids = [result.id for result in create_res.results]
+
+    get_res = service.BatchGetNotes(notes_pb2.BatchGetNotesRequest(ids=ids + ["non-existent-uuid"]), mock_context)
+    assert [note.title for note in get_res.notes] == ["A", "B"]
+    assert list(get_res.missing_ids) == ["non-existent-uuid"]
+
+
+def test_batch_delete_notes(service: server.NoteService, mocker: MockerFixture):
+    mock_context = mocker.Mock()
+    create_res = service.CreateNote(notes_pb2.CreateNoteRequest(title="Delete Me"), mock_context)
+    delete_res = service.BatchDeleteNotes(
+        notes_pb2.BatchDeleteNotesRequest(ids=[create_res.id, "non-existent-uuid"]), mock_context)
+    assert [result.success for result in delete_res.results] == [True, False]
+    assert len(service.ListNotes(notes_pb2.ListNotesRequest(), mock_context).notes) == 0
+
+
+def test_batch_too_large(service: server.NoteService, mocker: MockerFixture):
+    mock_context = mocker.Mock()
+    ids = [str(i) for i in range(server.MAX_BATCH_SIZE + 1)]
+    service.BatchGetNotes(notes_pb2.BatchGetNotesRequest(ids=ids), mock_context)
+    mock_context.set_code.assert_called_with(grpc.StatusCode.INVALID_ARGUMENT)
+
+
+def test_import_notes(service: server.NoteService, mocker: MockerFixture):
+    mock_context = mocker.Mock()
+    notes = (notes_pb2.CreateNoteRequest(title=f"Imported {i}") for i in range(server.IMPORT_CHUNK_SIZE + 3))
+    response = service.ImportNotes(notes, mock_context)
+    assert response.imported_count == server.IMPORT_CHUNK_SIZE + 3
+    listed = service.ListNotes(notes_pb2.ListNotesRequest(), mock_context)
+    assert len(listed.notes) == server.IMPORT_CHUNK_SIZE + 3
+
+
+def test_get_note_uses_cache(service: server.NoteService, mocker: MockerFixture):
+    mock_context = mocker.Mock()
+    service.cache = LRUCache()
+    create_res = service.CreateNote(notes_pb2.CreateNoteRequest(title="Hot"), mock_context)
+    service.GetNote(notes_pb2.GetNoteRequest(id=create_res.id), mock_context)
+    response = service.GetNote(notes_pb2.GetNoteRequest(id=create_res.id), mock_context)
+    assert response.note.title == "Hot"
+    assert service.cache.stats()["hits"] == 1
+
+
+def test_delete_invalidates_cache(service: server.NoteService, mocker: MockerFixture):
+    mock_context = mocker.Mock()
+    service.cache = LRUCache()
+    create_res = service.CreateNote(notes_pb2.CreateNoteRequest(title="Soon Gone"), mock_context)
+    service.GetNote(notes_pb2.GetNoteRequest(id=create_res.id), mock_context)
+    service.DeleteNote(notes_pb2.DeleteNoteRequest(id=create_res.id), mock_context)
+    service.GetNote(notes_pb2.GetNoteRequest(id=create_res.id), mock_context)
+    mock_context.set_code.assert_called_with(grpc.StatusCode.NOT_FOUND)
+
+
+# --- UpdateNote / field mask tests ---
+
+def test_update_note_bumps_version(service: server.NoteService, mocker: MockerFixture):
+    mock_context = mocker.Mock()
+    create_res = service.CreateNote(notes_pb2.CreateNoteRequest(title="Draft", content="v1"), mock_context)
+    response = service.UpdateNote(notes_pb2.UpdateNoteRequest(
+        id=create_res.id, title="Final", expected_version=1, update_mask={"paths": ["title"]}), mock_context)
+    assert response.note.title == "Final"
+    assert response.note.content == "v1"
+    assert response.note.version == 2
+    assert service.GetNote(notes_pb2.GetNoteRequest(id=create_res.id), mock_context).note.version == 2
+
+
+def test_update_note_version_conflict(service: server.NoteService, mocker: MockerFixture):
+    mock_context = mocker.Mock()
+    create_res = service.CreateNote(notes_pb2.CreateNoteRequest(title="Shared"), mock_context)
+    service.UpdateNote(notes_pb2.UpdateNoteRequest(id=create_res.id, title="First writer", expected_version=1),
+                       mock_context)
+    service.UpdateNote(notes_pb2.UpdateNoteRequest(id=create_res.id, title="Second writer", expected_version=1),
+                       mock_context)
+    mock_context.set_code.assert_called_with(grpc.StatusCode.ABORTED)
+    assert service.GetNote(notes_pb2.GetNoteRequest(id=create_res.id), mock_context).note.title == "First writer"
+
+
+def test_update_note_not_found(service: server.NoteService, mocker: MockerFixture):
+    mock_context = mocker.Mock()
+    service.UpdateNote(notes_pb2.UpdateNoteRequest(id="non-existent-uuid", title="x"), mock_context)
+    mock_context.set_code.assert_called_with(grpc.StatusCode.NOT_FOUND)
+
+
+def test_update_note_invalidates_cache(service: server.NoteService, mocker: MockerFixture):
+    mock_context = mocker.Mock()
+    service.cache = LRUCache()
+    create_res = service.CreateNote(notes_pb2.CreateNoteRequest(title="Old"), mock_context)
+    service.GetNote(notes_pb2.GetNoteRequest(id=create_res.id), mock_context)
+    service.UpdateNote(notes_pb2.UpdateNoteRequest(id=create_res.id, title="New", content=""), mock_context)
+    assert service.GetNote(notes_pb2.GetNoteRequest(id=create_res.id), mock_context).note.title == "New"
+
+
+def test_read_mask_skips_content(service: server.NoteService, mocker: MockerFixture):
+    mock_context = mocker.Mock()
+    big = "x" * 100_000
+    create_res = service.CreateNote(notes_pb2.CreateNoteRequest(title="Big", content=big), mock_context)
+    title_only = {"paths": ["title"]}
+
+    note = service.GetNote(notes_pb2.GetNoteRequest(id=create_res.id, read_mask=title_only), mock_context).note
+    assert (note.id, note.title, note.content) == (create_res.id, "Big", "")
+
+    full = service.ListNotes(notes_pb2.ListNotesRequest(), mock_context)
+    listed = service.ListNotes(notes_pb2.ListNotesRequest(read_mask=title_only), mock_context)
+    assert listed.notes[0].title == "Big" and listed.notes[0].content == ""
+    assert listed.ByteSize() * 1000 < full.ByteSize()
+    streamed = list(service.StreamNotes(notes_pb2.ListNotesRequest(read_mask=title_only), mock_context))
+    assert streamed[0].content == ""
+
+
+def test_read_mask_unknown_field(service: server.NoteService, mocker: MockerFixture):
+    mock_context = mocker.Mock()
+    service.ListNotes(notes_pb2.ListNotesRequest(read_mask={"paths": ["author"]}), mock_context)
+    mock_context.set_code.assert_called_with(grpc.StatusCode.INVALID_ARGUMENT)
+
+
+# --- WatchNotes tests ---
+
+def test_watch_notes_resumes_from_list_change_seq(service: server.NoteService, mocker: MockerFixture):
+    mock_context = mocker.Mock()
+    mock_context.is_active.return_value = True
+    service.feed = changefeed.ChangeFeed(service.store, poll_interval=0.01).start()
+    try:
+        service.CreateNote(notes_pb2.CreateNoteRequest(title="Before"), mock_context)
+        change_seq = service.ListNotes(notes_pb2.ListNotesRequest(), mock_context).change_seq
+        created = service.CreateNote(notes_pb2.CreateNoteRequest(title="After"), mock_context)
+        service.DeleteNote(notes_pb2.DeleteNoteRequest(id=created.id), mock_context)
+
+        watch = service.WatchNotes(notes_pb2.WatchNotesRequest(after_seq=change_seq), mock_context)
+        events = list(itertools.islice(watch, 2))
+        watch.close()
+    finally:
+        service.feed.stop()
+    assert [(event.type, event.note_id) for event in events] == [
+        (notes_pb2.NoteEvent.CREATED, created.id), (notes_pb2.NoteEvent.DELETED, created.id)]
+    assert events[1].seq > events[0].seq > change_seq
+
+
+def test_watch_notes_from_an_empty_change_log(service: server.NoteService, mocker: MockerFixture):
+    mock_context = mocker.Mock()
+    mock_context.is_active.return_value = True
+    service.feed = changefeed.ChangeFeed(service.store, poll_interval=0.01).start()
+    try:
+        change_seq = service.ListNotes(notes_pb2.ListNotesRequest(), mock_context).change_seq
+        # Written between the listing and the watch; seq 0 must still resume, not mean "from now"
+        created = service.CreateNote(notes_pb2.CreateNoteRequest(title="Meanwhile"), mock_context)
+        watch = service.WatchNotes(notes_pb2.WatchNotesRequest(after_seq=change_seq), mock_context)
+        event = next(watch)
+        watch.close()
+    finally:
+        service.feed.stop()
+    assert (event.type, event.note_id) == (notes_pb2.NoteEvent.CREATED, created.id)
+
+
+def test_watch_notes_caps_concurrent_watchers(service: server.NoteService, mocker: MockerFixture):
+    mock_context = mocker.Mock()
+    mock_context.is_active.return_value = True
+    feed = changefeed.ChangeFeed(service.store, poll_interval=0.01).start()
+    capped = server.NoteService(service.store, feed=feed, max_watchers=1)
+    try:
+        first = capped.WatchNotes(notes_pb2.WatchNotesRequest(after_seq=0), mock_context)
+        service.CreateNote(notes_pb2.CreateNoteRequest(title="Hello"), mock_context)
+        next(first)
+        # Rejected up front rather than waiting for a worker thread
+        assert list(capped.WatchNotes(notes_pb2.WatchNotesRequest(), mock_context)) == []
+        mock_context.set_code.assert_called_once_with(grpc.StatusCode.RESOURCE_EXHAUSTED)
+        first.close()
+        second = capped.WatchNotes(notes_pb2.WatchNotesRequest(after_seq=0), mock_context)
+        assert next(second).type == notes_pb2.NoteEvent.CREATED
+        second.close()
+    finally:
+        feed.stop()
+
+
+def test_watch_notes_pruned_resume_point(service: server.NoteService, mocker: MockerFixture):
+    mock_context = mocker.Mock()
+    service.feed = changefeed.ChangeFeed(service.store)
+    for i in range(3):
+        service.CreateNote(notes_pb2.CreateNoteRequest(title=f"Note {i}"), mock_context)
+    service.store.prune_changes(keep=1)
+    list(service.WatchNotes(notes_pb2.WatchNotesRequest(after_seq=1), mock_context))
+    mock_context.set_code.assert_called_with(grpc.StatusCode.OUT_OF_RANGE)
+
+
+# --- Large content tests ---
+
+def test_read_note_content_in_chunks(service: server.NoteService, mocker: MockerFixture):
+    mock_context = mocker.Mock()
+    content = "ünïcödé " * 5000
+    created = service.CreateNote(notes_pb2.CreateNoteRequest(title="Huge", content=content), mock_context)
+    chunks = list(service.ReadNoteContent(notes_pb2.ReadNoteContentRequest(id=created.id, chunk_size=1000),
+                                          mock_context))
+    assert len(chunks) > 1
+    assert chunks[0].note.title == "Huge" and chunks[0].total_size == len(content.encode())
+    assert not chunks[1].HasField("note")
+    assert b"".join(chunk.data for chunk in chunks).decode() == content
+
+
+def test_read_note_content_not_found(service: server.NoteService, mocker: MockerFixture):
+    mock_context = mocker.Mock()
+    assert list(service.ReadNoteContent(notes_pb2.ReadNoteContentRequest(id="non-existent-uuid"), mock_context)) == []
+    mock_context.set_code.assert_called_with(grpc.StatusCode.NOT_FOUND)
+
+
+def test_gzip_channel_round_trip(service: server.NoteService):
+    grpc_server, port = server.create_server(service.store, address="127.0.0.1:0",
+                                             compression=grpc.Compression.Gzip)
+    grpc_server.start()
+    try:
+        with grpc.insecure_channel(f"127.0.0.1:{port}", compression=grpc.Compression.Gzip) as channel:
+            stub = notes_pb2_grpc.NoteServiceStub(channel)
+            created = stub.CreateNote(notes_pb2.CreateNoteRequest(title="Zipped", content="z" * 100_000))
+            assert stub.GetNote(notes_pb2.GetNoteRequest(id=created.id)).note.content == "z" * 100_000
+    finally:
+        grpc_server.stop(grace=None).wait()
+
+
+def test_admin_service_is_opt_in():
+    store = storage.MemoryNoteStore()
+    for admin_service, expected in [(False, grpc.StatusCode.UNIMPLEMENTED), (True, grpc.StatusCode.INVALID_ARGUMENT)]:
+        grpc_server, port = server.create_server(store, address="127.0.0.1:0", admin_service=admin_service)
+        grpc_server.start()
+        try:
+            with grpc.insecure_channel(f"127.0.0.1:{port}") as channel:
+                stub = notes_pb2_grpc.AdminServiceStub(channel)
+                with pytest.raises(grpc.RpcError) as error:
+                    stub.Backup(notes_pb2.BackupRequest(name="../outside.db"))
+                assert error.value.code() == expected
+        finally:
+            grpc_server.stop(grace=None).wait()
@@ -0,0 +1,192 @@
+import json
+import threading
+
+import grpc
+import pytest
+from pytest_mock import MockerFixture
+
+import admin
+import ids
+import sharding
+import storage
+
+# These imports will fail in PyCharm but work in Docker
+import notes_pb2
+
+new_id = ids.generator()
+
+
+@pytest.fixture
+def shard_dir(tmp_path):
+    return str(tmp_path / "shards")
+
+
+def _fill(store, count, start=0):
+    note_ids = [new_id() for _ in range(count)]
+    store.put_many([(note_id, f"Note {start + i}", "text") for i, note_id in enumerate(note_ids)])
+    return note_ids
+
+
+def _where(store, note_id):
+    return [index for index, shard in enumerate(store.shards) if shard.get(note_id) is not None]
+
+
+def test_hash_ring_only_moves_ids_to_the_new_shard():
+    note_ids = [new_id() for _ in range(5000)]
+    four, five = sharding.HashRing(4), sharding.HashRing(5)
+    moved = [note_id for note_id in note_ids if four.shard_for(note_id) != five.shard_for(note_id)]
+    assert all(five.shard_for(note_id) == 4 for note_id in moved)
+    assert 0.1 < len(moved) / len(note_ids) < 0.3  # about 1/5
+
+    sizes = [0] * 4
+    for note_id in note_ids:
+        sizes[four.shard_for(note_id)] += 1
+    assert min(sizes) > len(note_ids) / 4 * 0.6
+
+
+def test_notes_live_on_their_shard(shard_dir):
+    store = sharding.open_sharded_store(shard_dir, shards=3)
+    try:
+        note_ids = _fill(store, 30)
+        for note_id in note_ids:
+            assert _where(store, note_id) == [store.ring.shard_for(note_id)]
+        assert len({store.ring.shard_for(note_id) for note_id in note_ids}) == 3
+        assert set(store.get_many(note_ids)) == set(note_ids)
+        assert store.delete_many(note_ids[:10] + ["missing"]) == set(note_ids[:10])
+        assert store.count() == 20
+    finally:
+        store.close()
+
+
+def test_listings_merge_shards_in_order(shard_dir):
+    store = sharding.open_sharded_store(shard_dir, shards=3)
+    try:
+        note_ids = _fill(store, 40)
+        assert [note.id for note in store.scan()] == sorted(note_ids)
+        assert [note.id for note in store.scan(after_id=sorted(note_ids)[9], limit=5)] == sorted(note_ids)[10:15]
+
+        # The sort key isn't among the fields asked for, and doesn't come back
+        page = list(store.scan_sorted("created_at", descending=True, limit=15, fields=["title"]))
+        assert len(page) == 15 and not page[0].HasField("created_at")
+        last = store.get(page[-1].id)
+        rest = list(store.scan_sorted("created_at", descending=True,
+                                      after=(last.created_at.ToMilliseconds(), last.id)))
+        ordered = [store.get(note.id) for note in page] + rest
+        keys = [(note.created_at.ToMilliseconds(), note.id) for note in ordered]
+        assert keys == sorted(keys, reverse=True) and len(ordered) == 40
+    finally:
+        store.close()
+
+
+def test_reshard_while_writing(shard_dir):
+    store = sharding.open_sharded_store(shard_dir, shards=2)
+    note_ids = _fill(store, 300)
+    _, seq_before = store.change_bounds()
+    written = []
+    stop = threading.Event()
+
+    def writer():
+        while not stop.is_set():
+            written.extend(_fill(store, 5))
+            store.update(note_ids[len(written) % 300], title="Updated")
+
+    thread = threading.Thread(target=writer)
+    thread.start()
+    try:
+        moved = store.reshard(3, batch_size=50)
+    finally:
+        stop.set()
+        thread.join()
+    try:
+        assert 0 < moved < 300
+        assert not store.resharding
+        for note_id in note_ids + written:
+            assert _where(store, note_id) == [store.ring.shard_for(note_id)]
+        assert store.count() == 300 + len(written)
+
+        # Watchers only see the writer's changes, not the moves
+        kinds = [kind for _, kind, _, _ in store.changes(seq_before, 100_000)]
+        assert kinds.count("create") == len(written) and "delete" not in kinds
+        _, seq_after = store.change_bounds()
+    finally:
+        store.close()
+
+    with open(f"{shard_dir}/manifest.json") as f:
+        assert json.load(f)["shards"] == 3
+    reopened = sharding.open_sharded_store(shard_dir, shards=2)
+    try:
+        assert reopened.ring.shards == 3
+        assert reopened.change_bounds()[0] > seq_after  # seqs don't restart
+        assert set(reopened.get_many(note_ids)) == set(note_ids)
+    finally:
+        reopened.close()
+
+
+def test_reshard_down_to_one_shard(shard_dir):
+    store = sharding.open_sharded_store(shard_dir, shards=3)
+    try:
+        note_ids = _fill(store, 50)
+        assert store.reshard(1) == len([n for n in note_ids if sharding.HashRing(3).shard_for(n) != 0])
+        assert len(store.shards) == 1 and store.count() == 50
+        assert [note.id for note in store.scan()] == sorted(note_ids)
+    finally:
+        store.close()
+
+
+def test_interrupted_reshard_resumes_on_start(shard_dir):
+    store = sharding.open_sharded_store(shard_dir, shards=2)
+    note_ids = _fill(store, 100)
+    store.close()
+    # As if the server stopped right after the reshard began
+    with open(f"{shard_dir}/manifest.json", "w") as f:
+        json.dump({"shards": 3, "resharding_from": 2}, f)
+
+    store = sharding.open_sharded_store(shard_dir)
+    try:
+        assert set(store.get_many(note_ids)) == set(note_ids)  # found wherever they are
+        store._resume_thread.join()
+        assert not store.resharding
+        for note_id in note_ids:
+            assert _where(store, note_id) == [store.ring.shard_for(note_id)]
+    finally:
+        store.close()
+
+
+def test_admin_reshard(shard_dir, mocker: MockerFixture):
+    store = sharding.open_sharded_store(shard_dir, shards=2)
+    try:
+        _fill(store, 20)
+        service = admin.AdminService(store)
+        response = service.Reshard(notes_pb2.ReshardRequest(shards=4), mocker.Mock())
+        assert response.shards == 4 and response.moved_notes > 0
+
+        mock_context = mocker.Mock()
+        service.Reshard(notes_pb2.ReshardRequest(shards=0), mock_context)
+        mock_context.set_code.assert_called_once_with(grpc.StatusCode.INVALID_ARGUMENT)
+    finally:
+        store.close()
+
+    mock_context = mocker.Mock()
+    admin.AdminService(storage.MemoryNoteStore()).Reshard(notes_pb2.ReshardRequest(shards=2), mock_context)
+    mock_context.set_code.assert_called_once_with(grpc.StatusCode.UNIMPLEMENTED)
+
+
+def test_a_note_caught_mid_move_counts_once(shard_dir, mocker: MockerFixture):
+    store = sharding.open_sharded_store(shard_dir, shards=2)
+    try:
+        note_ids = _fill(store, 10)
+        # As if a move had copied the note to its new shard but not yet deleted the old copy
+        store._old_ring = sharding.HashRing(2)
+        moving = store.get(note_ids[0])
+        store.shards[1 - _where(store, moving.id)[0]].restore_many([moving])
+
+        assert store.count() == 10
+        assert sorted(result[0].id for result in store.search("Note", 20)) == sorted(note_ids)
+        with pytest.raises(sharding.ReshardInProgressError):
+            store.backup(f"{shard_dir}-backup")
+        mock_context = mocker.Mock()
+        admin.AdminService(store, backup_dir=f"{shard_dir}-backups").Backup(notes_pb2.BackupRequest(), mock_context)
+        mock_context.set_code.assert_called_once_with(grpc.StatusCode.FAILED_PRECONDITION)
+    finally:
+        store._old_ring = None
+        store.close()
@@ -0,0 +1,85 @@
+import io
+import sqlite3
+import threading
+
+import pytest
+
+import database
+import snapshot
+import storage
+
+
+def sqlite_store(path):
+    database.init_db(db_name=str(path))
+    return storage.SQLiteNoteStore(database.ConnectionPool(str(path)), compress_threshold=1024)
+
+
+def test_snapshot_round_trip_keeps_ids_versions_and_times(tmp_path):
+    source = sqlite_store(tmp_path / "source.db")
+    source.put_many([("a", "First", "x" * 5000), ("b", "Second", "short", ("work",), "alice", "q3")])
+    source.update("a", title="Edited")
+    buffer = io.BytesIO()
+    assert snapshot.export_snapshot(source, buffer) == 2
+
+    for target in (sqlite_store(tmp_path / "copy.db"), storage.MemoryNoteStore()):
+        target.put("b", "Stale", "replaced by the snapshot")
+        header, count = snapshot.import_snapshot(target, io.BytesIO(buffer.getvalue()), batch_size=1)
+        assert count == 2
+        assert header.change_seq == source.change_bounds()[1]
+        assert list(target.scan()) == list(source.scan())
+        assert target.get("a").version == 2
+        assert target.tag_counts() == [("work", 1)]
+        target.close()
+    source.close()
+
+
+@pytest.mark.parametrize("data", [b"", b"NOTPSNAP", b"NOTESNAP", b"NOTESNAP\x05ab"])
+def test_snapshot_rejects_bad_files(data):
+    with pytest.raises(snapshot.SnapshotError):
+        header, notes = snapshot.read_snapshot(io.BytesIO(data))
+        list(notes)
+
+
+def test_backup_is_consistent_while_writers_run(tmp_path):
+    store = sqlite_store(tmp_path / "notes.db")
+    store.put_many([(f"seed-{i}", "t", "c" * 200) for i in range(5000)])
+    stop = threading.Event()
+
+    def write():
+        i = 0
+        while not stop.is_set():
+            store.put(f"live-{i}", "t", "c")
+            i += 1
+
+    writer = threading.Thread(target=write)
+    writer.start()
+    try:
+        # Small steps, so writers commit many times while the copy runs
+        pages = database.backup(store.pool.db_name, str(tmp_path / "copy.db"), step_pages=8)
+    finally:
+        stop.set()
+        writer.join()
+    assert pages > 8
+    copy = sqlite3.connect(str(tmp_path / "copy.db"))
+    assert copy.execute("PRAGMA integrity_check").fetchone()[0] == "ok"
+    assert copy.execute("SELECT COUNT(*) FROM notes WHERE id LIKE 'seed-%'").fetchone()[0] == 5000
+    copy.close()
+    with pytest.raises(FileExistsError):
+        database.backup(store.pool.db_name, str(tmp_path / "copy.db"))
+    store.close()
+
+
+def test_cli_export_import_and_backup(tmp_path):
+    source = sqlite_store(tmp_path / "source.db")
+    source.put_many([("a", "First", "one"), ("b", "Second", "two")])
+    source.close()
+    source_db, replica_db = str(tmp_path / "source.db"), str(tmp_path / "replica.db")
+    snap = str(tmp_path / "notes.snap.gz")
+    assert snapshot.main(["--db", source_db, "export", snap]) == 0
+    assert snapshot.main(["--db", replica_db, "import", snap]) == 0
+    assert snapshot.main(["--db", source_db, "backup", str(tmp_path / "backup.db")]) == 0
+    assert snapshot.main(["--db", source_db, "backup", str(tmp_path / "backup.db")]) == 1
+    for path in (replica_db, str(tmp_path / "backup.db")):
+        copy = sqlite_store(path)
+        assert [note.title for note in copy.scan()] == ["First", "Second"]
+        copy.close()
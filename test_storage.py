@@ -0,0 +1,207 @@
+import json
+import sqlite3
+import threading
+
+import pytest
+
+import database
+import storage
+
+
+def test_memory_store_log_replay(tmp_path):
+    log_path = str(tmp_path / "notes.log")
+    store = storage.MemoryNoteStore(log_path=log_path)
+    store.put_many([("a", "First", "one"), ("b", "Second", "two")])
+    store.delete("a")
+    store.close()
+
+    reopened = storage.MemoryNoteStore(log_path=log_path)
+    assert reopened.get("a") is None
+    assert reopened.get("b").title == "Second"
+    reopened.close()
+
+
+def test_memory_store_compact(tmp_path):
+    log_path = tmp_path / "notes.log"
+    store = storage.MemoryNoteStore(log_path=str(log_path))
+    for i in range(10):
+        store.put(str(i), f"Note {i}", "")
+    store.delete_many([str(i) for i in range(9)])
+    store.compact()
+    assert len(log_path.read_text().splitlines()) == 1
+    store.put("x", "After compaction", "")
+    store.close()
+
+    reopened = storage.MemoryNoteStore(log_path=str(log_path))
+    assert sorted(note.id for note in reopened.scan()) == ["9", "x"]
+    reopened.close()
+
+
+def test_memory_store_compacts_log_automatically(tmp_path, monkeypatch):
+    monkeypatch.setattr(storage, "LOG_COMPACT_MIN_ENTRIES", 10)
+    log_path = tmp_path / "notes.log"
+    store = storage.MemoryNoteStore(log_path=str(log_path))
+    store.put("a", "Hot", "v1")
+    for i in range(100):
+        store.update("a", content=f"v{i + 2}")
+    # Never more than ratio * 10 entries for a single live note
+    assert len(log_path.read_text().splitlines()) <= storage.LOG_COMPACT_RATIO * 10
+    store.close()
+
+    with open(log_path, "a") as log:
+        log.writelines(json.dumps({"op": "del", "id": str(i)}) + "\n" for i in range(100))
+    reopened = storage.MemoryNoteStore(log_path=str(log_path))
+    assert len(log_path.read_text().splitlines()) == 1  # compacted after replay
+    assert reopened.get("a").content == "v101"
+    reopened.close()
+
+
+def test_memory_store_ignores_torn_log_tail(tmp_path):
+    log_path = tmp_path / "notes.log"
+    store = storage.MemoryNoteStore(log_path=str(log_path))
+    store.put("a", "Kept", "")
+    store.close()
+    with open(log_path, "a") as log:
+        log.write('{"op": "put", "id": "b", "ti')
+
+    reopened = storage.MemoryNoteStore(log_path=str(log_path))
+    assert [note.id for note in reopened.scan()] == ["a"]
+    reopened.put("c", "Written after recovery", "")
+    reopened.close()
+
+    again = storage.MemoryNoteStore(log_path=str(log_path))
+    assert [note.id for note in again.scan()] == ["a", "c"]
+    again.close()
+
+
+def test_memory_store_concurrent_writers():
+    store = storage.MemoryNoteStore(stripes=4)
+
+    def write(worker):
+        store.put_many([(f"{worker}-{i}", "t", "c") for i in range(200)])
+
+    threads = [threading.Thread(target=write, args=(worker,)) for worker in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert len(list(store.scan())) == 8 * 200
+    assert len(list(store.scan(limit=5))) == 5
+
+
+def test_memory_store_log_keeps_versions(tmp_path):
+    log_path = str(tmp_path / "notes.log")
+    store = storage.MemoryNoteStore(log_path=log_path)
+    store.put("a", "First", "one")
+    before = store.update("a", content="two", expected_version=1)
+    store.close()
+
+    reopened = storage.MemoryNoteStore(log_path=log_path)
+    note = reopened.get("a")
+    assert (note.content, note.version) == ("two", 2)
+    assert (note.created_at, note.updated_at) == (before.created_at, before.updated_at)
+    reopened.close()
+
+
+def test_memory_store_log_keeps_tags(tmp_path):
+    log_path = str(tmp_path / "notes.log")
+    store = storage.MemoryNoteStore(log_path=log_path)
+    store.put("a", "Tagged", "", tags=("work", "home"), owner="alice", notebook="q3")
+    store.update("a", tags=("home",))
+    store.close()
+
+    reopened = storage.MemoryNoteStore(log_path=log_path)
+    note = reopened.get("a")
+    assert (list(note.tags), note.owner, note.notebook) == (["home"], "alice", "q3")
+    assert reopened.tag_counts() == [("home", 1)]
+    reopened.close()
+
+
+def test_sqlite_store_compresses_large_content(tmp_path):
+    pool = database.ConnectionPool(str(tmp_path / "notes.db"))
+    database.migrate(pool.get_connection())
+    store = storage.SQLiteNoteStore(pool, compress_threshold=1024)
+    big = "searchable words repeated " * 1000
+    store.put_many([("big", "Big", big), ("small", "Small", "searchable but short")])
+    rows = dict(pool.get_connection().execute("SELECT id, compressed FROM notes").fetchall())
+    assert rows == {"big": 1, "small": 0}
+    assert store.get("big").content == big
+    assert store.scan(fields=["content"]).__next__().content == big
+
+    # The full-text index sees the decompressed text
+    assert sorted(note.id for note, _, _ in store.search("searchable", 10)) == ["big", "small"]
+    store.update("big", content="tiny now")
+    assert [note.id for note, _, _ in store.search("repeated", 10)] == []
+    assert [note.id for note, _, _ in store.search("tiny", 10)] == ["big"]
+    store.close()
+
+
+def test_search_only_blames_the_query_for_fts_errors(tmp_path, monkeypatch):
+    pool = database.ConnectionPool(str(tmp_path / "notes.db"))
+    database.migrate(pool.get_connection())
+    store = storage.SQLiteNoteStore(pool)
+    for query in ('"unbalanced', "nocolumn:word", "AND"):
+        with pytest.raises(storage.InvalidQueryError):
+            store.search(query, 10)
+
+    class FailingConnection:
+        def execute(self, *args):
+            raise sqlite3.OperationalError("disk I/O error")
+
+    monkeypatch.setattr(store, "get_db_connection", FailingConnection)
+    with pytest.raises(storage.StorageError) as excinfo:
+        store.search("words", 10)
+    assert not isinstance(excinfo.value, storage.InvalidQueryError)
+    store.close()
+
+
+def test_group_commit_batches_concurrent_writes(tmp_path):
+    pool = database.ConnectionPool(str(tmp_path / "notes.db"))
+    database.migrate(pool.get_connection())
+    store = storage.GroupCommitStore(storage.SQLiteNoteStore(pool), max_delay=0.02)
+
+    def write(worker):
+        for i in range(20):
+            store.put(f"{worker}-{i}", "t", "c")
+
+    threads = [threading.Thread(target=write, args=(worker,)) for worker in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert len(list(store.scan())) == 8 * 20
+    stats = store.stats()
+    assert stats["writes"] == 8 * 20
+    assert stats["batches"] < stats["writes"]
+    store.close()
+
+
+def test_group_commit_isolates_failing_writes(tmp_path):
+    pool = database.ConnectionPool(str(tmp_path / "notes.db"))
+    database.migrate(pool.get_connection())
+    store = storage.GroupCommitStore(storage.SQLiteNoteStore(pool))
+    store.put("a", "First", "one")
+
+    with pytest.raises(storage.StorageError):
+        store.put("a", "Duplicate", "two")
+    with pytest.raises(storage.VersionConflictError):
+        store.update("a", content="stale", expected_version=5)
+    assert store.update("a", content="fresh", expected_version=1).version == 2
+    assert store.delete("a") is True
+    assert store.delete("a") is False
+    store.close()
+    with pytest.raises(storage.StorageError):
+        store.put("b", "Closed", "store")
+
+
+def test_tag_filters_use_indexes(tmp_path):
+    store = storage.SQLiteNoteStore(database.ConnectionPool(str(tmp_path / "notes.db")))
+    database.migrate(store.get_db_connection())
+    source, id_column, conditions, params = store._filter(tags=("work",))
+    plan = " ".join(row[3] for row in store.get_db_connection().execute(
+        f"EXPLAIN QUERY PLAN SELECT notes.id FROM {source} WHERE {' AND '.join(conditions)} ORDER BY {id_column}",
+        params))
+    # Only the tag's range of note_tags is read, already in id order
+    assert "SEARCH first_tag USING PRIMARY KEY (tag_id=?)" in plan
+    assert "SCAN" not in plan and "TEMP B-TREE" not in plan
+    store.close()
@@ -0,0 +1,141 @@
+import asyncio
+import socket
+import threading
+import time
+
+import grpc
+import pytest
+
+import server
+import supervisor
+
+# These imports will fail in PyCharm but work in Docker
+import notes_pb2
+import notes_pb2_grpc
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def wait_until(predicate, timeout=20.0):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        if predicate():
+            return True
+        time.sleep(0.1)
+    return False
+
+
+@pytest.fixture
+def running(tmp_path):
+    port = free_port()
+    args = server.build_parser().parse_args([
+        "--workers", "2", "--port", str(port), "--db", str(tmp_path / "notes.db"),
+        "--metrics-port", "0", "--no-cache",
+    ])
+    sup = supervisor.Supervisor(args)
+    sup.start()
+    assert wait_until(lambda: all(worker.beat.value for worker in sup.workers))
+    yield sup, port
+    sup.stop()
+
+
+def test_workers_share_port_and_database(running):
+    sup, port = running
+    with grpc.insecure_channel(f"127.0.0.1:{port}") as channel:
+        stub = notes_pb2_grpc.NoteServiceStub(channel)
+        grpc.channel_ready_future(channel).result(timeout=10)
+        created = stub.CreateNote(notes_pb2.CreateNoteRequest(title="Shared"))
+    # A fresh connection may land on the other worker; the note must still be there
+    with grpc.insecure_channel(f"127.0.0.1:{port}") as channel:
+        stub = notes_pb2_grpc.NoteServiceStub(channel)
+        assert stub.GetNote(notes_pb2.GetNoteRequest(id=created.id)).note.title == "Shared"
+    assert all(status["healthy"] for status in sup.status())
+
+
+def test_liveness_tells_busy_from_wedged():
+    liveness = server.Liveness()
+    executor = server.CountingExecutor(max_workers=1)
+    liveness.watch_executor(executor)
+    assert not liveness.making_progress()  # not serving yet
+    liveness.serving = True
+    assert liveness.making_progress()  # idle
+
+    # Busy: the queue is backed up but calls keep finishing
+    release = threading.Event()
+    for _ in range(8):
+        executor.submit(release.wait, 0.1)
+    for _ in range(2):
+        time.sleep(0.15)
+        assert executor._work_queue.qsize() and liveness.making_progress()
+
+    release.set()
+
+    # Wedged: the only thread never returns, with work queued behind it
+    stuck = threading.Event()
+    executor.submit(stuck.wait)
+    executor.submit(time.sleep, 0)
+    time.sleep(0.2)
+    liveness.making_progress()
+    assert not liveness.making_progress()
+    stuck.set()
+    executor.shutdown(wait=True)
+    assert liveness.making_progress()
+    liveness.serving = False
+    assert not liveness.making_progress()
+
+
+def test_liveness_notices_a_blocked_event_loop():
+    liveness = server.Liveness()
+    loop = asyncio.new_event_loop()
+    liveness.watch_loop(loop)
+    liveness.serving = True
+    try:
+        assert liveness.making_progress()
+        assert not liveness.making_progress()  # the loop isn't running, so the tick never ran
+        loop.run_until_complete(asyncio.sleep(0))
+        assert liveness.making_progress()
+    finally:
+        loop.close()
+    assert not liveness.making_progress()
+
+
+def test_dead_worker_is_replaced(running):
+    sup, _ = running
+    victim = sup.workers[0]
+    victim.process.kill()
+    victim.process.join()
+    sup.check_workers()
+    assert sup.workers[0] is not victim
+    assert wait_until(lambda: sup.workers[0].beat.value)
+    assert all(status["alive"] for status in sup.status())
+
+
+def test_workers_read_each_others_writes(tmp_path):
+    port = free_port()
+    args = server.build_parser().parse_args([
+        "--workers", "2", "--port", str(port), "--db", str(tmp_path / "notes.db"), "--metrics-port", "0",
+    ])
+    sup = supervisor.Supervisor(args)
+    sup.start()
+    try:
+        assert wait_until(lambda: all(worker.beat.value for worker in sup.workers))
+
+        def call(method, request):
+            # A channel of its own gets a fresh connection, which may land on either worker
+            with grpc.insecure_channel(f"127.0.0.1:{port}", options=[("grpc.use_local_subchannel_pool", 1)]) as channel:
+                return getattr(notes_pb2_grpc.NoteServiceStub(channel), method)(request)
+
+        note_id = call("CreateNote", notes_pb2.CreateNoteRequest(title="v1")).id
+        for _ in range(10):  # warm whatever cache each worker might have
+            call("GetNote", notes_pb2.GetNoteRequest(id=note_id))
+        for version in range(2, 7):
+            call("UpdateNote", notes_pb2.UpdateNoteRequest(id=note_id, title=f"v{version}",
+                                                           expected_version=version - 1))
+            for _ in range(3):
+                assert call("GetNote", notes_pb2.GetNoteRequest(id=note_id)).note.title == f"v{version}"
+    finally:
+        sup.stop()
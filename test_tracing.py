@@ -0,0 +1,190 @@
+import asyncio
+import json
+import logging
+import threading
+import time
+from concurrent import futures
+
+import grpc
+import pytest
+from pytest_mock import MockerFixture
+
+import admin
+import aio_server
+import database
+import server
+import storage
+import tracing
+
+# These imports will fail in PyCharm but work in Docker
+import notes_pb2
+import notes_pb2_grpc
+
+
+def _traced_store(tmp_path, slow_query_ms=0.0):
+    return storage.open_store("sqlite", db_name=str(tmp_path / "notes.db"),
+                              connection_factory=tracing.connection_factory(slow_query_ms))
+
+
+def test_server_writes_chrome_trace(tmp_path):
+    store = _traced_store(tmp_path)
+    tracer = tracing.Tracer(str(tmp_path / "trace.json"))
+    grpc_server, port = server.create_server(store, address="127.0.0.1:0", tracer=tracer)
+    grpc_server.start()
+    try:
+        with grpc.insecure_channel(f"127.0.0.1:{port}") as channel:
+            stub = notes_pb2_grpc.NoteServiceStub(channel)
+            created = stub.CreateNote(notes_pb2.CreateNoteRequest(title="Traced", content="text"))
+            stub.GetNote(notes_pb2.GetNoteRequest(id=created.id))
+            assert len(list(stub.StreamNotes(notes_pb2.ListNotesRequest()))) == 1
+    finally:
+        grpc_server.stop(grace=None).wait()
+        store.close()
+    tracer.close()
+
+    with open(tmp_path / "trace.json") as f:
+        events = json.load(f)
+    roots = {event["name"]: event for event in events if event["cat"] == "rpc"}
+    assert set(roots) == {"CreateNote", "GetNote", "StreamNotes"}
+    get_lane = roots["GetNote"]["tid"]
+    phases = {event["name"] for event in events if event["tid"] == get_lane and event["cat"] == "phase"}
+    assert {"deserialize", "sql.execute", "sql.fetch", "convert", "serialize"} <= phases
+    assert roots["GetNote"]["args"]["rpc.status"] == "OK"
+    assert roots["GetNote"]["args"]["sql.execute_ms"] >= 0
+    statements = [event["args"]["statement"] for event in events
+                  if event["tid"] == get_lane and event["name"] == "sql.execute"]
+    assert any("FROM notes WHERE id = ?" in statement for statement in statements)
+    create_phases = {event["name"] for event in events if event["tid"] == roots["CreateNote"]["tid"]}
+    assert "db.commit" in create_phases  # the fsync at the end of `with conn:`
+
+
+def test_group_commit_flush_is_traced(tmp_path):
+    store = storage.open_store("sqlite", db_name=str(tmp_path / "notes.db"), group_commit=8,
+                               connection_factory=tracing.connection_factory())
+    tracer = tracing.Tracer(str(tmp_path / "trace.json"))
+    grpc_server, port = server.create_server(store, address="127.0.0.1:0", tracer=tracer)
+    grpc_server.start()
+    try:
+        with grpc.insecure_channel(f"127.0.0.1:{port}") as channel:
+            notes_pb2_grpc.NoteServiceStub(channel).CreateNote(notes_pb2.CreateNoteRequest(title="Batched"))
+    finally:
+        grpc_server.stop(grace=None).wait()
+        store.close()
+    tracer.close()
+
+    with open(tmp_path / "trace.json") as f:
+        events = json.load(f)
+    # The writer thread's statements and commit show up under the request that waited for them
+    names = [event["name"] for event in events if event["cat"] == "phase"]
+    assert {"group_commit", "sql.execute", "db.commit"} <= set(names)
+    assert any("INSERT INTO notes" in event["args"].get("statement", "") for event in events)
+
+
+def test_otlp_export(tmp_path):
+    tracer = tracing.Tracer(str(tmp_path / "trace.jsonl"), trace_format="otlp")
+    trace = tracer.start("GetNote")
+    trace.add("sql.execute", time.time_ns(), statement="SELECT 1")
+    trace.accumulate("convert", time.time_ns())
+    tracer.finish(trace, grpc.StatusCode.NOT_FOUND)
+    tracer.close()
+
+    with open(tmp_path / "trace.jsonl") as f:
+        lines = f.read().splitlines()
+    assert len(lines) == 1
+    spans = json.loads(lines[0])["resourceSpans"][0]["scopeSpans"][0]["spans"]
+    root, children = spans[0], spans[1:]
+    assert root["name"] == "GetNote" and "parentSpanId" not in root
+    assert {span["name"] for span in children} == {"sql.execute", "convert"}
+    assert all(span["parentSpanId"] == root["spanId"] and span["traceId"] == root["traceId"] for span in children)
+    assert {"key": "rpc.status", "value": {"stringValue": "NOT_FOUND"}} in root["attributes"]
+
+
+def test_sampling_skips_calls(tmp_path):
+    tracer = tracing.Tracer(str(tmp_path / "trace.json"), sample_rate=0.0)
+    assert tracer.start("GetNote") is None
+    tracer.close()
+
+
+def test_slow_query_log_has_plan(tmp_path, caplog):
+    pool = database.ConnectionPool(str(tmp_path / "notes.db"),
+                                   connection_factory=tracing.connection_factory(slow_query_ms=1e-6))
+    database.migrate(pool.get_connection())
+    store = storage.SQLiteNoteStore(pool)
+    try:
+        with caplog.at_level(logging.WARNING, logger="notes.slow_query"):
+            store.get("missing")
+    finally:
+        store.close()
+    record = next(record for record in caplog.records if "WHERE id = ?" in record.statement)
+    assert record.ms > 0
+    assert "SEARCH notes USING" in record.plan
+
+
+def _spin(stop):
+    while not stop.is_set():
+        sum(range(1000))
+
+
+def test_sample_stacks():
+    stop = threading.Event()
+    thread = threading.Thread(target=_spin, args=(stop,), name="spinner")
+    thread.start()
+    try:
+        counts, samples = tracing.sample_stacks(0.2, interval=0.005)
+    finally:
+        stop.set()
+        thread.join()
+    assert samples > 5
+    spinner = [stack for stack in counts if stack[0] == "spinner"]
+    assert spinner and spinner[0][-1] == "test_tracing.py:_spin"
+    line = tracing.collapse(counts).splitlines()[0]
+    assert line.rsplit(" ", 1)[1].isdigit()
+
+
+def test_admin_profile(mocker: MockerFixture):
+    service = admin.AdminService(storage.MemoryNoteStore())
+    stop = threading.Event()
+    thread = threading.Thread(target=_spin, args=(stop,), name="spinner")
+    thread.start()
+    try:
+        response = service.Profile(notes_pb2.ProfileRequest(seconds=0.05, interval_ms=5), mocker.Mock())
+    finally:
+        stop.set()
+        thread.join()
+    assert response.samples > 0 and "spinner;" in response.collapsed_stacks
+
+    mock_context = mocker.Mock()
+    service.Profile(notes_pb2.ProfileRequest(seconds=120), mock_context)
+    mock_context.set_code.assert_called_once_with(grpc.StatusCode.INVALID_ARGUMENT)
+
+
+def test_aio_server_traces_executor_work(tmp_path):
+    store = _traced_store(tmp_path)
+    tracer = tracing.Tracer(str(tmp_path / "trace.json"))
+
+    async def scenario():
+        executor = futures.ThreadPoolExecutor(max_workers=2)
+        grpc_server = grpc.aio.server(interceptors=[tracing.AioTracingInterceptor(tracer)])
+        notes_pb2_grpc.add_NoteServiceServicer_to_server(
+            aio_server.AsyncNoteService(server.NoteService(store), executor), grpc_server)
+        port = grpc_server.add_insecure_port("127.0.0.1:0")
+        await grpc_server.start()
+        async with grpc.aio.insecure_channel(f"127.0.0.1:{port}") as channel:
+            stub = notes_pb2_grpc.NoteServiceStub(channel)
+            await stub.CreateNote(notes_pb2.CreateNoteRequest(title="Async"))
+        await grpc_server.stop(None)
+        executor.shutdown()
+
+    try:
+        asyncio.run(scenario())
+    finally:
+        store.close()
+    tracer.close()
+    with open(tmp_path / "trace.json") as f:
+        names = {event["name"] for event in json.load(f)}
+    assert {"CreateNote", "sql.execute", "serialize"} <= names
+
+
+def test_tracer_rejects_unknown_format(tmp_path):
+    with pytest.raises(ValueError):
+        tracing.Tracer(str(tmp_path / "trace.json"), trace_format="zipkin")
@@ -0,0 +1,566 @@
+"""Opt-in request tracing, a slow-query log and a sampling profiler.
+
+Tracing (server.py --trace-file) gives every sampled RPC a request span
+with children for the phases it spent time in:
+
+    deserialize / serialize  request and response protobuf (de)serialization
+    db.connect               opening a pooled SQLite connection
+    sql.execute              one span per statement, with the SQL
+    db.commit / db.rollback  ending a transaction (the commit is where the fsync happens)
+    sql.fetch                stepping through result rows (one span, summed)
+    convert                  rows -> notes_pb2.Note (one span, summed)
+    group_commit             waiting for the group-commit writer; the writer's
+                             statements and commit for the batch are copied
+                             into every request that was in it
+
+The request span also carries the total milliseconds per phase. Spans are
+appended to the file as each request finishes, either as Chrome trace
+events (open it in chrome://tracing or https://ui.perfetto.dev) or as
+OTLP/JSON, one ExportTraceServiceRequest per line (what the OpenTelemetry
+collector's file exporter writes).
+
+The SQL spans and the slow-query log (--slow-query-ms) come from
+TracedConnection, a sqlite3.Connection subclass that is only used when
+one of them is on. Statements slower than the threshold are logged to
+"notes.slow_query" with their EXPLAIN QUERY PLAN.
+
+sample_stacks() is the sampling profiler behind AdminService.Profile: it
+snapshots every thread's stack at a fixed interval and returns the counts
+as collapsed stacks, the input format of flamegraph.pl and speedscope.
+"""
+import collections
+import contextlib
+import contextvars
+import itertools
+import json
+import logging
+import os
+import random
+import sqlite3
+import sys
+import threading
+import time
+
+import grpc
+
+TRACE_FORMATS = ("chrome", "otlp")
+MAX_STATEMENT_LENGTH = 500  # characters of SQL kept in a span / log record
+PLAN_CACHE_SIZE = 256  # EXPLAIN QUERY PLAN results kept per connection class
+PROFILE_INTERVAL = 0.01  # seconds between stack samples
+MAX_PROFILE_SECONDS = 60.0
+# Stacks ending in these files are threads waiting for work, left out by default
+IDLE_FILES = ("threading.py", "queue.py", "selectors.py")
+
+logger = logging.getLogger("notes.tracing")
+slow_query_logger = logging.getLogger("notes.slow_query")
+
+_current = contextvars.ContextVar("notes_trace", default=None)
+
+
+def current():
+    """The Trace of the RPC running in this context, or None."""
+    return _current.get()
+
+
+# --- Spans ---
+
+class Span:
+    __slots__ = ("name", "span_id", "start_ns", "end_ns", "attributes")
+
+    def __init__(self, name, start_ns, end_ns=None, attributes=None):
+        self.name = name
+        self.span_id = os.urandom(8).hex()
+        self.start_ns = start_ns
+        self.end_ns = end_ns
+        self.attributes = attributes or {}
+
+
+class Trace:
+    """The spans of one RPC: a root span and its direct children."""
+
+    def __init__(self, method):
+        self.trace_id = os.urandom(16).hex()
+        self.root = Span(method, time.time_ns(), attributes={"rpc.method": method})
+        self.spans = []
+        # Phases that happen per row are summed into one span each:
+        # name -> [first start, total ns, calls]
+        self._totals = {}
+
+    def add(self, name, start_ns, end_ns=None, **attributes):
+        self.spans.append(Span(name, start_ns, end_ns or time.time_ns(), attributes))
+
+    def accumulate(self, name, start_ns):
+        elapsed = time.time_ns() - start_ns
+        total = self._totals.get(name)
+        if total is None:
+            self._totals[name] = [start_ns, elapsed, 1]
+        else:
+            total[1] += elapsed
+            total[2] += 1
+
+    def finish(self, code=None):
+        self.root.end_ns = time.time_ns()
+        for name, (start_ns, total, calls) in self._totals.items():
+            self.spans.append(Span(name, start_ns, start_ns + total, {"calls": calls}))
+        phases = collections.Counter()
+        for span in self.spans:
+            phases[span.name] += span.end_ns - span.start_ns
+        for name, total in phases.items():
+            self.root.attributes[f"{name}_ms"] = round(total / 1e6, 3)
+        self.root.attributes["rpc.status"] = (code or grpc.StatusCode.OK).name
+
+
+class _SpanContext:
+    __slots__ = ("trace", "name", "started")
+
+    def __init__(self, trace, name):
+        self.trace = trace
+        self.name = name
+
+    def __enter__(self):
+        self.started = time.time_ns()
+
+    def __exit__(self, *exc_info):
+        self.trace.add(self.name, self.started)
+
+
+class _NoSpan:
+    def __enter__(self):
+        pass
+
+    def __exit__(self, *exc_info):
+        pass
+
+
+_NO_SPAN = _NoSpan()
+
+
+def span(name):
+    """`with span("phase"):` records a child span of the current trace, if there is one."""
+    trace = _current.get()
+    return _NO_SPAN if trace is None else _SpanContext(trace, name)
+
+
+@contextlib.contextmanager
+def shared(traces):
+    """Records the block's spans into each of `traces`, for work done on behalf of several RPCs.
+
+    The RPCs' threads must not touch their traces meanwhile (they are waiting on the block).
+    """
+    traces = [trace for trace in traces if trace is not None]
+    if not traces:
+        yield
+        return
+    batch = Trace("batch")
+    token = _current.set(batch)
+    try:
+        yield
+    finally:
+        _current.reset(token)
+        batch.finish()
+        for trace in traces:
+            trace.spans.extend(Span(s.name, s.start_ns, s.end_ns, dict(s.attributes)) for s in batch.spans)
+
+
+# --- Export ---
+
+def chrome_events(trace, lane):
+    """Chrome trace "complete" events; each request gets its own lane (tid)."""
+    pid = os.getpid()
+    return [{"name": s.name, "cat": "rpc" if s is trace.root else "phase", "ph": "X",
+             "ts": s.start_ns / 1000, "dur": (s.end_ns - s.start_ns) / 1000, "pid": pid, "tid": lane,
+             "args": s.attributes}
+            for s in [trace.root] + trace.spans]
+
+
+def _otlp_value(value):
+    if isinstance(value, bool):
+        return {"boolValue": value}
+    if isinstance(value, int):
+        return {"intValue": str(value)}
+    if isinstance(value, float):
+        return {"doubleValue": value}
+    return {"stringValue": str(value)}
+
+
+def otlp_request(trace, service_name="notes"):
+    """An OTLP/JSON ExportTraceServiceRequest holding the trace."""
+    def otlp_span(s, parent=None):
+        result = {"traceId": trace.trace_id, "spanId": s.span_id, "name": s.name,
+                  "kind": 2 if parent is None else 1,  # SERVER / INTERNAL
+                  "startTimeUnixNano": str(s.start_ns), "endTimeUnixNano": str(s.end_ns),
+                  "attributes": [{"key": key, "value": _otlp_value(value)} for key, value in s.attributes.items()]}
+        if parent is not None:
+            result["parentSpanId"] = parent.span_id
+        return result
+
+    spans = [otlp_span(trace.root)] + [otlp_span(s, trace.root) for s in trace.spans]
+    return {"resourceSpans": [{
+        "resource": {"attributes": [{"key": "service.name", "value": {"stringValue": service_name}}]},
+        "scopeSpans": [{"scope": {"name": "notes.tracing"}, "spans": spans}],
+    }]}
+
+
+class Tracer:
+    """Starts traces for a `sample_rate` fraction of RPCs and appends finished ones to `path`."""
+
+    def __init__(self, path, trace_format="chrome", sample_rate=1.0):
+        if trace_format not in TRACE_FORMATS:
+            raise ValueError(f"Unknown trace format: {trace_format}")
+        self.path = path
+        self.trace_format = trace_format
+        self.sample_rate = sample_rate
+        self.traces = 0
+        self._lanes = itertools.count(1)
+        self._lock = threading.Lock()
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self._file = open(path, "w", encoding="utf-8")
+        if trace_format == "chrome":
+            # JSON array format; viewers accept it without the closing "]",
+            # so the file is usable even if the server never closes it
+            self._file.write("[\n")
+
+    def start(self, method):
+        """Returns a Trace for this call, or None if it isn't sampled."""
+        if self.sample_rate < 1.0 and random.random() >= self.sample_rate:
+            return None
+        return Trace(method)
+
+    def finish(self, trace, code=None):
+        trace.finish(code)
+        with self._lock:
+            if self._file is None:
+                return
+            if self.trace_format == "chrome":
+                events = chrome_events(trace, next(self._lanes))
+                text = "".join((",\n" if self.traces or i else "") + json.dumps(event)
+                               for i, event in enumerate(events))
+            else:
+                text = json.dumps(otlp_request(trace)) + "\n"
+            self._file.write(text)
+            self._file.flush()
+            self.traces += 1
+
+    def close(self):
+        with self._lock:
+            if self._file is None:
+                return
+            if self.trace_format == "chrome":
+                self._file.write("\n]\n")
+            self._file.close()
+            self._file = None
+
+
+# --- Interceptors ---
+
+def _method_name(handler_call_details):
+    return handler_call_details.method.rsplit("/", 1)[-1]
+
+
+def _timed(trace, name, function):
+    if function is None:
+        return None
+
+    def timed(value):
+        started = time.time_ns()
+        try:
+            return function(value)
+        finally:
+            trace.add(name, started)
+    return timed
+
+
+class TracingInterceptor(grpc.ServerInterceptor):
+    """Traces sampled calls on the thread pool server.
+
+    The trace is the current one while the handler runs, so storage code
+    can add spans to it, and it is written out when the RPC terminates,
+    after the response was serialized.
+    """
+
+    def __init__(self, tracer):
+        self.tracer = tracer
+
+    def intercept_service(self, continuation, handler_call_details):
+        handler = continuation(handler_call_details)
+        if handler is None:
+            return None
+        trace = self.tracer.start(_method_name(handler_call_details))
+        if trace is None:
+            return handler
+        tracer = self.tracer
+
+        def run(behavior, request, context):
+            context.add_callback(lambda: tracer.finish(trace, context.code()))
+            token = _current.set(trace)
+            try:
+                return behavior(request, context)
+            finally:
+                _current.reset(token)
+
+        def run_stream(behavior, request, context):
+            context.add_callback(lambda: tracer.finish(trace, context.code()))
+            # Set and cleared around each step: grpc may resume the
+            # generator from another context
+            iterator = iter(behavior(request, context))
+            while True:
+                token = _current.set(trace)
+                try:
+                    response = next(iterator)
+                except StopIteration:
+                    return
+                finally:
+                    _current.reset(token)
+                yield response
+
+        deserializer = _timed(trace, "deserialize", handler.request_deserializer)
+        serializer = _timed(trace, "serialize", handler.response_serializer)
+        if handler.unary_unary:
+            return grpc.unary_unary_rpc_method_handler(
+                lambda request, context: run(handler.unary_unary, request, context), deserializer, serializer)
+        if handler.unary_stream:
+            return grpc.unary_stream_rpc_method_handler(
+                lambda request, context: run_stream(handler.unary_stream, request, context), deserializer, serializer)
+        if handler.stream_unary:
+            return grpc.stream_unary_rpc_method_handler(
+                lambda request_iterator, context: run(handler.stream_unary, request_iterator, context),
+                deserializer, serializer)
+        return grpc.stream_stream_rpc_method_handler(
+            lambda request_iterator, context: run_stream(handler.stream_stream, request_iterator, context),
+            deserializer, serializer)
+
+
+class AioTracingInterceptor(grpc.aio.ServerInterceptor):
+    """grpc.aio version of TracingInterceptor.
+
+    Every call runs in its own task, so setting the trace once is enough;
+    AsyncNoteService copies the context into its executor calls.
+    """
+
+    def __init__(self, tracer):
+        self.tracer = tracer
+
+    async def intercept_service(self, continuation, handler_call_details):
+        handler = await continuation(handler_call_details)
+        if handler is None:
+            return None
+        trace = self.tracer.start(_method_name(handler_call_details))
+        if trace is None:
+            return handler
+        tracer = self.tracer
+
+        def begin(context):
+            context.add_done_callback(lambda done: tracer.finish(trace, done.code()))
+            _current.set(trace)
+
+        # Real async functions / generators, as in AioMetricsInterceptor
+        async def unary(behavior, request, context):
+            begin(context)
+            return await behavior(request, context)
+
+        async def stream(behavior, request, context):
+            begin(context)
+            async for response in behavior(request, context):
+                yield response
+
+        deserializer = _timed(trace, "deserialize", handler.request_deserializer)
+        serializer = _timed(trace, "serialize", handler.response_serializer)
+        if handler.unary_unary:
+            async def unary_unary(request, context):
+                return await unary(handler.unary_unary, request, context)
+            return grpc.unary_unary_rpc_method_handler(unary_unary, deserializer, serializer)
+        if handler.unary_stream:
+            async def unary_stream(request, context):
+                async for response in stream(handler.unary_stream, request, context):
+                    yield response
+            return grpc.unary_stream_rpc_method_handler(unary_stream, deserializer, serializer)
+        if handler.stream_unary:
+            async def stream_unary(request_iterator, context):
+                return await unary(handler.stream_unary, request_iterator, context)
+            return grpc.stream_unary_rpc_method_handler(stream_unary, deserializer, serializer)
+
+        async def stream_stream(request_iterator, context):
+            async for response in stream(handler.stream_stream, request_iterator, context):
+                yield response
+        return grpc.stream_stream_rpc_method_handler(stream_stream, deserializer, serializer)
+
+
+# --- SQLite statements ---
+
+class TracedCursor(sqlite3.Cursor):
+    """Adds sql.execute / sql.fetch spans and slow-query logging to a cursor."""
+
+    def execute(self, sql, parameters=()):
+        started = time.time_ns()
+        try:
+            return super().execute(sql, parameters)
+        finally:
+            self.connection.statement_done(sql, parameters, started)
+
+    def executemany(self, sql, seq_of_parameters):
+        started = time.time_ns()
+        try:
+            return super().executemany(sql, seq_of_parameters)
+        finally:
+            self.connection.statement_done(sql, None, started)
+
+    def _fetched(self, started):
+        trace = _current.get()
+        if trace is not None:
+            trace.accumulate("sql.fetch", started)
+
+    def fetchone(self):
+        started = time.time_ns()
+        try:
+            return super().fetchone()
+        finally:
+            self._fetched(started)
+
+    def fetchmany(self, size=None):
+        started = time.time_ns()
+        try:
+            return super().fetchmany(size if size is not None else self.arraysize)
+        finally:
+            self._fetched(started)
+
+    def fetchall(self):
+        started = time.time_ns()
+        try:
+            return super().fetchall()
+        finally:
+            self._fetched(started)
+
+    def __next__(self):
+        started = time.time_ns()
+        try:
+            return super().__next__()
+        finally:
+            self._fetched(started)
+
+
+class TracedConnection(sqlite3.Connection):
+    """sqlite3.Connection whose statements show up in traces and the slow-query log.
+
+    Use connection_factory() to get one with a slow-query threshold.
+    """
+
+    slow_query_ms = 0.0  # 0 = no slow-query log
+    _plans = collections.OrderedDict()  # SQL -> plan text, per subclass
+    _plans_lock = threading.Lock()
+
+    def cursor(self, factory=TracedCursor):
+        return super().cursor(factory)
+
+    def execute(self, sql, parameters=()):
+        return self.cursor().execute(sql, parameters)
+
+    def executemany(self, sql, seq_of_parameters):
+        return self.cursor().executemany(sql, seq_of_parameters)
+
+    def commit(self):
+        with span("db.commit"):
+            super().commit()
+
+    def rollback(self):
+        with span("db.rollback"):
+            super().rollback()
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        # `with conn:` commits or rolls back in C, without calling the methods above
+        with span("db.commit" if exc_type is None else "db.rollback"):
+            return super().__exit__(exc_type, exc_value, traceback)
+
+    def statement_done(self, sql, parameters, started):
+        ended = time.time_ns()
+        trace = _current.get()
+        if trace is not None:
+            trace.add("sql.execute", started, ended, statement=sql.strip()[:MAX_STATEMENT_LENGTH])
+        elapsed_ms = (ended - started) / 1e6
+        if self.slow_query_ms and elapsed_ms >= self.slow_query_ms:
+            slow_query_logger.warning("Slow SQL statement", extra={
+                "ms": round(elapsed_ms, 3), "statement": " ".join(sql.split())[:MAX_STATEMENT_LENGTH],
+                "plan": self.query_plan(sql, parameters)})
+
+    def query_plan(self, sql, parameters):
+        """EXPLAIN QUERY PLAN output as indented lines, or None if there isn't one.
+
+        Plans are cached per statement text: the same SQL gets the same plan.
+        """
+        with self._plans_lock:
+            if sql in self._plans:
+                self._plans.move_to_end(sql)
+                return self._plans[sql]
+        if parameters is None:
+            return None  # executemany: one plan per row isn't worth it
+        try:
+            rows = sqlite3.Connection.execute(self, "EXPLAIN QUERY PLAN " + sql, parameters).fetchall()
+        except sqlite3.Error:
+            rows = []
+        depths = {0: -1}
+        lines = []
+        for node_id, parent, _, detail in rows:
+            depths[node_id] = depths.get(parent, -1) + 1
+            lines.append("  " * depths[node_id] + detail)
+        plan = "\n".join(lines) or None
+        with self._plans_lock:
+            self._plans[sql] = plan
+            if len(self._plans) > PLAN_CACHE_SIZE:
+                self._plans.popitem(last=False)
+        return plan
+
+
+def connection_factory(slow_query_ms=0.0):
+    """A TracedConnection subclass logging statements slower than slow_query_ms (0 = never)."""
+    return type("TracedConnection", (TracedConnection,), {
+        "slow_query_ms": slow_query_ms, "_plans": collections.OrderedDict(), "_plans_lock": threading.Lock()})
+
+
+# --- Sampling profiler ---
+
+_profile_lock = threading.Lock()
+
+
+class ProfilerBusyError(Exception):
+    """Another profile is already being taken."""
+
+
+def _stack(frame, thread_name):
+    names = []
+    while frame is not None:
+        names.append(f"{os.path.basename(frame.f_code.co_filename)}:{frame.f_code.co_name}")
+        frame = frame.f_back
+    return [thread_name] + names[::-1]
+
+
+def sample_stacks(seconds, interval=PROFILE_INTERVAL, include_idle=False):
+    """Samples every other thread's stack for `seconds`; returns (Counter of stacks, samples taken).
+
+    A stack is the thread name followed by "file:function" frames, outermost
+    first. Raises ProfilerBusyError if a profile is already running.
+    """
+    if not _profile_lock.acquire(blocking=False):
+        raise ProfilerBusyError("A profile is already being taken")
+    try:
+        me = threading.get_ident()
+        counts = collections.Counter()
+        samples = 0
+        deadline = time.monotonic() + seconds
+        while time.monotonic() < deadline:
+            names = {thread.ident: thread.name for thread in threading.enumerate()}
+            for ident, frame in sys._current_frames().items():
+                if ident == me:
+                    continue
+                if not include_idle and os.path.basename(frame.f_code.co_filename) in IDLE_FILES:
+                    continue
+                counts[tuple(_stack(frame, names.get(ident, str(ident))))] += 1
+            samples += 1
+            time.sleep(interval)
+        return counts, samples
+    finally:
+        _profile_lock.release()
+
+
+def collapse(counts):
+    """Collapsed stack text: "frame;frame;frame count" per line, most frequent first."""
+    return "".join(f"{';'.join(stack)} {count}\n" for stack, count in counts.most_common())